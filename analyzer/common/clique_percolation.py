@@ -0,0 +1,212 @@
+"""
+=================================== LICENSE ==================================
+Copyright (c) 2021, Consortium Board ROXANNE
+All rights reserved.
+
+Redistribution and use in source and binary forms, with or without
+modification, are permitted provided that the following conditions are met:
+
+Redistributions of source code must retain the above copyright
+notice, this list of conditions and the following disclaimer.
+
+Redistributions in binary form must reproduce the above copyright
+notice, this list of conditions and the following disclaimer in the
+documentation and/or other materials provided with the distribution.
+
+Neither the name of the ROXANNE nor the
+names of its contributors may be used to endorse or promote products
+derived from this software without specific prior written permission.
+
+THIS SOFTWARE IS PROVIDED BY CONSORTIUM BOARD ROXANNE ``AS IS'' AND ANY
+EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+DISCLAIMED. IN NO EVENT SHALL CONSORTIUM BOARD TENCOMPETENCE BE LIABLE FOR ANY
+DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+(INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+(INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+==============================================================================
+"""
+import time
+from itertools import combinations
+
+from scipy.special import comb
+
+
+def degeneracy_ordering(neighbors):
+    """
+    degeneracy ordering and core numbers by the bucket algorithm of Batagelj & Zaversnik (2003), O(n + m)
+    :param neighbors: neighbors[v] is the collection of neighbors of node v (0..n-1), without self-loops
+    :return: (order, core): nodes by increasing core number, each one having at most core[v] neighbors after it,
+        and the core number of every node
+    """
+    n = len(neighbors)
+    degree = [len(a) for a in neighbors]
+    max_degree = max(degree, default=0)
+    # bins[d]: first position of the nodes of degree d in `order`
+    bins = [0] * (max_degree + 1)
+    for d in degree:
+        bins[d] += 1
+    start = 0
+    for d in range(max_degree + 1):
+        bins[d], start = start, start + bins[d]
+    position = [0] * n
+    order = [0] * n
+    for v in range(n):
+        position[v] = bins[degree[v]]
+        order[position[v]] = v
+        bins[degree[v]] += 1
+    for d in range(max_degree, 0, -1):
+        bins[d] = bins[d - 1]
+    bins[0] = 0
+
+    for i in range(n):
+        v = order[i]
+        for u in neighbors[v]:
+            if degree[u] > degree[v]:
+                # move u to the front of its bin, then to the bin below
+                du, pu = degree[u], position[u]
+                pw = bins[du]
+                w = order[pw]
+                if u != w:
+                    position[u], position[w] = pw, pu
+                    order[pu], order[pw] = w, u
+                bins[du] += 1
+                degree[u] -= 1
+    return order, degree
+
+
+class _UnionFind:
+    def __init__(self, n):
+        self.parent = list(range(n))
+
+    def find(self, x):
+        root = x
+        while self.parent[root] != root:
+            root = self.parent[root]
+        while self.parent[x] != root:
+            self.parent[x], x = root, self.parent[x]
+        return root
+
+    def union(self, x, y):
+        x, y = self.find(x), self.find(y)
+        if x != y:
+            self.parent[max(x, y)] = min(x, y)
+
+
+class _Percolation:
+    """
+    union of the cliques sharing at least k-1 nodes, maintained as cliques are added. small cliques are joined
+    through a hash of their (k-1)-subsets, cliques with more than `max_subsets` such subsets are compared to the
+    others by counting the shared nodes
+    """
+
+    def __init__(self, k, max_subsets=1000):
+        self.k = k
+        self.max_subsets = max_subsets
+        self.cliques = []
+        self.components = _UnionFind(0)
+        self.owners = {}
+        self.node_cliques = {}
+        self.node_large_cliques = {}
+
+    def _union_overlapping(self, i, index):
+        shared = {}
+        for u in self.cliques[i]:
+            for j in index.get(u, ()):
+                shared[j] = shared.get(j, 0) + 1
+        for j, count in shared.items():
+            if j != i and count >= self.k - 1:
+                self.components.union(i, j)
+
+    def add(self, clique):
+        i = len(self.cliques)
+        self.cliques.append(clique)
+        self.components.parent.append(i)
+        large = comb(len(clique), self.k - 1, exact=True) > self.max_subsets
+        if large:
+            self._union_overlapping(i, self.node_cliques)
+        else:
+            self._union_overlapping(i, self.node_large_cliques)
+            for subset in combinations(sorted(clique), self.k - 1):
+                if subset in self.owners:
+                    self.components.union(i, self.owners[subset])
+                else:
+                    self.owners[subset] = i
+        for u in clique:
+            self.node_cliques.setdefault(u, []).append(i)
+            if large:
+                self.node_large_cliques.setdefault(u, []).append(i)
+
+    def communities(self):
+        """
+        :return: list of communities, each one a set of nodes
+        """
+        communities = {}
+        for i, clique in enumerate(self.cliques):
+            communities.setdefault(self.components.find(i), set()).update(clique)
+        return list(communities.values())
+
+
+def _percolate_maximal_cliques(neighbors, order, k, deadline, max_cliques):
+    """
+    maximal cliques of at least k nodes by Bron-Kerbosch with pivoting, the outer loop following a degeneracy
+    ordering (Eppstein, Löffler & Strash, 2010), each one merged into the percolation as soon as it is found.
+    the search stops when the deadline or the number of cliques is reached
+    :return: (percolation, complete)
+    """
+    rank = {v: i for i, v in enumerate(order)}
+    percolation = _Percolation(k)
+    steps = 0
+    for v in order:
+        later = {u for u in neighbors[v] if rank[u] > rank[v]}
+        if len(later) + 1 < k:
+            continue
+        stack = [([v], later, neighbors[v] - later)]
+        while stack:
+            steps += 1
+            if deadline is not None and steps % 256 == 0 and time.perf_counter() > deadline:
+                return percolation, False
+            clique, candidates, excluded = stack.pop()
+            if not candidates:
+                if not excluded and len(clique) >= k:
+                    percolation.add(clique)
+                    if max_cliques is not None and len(percolation.cliques) >= max_cliques:
+                        return percolation, False
+                continue
+            if len(clique) + len(candidates) < k:
+                continue
+            pivot = max(candidates | excluded, key=lambda u: len(candidates & neighbors[u]))
+            for u in list(candidates - neighbors[pivot]):
+                stack.append((clique + [u], candidates & neighbors[u], excluded & neighbors[u]))
+                candidates = candidates - {u}
+                excluded = excluded | {u}
+    return percolation, True
+
+
+def k_clique_communities(neighbors, k, time_budget=None, max_cliques=None):
+    """
+    k-clique percolation (Palla et al., 2005): communities are unions of k-cliques reachable from each other
+    through k-cliques sharing k-1 nodes, equivalently of the maximal cliques of at least k nodes sharing at
+    least k-1 nodes. nodes of core number below k-1 cannot be in a k-clique and are removed before enumeration
+    :param neighbors: neighbors[v] is the collection of neighbors of node v (0..n-1) in an undirected graph
+    :param k: size of the smallest clique, at least 2
+    :param time_budget: optional number of seconds of clique enumeration
+    :param max_cliques: optional maximal number of enumerated maximal cliques
+    :return: (communities, complete): list of sets of nodes, and False if a budget stopped the enumeration,
+        in which case the communities are built from the cliques found so far
+    """
+    if k < 2:
+        raise ValueError('k must be at least 2, got %d' % k)
+    deadline = None if time_budget is None else time.perf_counter() + time_budget
+    neighbors = [set(a) - {v} for v, a in enumerate(neighbors)]
+    _, core = degeneracy_ordering(neighbors)
+    kept = [core[v] >= k - 1 for v in range(len(neighbors))]
+    pruned = [{u for u in a if kept[u]} if kept[v] else set() for v, a in enumerate(neighbors)]
+    # the ordering of the pruned graph, so that the outer loop of the enumeration has the degeneracy bound
+    order, _ = degeneracy_ordering(pruned)
+    order = [v for v in order if kept[v]]
+    percolation, complete = _percolate_maximal_cliques(pruned, order, k, deadline, max_cliques)
+    return percolation.communities(), complete
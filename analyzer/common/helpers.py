@@ -31,6 +31,7 @@ SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
 """
 import networkx as nx
 from scipy.sparse import csr_matrix
+from analyzer.common import instrumentation
 
 def is_valid(edge, params):
     """
@@ -57,7 +58,7 @@ def is_valid(edge, params):
     return True
 
 
-def get_edges_and_node_ids(network, params):
+def get_edges_and_node_ids(network, params, node_is_str=False):
     nodes = {}
     edges = []
     node_ids = []
@@ -82,12 +83,16 @@ def get_edges_and_node_ids(network, params):
             else:
                 target_index = nodes[target]
 
-            edges.append((source_index, target_index))
+            if node_is_str:
+                edges.append((str(source_index), str(target_index)))
+            else:
+                edges.append((source_index, target_index))
 
     return edges, node_ids
 
 
-def convert_to_nx_undirected_graph(network, params=None):
+@instrumentation.traced()
+def convert_to_nx_undirected_graph(network, params=None, node_is_str=False):
     """
     convert a undirected network in edge list format into `networkx` network
     :param network: is a dictionany having two keys 'edges' and 'nodes', 
@@ -108,18 +113,21 @@ def convert_to_nx_undirected_graph(network, params=None):
                                 ...
                             }
     :param params: options for filtering edges #TODO: to add options
+    :param node_is_str: if True, nodes of nx_network are indexed by strings '0', '1', etc (as required by
+                        the word2vec based embedding models)
     :return: (nx_network, node_ids)
         nx_network: networkx network with nodes indexed to 0, 1, etc
         node_ids: ids of nodes in input network, i.e., node_ids[i] is original id node i of nx_network
     """
-    edges, node_ids = get_edges_and_node_ids(network, params)
+    edges, node_ids = get_edges_and_node_ids(network, params, node_is_str)
 
     graph = nx.Graph()
     graph.add_edges_from(edges)
     return graph, node_ids
 
 
-def convert_to_nx_directed_graph(network, params=None):
+@instrumentation.traced()
+def convert_to_nx_directed_graph(network, params=None, node_is_str=False):
     """
     convert a directed network in edge list format into `networkx` network
     :param network: is a dictionany having two keys 'edges' and 'nodes', 
@@ -140,16 +148,19 @@ def convert_to_nx_directed_graph(network, params=None):
                                 ...
                             }
     :param params: options for filtering edges #TODO: to add options
+    :param node_is_str: if True, nodes of nx_network are indexed by strings '0', '1', etc (as required by
+                        the word2vec based embedding models)
     :return: (nx_network, node_ids)
         nx_network: networkx network with nodes indexed to 0, 1, etc
         node_ids: ids of nodes in input network, i.e., node_ids[i] is original id node i of nx_network
     """
-    edges, node_ids = get_edges_and_node_ids(network, params)
+    edges, node_ids = get_edges_and_node_ids(network, params, node_is_str)
 
     graph = nx.DiGraph()
     graph.add_edges_from(edges)
     return graph, node_ids
 
+@instrumentation.traced()
 def convert_to_csr_sparse_matrix(network, params=None):
     """
     convert a network in edge list format into scipy  csr_sparse matrix
@@ -171,8 +182,8 @@ def convert_to_csr_sparse_matrix(network, params=None):
                                 ...
                             }
     :param params: options for filtering edges #TODO: to add options
-    :return: (nx_network, node_ids)
-        matrix: scipy csr_sparse matrix
+    :return: (matrix, node_ids)
+        matrix: scipy csr_sparse matrix of shape (n, n), n being the number of nodes
         node_ids: ids of nodes in input matrix, i.e., node_ids[i] is original id node i of nx_network
     """
     nodes = {}
@@ -208,6 +219,6 @@ def convert_to_csr_sparse_matrix(network, params=None):
             cols.append(target_index)
             weights.append(weight)
 
-    matrix = csr_matrix((weights, (rows, cols)))
-    matrix = matrix.asfptype()
+    # square, so that rows and columns both index all nodes of the network
+    matrix = csr_matrix((weights, (rows, cols)), shape=(len(node_ids), len(node_ids)), dtype=float)
     return matrix, node_ids
@@ -0,0 +1,302 @@
+"""
+=================================== LICENSE ==================================
+Copyright (c) 2021, Consortium Board ROXANNE
+All rights reserved.
+
+Redistribution and use in source and binary forms, with or without
+modification, are permitted provided that the following conditions are met:
+
+Redistributions of source code must retain the above copyright
+notice, this list of conditions and the following disclaimer.
+
+Redistributions in binary form must reproduce the above copyright
+notice, this list of conditions and the following disclaimer in the
+documentation and/or other materials provided with the distribution.
+
+Neither the name of the ROXANNE nor the
+names of its contributors may be used to endorse or promote products
+derived from this software without specific prior written permission.
+
+THIS SOFTWARE IS PROVIDED BY CONSORTIUM BOARD ROXANNE ``AS IS'' AND ANY
+EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+DISCLAIMED. IN NO EVENT SHALL CONSORTIUM BOARD TENCOMPETENCE BE LIABLE FOR ANY
+DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+(INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+(INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+==============================================================================
+"""
+import os
+import time
+import threading
+import functools
+import tracemalloc
+
+# spans are recorded only on the threads where a Recorder is active, so that code instrumented with `span` and
+# `traced` costs a thread-local lookup when nothing is recorded
+class _Local(threading.local):
+    # a class attribute, so that threads without a recorder do not pay for a failed lookup
+    recorder = None
+
+
+_local = _Local()
+
+# instrumentation of the entry points (analysis requests, celery tasks), set from ROXANNE_INSTRUMENTATION:
+# '1' or 'true' records times, 'memory' records times and peak allocations
+_settings = {'enabled': False, 'memory': False}
+
+
+def enable(memory=False):
+    """
+    let the entry points record the stages of the requests they serve
+    :param memory: also record the peak allocation of every stage with tracemalloc, which slows the code down
+    """
+    _settings['enabled'] = True
+    _settings['memory'] = memory
+
+
+def disable():
+    _settings['enabled'] = False
+    _settings['memory'] = False
+
+
+def is_enabled():
+    return _settings['enabled']
+
+
+def _configure_from_environment():
+    value = os.environ.get('ROXANNE_INSTRUMENTATION', '').strip().lower()
+    if value in ('1', 'true', 'yes', 'on'):
+        enable()
+    elif value == 'memory':
+        enable(memory=True)
+
+
+_configure_from_environment()
+
+
+def current_recorder():
+    """
+    :return: the Recorder active on the current thread, None if nothing is recorded
+    """
+    return _local.recorder
+
+
+def new_recorder():
+    """
+    recorder for an entry point: None if the instrumentation is disabled or if an outer entry point is already
+    recording on this thread (its stages then include the ones of the inner entry point)
+    """
+    if not _settings['enabled'] or current_recorder() is not None:
+        return None
+    return Recorder(memory=_settings['memory'])
+
+
+def current_stages():
+    """
+    :return: stages recorded so far on the current thread (see `Recorder.stages`), None if nothing is recorded
+    """
+    recorder = current_recorder()
+    if recorder is None:
+        return None
+    return recorder.stages()
+
+
+class _Stage:
+    """
+    accumulated measures of the spans with the same path
+    """
+    __slots__ = ('path', 'calls', 'wall_time', 'cpu_time', 'peak_memory', 'attributes')
+
+    def __init__(self, path):
+        self.path = path
+        self.calls = 0
+        self.wall_time = 0.0
+        self.cpu_time = 0.0
+        self.peak_memory = None
+        self.attributes = {}
+
+    def to_dict(self):
+        stage = {'name': self.path, 'calls': self.calls, 'wall_time': self.wall_time, 'cpu_time': self.cpu_time,
+                 'peak_memory': self.peak_memory}
+        if self.attributes:
+            stage['attributes'] = dict(self.attributes)
+        return stage
+
+
+class Span:
+    """
+    a named, timed section of code, used as a context manager; nested spans are recorded under the path of
+    their parents ('perform_analysis/community_detection.louvain/convert_to_csr_sparse_matrix')
+    """
+    __slots__ = ('recorder', 'name', 'attributes', 'path', 'start_wall', 'start_cpu', 'start_memory',
+                 'peak_memory')
+
+    def __init__(self, recorder, name, attributes):
+        self.recorder = recorder
+        self.name = name
+        self.attributes = attributes
+        self.path = None
+        self.peak_memory = 0
+
+    def set(self, key, value):
+        """
+        attach a value (e.g., a number of nodes) to the stage of the span
+        """
+        self.attributes[key] = value
+
+    def __enter__(self):
+        stack = self.recorder.stack
+        self.path = stack[-1].path + '/' + self.name if stack else self.name
+        # stages are listed in the order they are first opened
+        self.recorder.stage(self.path)
+        stack.append(self)
+        if self.recorder.memory:
+            self.start_memory = self.recorder.enter_memory(self)
+        self.start_cpu = time.process_time()
+        self.start_wall = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        wall_time = time.perf_counter() - self.start_wall
+        cpu_time = time.process_time() - self.start_cpu
+        stack = self.recorder.stack
+        stack.pop()
+        stage = self.recorder.stage(self.path)
+        stage.calls += 1
+        stage.wall_time += wall_time
+        stage.cpu_time += cpu_time
+        if self.recorder.memory:
+            peak_memory = self.recorder.exit_memory(self)
+            stage.peak_memory = peak_memory if stage.peak_memory is None else max(stage.peak_memory, peak_memory)
+        if self.attributes:
+            stage.attributes.update(self.attributes)
+        return False
+
+
+class _NullSpan:
+    """
+    span returned when nothing is recorded
+    """
+    __slots__ = ()
+
+    def set(self, key, value):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class Recorder:
+    """
+    collects the spans opened on the thread where it is active, e.g.,
+        with Recorder() as recorder:
+            analyzer.perform_analysis(task, params=None)
+        recorder.stages()
+    """
+
+    def __init__(self, memory=False):
+        """
+        :param memory: also record the peak allocation of every span with tracemalloc. On Python < 3.9, where
+            the peak cannot be reset, the peak of a span is the one since the start of the recording
+        """
+        self.memory = memory
+        self.stack = []
+        self._stages = {}
+        self._started_tracing = False
+        self._outer = None
+
+    def stage(self, path):
+        stage = self._stages.get(path)
+        if stage is None:
+            stage = self._stages[path] = _Stage(path)
+        return stage
+
+    def stages(self):
+        """
+        :return: list of dictionaries, one per span path in the order the spans were first opened, each in the
+            following format
+            {
+                'name': path of the span
+                'calls': number of times the span was opened
+                'wall_time': total elapsed time in seconds
+                'cpu_time': total processor time of the process in seconds
+                'peak_memory': bytes allocated at the peak above the allocations at the start of the span, None if
+                    memory is not recorded
+                'attributes': (optional) values attached to the span
+            }
+        """
+        return [stage.to_dict() for stage in self._stages.values()]
+
+    def enter_memory(self, span):
+        current, peak = tracemalloc.get_traced_memory()
+        if hasattr(tracemalloc, 'reset_peak'):
+            # the peak reached so far belongs to the enclosing spans
+            for outer in self.stack[:-1]:
+                outer.peak_memory = max(outer.peak_memory, peak - outer.start_memory)
+            tracemalloc.reset_peak()
+        return current
+
+    def exit_memory(self, span):
+        _, peak = tracemalloc.get_traced_memory()
+        span.peak_memory = max(span.peak_memory, peak - span.start_memory)
+        return max(span.peak_memory, 0)
+
+    def __enter__(self):
+        if self.memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._started_tracing = True
+        self._outer = current_recorder()
+        _local.recorder = self
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        _local.recorder = self._outer
+        self._outer = None
+        if self._started_tracing:
+            tracemalloc.stop()
+            self._started_tracing = False
+        return False
+
+
+def span(name, **attributes):
+    """
+    open a span in the recorder of the current thread:
+        with span('convert_network', edges=len(edges)):
+            ...
+    :param name: name of the stage, without '/'
+    :param attributes: values attached to the stage
+    :return: the span, a no-op one if nothing is recorded
+    """
+    recorder = _local.recorder
+    if recorder is None:
+        return _NULL_SPAN
+    return Span(recorder, name, attributes)
+
+
+def traced(name=None):
+    """
+    decorator recording every call of a function as a span
+    :param name: name of the span, the name of the function by default
+    """
+    def decorator(function):
+        span_name = name or function.__name__
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            recorder = _local.recorder
+            if recorder is None:
+                return function(*args, **kwargs)
+            with Span(recorder, span_name, {}):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorator
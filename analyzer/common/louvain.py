@@ -0,0 +1,206 @@
+"""
+=================================== LICENSE ==================================
+Copyright (c) 2021, Consortium Board ROXANNE
+All rights reserved.
+
+Redistribution and use in source and binary forms, with or without
+modification, are permitted provided that the following conditions are met:
+
+Redistributions of source code must retain the above copyright
+notice, this list of conditions and the following disclaimer.
+
+Redistributions in binary form must reproduce the above copyright
+notice, this list of conditions and the following disclaimer in the
+documentation and/or other materials provided with the distribution.
+
+Neither the name of the ROXANNE nor the
+names of its contributors may be used to endorse or promote products
+derived from this software without specific prior written permission.
+
+THIS SOFTWARE IS PROVIDED BY CONSORTIUM BOARD ROXANNE ``AS IS'' AND ANY
+EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+DISCLAIMED. IN NO EVENT SHALL CONSORTIUM BOARD TENCOMPETENCE BE LIABLE FOR ANY
+DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+(INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+(INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+==============================================================================
+"""
+import time
+
+import numpy as np
+from scipy.sparse import csr_matrix
+from scipy.sparse.csgraph import connected_components
+
+
+def modularity(adjacency, labels, resolution=1.0):
+    """
+    modularity of a partition
+    :param adjacency: symmetric scipy sparse matrix
+    :param labels: community of each node
+    :param resolution: resolution parameter gamma
+    :return: Q = sum_c [in_c / 2m - gamma * (tot_c / 2m)^2]
+    """
+    return _Level(adjacency).modularity(np.asarray(labels), resolution)
+
+
+class _Level:
+    """
+    graph of one aggregation level as flat coordinate arrays, the rows are sorted (csr order) so that
+    per-node groups are contiguous
+    """
+    def __init__(self, adjacency):
+        adjacency = csr_matrix(adjacency, dtype=np.float64)
+        adjacency.sum_duplicates()
+        self.matrix = adjacency
+        self.n = adjacency.shape[0]
+        self.rows = np.repeat(np.arange(self.n), np.diff(adjacency.indptr))
+        self.cols = adjacency.indices
+        self.data = adjacency.data
+        self.degrees = np.bincount(self.rows, weights=self.data, minlength=self.n)
+        self.self_loops = np.zeros(self.n)
+        loops = self.rows == self.cols
+        self.self_loops[self.rows[loops]] = self.data[loops]
+        self.two_m = self.degrees.sum()
+
+    def modularity(self, labels, resolution):
+        if self.two_m == 0:
+            return 0.0
+        inside = self.data[labels[self.rows] == labels[self.cols]].sum()
+        totals = np.bincount(labels, weights=self.degrees)
+        return float(inside / self.two_m - resolution * np.sum((totals / self.two_m) ** 2))
+
+
+def _compact(labels):
+    _, labels = np.unique(labels, return_inverse=True)
+    return labels.reshape(-1)
+
+
+def _best_moves(level, labels, totals, resolution, active):
+    """
+    for every active node, the neighbor community with the highest modularity gain, and the gain of staying
+    :return: (best_community, best_gain, stay_gain), best_gain is -inf for the inactive nodes
+    """
+    n = level.n
+    entries = np.flatnonzero(active[level.rows])
+    rows = level.rows[entries]
+    communities = labels[level.cols[entries]]
+    # group the entries by (node, neighbor community), rows are already sorted so the sort is nearly linear
+    keys = rows * np.int64(len(totals)) + communities
+    order = np.argsort(keys, kind='stable')
+    keys = keys[order]
+    starts = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]])
+    # links[j]: total weight between node link_rows[j] and community link_communities[j]
+    links = np.add.reduceat(level.data[entries[order]], starts) if len(starts) > 0 else np.zeros(0)
+    link_rows = rows[order[starts]]
+    link_communities = communities[order[starts]]
+    gains = links - resolution * level.degrees[link_rows] * totals[link_communities] / level.two_m
+
+    own = link_communities == labels[link_rows]
+    own_links = np.zeros(n)
+    own_links[link_rows[own]] = links[own]
+    stay_gain = own_links - level.self_loops - resolution * level.degrees * (totals[labels] - level.degrees) / level.two_m
+
+    gains[own] = -np.inf
+    best_community = labels.copy()
+    best_gain = np.full(n, -np.inf)
+    if len(gains) > 0:
+        # link_rows is sorted: maximum of every row, then the first entry reaching it
+        row_starts = np.flatnonzero(np.r_[True, link_rows[1:] != link_rows[:-1]])
+        row_best = np.maximum.reduceat(gains, row_starts)
+        nodes = link_rows[row_starts]
+        best_gain[nodes] = row_best
+        reached = np.flatnonzero(gains == np.repeat(row_best, np.diff(np.r_[row_starts, len(gains)])))
+        reached = reached[np.r_[True, link_rows[reached[1:]] != link_rows[reached[:-1]]]]
+        best_community[link_rows[reached]] = link_communities[reached]
+    return best_community, best_gain, stay_gain
+
+
+def _local_moving(level, labels, resolution, random_state, deadline, max_iterations=50, move_probability=0.5):
+    """
+    synchronous local moving: all active nodes compute their best move at once from the current partition, a
+    random subset of the improving ones is applied (moving all of them at once makes neighbors swap communities
+    forever). as in the queue of Leiden, only the nodes next to a move are re-evaluated in the next iteration.
+    the best partition seen is kept
+    """
+    best_labels, best_quality = labels, level.modularity(labels, resolution)
+    active = np.ones(level.n, dtype=bool)
+    stalled = 0
+    for _ in range(max_iterations):
+        if deadline is not None and time.perf_counter() > deadline:
+            break
+        totals = np.bincount(labels, weights=level.degrees, minlength=level.n)
+        best_community, best_gain, stay_gain = _best_moves(level, labels, totals, resolution, active)
+        improving = best_gain > stay_gain + 1e-12
+        movers = np.flatnonzero(improving)
+        if len(movers) == 0:
+            break
+        movers = movers[random_state.random_sample(len(movers)) < move_probability]
+        labels = labels.copy()
+        labels[movers] = best_community[movers]
+        # next iteration: the nodes that did not get their turn, the moved nodes and their neighbors
+        moved = np.zeros(level.n, dtype=bool)
+        moved[movers] = True
+        active = improving | moved
+        active[level.rows[moved[level.cols]]] = True
+        quality = level.modularity(labels, resolution)
+        if quality > best_quality + 1e-10:
+            best_labels, best_quality = labels, quality
+            stalled = 0
+        else:
+            stalled += 1
+            if stalled >= 3:
+                break
+    return best_labels
+
+
+def _split_disconnected(level, labels):
+    """
+    Leiden-style refinement: split every community into its connected components, so that no community
+    is internally disconnected
+    """
+    inside = labels[level.rows] == labels[level.cols]
+    intra = csr_matrix((level.data[inside], (level.rows[inside], level.cols[inside])), shape=(level.n, level.n))
+    _, components = connected_components(intra, directed=False)
+    return components
+
+
+def louvain(adjacency, resolution=1.0, seed=0, time_budget=None, refine=False, max_levels=20):
+    """
+    Louvain community detection (Blondel et al., 2008) over sparse arrays: local moving of nodes between
+    communities, then aggregation of every community into a node of a new graph, repeated until no node moves.
+    with `refine`, communities are split into their connected components before aggregation, which gives the
+    well-connectedness guarantee of Leiden (Traag et al., 2019)
+    :param adjacency: symmetric scipy sparse matrix (weighted)
+    :param resolution: resolution parameter, larger values give smaller communities
+    :param seed: seed of the random choices, results are reproducible for a given seed
+    :param time_budget: optional number of seconds after which the current partition is returned
+    :param refine: split disconnected communities (Leiden refinement)
+    :param max_levels: maximal number of aggregation levels
+    :return: numpy array, community index of every node (0..C-1)
+    """
+    deadline = None if time_budget is None else time.perf_counter() + time_budget
+    random_state = np.random.RandomState(seed)
+    graph = csr_matrix(adjacency, dtype=np.float64)
+    n = graph.shape[0]
+    membership = np.arange(n)
+    if graph.nnz == 0:
+        return membership
+
+    for _ in range(max_levels):
+        level = _Level(graph)
+        labels = _local_moving(level, np.arange(level.n), resolution, random_state, deadline)
+        if refine:
+            labels = _split_disconnected(level, labels)
+        labels = _compact(labels)
+        membership = labels[membership]
+        if labels.max() + 1 == graph.shape[0] or (deadline is not None and time.perf_counter() > deadline):
+            break
+        # aggregate: community c becomes node c, edge weights are summed (intra-community weight as self-loop)
+        assignment = csr_matrix((np.ones(graph.shape[0]), (np.arange(graph.shape[0]), labels)),
+                                shape=(graph.shape[0], labels.max() + 1))
+        graph = csr_matrix(assignment.T @ graph @ assignment)
+    return _compact(membership)
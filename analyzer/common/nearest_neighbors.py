@@ -0,0 +1,182 @@
+"""
+=================================== LICENSE ==================================
+Copyright (c) 2021, Consortium Board ROXANNE
+All rights reserved.
+
+Redistribution and use in source and binary forms, with or without
+modification, are permitted provided that the following conditions are met:
+
+Redistributions of source code must retain the above copyright
+notice, this list of conditions and the following disclaimer.
+
+Redistributions in binary form must reproduce the above copyright
+notice, this list of conditions and the following disclaimer in the
+documentation and/or other materials provided with the distribution.
+
+Neither the name of the ROXANNE nor the
+names of its contributors may be used to endorse or promote products
+derived from this software without specific prior written permission.
+
+THIS SOFTWARE IS PROVIDED BY CONSORTIUM BOARD ROXANNE ``AS IS'' AND ANY
+EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+DISCLAIMED. IN NO EVENT SHALL CONSORTIUM BOARD TENCOMPETENCE BE LIABLE FOR ANY
+DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+(INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+(INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+==============================================================================
+"""
+import numpy as np
+from sklearn.cluster import MiniBatchKMeans
+
+
+def normalize_rows(matrix):
+    """
+    scale rows to unit length so that dot products become cosine similarities
+    :param matrix: array of shape (n, d)
+    :return: float32 array of shape (n, d), zero rows are kept as zeros
+    """
+    matrix = np.asarray(matrix, dtype=np.float32)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1
+    return matrix / norms
+
+
+def _merge_top_k(scores, indices, k):
+    """
+    keep the k best (score, index) pairs of each row, unsorted
+    """
+    if scores.shape[1] <= k:
+        return scores, indices
+    part = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    return np.take_along_axis(scores, part, axis=1), np.take_along_axis(indices, part, axis=1)
+
+
+def _sort_top_k(scores, indices):
+    order = np.argsort(-scores, axis=1, kind='stable')
+    return np.take_along_axis(scores, order, axis=1), np.take_along_axis(indices, order, axis=1)
+
+
+def exact_top_k(queries, matrix, k, exclude=None, block_size=65536, query_block_size=1024):
+    """
+    exact top-k maximum inner product search by blocked matrix multiplication: the rows of `matrix` are scanned
+    in blocks, the k best candidates of every block are selected with argpartition and merged with the
+    current ones, so memory stays bounded by query_block_size x block_size scores
+    :param queries: array of shape (q, d)
+    :param matrix: array of shape (n, d), normalized rows give cosine similarity
+    :param k: number of results per query
+    :param exclude: optional array of row indices never returned (e.g., the query nodes themselves)
+    :param block_size: number of rows of `matrix` scored at once
+    :param query_block_size: number of queries scored at once
+    :return: (scores, indices): arrays of shape (q, k') with k' = min(k, number of eligible rows),
+        sorted by decreasing score
+    """
+    queries = np.asarray(queries, dtype=np.float32)
+    n = matrix.shape[0]
+    exclude = np.unique(np.asarray([] if exclude is None else exclude, dtype=np.int64))
+    k = max(0, min(k, n - len(exclude)))
+    all_scores = np.empty((len(queries), k), dtype=np.float32)
+    all_indices = np.empty((len(queries), k), dtype=np.int64)
+    if k == 0:
+        return all_scores, all_indices
+
+    for q_start in range(0, len(queries), query_block_size):
+        query_block = queries[q_start:q_start + query_block_size]
+        best_scores = np.empty((len(query_block), 0), dtype=np.float32)
+        best_indices = np.empty((len(query_block), 0), dtype=np.int64)
+        for start in range(0, n, block_size):
+            block = np.asarray(matrix[start:start + block_size], dtype=np.float32)
+            scores = query_block @ block.T
+            excluded = exclude[(exclude >= start) & (exclude < start + len(block))] - start
+            scores[:, excluded] = -np.inf
+            indices = np.broadcast_to(np.arange(start, start + len(block)), scores.shape)
+            scores, indices = _merge_top_k(scores, indices, k)
+            best_scores, best_indices = _merge_top_k(np.hstack([best_scores, scores]),
+                                                     np.hstack([best_indices, indices]), k)
+        best_scores, best_indices = _sort_top_k(best_scores, best_indices)
+        all_scores[q_start:q_start + len(query_block)] = best_scores
+        all_indices[q_start:q_start + len(query_block)] = best_indices
+    return all_scores, all_indices
+
+
+class IVFIndex:
+    """
+    inverted file index: rows are clustered by k-means (coarse quantization) and stored grouped by cluster,
+    a query only scores the rows of the `n_probe` clusters whose centroids are closest to it
+    """
+
+    def __init__(self, centroids, offsets, order):
+        """
+        :param centroids: array of shape (n_lists, d)
+        :param offsets: array of shape (n_lists + 1,), rows of list l are order[offsets[l]:offsets[l + 1]]
+        :param order: row indices grouped by list
+        """
+        self.centroids = np.asarray(centroids, dtype=np.float32)
+        self.offsets = np.asarray(offsets, dtype=np.int64)
+        self.order = np.asarray(order, dtype=np.int64)
+        self._half_sq_norms = 0.5 * np.sum(self.centroids ** 2, axis=1)
+
+    @classmethod
+    def build(cls, matrix, n_lists=None, seed=0, batch_size=4096):
+        """
+        :param matrix: array of shape (n, d)
+        :param n_lists: number of clusters, about sqrt(n) if None
+        :param seed: seed of k-means
+        :return: IVFIndex
+        """
+        n = matrix.shape[0]
+        if n_lists is None:
+            n_lists = int(np.sqrt(n))
+        n_lists = max(1, min(n_lists, n))
+        matrix = np.asarray(matrix, dtype=np.float32)
+        kmeans = MiniBatchKMeans(n_clusters=n_lists, random_state=seed, batch_size=batch_size, n_init=3)
+        labels = kmeans.fit_predict(matrix)
+        order = np.argsort(labels, kind='stable')
+        offsets = np.searchsorted(labels[order], np.arange(n_lists + 1))
+        return cls(kmeans.cluster_centers_, offsets, order)
+
+    def search(self, queries, matrix, k, n_probe=8, exclude=None):
+        """
+        approximate top-k maximum inner product search
+        :param queries: array of shape (q, d)
+        :param matrix: the (n, d) matrix the index was built on
+        :param k: number of results per query
+        :param n_probe: number of clusters scanned per query, more clusters give higher recall and latency
+        :param exclude: optional array of row indices never returned
+        :return: (scores, indices) as in `exact_top_k`, rows may hold fewer than k results (padded with
+            -inf scores and -1 indices) when the probed clusters are too small
+        """
+        queries = np.asarray(queries, dtype=np.float32)
+        n_probe = max(1, min(n_probe, len(self.centroids)))
+        # nearest centroids in euclidean distance, as used by k-means for the assignment
+        coarse = queries @ self.centroids.T - self._half_sq_norms
+        probes = np.argpartition(-coarse, n_probe - 1, axis=1)[:, :n_probe]
+        excluded = set(np.asarray([] if exclude is None else exclude, dtype=np.int64).tolist())
+
+        all_scores = np.full((len(queries), k), -np.inf, dtype=np.float32)
+        all_indices = np.full((len(queries), k), -1, dtype=np.int64)
+        for i, query in enumerate(queries):
+            rows = np.concatenate([self.order[self.offsets[l]:self.offsets[l + 1]] for l in probes[i]])
+            if excluded:
+                rows = rows[[row not in excluded for row in rows.tolist()]]
+            if len(rows) == 0:
+                continue
+            # sorted rows make the gather sequential, which matters for memory-mapped matrices
+            rows = np.sort(rows)
+            scores = np.asarray(matrix[rows], dtype=np.float32) @ query
+            scores, indices = _merge_top_k(scores[None, :], rows[None, :], k)
+            scores, indices = _sort_top_k(scores, indices)
+            all_scores[i, :scores.shape[1]] = scores[0]
+            all_indices[i, :indices.shape[1]] = indices[0]
+        return all_scores, all_indices
+
+    def save(self, path):
+        np.savez(path, centroids=self.centroids, offsets=self.offsets, order=self.order)
+
+    @classmethod
+    def load(cls, path):
+        data = np.load(path)
+        return cls(data['centroids'], data['offsets'], data['order'])
@@ -0,0 +1,237 @@
+"""
+=================================== LICENSE ==================================
+Copyright (c) 2021, Consortium Board ROXANNE
+All rights reserved.
+
+Redistribution and use in source and binary forms, with or without
+modification, are permitted provided that the following conditions are met:
+
+Redistributions of source code must retain the above copyright
+notice, this list of conditions and the following disclaimer.
+
+Redistributions in binary form must reproduce the above copyright
+notice, this list of conditions and the following disclaimer in the
+documentation and/or other materials provided with the distribution.
+
+Neither the name of the ROXANNE nor the
+names of its contributors may be used to endorse or promote products
+derived from this software without specific prior written permission.
+
+THIS SOFTWARE IS PROVIDED BY CONSORTIUM BOARD ROXANNE ``AS IS'' AND ANY
+EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+DISCLAIMED. IN NO EVENT SHALL CONSORTIUM BOARD TENCOMPETENCE BE LIABLE FOR ANY
+DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+(INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+(INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+==============================================================================
+"""
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from scipy.sparse import csr_matrix, diags, identity
+from scipy.sparse.csgraph import connected_components
+from scipy.sparse.linalg import eigsh, lobpcg
+
+
+def symmetrize(matrix):
+    """
+    undirected version of a (square) adjacency matrix: A + A^T
+    :param matrix: scipy sparse matrix
+    :return: csr_matrix
+    """
+    return csr_matrix(matrix + matrix.T)
+
+
+def normalize_adjacency(matrix, method='sym'):
+    """
+    normalize a square adjacency matrix by node degrees
+    :param matrix: scipy sparse matrix
+    :param method: 'sym' for D_out^-1/2 A D_in^-1/2, 'rw' for D_out^-1 A, None to keep the matrix as is
+    :return: csr_matrix in float32, nodes without edges get zero rows/columns
+    """
+    matrix = csr_matrix(matrix, dtype=np.float32)
+    if method is None or method == 'none':
+        return matrix
+    out_degrees = np.asarray(matrix.sum(axis=1)).ravel()
+    in_degrees = np.asarray(matrix.sum(axis=0)).ravel()
+    if method == 'sym':
+        left = _inverse_power(out_degrees, 0.5)
+        right = _inverse_power(in_degrees, 0.5)
+        return csr_matrix(diags(left) @ matrix @ diags(right), dtype=np.float32)
+    if method == 'rw':
+        return csr_matrix(diags(_inverse_power(out_degrees, 1.0)) @ matrix, dtype=np.float32)
+    raise ValueError('unknown normalization: %s' % method)
+
+
+def _inverse_power(values, power):
+    result = np.zeros(len(values), dtype=np.float32)
+    positive = values > 0
+    result[positive] = values[positive] ** -power
+    return result
+
+
+class ParallelSparseOperator:
+    """
+    sparse matrix (optionally shifted by a multiple of the identity) whose products with dense blocks are
+    computed by a pool of threads, each one over a band of rows balanced by number of non-zeros.
+    scipy's sparse kernels release the GIL, so the bands run concurrently
+    """
+
+    def __init__(self, matrix, workers=None, shift=0.0):
+        """
+        :param matrix: scipy sparse matrix
+        :param workers: number of threads, all cpus if None
+        :param shift: s in (A + s * I), requires a square matrix
+        """
+        matrix = csr_matrix(matrix, dtype=np.float32)
+        if shift and matrix.shape[0] != matrix.shape[1]:
+            raise ValueError('a shifted operator must be square')
+        self.shape = matrix.shape
+        self.shift = np.float32(shift)
+        self.workers = max(1, workers or os.cpu_count() or 1)
+        self._bands = self._split(matrix)
+        self._transposed_bands = self._split(csr_matrix(matrix.T))
+
+    def _split(self, matrix):
+        # cut rows so that every band holds about the same number of non-zeros
+        cuts = np.searchsorted(matrix.indptr, np.linspace(0, matrix.nnz, self.workers + 1)[1:-1])
+        bounds = np.unique(np.concatenate([[0], cuts, [matrix.shape[0]]]))
+        return [(start, stop, matrix[start:stop]) for start, stop in zip(bounds[:-1], bounds[1:])]
+
+    def _multiply(self, bands, num_rows, dense):
+        dense = np.asarray(dense, dtype=np.float32)
+        result = np.empty((num_rows, dense.shape[1]), dtype=np.float32)
+
+        def run(band):
+            start, stop, block = band
+            result[start:stop] = block @ dense
+            if self.shift:
+                result[start:stop] += self.shift * dense[start:stop]
+
+        if len(bands) == 1:
+            run(bands[0])
+        else:
+            with ThreadPoolExecutor(max_workers=len(bands)) as executor:
+                list(executor.map(run, bands))
+        return result
+
+    def dot(self, dense):
+        """
+        :param dense: numpy array of shape (n_cols, b)
+        :return: (A + s * I) @ dense, float32 array of shape (n_rows, b)
+        """
+        return self._multiply(self._bands, self.shape[0], dense)
+
+    def tdot(self, dense):
+        """
+        :param dense: numpy array of shape (n_rows, b)
+        :return: (A + s * I)^T @ dense, float32 array of shape (n_cols, b)
+        """
+        return self._multiply(self._transposed_bands, self.shape[1], dense)
+
+
+def randomized_svd(matrix, k, n_oversamples=10, n_iter=4, seed=0, workers=None, shift=0.0):
+    """
+    truncated SVD by randomized subspace iteration (Halko, Martinsson & Tropp, 2011).
+    memory is linear in the number of non-zeros plus (n_rows + n_cols) * (k + n_oversamples) floats
+    :param matrix: scipy sparse matrix
+    :param k: number of singular triplets
+    :param n_oversamples: extra columns of the random test matrix
+    :param n_iter: number of power iterations, more iterations give more accurate trailing vectors
+    :param seed: seed of the random test matrix, results are reproducible for a given seed
+    :param workers: number of threads used for the sparse products
+    :param shift: decompose A + shift * I instead of A
+    :return: (u, s, vt): float32 arrays of shapes (n_rows, k), (k,), (k, n_cols), singular values in
+        decreasing order
+    """
+    operator = ParallelSparseOperator(matrix, workers=workers, shift=shift)
+    k = min(k, min(operator.shape))
+    size = min(k + n_oversamples, min(operator.shape))
+    random_state = np.random.RandomState(seed)
+    test_matrix = random_state.standard_normal((operator.shape[1], size)).astype(np.float32)
+
+    q, _ = np.linalg.qr(operator.dot(test_matrix))
+    for _ in range(n_iter):
+        q, _ = np.linalg.qr(operator.tdot(q))
+        q, _ = np.linalg.qr(operator.dot(q))
+
+    # B = Q^T A is small (size x n_cols), its exact SVD gives the one of A restricted to range(Q)
+    u_small, s, vt = np.linalg.svd(operator.tdot(q).T, full_matrices=False)
+    u = q @ u_small
+    return u[:, :k], s[:k], vt[:k]
+
+
+def laplacian_eigenmap(matrix, k, seed=0, solver=None):
+    """
+    Laplacian eigenmap (Belkin & Niyogi, 2003): the eigenvectors of the k smallest non-trivial eigenvalues of
+    the normalized Laplacian L = I - D^-1/2 A D^-1/2, scaled back by D^-1/2.
+    L is block diagonal over the connected components, its eigenvectors are the ones of the components. each
+    component has its own trivial eigenvector (proportional to D^1/2 1, eigenvalue 0), which iterative solvers
+    don't tell apart reliably, so the eigenvectors are computed per component by `spectral_embedding` and the
+    k smallest non-trivial ones of all components are kept. nodes without edges are embedded at the origin
+    :param matrix: scipy sparse adjacency matrix, symmetrized before use
+    :param k: embedding dimension
+    :param seed, solver: see `spectral_embedding`
+    :return: float32 array of shape (n, k), zero columns if there are less than k non-trivial eigenvectors
+    """
+    adjacency = symmetrize(csr_matrix(matrix, dtype=np.float32))
+    adjacency = csr_matrix(adjacency - diags(adjacency.diagonal()))
+    degrees = np.asarray(adjacency.sum(axis=1)).ravel()
+    n = adjacency.shape[0]
+    _, labels = connected_components(adjacency, directed=False)
+    order = np.argsort(labels, kind='stable')
+    bounds = np.flatnonzero(np.diff(labels[order])) + 1
+    candidates = []  # (eigenvalue of L, nodes of the component, eigenvector)
+    for nodes in np.split(order, bounds):
+        if len(nodes) < 2:
+            continue
+        values, vectors = spectral_embedding(adjacency[nodes][:, nodes], min(k + 1, len(nodes)), seed=seed,
+                                             solver=solver, return_values=True)
+        candidates.extend((2.0 - value, nodes, vector) for value, vector in zip(values[1:], vectors[:, 1:].T))
+    candidates.sort(key=lambda candidate: candidate[0])
+    result = np.zeros((n, k), dtype=np.float32)
+    for column, (_, nodes, vector) in enumerate(candidates[:k]):
+        result[nodes, column] = vector
+    return result * _inverse_power(degrees, 0.5)[:, None]
+
+
+def spectral_embedding(matrix, k, seed=0, solver=None, tol=1e-5, max_iter=500, return_values=False):
+    """
+    eigenvectors of the k smallest eigenvalues of the normalized Laplacian L = I - D^-1/2 A D^-1/2, as used by
+    spectral clustering (Ng, Jordan & Weiss, 2002), computed on the sparse matrix as the leading eigenvectors of
+    I + D^-1/2 A D^-1/2, so that memory stays linear in the number of edges
+    :param matrix: scipy sparse adjacency matrix, symmetrized before use
+    :param k: number of eigenvectors
+    :param seed: seed of the starting vectors
+    :param solver: 'arpack' (scipy's eigsh), 'lobpcg', or None to pick lobpcg for large graphs
+    :param tol, max_iter: convergence criteria of the solver
+    :param return_values: also return the eigenvalues of I + D^-1/2 A D^-1/2, that is 2 minus the ones of L
+    :return: float64 array of shape (n, k), by increasing eigenvalue of L, or (eigenvalues, array) if
+        return_values
+    """
+    adjacency = symmetrize(csr_matrix(matrix, dtype=np.float64))
+    n = adjacency.shape[0]
+    shifted = csr_matrix(normalize_adjacency(adjacency, 'sym'), dtype=np.float64) + identity(n, format='csr')
+    if n <= 2 * k + 1:
+        # too small for iterative solvers
+        values, vectors = np.linalg.eigh(shifted.toarray())
+        values, vectors = values[::-1][:k], vectors[:, ::-1][:, :k]
+        return (values, vectors) if return_values else vectors
+    random_state = np.random.RandomState(seed)
+    if solver is None:
+        solver = 'lobpcg' if n > 20000 else 'arpack'
+    if solver == 'arpack':
+        values, vectors = eigsh(shifted, k=k, which='LA', tol=tol, maxiter=max_iter * n,
+                                v0=random_state.uniform(-1, 1, n))
+    elif solver == 'lobpcg':
+        initial = random_state.standard_normal((n, k))
+        values, vectors = lobpcg(shifted, initial, tol=tol, maxiter=max_iter, largest=True)
+    else:
+        raise ValueError('unknown eigen solver: %s' % solver)
+    order = np.argsort(-values, kind='stable')
+    return (values[order], vectors[:, order]) if return_values else vectors[:, order]
@@ -33,8 +33,8 @@ import sys
 import os
 import itertools
 import networkx.algorithms.community as methods
-import networkx
-from sklearn.cluster import SpectralClustering
+import numpy
+from sklearn.cluster import MiniBatchKMeans
 from sklearn.cluster import AgglomerativeClustering
 
 # find path to root directory of the project so as to import from other packages
@@ -46,6 +46,10 @@ if path2root not in sys.path:
     sys.path.append(path2root)
 
 import analyzer.common.helpers as helpers
+import analyzer.common.instrumentation as instrumentation
+import analyzer.common.clique_percolation as clique_percolation
+from analyzer.common.louvain import louvain
+from analyzer.common.spectral import symmetrize, spectral_embedding
 
 
 def _generate_communities_and_membership(nx_communities, node_ids):
@@ -62,31 +66,42 @@ def _generate_communities_and_membership(nx_communities, node_ids):
     return communities, membership
 
 
+def _get_number_of_communities(params):
+    # If no parameter were given, use 3 as default.
+    try:
+        return int(params['K'])
+    except KeyError:
+        return 3
+
+
 def k_clique_communities(network, params):
     """
-    wrapper for NetworkX's k_clique_communities algorithm
+    k-clique percolation with degeneracy ordered clique enumeration, see `analyzer.common.clique_percolation`
     :param network:
-    :param params:
+    :param params: 'K' size of the smallest clique (default 3), optional 'time_budget' in seconds (default 60)
+                    and 'max_cliques' (default 1000000) bounding the clique enumeration
     :return: dictionary, in the form
         {
             'success': 1 if success, 0 otherwise
             'message': a string
             'communities': communities - list of communities found, each is a dictionary of member nodes' id, and their membership
             'membership': membership - dictionary, membership[u] is a dictionary of communities of u and its membership in those communities
+            'incomplete': True if the budget stopped the enumeration, the communities are then built from the cliques found so far
         }
     """
     try:
-        graph, node_ids = helpers.convert_to_nx_undirected_graph(network)
-        # If no parameter were given, use 3 as default.
-        # May not be the most elegant solution but is the easiest for now.
-        try:
-            k = params['K']
-        except KeyError:
-            k = 3
-        nx_comms = list(methods.k_clique_communities(graph, k))
+        params = params or {}
+        k = _get_number_of_communities(params)
+        matrix, node_ids = helpers.convert_to_csr_sparse_matrix(network)
+        adjacency = symmetrize(matrix)
+        neighbors = numpy.split(adjacency.indices, adjacency.indptr[1:-1])
+        nx_comms, complete = clique_percolation.k_clique_communities(
+            neighbors, k, time_budget=params.get('time_budget', 60.0), max_cliques=params.get('max_cliques', 1000000))
         communities, membership = _generate_communities_and_membership(nx_comms, node_ids)
-        result = {'success': 1, 'message': 'the task is performed successfully', 'communities': communities,
-                  'membership': membership}
+        message = 'the task is performed successfully' if complete else \
+            'the task is partially performed, the clique enumeration exceeded its budget'
+        result = {'success': 1, 'message': message, 'communities': communities,
+                  'membership': membership, 'incomplete': not complete}
         return result
     except Exception as e:
         print(e)
@@ -208,11 +223,90 @@ def kernighan_lin_bipartition(network, params):
         return result
 
 
+def _labels_to_communities(labels):
+    order = numpy.argsort(labels, kind='stable')
+    bounds = numpy.flatnonzero(numpy.diff(labels[order])) + 1
+    return [list(c) for c in numpy.split(order, bounds)]
+
+
+def _louvain_communities(network, params, refine):
+    try:
+        params = params or {}
+        matrix, node_ids = helpers.convert_to_csr_sparse_matrix(network)
+        labels = louvain(symmetrize(matrix), resolution=float(params.get('resolution', 1.0)),
+                         seed=int(params.get('seed', 0)), time_budget=params.get('time_budget'), refine=refine)
+        nx_comms = _labels_to_communities(labels)
+        communities, membership = _generate_communities_and_membership(nx_comms, node_ids)
+        result = {'success': 1, 'message': 'the task is performed successfully', 'communities': communities,
+                  'membership': membership}
+        return result
+    except Exception as e:
+        print(e)
+        result = {'success': 0, 'message': 'this algorithm is not suitable for the input network',
+                  'communities': None,
+                  'membership': None}
+        return result
+
+
+def louvain_communities(network, params):
+    """
+    Louvain modularity optimization over sparse arrays, with multi-level aggregation
+    :param network:
+    :param params: optional 'resolution' (default 1.0), 'seed' (default 0), and 'time_budget' in seconds after
+                    which the best partition found so far is returned
+    :return: dictionary, in the form
+        {
+            'success': 1 if success, 0 otherwise
+            'message': a string
+            'communities': communities - list of communities found, each is a dictionary of member nodes' id, and their membership
+            'membership': membership - dictionary, membership[u] is a dictionary of communities of u and its membership in those communities
+        }
+    """
+    return _louvain_communities(network, params, refine=False)
+
+
+def leiden_communities(network, params):
+    """
+    Louvain modularity optimization with Leiden-style refinement, i.e., communities are split into their
+    connected components before every aggregation, so that all returned communities are connected
+    :param network:
+    :param params: optional 'resolution' (default 1.0), 'seed' (default 0), and 'time_budget' in seconds
+    :return: dictionary, in the form
+        {
+            'success': 1 if success, 0 otherwise
+            'message': a string
+            'communities': communities - list of communities found, each is a dictionary of member nodes' id, and their membership
+            'membership': membership - dictionary, membership[u] is a dictionary of communities of u and its membership in those communities
+        }
+    """
+    return _louvain_communities(network, params, refine=True)
+
+
+def _spectral_features(network, k, seed):
+    """
+    undirected sparse adjacency of the network and the row-normalized spectral embedding of its nodes
+    """
+    matrix, node_ids = helpers.convert_to_csr_sparse_matrix(network)
+    adjacency = symmetrize(matrix)
+    features = spectral_embedding(adjacency, k, seed=seed)
+    norms = numpy.linalg.norm(features, axis=1)
+    norms[norms == 0] = 1.0
+    return adjacency, features / norms[:, None], node_ids
+
+
+def _clusters_to_communities(labels, k):
+    # keep one (possibly empty) community per cluster, so that community c is cluster c
+    order = numpy.argsort(labels, kind='stable')
+    bounds = numpy.searchsorted(labels[order], numpy.arange(1, k))
+    return [list(c) for c in numpy.split(order, bounds)]
+
+
 def spectral_communities(network, params):
     """
-    wrapper for NetworkX's k_clique_communities algorithm
+    spectral clustering: k-means (mini-batch) on the eigenvectors of the k smallest eigenvalues of the sparse
+    normalized Laplacian
     :param network:
-    :param params:
+    :param params: 'K' the number of communities (default 3), optional 'seed'
     :return: dictionary, in the form
         {
             'success': 1 if success, 0 otherwise
@@ -222,28 +316,13 @@ def spectral_communities(network, params):
         }
     """
     try:
-        graph, node_ids = helpers.convert_to_nx_undirected_graph(network)
-        # If no parameter were given, use 3 as default.
-        # May not be the most elegant solution but is the easiest for now.
-        try:
-            k = params['K']
-        except KeyError:
-            k = 3
-
-        adj_matrix = networkx.adjacency_matrix(graph)
-        clustering = SpectralClustering(n_clusters=k, assign_labels="discretize", random_state=0).fit(adj_matrix)
-        # print(clustering.labels_)
-        communities = [{}] * k
-        membership = {}
-        for u in range(len(clustering.labels_)):
-            c = clustering.labels_[u]
-            nid = node_ids[u]
-            if nid in membership:
-                membership[nid][c] = 1.0
-            else:
-                membership[nid] = {c: 1.0}
-            communities[c][nid] = 1.0
-
+        params = params or {}
+        k = _get_number_of_communities(params)
+        seed = int(params.get('seed', 0))
+        _, features, node_ids = _spectral_features(network, k, seed)
+        clustering = MiniBatchKMeans(n_clusters=k, random_state=seed, batch_size=4096, n_init=3).fit(features)
+        nx_comms = _clusters_to_communities(clustering.labels_, k)
+        communities, membership = _generate_communities_and_membership(nx_comms, node_ids)
         result = {'success': 1, 'message': 'the task is performed successfully', 'communities': communities,
                   'membership': membership}
         return result
@@ -258,9 +337,10 @@ def spectral_communities(network, params):
 
 def hierarchical_communities(network, params):
     """
-    wrapper for NetworkX's k_clique_communities algorithm
+    hierarchical clustering: Ward agglomeration of the nodes' spectral embedding, where only clusters linked by
+    an edge of the (sparse) network may be merged
     :param network:
-    :param params:
+    :param params: 'K' the number of communities (default 3), optional 'seed'
     :return: dictionary, in the form
         {
             'success': 1 if success, 0 otherwise
@@ -270,33 +350,16 @@ def hierarchical_communities(network, params):
         }
     """
     try:
-        graph, node_ids = helpers.convert_to_nx_undirected_graph(network)
-        # If no parameter were given, use 3 as default.
-        # May not be the most elegant solution but is the easiest for now.
-        try:
-            k = params['K']
-        except KeyError:
-            k = 3
-        adj_matrix = networkx.adjacency_matrix(graph)
-        clustering = AgglomerativeClustering(n_clusters=k).fit(adj_matrix.toarray())
-        # print(clustering.labels_)
-        communities = [{}] * k
-        membership = {}
-        for u in range(len(clustering.labels_)):
-            c = clustering.labels_[u]
-            nid = node_ids[u]
-            if nid in membership:
-                membership[nid][c] = 1.0
-            else:
-                membership[nid] = {c: 1.0}
-            communities[c][nid] = 1.0
-
-        result = {'success': 1, 'message': 'the task is performed successfully', 'communities': communities,
-                  'membership': membership}
-        return result
+        params = params or {}
+        k = _get_number_of_communities(params)
+        adjacency, features, node_ids = _spectral_features(network, k, int(params.get('seed', 0)))
+        clustering = AgglomerativeClustering(n_clusters=k, connectivity=adjacency, linkage='ward').fit(features)
+        nx_comms = _clusters_to_communities(clustering.labels_, k)
+        communities, membership = _generate_communities_and_membership(nx_comms, node_ids)
         result = {'success': 1, 'message': 'the task is performed successfully', 'communities': communities,
                   'membership': membership}
         return result
+
     except Exception as e:
         print(e)
         result = {'success': 0, 'message': 'this algorithm is not suitable for the input network',
@@ -348,6 +411,14 @@ def get_info():
                     'name': 'Modularity Maximization',
                     'parameter': {}
                 },
+                'louvain': {
+                    'name': 'Louvain',
+                    'parameter': {}
+                },
+                'leiden': {
+                    'name': 'Leiden',
+                    'parameter': {}
+                },
                 'label_propagation': {
                     'name': 'Label Propagation',
                     'parameter': {}
@@ -397,6 +468,8 @@ class CommunityDetector:
         self.methods = {
             'k_cliques': k_clique_communities,
             'modularity': greedy_modularity_communities,
+            'louvain': louvain_communities,
+            'leiden': leiden_communities,
             'asyn_lpa': asyn_lpa_communities,
             'label_propagation': label_propagation_communities,
             'bipartition': kernighan_lin_bipartition,
@@ -412,4 +485,5 @@ class CommunityDetector:
         :param params:
         :return:
         """
-        return self.methods[self.algorithm](network, params)
+        with instrumentation.span('community_detection.' + self.algorithm):
+            return self.methods[self.algorithm](network, params)
@@ -0,0 +1,353 @@
+"""
+=================================== LICENSE ==================================
+Copyright (c) 2021, Consortium Board ROXANNE
+All rights reserved.
+
+Redistribution and use in source and binary forms, with or without
+modification, are permitted provided that the following conditions are met:
+
+Redistributions of source code must retain the above copyright
+notice, this list of conditions and the following disclaimer.
+
+Redistributions in binary form must reproduce the above copyright
+notice, this list of conditions and the following disclaimer in the
+documentation and/or other materials provided with the distribution.
+
+Neither the name of the ROXANNE nor the
+names of its contributors may be used to endorse or promote products
+derived from this software without specific prior written permission.
+
+THIS SOFTWARE IS PROVIDED BY CONSORTIUM BOARD ROXANNE ``AS IS'' AND ANY
+EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+DISCLAIMED. IN NO EVENT SHALL CONSORTIUM BOARD TENCOMPETENCE BE LIABLE FOR ANY
+DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+(INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+(INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+==============================================================================
+"""
+import sys
+import os
+import json
+import shutil
+import tempfile
+from collections import Counter
+import networkx as nx
+import numpy as np
+from gensim.models import Word2Vec
+
+# find path to root directory of the project so as to import from other packages
+tokens = os.path.abspath(__file__).split('/')
+# print('tokens = ', tokens)
+path2root = '/'.join(tokens[:-2])
+# print('path2root = ', path2root)
+if path2root not in sys.path:
+    sys.path.append(path2root)
+
+from analyzer.common.nearest_neighbors import normalize_rows, IVFIndex
+from analyzer.common import instrumentation
+from analyzer.ge.models.deepwalk import DeepWalk
+from analyzer.node_embedding import NodeEmbedder
+
+
+VECTORS_FILE = 'vectors.npy'
+NODE_IDS_FILE = 'node_ids.json'
+EDGES_FILE = 'edges.npy'
+MODEL_FILE = 'word2vec.model'
+
+# methods whose model can be trained further on new walks instead of being retrained from scratch
+INCREMENTAL_METHODS = {'deepwalk'}
+
+
+def _version_name(version):
+    """
+    folder of a version of a dataset: a number, or a string such as '<uid>-<number of changes>' of `BuiltinDataset`
+    """
+    try:
+        return str(float(version))
+    except (TypeError, ValueError):
+        return str(version)
+
+
+class StoredEmbeddings:
+    """
+    embeddings of one version of a dataset: a float32 matrix (memory-mapped when loaded from disk)
+    and the index of node ids, i.e., matrix[index[node_id]] is the vector of node_id
+    """
+
+    def __init__(self, matrix, node_ids, edges=None, directory=None):
+        """
+        :param matrix: float32 array of shape (n, K)
+        :param node_ids: list of n node ids
+        :param edges: int array of shape (m, 2), edges of the embedded network as rows of `matrix`
+        :param directory: folder the embeddings are stored in, None if not saved
+        """
+        self.matrix = matrix
+        self.node_ids = node_ids
+        self.index = {node_id: i for i, node_id in enumerate(node_ids)}
+        self.edges = edges
+        self.directory = directory
+
+    def vector(self, node_id):
+        """
+        :return: vector of `node_id`, None if the node is not embedded
+        """
+        i = self.index.get(node_id)
+        return None if i is None else self.matrix[i]
+
+    def vectors(self):
+        """
+        :return: dictionary of vectors of nodes, as in the results of `NodeEmbedder`
+        """
+        return {node_id: self.matrix[i] for i, node_id in enumerate(self.node_ids)}
+
+
+class EmbeddingStore:
+    """
+    persistent node embeddings, one folder per dataset, method, dimension and dataset version:
+        <root_dir>/<dataset_id>/<method>-<K>/<version>/{vectors.npy, node_ids.json, edges.npy[, word2vec.model]}
+    versions are numbers or strings, the latest version is the one stored last
+    a new version of a dataset embedded by an incremental method is derived from the latest stored version
+    by re-walking only around the nodes whose neighborhood changed and continuing the training of its model
+    """
+
+    def __init__(self, root_dir=None, keep_versions=2, walk_length=40, num_walks=80, refresh_radius=1, workers=8):
+        """
+        :param root_dir: folder of the store, a folder in the system's temporary directory if None
+        :param keep_versions: number of versions kept per dataset and method, older ones are removed
+        :param walk_length: length of random walks
+        :param num_walks: number of walks per (re-walked) node
+        :param refresh_radius: number of hops around changed nodes that are re-walked on refresh
+        :param workers: number of workers for walking and training
+        """
+        self.root_dir = root_dir or os.path.join(tempfile.gettempdir(), 'embeddings')
+        self.keep_versions = keep_versions
+        self.walk_length = walk_length
+        self.num_walks = num_walks
+        self.refresh_radius = refresh_radius
+        self.workers = workers
+        # lookups answered from the stored files (hits) or computing them (misses), per kind of stored object
+        self.hits = Counter()
+        self.misses = Counter()
+        os.makedirs(self.root_dir, exist_ok=True)
+
+    def _method_dir(self, dataset_id, method, k):
+        return os.path.join(self.root_dir, str(dataset_id), '%s-%s' % (method, k))
+
+    def versions(self, dataset_id, method, k):
+        """
+        :return: names of the stored versions of the dataset for the method and dimension, in the order they were
+                 stored
+        """
+        method_dir = self._method_dir(dataset_id, method, k)
+        if not os.path.isdir(method_dir):
+            return []
+        stored = []
+        for name in os.listdir(method_dir):
+            if name.startswith('.tmp-'):
+                continue  # unfinished writes
+            try:
+                # the vectors are written once, unlike the folder which gets indexes and classifiers later
+                stored.append((os.path.getmtime(os.path.join(method_dir, name, VECTORS_FILE)), name))
+            except OSError:
+                continue
+        return [name for _, name in sorted(stored)]
+
+    def load(self, dataset_id, method, k, version=None, mmap_mode='r'):
+        """
+        load stored embeddings
+        :param version: version of the dataset, the latest stored version if None
+        :param mmap_mode: passed to numpy.load, None to read the matrix into memory
+        :return: StoredEmbeddings, or None if not found
+        """
+        if version is None:
+            versions = self.versions(dataset_id, method, k)
+            if len(versions) == 0:
+                return None
+            version = versions[-1]
+        directory = os.path.join(self._method_dir(dataset_id, method, k), _version_name(version))
+        if not os.path.isdir(directory):
+            return None
+        with open(os.path.join(directory, NODE_IDS_FILE), 'r') as f:
+            node_ids = json.load(f)
+        matrix = np.load(os.path.join(directory, VECTORS_FILE), mmap_mode=mmap_mode)
+        edges = np.load(os.path.join(directory, EDGES_FILE))
+        return StoredEmbeddings(matrix, node_ids, edges, directory)
+
+    def save(self, dataset_id, method, k, version, node_ids, matrix, edges, model=None):
+        """
+        save embeddings of a version of a dataset, the files are written to a temporary folder which is then
+        renamed, so readers never see a partially written version
+        :param node_ids: list of node ids (json serializable)
+        :param matrix: array of shape (len(node_ids), k)
+        :param edges: int array of shape (m, 2), edges of the embedded network as indices into `node_ids`
+        :param model: Word2Vec model to continue training from, for incremental methods
+        :return: StoredEmbeddings, memory-mapped from the saved files
+        """
+        method_dir = self._method_dir(dataset_id, method, k)
+        os.makedirs(method_dir, exist_ok=True)
+        directory = os.path.join(method_dir, _version_name(version))
+        temp_dir = tempfile.mkdtemp(dir=method_dir, prefix='.tmp-')
+        try:
+            np.save(os.path.join(temp_dir, VECTORS_FILE), np.ascontiguousarray(matrix, dtype=np.float32))
+            np.save(os.path.join(temp_dir, EDGES_FILE), np.asarray(edges, dtype=np.int64).reshape(-1, 2))
+            with open(os.path.join(temp_dir, NODE_IDS_FILE), 'w') as f:
+                json.dump(list(node_ids), f)
+            if model is not None:
+                model.save(os.path.join(temp_dir, MODEL_FILE))
+            if os.path.isdir(directory):
+                # another worker stored the same version meanwhile
+                shutil.rmtree(temp_dir)
+            else:
+                os.rename(temp_dir, directory)
+        except Exception:
+            shutil.rmtree(temp_dir, ignore_errors=True)
+            raise
+        self._remove_old_versions(dataset_id, method, k)
+        return self.load(dataset_id, method, k, version)
+
+    def _remove_old_versions(self, dataset_id, method, k):
+        versions = self.versions(dataset_id, method, k)
+        for version in versions[:-self.keep_versions]:
+            shutil.rmtree(os.path.join(self._method_dir(dataset_id, method, k), str(version)), ignore_errors=True)
+
+    def remove(self, dataset_id):
+        """
+        remove all stored embeddings of a dataset
+        """
+        shutil.rmtree(os.path.join(self.root_dir, str(dataset_id)), ignore_errors=True)
+
+    @instrumentation.traced('embedding_store.get_ivf_index')
+    def get_ivf_index(self, stored, normalized, n_lists=None):
+        """
+        get the inverted file index over stored embeddings, building and saving it next to them if needed
+        :param stored: StoredEmbeddings loaded from this store
+        :param normalized: True for an index over the normalized rows (cosine similarity)
+        :param n_lists: number of clusters, about sqrt(n) if None
+        :return: IVFIndex
+        """
+        path = os.path.join(stored.directory, 'ivf-%s-%s.npz' % ('cosine' if normalized else 'dot', n_lists))
+        if os.path.exists(path):
+            self.hits['ivf_index'] += 1
+            return IVFIndex.load(path)
+        self.misses['ivf_index'] += 1
+        matrix = normalize_rows(stored.matrix) if normalized else stored.matrix
+        index = IVFIndex.build(matrix, n_lists)
+        fd, temp_file = tempfile.mkstemp(dir=stored.directory, suffix='.npz')
+        os.close(fd)
+        index.save(temp_file)
+        os.replace(temp_file, path)
+        return index
+
+    @instrumentation.traced('embedding_store.get_embeddings')
+    def get_embeddings(self, dataset_id, version, network, method, params):
+        """
+        get the embeddings of a version of a dataset, computing and storing them if needed
+        :param dataset_id: id of the dataset
+        :param version: version of the dataset, `network` must be its content
+        :param network: network in the format of `get_network`
+        :param method: one of the methods of `NodeEmbedder`
+        :param params: parameters of the method, 'K' is the embedding dimension
+        :return: StoredEmbeddings, or None if the embedding method fails on the network
+        """
+        k = params['K']
+        stored = self.load(dataset_id, method, k, version)
+        if stored is not None:
+            self.hits['embeddings'] += 1
+            return stored
+        self.misses['embeddings'] += 1
+
+        previous = None
+        if method in INCREMENTAL_METHODS:
+            previous = self.load(dataset_id, method, k)
+            if previous is not None and not os.path.exists(os.path.join(previous.directory, MODEL_FILE)):
+                previous = None
+
+        if previous is None:
+            return self._embed(dataset_id, version, network, method, params)
+        return self._refresh(dataset_id, version, network, method, params, previous)
+
+    def _embed(self, dataset_id, version, network, method, params):
+        graph, node_ids = _network_to_graph(network)
+        model = None
+        if method == 'deepwalk':
+            deepwalk = DeepWalk(graph, walk_length=self.walk_length, num_walks=self.num_walks, workers=self.workers)
+            model = deepwalk.train(embed_size=params['K'], window_size=5, workers=self.workers, iter=10)
+            matrix = np.vstack([model.wv[str(node_id)] for node_id in node_ids]) if node_ids else \
+                np.zeros((0, params['K']))
+        else:
+            result = NodeEmbedder(method).perform(network, params)
+            if result is None or result['success'] == 0:
+                return None
+            vectors = result['vectors']
+            node_ids = [node_id for node_id in node_ids if vectors.get(node_id) is not None]
+            matrix = np.vstack([vectors[node_id] for node_id in node_ids]) if node_ids else \
+                np.zeros((0, params['K']))
+        return self.save(dataset_id, method, params['K'], version, node_ids, matrix,
+                         _edge_indices(graph, node_ids), model)
+
+    def _refresh(self, dataset_id, version, network, method, params, previous):
+        graph, node_ids = _network_to_graph(network)
+        deepwalk = DeepWalk(graph, walk_length=self.walk_length, num_walks=0, workers=self.workers)
+        deepwalk.w2v_model = Word2Vec.load(os.path.join(previous.directory, MODEL_FILE))
+
+        changed = _changed_nodes(previous, graph)
+        if len(changed) > 0:
+            affected = _neighborhood(graph, changed, self.refresh_radius)
+            deepwalk.update(graph, affected, walk_length=self.walk_length, num_walks=self.num_walks,
+                            workers=self.workers)
+        model = deepwalk.w2v_model
+        matrix = np.vstack([model.wv[str(node_id)] for node_id in node_ids]) if node_ids else \
+            np.zeros((0, params['K']))
+        return self.save(dataset_id, method, params['K'], version, node_ids, matrix,
+                         _edge_indices(graph, node_ids), model)
+
+
+def _network_to_graph(network):
+    """
+    undirected graph of the network's edges, nodes are named by the string of their ids so that
+    the vocabulary of word2vec models stays stable across versions of a dataset
+    :return: (graph, node_ids): node_ids in order of first appearance in the edges
+    """
+    graph = nx.Graph()
+    node_ids = []
+    seen = set()
+    for e in network.get('edges'):
+        for node_id in (e['source'], e['target']):
+            if node_id not in seen:
+                seen.add(node_id)
+                node_ids.append(node_id)
+        graph.add_edge(str(e['source']), str(e['target']))
+    return graph, node_ids
+
+
+def _edge_indices(graph, node_ids):
+    index = {str(node_id): i for i, node_id in enumerate(node_ids)}
+    return np.array([(index[u], index[v]) for u, v in graph.edges()], dtype=np.int64).reshape(-1, 2)
+
+
+def _changed_nodes(previous, graph):
+    """
+    nodes of `graph` which are new or whose set of neighbors differs from the one in the previous version
+    """
+    words = [str(node_id) for node_id in previous.node_ids]
+    old_adj = {word: set() for word in words}
+    for u, v in previous.edges:
+        old_adj[words[u]].add(words[v])
+        old_adj[words[v]].add(words[u])
+    return [node for node in graph.nodes() if node not in old_adj or set(graph[node]) != old_adj[node]]
+
+
+def _neighborhood(graph, nodes, radius):
+    """
+    nodes within `radius` hops of `nodes`
+    """
+    reached = set(nodes)
+    frontier = set(nodes)
+    for _ in range(radius):
+        frontier = {nbr for node in frontier for nbr in graph[node]} - reached
+        reached.update(frontier)
+    return list(reached)
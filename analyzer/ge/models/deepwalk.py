@@ -83,6 +83,26 @@ class DeepWalk:
         self.w2v_model = model
         return model
 
+    def update(self, graph, nodes, walk_length, num_walks, workers=1):
+        """
+        continue training on walks that start from `nodes` in the (modified) `graph`,
+        new nodes are added to the vocabulary, vectors of the other nodes keep their current values
+        :param graph: the new graph
+        :param nodes: start nodes of the new walks, typically the changed nodes and their neighborhood
+        :param walk_length:
+        :param num_walks: number of walks per start node
+        :param workers:
+        :return: the updated Word2Vec model
+        """
+        self.graph = graph
+        self.walker = RandomWalker(graph, p=1, q=1, )
+        self.sentences = self.walker.simulate_walks(
+            num_walks=num_walks, walk_length=walk_length, workers=workers, verbose=0, nodes=nodes)
+        if len(self.sentences) > 0:
+            self.w2v_model.build_vocab(self.sentences, update=True)
+            self.w2v_model.train(self.sentences, total_examples=len(self.sentences), epochs=self.w2v_model.epochs)
+        return self.w2v_model
+
     def get_embeddings(self,):
         if self.w2v_model is None:
             print("model not train")
@@ -49,20 +49,20 @@ Reference:
 
 """
 
+import hashlib
 import math
 import os
-import shutil
-from collections import ChainMap, deque
+import tempfile
+from collections import deque
 
 import numpy as np
 import pandas as pd
-from fastdtw import fastdtw
 from gensim.models import Word2Vec
 from joblib import Parallel, delayed
 from tqdm import tqdm
 
 from ..alias import create_alias_table
-from ..utils import partition_dict, preprocess_nxgraph
+from ..utils import preprocess_nxgraph
 from ..walker import BiasedWalker
 
 
@@ -76,14 +76,12 @@ class Struc2Vec():
         self.opt2_reduce_sim_calc = opt2_reduce_sim_calc
         self.opt3_num_layers = opt3_num_layers
 
-        self.resue = reuse
-        self.temp_path = temp_path
-
-        if not os.path.exists(self.temp_path):
-            os.mkdir(self.temp_path)
-        if not reuse:
-            shutil.rmtree(self.temp_path)
-            os.mkdir(self.temp_path)
+        self.reuse = reuse
+        # intermediate results only depend on the graph and the three options above, so they are kept in a
+        # sub-folder named after them: concurrent runs on different graphs never touch each other's files and
+        # a run on the same graph can safely pick up what an earlier one left behind
+        self.temp_path = os.path.join(temp_path, self._cache_key()) + os.sep
+        os.makedirs(self.temp_path, exist_ok=True)
 
         self.create_context_graph(self.opt3_num_layers, workers, verbose)
         self.prepare_biased_walk()
@@ -91,19 +89,50 @@ class Struc2Vec():
         self.sentences = self.walker.simulate_walks(
             num_walks, walk_length, stay_prob, workers, verbose)
 
+        self.w2v_model = None
         self._embeddings = {}
 
+    def _cache_key(self):
+        """
+        fingerprint of the graph (in index space, so node order matters) and of the options
+        that change the intermediate results
+        :return: hex digest naming the cache folder of this graph
+        """
+        digest = hashlib.sha1()
+        digest.update(repr([str(node) for node in self.idx2node]).encode('utf-8'))
+        edges = sorted(tuple(sorted((self.node2idx[u], self.node2idx[v]))) for u, v in self.graph.edges())
+        digest.update(np.asarray(edges, dtype=np.int64).tobytes())
+        digest.update(repr((self.opt1_reduce_len, self.opt2_reduce_sim_calc, self.opt3_num_layers)).encode('utf-8'))
+        return digest.hexdigest()
+
+    def _cached(self, name):
+        return self.reuse and os.path.exists(self.temp_path + name)
+
+    def _dump(self, obj, name):
+        """
+        pickle `obj` into the cache folder, writing to a temporary file first so that
+        a concurrent reader never sees a partially written file
+        """
+        fd, tmp_file = tempfile.mkstemp(dir=self.temp_path, suffix='.tmp')
+        os.close(fd)
+        try:
+            pd.to_pickle(obj, tmp_file)
+            os.replace(tmp_file, self.temp_path + name)
+        finally:
+            if os.path.exists(tmp_file):
+                os.remove(tmp_file)
+
     def create_context_graph(self, max_num_layers, workers=1, verbose=0,):
 
         pair_distances = self._compute_structural_distance(
             max_num_layers, workers, verbose,)
         layers_adj, layers_distances = self._get_layer_rep(pair_distances)
-        pd.to_pickle(layers_adj, self.temp_path + 'layers_adj.pkl')
+        self._dump(layers_adj, 'layers_adj.pkl')
 
         layers_accept, layers_alias = self._get_transition_probs(
             layers_adj, layers_distances)
-        pd.to_pickle(layers_alias, self.temp_path + 'layers_alias.pkl')
-        pd.to_pickle(layers_accept, self.temp_path + 'layers_accept.pkl')
+        self._dump(layers_alias, 'layers_alias.pkl')
+        self._dump(layers_accept, 'layers_accept.pkl')
 
     def prepare_biased_walk(self,):
 
@@ -134,8 +163,8 @@ class Struc2Vec():
 
             layer += 1
 
-        pd.to_pickle(average_weight, self.temp_path + 'average_weight')
-        pd.to_pickle(gamma, self.temp_path + 'gamma.pkl')
+        self._dump(average_weight, 'average_weight')
+        self._dump(gamma, 'gamma.pkl')
 
     def train(self, embed_size=128, window_size=5, workers=3, iter=5):
 
@@ -217,46 +246,50 @@ class Struc2Vec():
 
     def _compute_structural_distance(self, max_num_layers, workers=1, verbose=0,):
 
-        if os.path.exists(self.temp_path+'structural_dist.pkl'):
-            structural_dist = pd.read_pickle(
-                self.temp_path+'structural_dist.pkl')
-        else:
-            if self.opt1_reduce_len:
-                dist_func = cost_max
-            else:
-                dist_func = cost
-
-            if os.path.exists(self.temp_path + 'degreelist.pkl'):
-                degreeList = pd.read_pickle(self.temp_path + 'degreelist.pkl')
-            else:
-                degreeList = self._compute_ordered_degreelist(max_num_layers)
-                pd.to_pickle(degreeList, self.temp_path + 'degreelist.pkl')
-
-            if self.opt2_reduce_sim_calc:
-                degrees = self._create_vectors()
-                degreeListsSelected = {}
-                vertices = {}
-                n_nodes = len(self.idx)
-                for v in self.idx:  # c:list of vertex
-                    nbs = get_vertices(
-                        v, len(self.graph[self.idx2node[v]]), degrees, n_nodes)
-                    vertices[v] = nbs  # store nbs
-                    degreeListsSelected[v] = degreeList[v]  # store dist
-                    for n in nbs:
-                        # store dist of nbs
-                        degreeListsSelected[n] = degreeList[n]
-            else:
-                vertices = {}
-                for v in degreeList:
-                    vertices[v] = [vd for vd in degreeList.keys() if vd > v]
-
-            results = Parallel(n_jobs=workers, verbose=verbose,)(
-                delayed(compute_dtw_dist)(part_list, degreeList, dist_func) for part_list in partition_dict(vertices, workers))
-            dtw_dist = dict(ChainMap(*results))
+        if self._cached('structural_dist.pkl'):
+            return pd.read_pickle(self.temp_path+'structural_dist.pkl')
 
-            structural_dist = convert_dtw_struc_dist(dtw_dist)
-            pd.to_pickle(structural_dist, self.temp_path +
-                         'structural_dist.pkl')
+        if self._cached('degreelist.pkl'):
+            degreeList = pd.read_pickle(self.temp_path + 'degreelist.pkl')
+        else:
+            degreeList = self._compute_ordered_degreelist(max_num_layers)
+            self._dump(degreeList, 'degreelist.pkl')
+
+        if self.opt2_reduce_sim_calc:
+            degrees = self._create_vectors()
+            vertices = {}
+            n_nodes = len(self.idx)
+            for v in self.idx:  # c:list of vertex
+                vertices[v] = get_vertices(
+                    v, len(self.graph[self.idx2node[v]]), degrees, n_nodes)
+        else:
+            vertices = {}
+            for v in degreeList:
+                vertices[v] = [vd for vd in degreeList.keys() if vd > v]
+
+        sources = np.fromiter((v1 for v1, nbs in vertices.items() for _ in nbs), dtype=np.int64)
+        targets = np.fromiter((v2 for nbs in vertices.values() for v2 in nbs), dtype=np.int64)
+
+        # every layer is packed once into flat arrays; joblib memory-maps them for the worker processes
+        # instead of pickling the whole degree list into each job
+        packed = pack_degree_lists(degreeList, len(self.idx), self.opt1_reduce_len)
+        jobs = [(layer, chunk) for layer in range(len(packed))
+                for chunk in np.array_split(np.arange(len(sources)), max(workers, 1)) if len(chunk) > 0]
+        results = Parallel(n_jobs=workers, verbose=verbose,)(
+            delayed(compute_dtw_dist)(*packed[layer], sources[chunk], targets[chunk]) for layer, chunk in jobs)
+
+        # distances[p, l] is the DTW distance of pair p at layer l, nan where one of the nodes has no such layer
+        distances = np.full((len(sources), len(packed)), np.nan)
+        for (layer, chunk), dist in zip(jobs, results):
+            distances[chunk, layer] = dist
+        # structural distance of layer l accumulates the DTW distances of layers 0..l
+        distances = np.cumsum(distances, axis=1)
+
+        structural_dist = {}
+        for v1, v2, row in zip(sources.tolist(), targets.tolist(), distances):
+            structural_dist[v1, v2] = {layer: dist for layer, dist in enumerate(row.tolist())
+                                       if not math.isnan(dist)}
+        self._dump(structural_dist, 'structural_dist.pkl')
 
         return structural_dist
 
@@ -333,8 +366,7 @@ class Struc2Vec():
                 node_alias_dict[v] = alias
                 node_accept_dict[v] = accept
 
-            pd.to_pickle(
-                norm_weights, self.temp_path + 'norm_weights_distance-layer-' + str(layer)+'.pkl')
+            self._dump(norm_weights, 'norm_weights_distance-layer-' + str(layer)+'.pkl')
 
             layers_alias[layer] = node_alias_dict
             layers_accept[layer] = node_accept_dict
@@ -342,45 +374,6 @@ class Struc2Vec():
         return layers_accept, layers_alias
 
 
-def cost(a, b):
-    ep = 0.5
-    m = max(a, b) + ep
-    mi = min(a, b) + ep
-    return ((m / mi) - 1)
-
-
-def cost_min(a, b):
-    ep = 0.5
-    m = max(a[0], b[0]) + ep
-    mi = min(a[0], b[0]) + ep
-    return ((m / mi) - 1) * min(a[1], b[1])
-
-
-def cost_max(a, b):
-    ep = 0.5
-    m = max(a[0], b[0]) + ep
-    mi = min(a[0], b[0]) + ep
-    return ((m / mi) - 1) * max(a[1], b[1])
-
-
-def convert_dtw_struc_dist(distances, startLayer=1):
-    """
-
-    :param distances: dict of dict
-    :param startLayer:
-    :return:
-    """
-    for vertices, layers in distances.items():
-        keys_layers = sorted(layers.keys())
-        startLayer = min(len(keys_layers), startLayer)
-        for layer in range(0, startLayer):
-            keys_layers.pop(0)
-
-        for layer in keys_layers:
-            layers[layer] += layers[layer - 1]
-    return distances
-
-
 def get_vertices(v, degree_v, degrees, n_nodes):
     a_vertices_selected = 2 * math.log(n_nodes, 2)
     vertices = []
@@ -450,16 +443,81 @@ def verifyDegrees(degrees, degree_v_root, degree_a, degree_b):
     return degree_now
 
 
-def compute_dtw_dist(part_list, degreeList, dist_func):
-    dtw_dist = {}
-    for v1, nbs in part_list:
-        lists_v1 = degreeList[v1]  # lists_v1 :orderd degree list of v1
-        for v2 in nbs:
-            lists_v2 = degreeList[v2]  # lists_v1 :orderd degree list of v2
-            max_layer = min(len(lists_v1), len(lists_v2))  # valid layer
-            dtw_dist[v1, v2] = {}
-            for layer in range(0, max_layer):
-                dist, path = fastdtw(
-                    lists_v1[layer], lists_v2[layer], radius=1, dist=dist_func)
-                dtw_dist[v1, v2][layer] = dist
-    return dtw_dist
+def pack_degree_lists(degree_list, num_nodes, reduced):
+    """
+    pack the ordered degree lists into flat arrays, one triple per layer
+    :param degree_list: {node index: {layer: ordered degree list}}, as computed by `_compute_ordered_degreelist`
+    :param num_nodes: number of nodes
+    :param reduced: True if the lists hold (degree, frequency) pairs (opt1_reduce_len)
+    :return: list of (degrees, counts, offsets): the sequence of node v at layer l is
+        packed[l][0][offsets[v]:offsets[v + 1]], its frequencies packed[l][1][offsets[v]:offsets[v + 1]];
+        nodes that do not reach layer l have an empty sequence
+    """
+    num_layers = max((len(layers) for layers in degree_list.values()), default=0)
+    packed = []
+    for layer in range(num_layers):
+        lengths = np.zeros(num_nodes, dtype=np.int64)
+        degrees = []
+        counts = []
+        for v in range(num_nodes):
+            sequence = degree_list[v].get(layer)
+            if not sequence:
+                continue
+            lengths[v] = len(sequence)
+            if reduced:
+                degrees.extend(degree for degree, _ in sequence)
+                counts.extend(count for _, count in sequence)
+            else:
+                degrees.extend(sequence)
+                counts.extend([1] * len(sequence))
+        offsets = np.zeros(num_nodes + 1, dtype=np.int64)
+        np.cumsum(lengths, out=offsets[1:])
+        packed.append((np.asarray(degrees, dtype=np.float64), np.asarray(counts, dtype=np.float64), offsets))
+    return packed
+
+
+def compute_dtw_dist(degrees, counts, offsets, sources, targets, max_cells=1 << 22):
+    """
+    exact DTW distance between the packed sequences of node pairs (sources[i], targets[i]) at one layer,
+    with the struc2vec cost ((max(a, b) + 0.5) / (min(a, b) + 0.5) - 1) * max(count_a, count_b)
+    (frequencies are all 1 when the lists are not reduced, which gives the plain cost).
+    pairs are grouped by the lengths of their two sequences so that each group is computed
+    as one (pairs x n x m) cost tensor without padding
+    :param degrees, counts, offsets: one layer of `pack_degree_lists`
+    :param sources: node indices of the first elements of the pairs
+    :param targets: node indices of the second elements of the pairs
+    :param max_cells: upper bound on the size of a cost tensor, larger groups are split
+    :return: numpy array of distances, nan for pairs where one of the sequences is empty
+    """
+    lengths = np.diff(offsets)
+    len_a = lengths[sources]
+    len_b = lengths[targets]
+    distances = np.full(len(sources), np.nan)
+
+    valid = np.flatnonzero((len_a > 0) & (len_b > 0))
+    shapes, group_of = np.unique(np.stack([len_a[valid], len_b[valid]], axis=1), axis=0, return_inverse=True)
+    group_of = np.asarray(group_of).reshape(-1)
+    for g, (n, m) in enumerate(shapes):
+        members = valid[group_of == g]
+        batch_size = max(1, max_cells // (n * m))
+        for start in range(0, len(members), batch_size):
+            batch = members[start:start + batch_size]
+            index_a = offsets[sources[batch]][:, None] + np.arange(n)
+            index_b = offsets[targets[batch]][:, None] + np.arange(m)
+            a = degrees[index_a][:, :, None]
+            b = degrees[index_b][:, None, :]
+            cost = (np.maximum(a, b) + 0.5) / (np.minimum(a, b) + 0.5) - 1
+            cost *= np.maximum(counts[index_a][:, :, None], counts[index_b][:, None, :])
+
+            # row-by-row DTW: D[i, j] = c[i, j] + min(D[i-1, j], D[i-1, j-1], D[i, j-1]);
+            # with s = cumsum(c[i]) the in-row dependency becomes a running minimum of (t - s)
+            acc = np.cumsum(cost[:, 0, :], axis=1)
+            for i in range(1, n):
+                previous = np.empty_like(acc)
+                previous[:, 0] = acc[:, 0]
+                np.minimum(acc[:, 1:], acc[:, :-1], out=previous[:, 1:])
+                row = cost[:, i, :]
+                prefix = np.cumsum(row, axis=1)
+                acc = prefix + np.minimum.accumulate(row + previous - prefix, axis=1)
+            distances[batch] = acc[:, m - 1]
+    return distances
@@ -147,11 +147,12 @@ class RandomWalker:
                 break
         return walk
 
-    def simulate_walks(self, num_walks, walk_length, workers=1, verbose=0):
+    def simulate_walks(self, num_walks, walk_length, workers=1, verbose=0, nodes=None):
 
         G = self.G
 
-        nodes = list(G.nodes())
+        # walks may be restricted to start from a subset of nodes, e.g., around a changed region of the graph
+        nodes = list(G.nodes()) if nodes is None else list(nodes)
 
         results = Parallel(n_jobs=workers, verbose=verbose, )(
             delayed(self._simulate_walks)(nodes, num, walk_length) for num in
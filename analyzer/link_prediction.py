@@ -31,8 +31,11 @@ SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
 """
 import sys
 import os
+import joblib
+import numpy as np
 import networkx.algorithms.link_prediction as methods
-import networkx.algorithms.community as community_methods
+import hashlib
+from collections import OrderedDict
 from operator import itemgetter
 
 # find path to root directory of the project so as to import from other packages
@@ -44,6 +47,11 @@ if path2root not in sys.path:
     sys.path.append(path2root)
 
 import analyzer.common.helpers as helpers
+import analyzer.common.instrumentation as instrumentation
+import analyzer.common.spectral as spectral
+from analyzer.common.nearest_neighbors import normalize_rows
+from analyzer.node_embedding import NodeEmbedder
+from analyzer.community_detection import CommunityDetector
 
 
 def _get_sources(nx_graph, params, node_index):
@@ -102,27 +110,115 @@ def _generate_link_predictions(scores, params, sources, node_ids):
     return preds
 
 
-def _call_nx_community_detection_method(method_name, graph):
+def _get_candidate_arrays(adjacency, sources):
     """
-    call networkx' community detection methods. 
-    supported methods including 'modularity', 'asyn_lpa', 'label_propagation'
-    :param method_name: the name of networkx' community detection algorithm
-    :param graph: networkx graph
-    :return:
+    vectorized version of `_get_candidates`: second hop neighbors of the sources that are not already neighbors
+    :param adjacency: symmetric scipy csr matrix of the network
+    :param sources: list of node indices
+    :return: (us, vs): arrays of node indices of the candidate links (us[i], vs[i])
+    """
+    sources = np.asarray(list(sources), dtype=np.int64)
+    first_hop = adjacency[sources]
+    second_hop = (first_hop @ adjacency).tocsr()
+    us = np.repeat(sources, np.diff(second_hop.indptr))
+    vs = second_hop.indices.astype(np.int64)
+    # drop self loops and links that already exist
+    n = adjacency.shape[0]
+    existing = np.repeat(sources, np.diff(first_hop.indptr)) * n + first_hop.indices
+    keep = (us != vs) & ~np.isin(us * n + vs, existing)
+    return us[keep], vs[keep]
+
+
+def _generate_link_predictions_from_arrays(us, vs, scores, params, sources, node_ids):
     """
-    supported_community_methods = ('modularity', 'asyn_lpa', 'label_propagation')
+    vectorized version of `_generate_link_predictions`, candidates are given as arrays of node indices and scores
+    """
+    top_k = params.get('top_k', 3)
+    preds = dict([(node_ids[u], []) for u in sources])
+    # group candidates by source, best scores first
+    order = np.lexsort((-scores, us))
+    us, vs = us[order], vs[order]
+    starts = np.flatnonzero(np.r_[True, us[1:] != us[:-1]]) if len(us) > 0 else np.array([], dtype=np.int64)
+    ends = np.r_[starts[1:], len(us)]
+    for start, end in zip(starts.tolist(), ends.tolist()):
+        preds[node_ids[us[start]]] = [node_ids[v] for v in vs[start:min(end, start + top_k)].tolist()]
+    return preds
 
-    if method_name not in supported_community_methods:
-        return None
 
-    if method_name is supported_community_methods[0]:
-        return community_methods.greedy_modularity_communities(graph)
-    elif method_name is supported_community_methods[1]:
-        return community_methods.asyn_lpa_communities(graph)
-    elif method_name is supported_community_methods[2]:
-        return community_methods.label_propagation_communities(graph)
+def _get_node_embeddings(network, params, node_ids):
+    """
+    embedding matrix aligned with node_ids, i.e., row i is the vector of node_ids[i] (zeros if it has none).
+    stored embeddings passed in params['embeddings'] (see `InMemoryAnalyzer`) are used when available,
+    otherwise they are computed with params['embedding_method'] ('svd' by default) and params['K'] (32 by default)
+    :return: float32 array of shape (len(node_ids), K)
+    """
+    stored = params.get('embeddings')
+    if stored is not None:
+        vectors_index, matrix = stored.index, stored.matrix
     else:
-        return None
+        result = NodeEmbedder(params.get('embedding_method', 'svd')).perform(network, {'K': params.get('K', 32)})
+        if result is None or result['success'] == 0:
+            raise ValueError('embeddings could not be computed')
+        embedded = [u for u, vector in result['vectors'].items() if vector is not None]
+        vectors_index = dict([(u, i) for i, u in enumerate(embedded)])
+        matrix = np.vstack([result['vectors'][u] for u in embedded])
+    rows = np.array([vectors_index.get(u, -1) for u in node_ids], dtype=np.int64)
+    aligned = np.zeros((len(node_ids), matrix.shape[1]), dtype=np.float32)
+    aligned[rows >= 0] = matrix[rows[rows >= 0]]
+    return aligned
+
+
+def _edge_features(embeddings, us, vs, operator):
+    if operator == 'l1':
+        return np.abs(embeddings[us] - embeddings[vs])
+    return embeddings[us] * embeddings[vs]
+
+
+def _train_edge_classifier(embeddings, adjacency, operator, max_edges=100000, seed=0):
+    """
+    train a logistic regression on features of observed edges (positive) against random non-adjacent pairs
+    (negative)
+    """
+    from sklearn.linear_model import LogisticRegression
+
+    random_state = np.random.RandomState(seed)
+    n = adjacency.shape[0]
+    coo = adjacency.tocoo()
+    mask = coo.row < coo.col
+    pos_u, pos_v = coo.row[mask].astype(np.int64), coo.col[mask].astype(np.int64)
+    if len(pos_u) > max_edges:
+        sample = random_state.choice(len(pos_u), max_edges, replace=False)
+        pos_u, pos_v = pos_u[sample], pos_v[sample]
+    neg_u = random_state.randint(0, n, 2 * len(pos_u))
+    neg_v = random_state.randint(0, n, 2 * len(pos_u))
+    keep = (neg_u != neg_v) & ~np.isin(neg_u * n + neg_v, coo.row.astype(np.int64) * n + coo.col)
+    neg_u, neg_v = neg_u[keep][:len(pos_u)], neg_v[keep][:len(pos_u)]
+
+    features = np.vstack([_edge_features(embeddings, pos_u, pos_v, operator),
+                          _edge_features(embeddings, neg_u, neg_v, operator)])
+    labels = np.r_[np.ones(len(pos_u)), np.zeros(len(neg_u))]
+    classifier = LogisticRegression(max_iter=1000, random_state=seed)
+    classifier.fit(features, labels)
+    return classifier
+
+
+def _get_edge_classifier(embeddings, adjacency, operator, params):
+    """
+    edge classifier of the network, cached next to stored embeddings so that it is trained once per
+    dataset version
+    """
+    stored = params.get('embeddings')
+    path = None
+    if stored is not None and stored.directory is not None:
+        path = os.path.join(stored.directory, 'edge-classifier-%s.joblib' % operator)
+        if os.path.exists(path):
+            return joblib.load(path)
+    classifier = _train_edge_classifier(embeddings, adjacency, operator)
+    if path is not None:
+        temp_file = '%s.%d.tmp' % (path, os.getpid())
+        joblib.dump(classifier, temp_file)
+        os.replace(temp_file, path)
+    return classifier
 
 
 def resource_allocation_index(network, params):
@@ -253,53 +349,98 @@ def preferential_attachment(network, params):
         return result
 
 
-def count_number_soundarajan_hopcroft(network, params):
+def _membership_to_labels(membership, node_ids):
     """
-    predict links for a set of nodes using networkx' cn_soundarajan_hopcroft function to 
-    count the number of common neighbors
-    :param network: networkx network
-    :param params:
-    :return: dictionary, in the form
-        {
-            'success': 1 if success, 0 otherwise
-            'message': a string
-            'predictions': predictions
-        }
+    :param membership: dictionary, membership[u] is the community of node u, either as a community index
+                        (e.g., the 'community' data of active network elements) or as a dictionary of communities
+                        and membership values (as in the results of community detection)
+    :param node_ids: ids of the nodes in index order
+    :return: community of every node as an array, nodes without community are each alone in their community
     """
-    try:
-        graph, node_ids = helpers.convert_to_nx_undirected_graph(network)
-        node_index = [(node_ids[i], i) for i in range(len(node_ids))]
-        node_index = dict(node_index)
-        if params is None:
-            params = {}
+    labels = np.empty(len(node_ids), dtype=np.int64)
+    index = {}
+    for i, u in enumerate(node_ids):
+        c = membership.get(u)
+        if isinstance(c, dict):
+            c = max(c.items(), key=itemgetter(1))[0] if len(c) > 0 else None
+        if c is None or c == -1:
+            # unassigned node
+            c = ('node', i)
+        labels[i] = index.setdefault(c, len(index))
+    return labels
 
-        try:
-            community_detection_method = params['community_detection_method']
-        except Exception as e:
-            print('Community detection method is not defined.', e)
-            return None
 
-        nx_comms = _call_nx_community_detection_method(community_detection_method, graph)
-        if nx_comms is None:
-            print("Community detection method is not supported.")
-            return None
-        else:
-            nx_comms = list(nx_comms)
+_community_cache = OrderedDict()
+_COMMUNITY_CACHE_SIZE = 16
 
-        # initalize community information
-        for node in graph.nodes():
-            graph.nodes[node]['community'] = None
 
-        # add community information
-        for i in range(len(nx_comms)):
-            for node in nx_comms[i]:
-                if graph.nodes[node]['community'] is None:
-                    graph.nodes[node]['community'] = i
+def _get_community_labels(network, params, adjacency, node_ids):
+    """
+    community of every node: from the precomputed 'membership' in params if given, otherwise detected with
+    'community_detection_method' (louvain by default). detected communities are cached by network structure, so
+    that switching between community based predictors does not cluster the network again
+    """
+    if params.get('membership'):
+        return _membership_to_labels(params['membership'], node_ids)
+
+    method = params.get('community_detection_method') or 'louvain'
+    fingerprint = hashlib.sha1()
+    fingerprint.update(adjacency.indptr.tobytes())
+    fingerprint.update(adjacency.indices.tobytes())
+    key = (method, fingerprint.hexdigest())
+    if key in _community_cache:
+        _community_cache.move_to_end(key)
+        return _community_cache[key]
+
+    result = CommunityDetector(method).perform(network, {})
+    if result['success'] == 0:
+        raise ValueError('community detection failed: %s' % result['message'])
+    labels = _membership_to_labels(result['membership'], node_ids)
+    _community_cache[key] = labels
+    if len(_community_cache) > _COMMUNITY_CACHE_SIZE:
+        _community_cache.popitem(last=False)
+    return labels
+
+
+def _community_common_neighbors(adjacency, labels, us, vs):
+    """
+    common neighbors of the candidate pairs, split by community
+    :return: (common, within, within_weights, same):
+        common[i]: number of common neighbors of us[i] and vs[i]
+        within[i]: number of them in the community of us[i]
+        within_weights[i]: sum of 1 / degree of them in the community of us[i]
+        same[i]: True if us[i] and vs[i] are in the same community
+    """
+    common_neighbors = adjacency[us].multiply(adjacency[vs]).tocsr()
+    rows = np.repeat(np.arange(len(us)), np.diff(common_neighbors.indptr))
+    columns = common_neighbors.indices
+    # degrees as counted by networkx, where a self-loop counts twice
+    degrees = np.diff(adjacency.indptr) + (adjacency.diagonal() != 0)
+    inside = labels[columns] == labels[us][rows]
+    common = np.bincount(rows, minlength=len(us)).astype(np.float64)
+    within = np.bincount(rows[inside], minlength=len(us)).astype(np.float64)
+    within_weights = np.bincount(rows[inside], weights=1.0 / degrees[columns[inside]], minlength=len(us))
+    same = labels[us] == labels[vs]
+    return common, within, within_weights, same
+
+
+def _community_link_predictions(network, params, score):
+    """
+    predict links of the sources with a score of the community information of their candidate links
+    :param score: function of the output of `_community_common_neighbors` giving the score of every candidate
+    """
+    try:
+        if params is None:
+            params = {}
+        adjacency, node_ids = _get_adjacency(network, params)
+        node_index = dict([(node_ids[i], i) for i in range(len(node_ids))])
 
-        sources = _get_sources(graph, params, node_index)
-        candidates = _get_candidates(graph, sources)
-        scores = methods.cn_soundarajan_hopcroft(graph, candidates)
-        predictions = _generate_link_predictions(scores, params, sources, node_ids)
+        sources = params['sources'] if 'sources' in params else node_ids
+        sources = [node_index[u] for u in sources]
+        us, vs = _get_candidate_arrays(adjacency, sources)
+        labels = _get_community_labels(network, params, adjacency, node_ids)
+        scores = score(*_community_common_neighbors(adjacency, labels, us, vs))
+        predictions = _generate_link_predictions_from_arrays(us, vs, scores, params, sources, node_ids)
 
         result = {'success': 1, 'message': 'the task is performed successfully', 'predictions': predictions}
         return result
@@ -309,12 +450,34 @@ def count_number_soundarajan_hopcroft(network, params):
         return result
 
 
+def count_number_soundarajan_hopcroft(network, params):
+    """
+    predict links for a set of nodes by the number of common neighbors using community information
+    (Soundarajan & Hopcroft, 2012, as networkx' cn_soundarajan_hopcroft): common neighbors of a pair in the same
+    community count twice if they are also in that community
+    :param network: networkx network
+    :param params: 'sources', 'top_k' as for the other methods,
+                   'membership' (optional): precomputed communities, membership[u] is the community index of node u
+                        or a dictionary of its communities as returned by community detection,
+                   'community_detection_method' (optional): method detecting the communities if no membership is
+                        given, louvain by default
+    :return: dictionary, in the form
+        {
+            'success': 1 if success, 0 otherwise
+            'message': a string
+            'predictions': predictions
+        }
+    """
+    return _community_link_predictions(network, params,
+                                       lambda common, within, within_weights, same: common + within * same)
+
+
 def resource_allocation_index_soundarajan_hopcroft(network, params):
     """
-    predict links for a set of nodes using networkx' ra_index_soundarajan_hopcroft function to 
-    compute the resource allocation index of all node pairs in network using community information.
+    predict links for a set of nodes by the resource allocation index using community information
+    (as networkx' ra_index_soundarajan_hopcroft): only common neighbors in the community of both nodes count
     :param network: networkx network
-    :param params:
+    :param params: see `count_number_soundarajan_hopcroft`
     :return: dictionary, in the form
         {
             'success': 1 if success, 0 otherwise
@@ -322,40 +485,64 @@ def resource_allocation_index_soundarajan_hopcroft(network, params):
             'predictions': predictions
         }
     """
-    try:
-        graph, node_ids = helpers.convert_to_nx_undirected_graph(network)
-        node_index = [(node_ids[i], i) for i in range(len(node_ids))]
-        node_index = dict(node_index)
-        if params is None:
-            params = {}
+    return _community_link_predictions(network, params,
+                                       lambda common, within, within_weights, same: within_weights * same)
 
-        try:
-            community_detection_method = params['community_detection_method']
-        except Exception as e:
-            print('Community detection method is not defined.', e)
-            return None
 
-        nx_comms = _call_nx_community_detection_method(community_detection_method, graph)
-        if nx_comms is None:
-            print("Community detection method is not supported.")
-            return None
-        else:
-            nx_comms = list(nx_comms)
+def within_inter_cluster(network, params, delta=0.001):
+    """
+    predict links for a set of nodes by the ratio of within- and inter-cluster common neighbors
+    (Valverde-Rebaza & Lopes, 2012, as networkx' within_inter_cluster)
+    :param network: networkx network
+    :param params: see `count_number_soundarajan_hopcroft`
+    :param delta: value added to the number of inter-cluster common neighbors to prevent division by zero
+    :return: dictionary, in the form
+        {
+            'success': 1 if success, 0 otherwise
+            'message': a string
+            'predictions': predictions
+        }
+    """
+    return _community_link_predictions(
+        network, params, lambda common, within, within_weights, same: same * within / (common - within + delta))
 
-        # initalize community information
-        for node in graph.nodes():
-            graph.nodes[node]['community'] = None
 
-        # add community information
-        for i in range(len(nx_comms)):
-            for node in nx_comms[i]:
-                if graph.nodes[node]['community'] is None:
-                    graph.nodes[node]['community'] = i
+def _get_adjacency(network, params):
+    """
+    :return: (adjacency, node_ids): binary symmetric csr matrix of the network and the ids of its rows
+    """
+    matrix, node_ids = helpers.convert_to_csr_sparse_matrix(network, params)
+    adjacency = spectral.symmetrize(matrix)
+    adjacency.data[:] = 1
+    return adjacency, node_ids
 
-        sources = _get_sources(graph, params, node_index)
-        candidates = _get_candidates(graph, sources)
-        scores = methods.ra_index_soundarajan_hopcroft(graph, candidates)
-        predictions = _generate_link_predictions(scores, params, sources, node_ids)
+
+def embedding_similarity(network, params):
+    """
+    predict links for a set of nodes by the cosine similarity of the embeddings of the candidate node pairs
+    :param network: networkx network
+    :param params: 'sources', 'top_k' as for the other methods,
+                   'embedding_method', 'K' (optional): method and dimension of the embeddings if no stored
+                        embeddings are available, 'svd' and 32 by default
+    :return: dictionary, in the form
+        {
+            'success': 1 if success, 0 otherwise
+            'message': a string
+            'predictions': predictions
+        }
+    """
+    try:
+        if params is None:
+            params = {}
+        adjacency, node_ids = _get_adjacency(network, params)
+        node_index = dict([(node_ids[i], i) for i in range(len(node_ids))])
+
+        sources = params['sources'] if 'sources' in params else node_ids
+        sources = [node_index[u] for u in sources]
+        us, vs = _get_candidate_arrays(adjacency, sources)
+        embeddings = normalize_rows(_get_node_embeddings(network, params, node_ids))
+        scores = np.einsum('ij,ij->i', embeddings[us], embeddings[vs])
+        predictions = _generate_link_predictions_from_arrays(us, vs, scores, params, sources, node_ids)
 
         result = {'success': 1, 'message': 'the task is performed successfully', 'predictions': predictions}
         return result
@@ -365,12 +552,15 @@ def resource_allocation_index_soundarajan_hopcroft(network, params):
         return result
 
 
-def within_inter_cluster(network, params):
+def edge_classifier(network, params):
     """
-    predict links for a set of nodes using networkx' within_inter_cluster to 
-    compute the ratio of within- and inter-cluster common neighbors of all node pairs in network.
+    predict links for a set of nodes by a logistic regression trained on the observed edges of the network,
+    with the Hadamard product or the L1 distance of the embeddings of the two nodes as features
     :param network: networkx network
-    :param params:
+    :param params: 'sources', 'top_k' as for the other methods,
+                   'edge_operator' (optional): 'hadamard' (default) or 'l1',
+                   'embedding_method', 'K' (optional): method and dimension of the embeddings if no stored
+                        embeddings are available, 'svd' and 32 by default
     :return: dictionary, in the form
         {
             'success': 1 if success, 0 otherwise
@@ -379,39 +569,20 @@ def within_inter_cluster(network, params):
         }
     """
     try:
-        graph, node_ids = helpers.convert_to_nx_undirected_graph(network)
-        node_index = [(node_ids[i], i) for i in range(len(node_ids))]
-        node_index = dict(node_index)
         if params is None:
             params = {}
+        adjacency, node_ids = _get_adjacency(network, params)
+        node_index = dict([(node_ids[i], i) for i in range(len(node_ids))])
+        operator = params.get('edge_operator', 'hadamard')
 
-        try:
-            community_detection_method = params['community_detection_method']
-        except Exception as e:
-            print('Community detection method is not defined.', e)
-            return None
-
-        nx_comms = _call_nx_community_detection_method(community_detection_method, graph)
-        if nx_comms is None:
-            print("Community detection method is not supported.")
-            return None
-        else:
-            nx_comms = list(nx_comms)
-
-        # initalize community information
-        for node in graph.nodes():
-            graph.nodes[node]['community'] = None
-
-        # add community information
-        for i in range(len(nx_comms)):
-            for node in nx_comms[i]:
-                if graph.nodes[node]['community'] is None:
-                    graph.nodes[node]['community'] = i
-
-        sources = _get_sources(graph, params, node_index)
-        candidates = _get_candidates(graph, sources)
-        scores = methods.within_inter_cluster(graph, candidates)
-        predictions = _generate_link_predictions(scores, params, sources, node_ids)
+        sources = params['sources'] if 'sources' in params else node_ids
+        sources = [node_index[u] for u in sources]
+        us, vs = _get_candidate_arrays(adjacency, sources)
+        embeddings = _get_node_embeddings(network, params, node_ids)
+        classifier = _get_edge_classifier(embeddings, adjacency, operator, params)
+        scores = classifier.predict_proba(_edge_features(embeddings, us, vs, operator))[:, 1] if len(us) > 0 \
+            else np.zeros(0)
+        predictions = _generate_link_predictions_from_arrays(us, vs, scores, params, sources, node_ids)
 
         result = {'success': 1, 'message': 'the task is performed successfully', 'predictions': predictions}
         return result
@@ -469,7 +640,9 @@ def get_info():
                     'parameter': {
                         'community_detection_method': {
                             'description': 'Community detection method',
-                            'options': {'modularity': 'Modularity',
+                            'options': {'louvain': 'Louvain',
+                                        'leiden': 'Leiden',
+                                        'modularity': 'Modularity',
                                         'asyn_lpa': 'Asynchronous Label Propagation',
                                         'label_propagation': 'Label Propagation'}
                         }
@@ -480,18 +653,36 @@ def get_info():
                     'parameter': {
                         'community_detection_method': {
                             'description': 'Community detection method',
-                            'options': {'modularity': 'Modularity',
+                            'options': {'louvain': 'Louvain',
+                                        'leiden': 'Leiden',
+                                        'modularity': 'Modularity',
                                         'asyn_lpa': 'Asynchronous Label Propagation',
                                         'label_propagation': 'Label Propagation'}
                         }
                     }
                 },
+                'embedding_similarity': {
+                    'name': 'Embedding Similarity',
+                    'parameter': {}
+                },
+                'edge_classifier': {
+                    'name': 'Edge Classifier on Embeddings',
+                    'parameter': {
+                        'edge_operator': {
+                            'description': 'Edge feature',
+                            'options': {'hadamard': 'Hadamard Product',
+                                        'l1': 'L1 Distance'}
+                        }
+                    }
+                },
                 'within_inter_cluster': {
                     'name': 'Within- and Interclustering',
                     'parameter': {
                         'community_detection_method': {
                             'description': 'Community detection method',
-                            'options': {'modularity': 'Modularity',
+                            'options': {'louvain': 'Louvain',
+                                        'leiden': 'Leiden',
+                                        'modularity': 'Modularity',
                                         'asyn_lpa': 'Asynchronous Label Propagation',
                                         'label_propagation': 'Label Propagation'}
                         }
@@ -520,7 +711,9 @@ class LinkPredictor:
             'preferential_attachment': preferential_attachment,
             'count_number_soundarajan_hopcroft': count_number_soundarajan_hopcroft,
             'resource_allocation_index_soundarajan_hopcroft': resource_allocation_index_soundarajan_hopcroft,
-            'within_inter_cluster': within_inter_cluster
+            'within_inter_cluster': within_inter_cluster,
+            'embedding_similarity': embedding_similarity,
+            'edge_classifier': edge_classifier
             # TODO: to add more methods from networkx, snap, and sklearn
         }
 
@@ -531,4 +724,5 @@ class LinkPredictor:
         :param params:
         :return:
         """
-        return self.methods[self.algorithm](network, params)
+        with instrumentation.span('link_prediction.' + self.algorithm):
+            return self.methods[self.algorithm](network, params)
@@ -31,8 +31,9 @@ SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
 """
 import sys
 import os
+import tempfile
 import networkx as nx
-from scipy.sparse.linalg import svds
+import numpy as np
 from sklearn.decomposition import NMF
 
 # find path to root directory of the project so as to import from other packages
@@ -44,16 +45,21 @@ if path2root not in sys.path:
     sys.path.append(path2root)
 
 import analyzer.common.helpers as helpers
+import analyzer.common.instrumentation as instrumentation
+import analyzer.common.spectral as spectral
 from analyzer.ge.models.deepwalk import DeepWalk
 from analyzer.ge.models.node2vec import Node2Vec
 from analyzer.ge.models.line import LINE
+from analyzer.ge.models.struc2vec import Struc2Vec
 
 
 def svd(network, params):
     """
-    perform node embedding by singular value decomposition
+    perform node embedding by randomized truncated singular value decomposition of the adjacency matrix
     :param network:
-    :param params:
+    :param params: 'K': embedding dimension,
+                   'normalization' (optional): 'sym' (default) for D^-1/2 A D^-1/2, 'rw' or 'none',
+                   'seed' (optional): seed of the randomized decomposition, 0 by default
     :return: dictionary, in the form
         {
             'success': 1 if success, 0 otherwise
@@ -64,9 +70,9 @@ def svd(network, params):
     try:
         matrix, node_ids = helpers.convert_to_csr_sparse_matrix(network, params)
         k = params['K']
-        print('shape =', matrix.shape)
-        print(matrix)
-        u, _, _ = svds(matrix, k)
+        matrix = spectral.normalize_adjacency(matrix, params.get('normalization', 'sym'))
+        u, s, _ = spectral.randomized_svd(matrix, k, seed=params.get('seed', 0))
+        u *= np.sqrt(s)
         vectors = [(node_ids[i], u[i]) for i in range(len(node_ids))]
         result = {'success': 1, 'message': 'the task is performed successfully', 'vectors': dict(vectors)}
         return result
@@ -80,7 +86,9 @@ def nmf(network, params):
     """
     perform node embedding by non-negative matrix factorization
     :param network:
-    :param params:
+    :param params: 'K': embedding dimension,
+                   'normalization' (optional): 'sym', 'rw' or 'none' (default),
+                   'seed' (optional): seed of the initialization, 0 by default
      :return: dictionary, in the form
     {
         'success': 1 if success, 0 otherwise
@@ -91,7 +99,10 @@ def nmf(network, params):
     try:
         matrix, node_ids = helpers.convert_to_csr_sparse_matrix(network, params)
         k = params['K']
-        model = NMF(n_components=k)
+        matrix = spectral.normalize_adjacency(matrix, params.get('normalization', 'none'))
+        # nndsvd initialization is deterministic and converges much faster than a random one on sparse input
+        model = NMF(n_components=min(k, matrix.shape[0]), init='nndsvd', max_iter=400,
+                    random_state=params.get('seed', 0))
         w = model.fit_transform(matrix)
         vectors = [(node_ids[i], w[i]) for i in range(len(node_ids))]
         result = {'success': 1, 'message': 'the task is performed successfully', 'vectors': dict(vectors)}
@@ -102,6 +113,32 @@ def nmf(network, params):
         return result
 
 
+def laplacian_eigenmap(network, params):
+    """
+    perform node embedding by Laplacian eigenmap of the undirected version of the network
+    :param network:
+    :param params: 'K': embedding dimension,
+                   'seed' (optional): seed of the eigen solver, 0 by default
+     :return: dictionary, in the form
+    {
+        'success': 1 if success, 0 otherwise
+        'message': a string
+        'vectors': a dictionary of vector of nodes in network, each vector is a numpy array
+    }
+    """
+    try:
+        matrix, node_ids = helpers.convert_to_csr_sparse_matrix(network, params)
+        k = params['K']
+        u = spectral.laplacian_eigenmap(matrix, k, seed=params.get('seed', 0))
+        vectors = [(node_ids[i], u[i]) for i in range(len(node_ids))]
+        result = {'success': 1, 'message': 'the task is performed successfully', 'vectors': dict(vectors)}
+        return result
+    except Exception as e:
+        print(e)
+        result = {'success': 0, 'message': 'this algorithm is not suitable for the input network', 'vectors': None}
+        return result
+
+
 def node2vec(network, params):
     """
     perform node embedding by node2vec
@@ -193,6 +230,39 @@ def line(network, params):
         return result
 
 
+def struc2vec(network, params):
+    """
+    perform node embedding by struc2vec
+    :param network:
+    :param params:
+     :return: dictionary, in the form
+    {
+        'success': 1 if success, 0 otherwise
+        'message': a string
+        'vectors': a dictionary of vector of nodes in network, each vector is a numpy array
+    }
+    """
+    try:
+        graph, node_ids = helpers.convert_to_nx_undirected_graph(network, params, node_is_str=True)
+        k = params['K']
+        workers = int(params.get('workers', os.cpu_count() or 1))
+
+        # the structural distances are cached per graph, so repeated runs on the same network skip the DTW step
+        model = Struc2Vec(graph, walk_length=int(params.get('walk_length', 10)),
+                          num_walks=int(params.get('num_walks', 80)), workers=workers, verbose=0,
+                          temp_path=os.path.join(tempfile.gettempdir(), 'struc2vec'), reuse=True)
+        model.train(embed_size=k, window_size=5, workers=workers, iter=int(params.get('iter', 5)))
+        embeddings = model.get_embeddings()
+
+        vectors = [(node_ids[i], embeddings.get(str(i))) for i in range(len(node_ids))]
+        result = {'success': 1, 'message': 'the task is performed successfully', 'vectors': dict(vectors)}
+        return result
+    except Exception as e:
+        print(e)
+        result = {'success': 0, 'message': 'this algorithm is not suitable for the input network', 'vectors': None}
+        return result
+
+
 def sine(network, params):
     pass
 
@@ -252,6 +322,40 @@ def get_info():
                             'options': {'Integer': 'Integer'}
                         }
                     }
+                },
+                'laplacian_eigenmap': {
+                    'name': 'Laplacian Eigenmap',
+                    'parameter': {
+                        'K': {
+                            'description': 'The embedding dimension',
+                            'options': {'Integer': 'Integer'}
+                        }
+                    }
+                },
+                'struc2vec': {
+                    'name': 'Struc2Vec',
+                    'parameter': {
+                        'K': {
+                            'description': 'The embedding dimension',
+                            'options': {'Integer': 'Integer'}
+                        },
+                        'walk_length': {
+                            'description': 'Length of the random walks, default 10',
+                            'options': {'Integer': 'Integer'}
+                        },
+                        'num_walks': {
+                            'description': 'Number of random walks per node, default 80',
+                            'options': {'Integer': 'Integer'}
+                        },
+                        'iter': {
+                            'description': 'Number of training epochs, default 5',
+                            'options': {'Integer': 'Integer'}
+                        },
+                        'workers': {
+                            'description': 'Number of parallel workers, default the number of CPUs',
+                            'options': {'Integer': 'Integer'}
+                        }
+                    }
                 }
             }
             }
@@ -280,9 +384,11 @@ class NodeEmbedder:
         self.methods = {
             'svd': svd,
             'nmf': nmf,
+            'laplacian_eigenmap': laplacian_eigenmap,
             'deepwalk': deepwalk,
             'node2vec': node2vec,
             'line': line,
+            'struc2vec': struc2vec,
             'sine': sine,
             'role2vec': role2vec,
             'metapath2vec': metapath2vec
@@ -296,4 +402,5 @@ class NodeEmbedder:
         :param params:
         :return:
         """
-        return self.methods[self.algorithm](network, params)
+        with instrumentation.span('node_embedding.' + self.algorithm):
+            return self.methods[self.algorithm](network, params)
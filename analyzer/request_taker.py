@@ -45,11 +45,17 @@ from analyzer.community_detection import CommunityDetector
 from analyzer.social_influence_analysis import SocialInfluenceAnalyzer
 from analyzer.link_prediction import LinkPredictor
 from analyzer.node_embedding import NodeEmbedder
+from analyzer.similarity_search import SimilarNodeSearcher
 
 from analyzer import community_detection
 from analyzer import link_prediction
 from analyzer import social_influence_analysis
 from analyzer import node_embedding
+from analyzer import similarity_search
+from analyzer.common import instrumentation
+
+# link prediction methods that score candidates with node embeddings
+EMBEDDING_LINK_PREDICTION_METHODS = ('embedding_similarity', 'edge_classifier')
 
 
 def get_info():
@@ -81,20 +87,25 @@ def get_info():
     info = {'community_detection': community_detection.get_info(),
             'link_prediction': link_prediction.get_info(),
             'social_influence_analysis': social_influence_analysis.get_info(),
-            'node_embedding': node_embedding.get_info()
+            'node_embedding': node_embedding.get_info(),
+            'similarity_search': similarity_search.get_info()
             }
     return info
 
 
 class InMemoryAnalyzer(AnalysisRequester):
-    def __init__(self):
+    def __init__(self, embedding_store=None):
         """
         #TODO: more to be added
+        :param embedding_store: optional EmbeddingStore, node embeddings of tasks that identify the dataset and
+            its version are then persisted and reused (or refreshed incrementally) across tasks
         """
         self.community_detector = None
         self.social_influence_analyzer = None
         self.link_predictor = None
         self.node_embedder = None
+        self.similar_node_searcher = None
+        self.embedding_store = embedding_store
 
     def perform_analysis(self, task, params):
         """
@@ -105,7 +116,8 @@ class InMemoryAnalyzer(AnalysisRequester):
                         "community_detection",
                         "social_influence_analysis"
                         "link_prediction",
-                        "node_embedding"
+                        "node_embedding",
+                        "similarity_search"
                         # TODO: more to be added
                 "network": either: a string to identify the in-database network to perform the task on, or
                            a network in format of edge list, i.e., a list of dictionaries, each contains information
@@ -132,6 +144,9 @@ class InMemoryAnalyzer(AnalysisRequester):
                             method
                     }
                 "run_id": id for the run
+                "dataset_id": (optional) id of the dataset the network is taken from
+                "dataset_version": (optional) version of that dataset, used with "dataset_id" to look up stored
+                    embeddings
             }
             the list of task_ids, the algorithms/methods for the tasks and their parameters will be described in another
             document
@@ -142,8 +157,22 @@ class InMemoryAnalyzer(AnalysisRequester):
                 "output_directory": (optional) directory to save the task result to files
                 "compressed": (optional) to compress the output files or not
             }
-        :return: 1 if the task is performed successfully, or 0 otherwise
+        :return: 1 if the task is performed successfully, or 0 otherwise. When the instrumentation is enabled
+            (see `analyzer.common.instrumentation`), the result also has the key 'stages': time and memory spent in
+            each stage of the task
         """
+        recorder = instrumentation.new_recorder()
+        if recorder is None:
+            with instrumentation.span('perform_analysis'):
+                return self._perform_analysis(task, params)
+        with recorder:
+            with instrumentation.span('perform_analysis'):
+                result = self._perform_analysis(task, params)
+        if isinstance(result, dict):
+            result['stages'] = recorder.stages()
+        return result
+
+    def _perform_analysis(self, task, params):
         network = task['network']
         if type(network) == str:
             # TODO: retrieve network from database
@@ -164,12 +193,56 @@ class InMemoryAnalyzer(AnalysisRequester):
             self.social_influence_analyzer = SocialInfluenceAnalyzer(algorithm)
             return self.social_influence_analyzer.perform(network, algorithm_params)
         elif task['task_id'] == 'link_prediction':
+            if algorithm in EMBEDDING_LINK_PREDICTION_METHODS and self.embedding_store is not None and \
+                    task.get('dataset_id') is not None:
+                algorithm_params = self._with_stored_embeddings(task)
             self.link_predictor = LinkPredictor(algorithm)
             return self.link_predictor.perform(network, algorithm_params)
         elif task['task_id'] == 'node_embedding':
+            if self.embedding_store is not None and task.get('dataset_id') is not None:
+                stored = self.embedding_store.get_embeddings(task['dataset_id'], task.get('dataset_version', 1.0),
+                                                             network, algorithm, algorithm_params)
+                if stored is None:
+                    return {'success': 0, 'message': 'this algorithm is not suitable for the input network',
+                            'vectors': None}
+                return {'success': 1, 'message': 'the task is performed successfully', 'vectors': stored.vectors()}
             self.node_embedder = NodeEmbedder(algorithm)
             return self.node_embedder.perform(network, algorithm_params)
+        elif task['task_id'] == 'similarity_search':
+            if self.embedding_store is not None and task.get('dataset_id') is not None:
+                algorithm_params = self.build_similarity_index(task)
+            self.similar_node_searcher = SimilarNodeSearcher(algorithm)
+            return self.similar_node_searcher.perform(network, algorithm_params)
         else:
             # TODO: what should be return?
             print('task %s is not defined' % task['task_id'])
             return None
+
+    def _with_stored_embeddings(self, task):
+        """
+        get (computing them if needed) the stored embeddings of the task's dataset version
+        :param task: a task with "dataset_id" and "dataset_version"
+        :return: parameters of the task, completed with 'embeddings' if they are available
+        """
+        params = dict(task['options']['parameters'])
+        embedding_params = {'K': params.get('K', 32)}
+        stored = self.embedding_store.get_embeddings(task['dataset_id'], task.get('dataset_version', 1.0),
+                                                     task['network'], params.get('embedding_method', 'svd'),
+                                                     embedding_params)
+        if stored is not None:
+            params['embeddings'] = stored
+        return params
+
+    def build_similarity_index(self, task):
+        """
+        get (computing them if needed) the stored embeddings of the task's dataset version and, if the task asks
+        for an 'ivf' index, the stored index over them
+        :param task: a "similarity_search" task, with "dataset_id" and "dataset_version"
+        :return: parameters of the task, completed with 'embeddings' and 'ivf_index' for `SimilarNodeSearcher`
+        """
+        params = self._with_stored_embeddings(task)
+        if 'embeddings' in params and params.get('index', 'exact') == 'ivf':
+            params['ivf_index'] = self.embedding_store.get_ivf_index(params['embeddings'],
+                                                                     task['options']['method'] == 'cosine',
+                                                                     params.get('n_lists'))
+        return params
@@ -0,0 +1,221 @@
+"""
+=================================== LICENSE ==================================
+Copyright (c) 2021, Consortium Board ROXANNE
+All rights reserved.
+
+Redistribution and use in source and binary forms, with or without
+modification, are permitted provided that the following conditions are met:
+
+Redistributions of source code must retain the above copyright
+notice, this list of conditions and the following disclaimer.
+
+Redistributions in binary form must reproduce the above copyright
+notice, this list of conditions and the following disclaimer in the
+documentation and/or other materials provided with the distribution.
+
+Neither the name of the ROXANNE nor the
+names of its contributors may be used to endorse or promote products
+derived from this software without specific prior written permission.
+
+THIS SOFTWARE IS PROVIDED BY CONSORTIUM BOARD ROXANNE ``AS IS'' AND ANY
+EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+DISCLAIMED. IN NO EVENT SHALL CONSORTIUM BOARD TENCOMPETENCE BE LIABLE FOR ANY
+DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+(INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+(INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+==============================================================================
+"""
+import sys
+import os
+import numpy as np
+
+# find path to root directory of the project so as to import from other packages
+tokens = os.path.abspath(__file__).split('/')
+# print('tokens = ', tokens)
+path2root = '/'.join(tokens[:-2])
+# print('path2root = ', path2root)
+if path2root not in sys.path:
+    sys.path.append(path2root)
+
+from analyzer.common.nearest_neighbors import normalize_rows, exact_top_k
+from analyzer.common import instrumentation
+from analyzer.node_embedding import NodeEmbedder
+
+
+def _get_embeddings(network, params):
+    """
+    embedding matrix of the network: either the stored embeddings passed in params['embeddings']
+    (see `InMemoryAnalyzer`), or embeddings computed with params['embedding_method'] ('svd' by default)
+    :return: (matrix, node_ids), or (None, None) if the embedding fails
+    """
+    if params.get('embeddings') is not None:
+        return params['embeddings'].matrix, params['embeddings'].node_ids
+    result = NodeEmbedder(params.get('embedding_method', 'svd')).perform(network, {'K': params.get('K', 32)})
+    if result is None or result['success'] == 0:
+        return None, None
+    node_ids = [u for u, vector in result['vectors'].items() if vector is not None]
+    matrix = np.vstack([result['vectors'][u] for u in node_ids]).astype(np.float32)
+    return matrix, node_ids
+
+
+def _search(network, params, normalize):
+    matrix, node_ids = _get_embeddings(network, params)
+    if matrix is None:
+        raise ValueError('embeddings could not be computed')
+    if normalize:
+        matrix = normalize_rows(matrix)
+    node_index = {u: i for i, u in enumerate(node_ids)}
+    sources = [u for u in params.get('sources', []) if u in node_index]
+    query_rows = np.array([node_index[u] for u in sources], dtype=np.int64)
+    top_k = params.get('top_k', 10)
+
+    # building an index costs more than one exact search, only the index stored with the embeddings is used
+    index = params.get('ivf_index') if params.get('index', 'exact') == 'ivf' else None
+    if index is not None:
+        scores, indices = index.search(matrix[query_rows], matrix, top_k, n_probe=params.get('n_probe', 8),
+                                       exclude=query_rows)
+    else:
+        scores, indices = exact_top_k(matrix[query_rows], matrix, top_k, exclude=query_rows)
+
+    similar_nodes = {}
+    for u, row_scores, row_indices in zip(sources, scores.tolist(), indices.tolist()):
+        similar_nodes[u] = [(node_ids[v], s) for v, s in zip(row_indices, row_scores) if v >= 0]
+    return similar_nodes
+
+
+def cosine(network, params):
+    """
+    find the nodes whose embeddings are the most similar to the ones of the query nodes, by cosine similarity
+    :param network:
+    :param params: 'sources': list of query node ids,
+                   'top_k' (optional): number of similar nodes per query node, 10 by default,
+                   'K', 'embedding_method' (optional): dimension and method of the embeddings, 32 and 'svd' by default,
+                   'index' (optional): 'exact' (default) or 'ivf' for the approximate inverted file index stored
+                        with the embeddings, the search is exact if no index is stored,
+                   'n_lists', 'n_probe' (optional): number of clusters of the ivf index and number of clusters
+                        scanned per query
+    :return: dictionary, in the form
+        {
+            'success': 1 if success, 0 otherwise
+            'message': a string
+            'similar_nodes': a dictionary of the list of (node id, similarity) of each query node, by decreasing
+                similarity, query nodes are never returned as results
+        }
+    """
+    try:
+        similar_nodes = _search(network, params, normalize=True)
+        result = {'success': 1, 'message': 'the task is performed successfully', 'similar_nodes': similar_nodes}
+        return result
+    except Exception as e:
+        print(e)
+        result = {'success': 0, 'message': 'this algorithm is not suitable for the input network',
+                  'similar_nodes': None}
+        return result
+
+
+def dot_product(network, params):
+    """
+    find the nodes whose embeddings have the largest dot product with the ones of the query nodes
+    :param network:
+    :param params: same as `cosine`
+    :return: dictionary, in the form
+        {
+            'success': 1 if success, 0 otherwise
+            'message': a string
+            'similar_nodes': a dictionary of the list of (node id, dot product) of each query node, by decreasing
+                dot product, query nodes are never returned as results
+        }
+    """
+    try:
+        similar_nodes = _search(network, params, normalize=False)
+        result = {'success': 1, 'message': 'the task is performed successfully', 'similar_nodes': similar_nodes}
+        return result
+    except Exception as e:
+        print(e)
+        result = {'success': 0, 'message': 'this algorithm is not suitable for the input network',
+                  'similar_nodes': None}
+        return result
+
+
+def get_info():
+    """
+    get information about methods provided in this class
+    :return: dictionary: Provides the name of the analysis task, available methods and information
+                         about an methods parameter. Also provides full names of tasks, methods and parameter.
+                         Information is provided in the following format:
+
+                        {
+                            'name': Full analysis task name as string
+                            'methods': {
+                                key: Internal method name (eg. 'asyn_lpa')
+                                value: {
+                                    'name': Full method name as string
+                                    'parameter': {
+                                        key: Parameter name
+                                        value: {
+                                            'description': Description of the parameter
+                                            'options': {
+                                                key: Accepted parameter value
+                                                value: Full parameter value name as string
+                                                !! If accepted values are integers key and value is 'Integer'. !!
+                                            }
+                                        }
+                                    }
+                                }
+                            }
+                        }
+    """
+    info = {'name': 'Similar Node Search',
+            'methods': {
+                'cosine': {
+                    'name': 'Cosine Similarity of Embeddings',
+                    'parameter': {
+                        'top_k': {
+                            'description': 'Number of similar nodes per query node',
+                            'options': {'Integer': 'Integer'}
+                        }
+                    }
+                },
+                'dot_product': {
+                    'name': 'Dot Product of Embeddings',
+                    'parameter': {
+                        'top_k': {
+                            'description': 'Number of similar nodes per query node',
+                            'options': {'Integer': 'Integer'}
+                        }
+                    }
+                }
+            }
+            }
+    return info
+
+
+class SimilarNodeSearcher:
+    """
+    class for performing similar node search
+    """
+
+    def __init__(self, algorithm):
+        """
+        init a similar node searcher using the given `algorithm`
+        :param algorithm:
+        """
+        self.algorithm = algorithm
+        self.methods = {
+            'cosine': cosine,
+            'dot_product': dot_product
+        }
+
+    def perform(self, network, params):
+        """
+        performing
+        :param network:
+        :param params:
+        :return:
+        """
+        with instrumentation.span('similarity_search.' + self.algorithm):
+            return self.methods[self.algorithm](network, params)
@@ -32,6 +32,7 @@ SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
 import sys
 import os
 import networkx as nx
+import numpy as np
 
 # find path to root directory of the project so as to import from other packages
 tokens = os.path.abspath(__file__).split('/')
@@ -42,6 +43,7 @@ if path2root not in sys.path:
     sys.path.append(path2root)
 
 import analyzer.common.helpers as helpers
+import analyzer.common.instrumentation as instrumentation
 
 
 def pagerank(network, params):
@@ -73,6 +75,38 @@ def pagerank(network, params):
         return result
 
 
+def pagerank_from_arrays(sources, targets, num_nodes, alpha=0.85, nstart=None, tol=1.0e-6, max_iter=100):
+    """
+    PageRank of a directed graph given as arrays of distinct edges, with the conventions of NetworkX's pagerank
+    (uniform teleportation, rank of dangling nodes spread uniformly, convergence when the l1 change is below
+    num_nodes * tol). a starting vector close to the solution, e.g. the ranks of an overlapping time window,
+    reduces the number of iterations
+    :param sources: array of source node indices (0..num_nodes-1)
+    :param targets: array of target node indices
+    :param num_nodes: number of nodes
+    :param alpha: damping factor
+    :param nstart: optional starting vector, normalized before use
+    :return: (ranks, number of iterations)
+    """
+    if num_nodes == 0:
+        return np.zeros(0), 0
+    out_degrees = np.bincount(sources, minlength=num_nodes).astype(np.float64)
+    dangling = out_degrees == 0
+    inverse_degrees = np.zeros(num_nodes)
+    inverse_degrees[~dangling] = 1.0 / out_degrees[~dangling]
+    if nstart is None:
+        x = np.full(num_nodes, 1.0 / num_nodes)
+    else:
+        x = np.asarray(nstart, dtype=np.float64) / np.sum(nstart)
+    for iteration in range(1, max_iter + 1):
+        previous = x
+        x = alpha * np.bincount(targets, weights=previous[sources] * inverse_degrees[sources], minlength=num_nodes)
+        x += (alpha * previous[dangling].sum() + 1.0 - alpha) / num_nodes
+        if np.abs(x - previous).sum() < num_nodes * tol:
+            return x, iteration
+    raise nx.PowerIterationFailedConvergence(max_iter)
+
+
 def authority(network, params):
     """
     wrapper for NetworkX's hits function
@@ -266,4 +300,5 @@ class SocialInfluenceAnalyzer:
         :param params:
         :return:
         """
-        return self.methods[self.algorithm](network, params)
+        with instrumentation.span('social_influence_analysis.' + self.algorithm):
+            return self.methods[self.algorithm](network, params)
@@ -39,6 +39,8 @@ from falcon import API, media
 from .src.middlewares.authorization import AuthorizationComponent
 from .src.middlewares.multipart import FormComponent
 from .src.middlewares.log_middleware import LoggingComponent
+from .src.middlewares.metrics_middleware import MetricsComponent
+from .src.middlewares.content_negotiation import ContentNegotiationComponent
 from .src.router import VersionedRouter
 from .src.config import config
 from .src.auth_models import Role, User, AlreadyExistsError
@@ -88,9 +90,13 @@ router = VersionedRouter()
 api = API(
     router=router,
     middleware=[
+        MetricsComponent(),
         LoggingComponent(),
         AuthorizationComponent(),
-        FormComponent()])
+        FormComponent(),
+        ContentNegotiationComponent(media_handlers)])
+api.req_options.media_handlers.update(media_handlers)
+api.resp_options.media_handlers.update(media_handlers)
 
 from .src import config_logs
 from .src import config_routes
@@ -33,12 +33,17 @@ SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
 import re
 from falcon import HTTP_400, HTTP_409, HTTP_404
 import hashlib
-import binascii
 import os
 import shutil
+import time
+import threading
+import weakref
+from collections import OrderedDict
 from .config import config
 from .exceptions import AuthenticationError, ValidationError, ErrorDetail, DatasetError
 from .graph import data_manager
+from .helpers.password_helpers import hash_password, verify_password, needs_rehash, hashing_executor
+from analyzer.embedding_store import EmbeddingStore
 
 
 class AlreadyExistsError(AuthenticationError):
@@ -83,31 +88,6 @@ class DatasetDoesNotExistError(DatasetError):
     response_code = HTTP_404
 
 
-def hash_password(password):
-    """ Hash password using salt in Flask """
-    salt = hashlib.sha256(os.urandom(60)).hexdigest().encode("ascii")
-    pwdhash = hashlib.pbkdf2_hmac(
-        "sha512",
-        password.encode("utf-8"),
-        salt,
-        100000)
-    pwdhash = binascii.hexlify(pwdhash)
-    return (salt + pwdhash).decode("ascii")
-
-
-def verify_password(password, check_password):
-    """ Verify stored password against given """
-    salt = password[:64]
-    stored_password = password[64:]
-    pwdhash = hashlib.pbkdf2_hmac(
-        "sha512",
-        check_password.encode("utf-8"),
-        salt.encode("ascii"),
-        100000)
-    pwdhash = binascii.hexlify(pwdhash).decode("ascii")
-    return pwdhash == stored_password
-
-
 def check_password(password):
     """
     Check if password has at least 8 latin characters or digits and at least one capital letter
@@ -126,6 +106,92 @@ def check_password(password):
         raise PasswordValidationError("Password isn't secure enough!", "user password", [description])
 
 
+class PrincipalCache(object):
+    """
+    Index of the users of an auth graph: username -> user vertex and username -> role name, and usernames of the
+    tokens already verified. The entries of a user are invalidated when the user is changed or deleted
+    """
+
+    def __init__(self, dataset, max_tokens=10000):
+        self.dataset = dataset
+        self.max_tokens = max_tokens
+        self._roles = {}
+        self._tokens = OrderedDict()  # token -> (username, expiration timestamp), least recently used first
+        self._user_tokens = {}  # username -> tokens
+        self._lock = threading.Lock()
+
+    def get_user_vertex(self, username):
+        """ Find user vertex by username """
+        vertex = self.dataset.nodes.get(username)
+        if vertex is None or vertex.get("type") != "User":
+            raise AuthRecordNotFoundError(f"User by username {username} not found!", "username")
+        return vertex
+
+    def get_role_name(self, username):
+        """ Find name of the role of a user """
+        role_name = self._roles.get(username)
+        if role_name is None:
+            for e_index in self.dataset.adj_list.get(username, []):
+                edge = self.dataset.edges[e_index]
+                if edge is not None and self.dataset.nodes.get(edge["target"], {}).get("type") == "Role":
+                    role_name = edge["target"]
+                    break
+            else:
+                raise AuthRecordNotFoundError(f"Role for user {username} not found!", "Role")
+            with self._lock:
+                self._roles[username] = role_name
+        return role_name
+
+    def get_token_username(self, token):
+        """ Username of a token verified before, None if the token is unknown or expired """
+        with self._lock:
+            entry = self._tokens.get(token)
+            if entry is None:
+                return None
+            username, expiration = entry
+            if expiration <= time.time():
+                self._forget_token(token)
+                return None
+            self._tokens.move_to_end(token)
+            return username
+
+    def add_token(self, token, username, expiration):
+        """ Remember the username of a verified token until its expiration timestamp """
+        with self._lock:
+            if token in self._tokens:
+                self._forget_token(token)
+            self._tokens[token] = (username, expiration)
+            self._user_tokens.setdefault(username, set()).add(token)
+            while len(self._tokens) > self.max_tokens:
+                self._forget_token(next(iter(self._tokens)))
+
+    def _forget_token(self, token):
+        username, _ = self._tokens.pop(token)
+        tokens = self._user_tokens.get(username)
+        if tokens is not None:
+            tokens.discard(token)
+            if not tokens:
+                del self._user_tokens[username]
+
+    def invalidate(self, username):
+        """ Forget role and tokens of a user """
+        with self._lock:
+            self._roles.pop(username, None)
+            for token in self._user_tokens.pop(username, ()):
+                self._tokens.pop(token, None)
+
+
+_principal_caches = weakref.WeakKeyDictionary()
+
+
+def principal_cache(dataset):
+    """ Principal cache of an auth graph """
+    cache = _principal_caches.get(dataset)
+    if cache is None:
+        cache = _principal_caches.setdefault(dataset, PrincipalCache(dataset))
+    return cache
+
+
 class Role(object):
     """ Role model """
 
@@ -165,10 +231,7 @@ class Role(object):
     @classmethod
     def get_user_role(cls, dataset, username):
         """ Find role of user vertex """
-        search_result = dataset.get_neighbors([username])
-        if search_result["found"]:
-            return cls(dataset).get_role_vertex(search_result["found"][0]["neighbors"][0]["neighbor_id"])
-        raise AuthRecordNotFoundError(f"Role for user {username} not found!", "Role")
+        return cls(dataset).get_role_vertex(principal_cache(dataset).get_role_name(username))
 
     @classmethod
     def get_all(cls, dataset):
@@ -220,18 +283,17 @@ class User(object):
         """ Set new username for user """
         if self.dataset.nodes.get(username):
             raise AlreadyExistsError(f"User by the name {username} already exists!", "User")
-        del self.dataset.nodes[self.get_username()]
-        temp_adj = self.dataset.adj_list[self.get_username()]
-        del self.dataset.adj_list[self.get_username()]
-        self.dataset.adj_list[username] = temp_adj
-        for edge in temp_adj:
-            self.dataset.edges[edge]["source"] = username
-        self.dataset.nodes[username] = self._vertex
+        previous_username = self.get_username()
+        self.dataset.rename_node(previous_username, username, dict(self._vertex, username=username))
+        self._vertex = self.dataset.nodes[username]
+        principal_cache(self.dataset).invalidate(previous_username)
+        principal_cache(self.dataset).invalidate(username)
         return self
 
     def set_password(self, password):
         """ Set new password for user """
-        self._vertex["password"] = hash_password(password)
+        self._vertex["password"] = hashing_executor.run(hash_password, password)
+        principal_cache(self.dataset).invalidate(self.get_username())
         return self
 
     def set_role(self, role_name):
@@ -240,11 +302,11 @@ class User(object):
         new_role = Role(self.dataset).get_role_vertex(role_name)
         found_edges = self.dataset.get_network([self.get_username(), current_role.get_name()])["edges"]
         if found_edges:
-            found_edges[0]["target"] = role_name
-        else:
-            self.dataset.save_edges(
-                [{"source": self.get_username(), "target": role_name, "properties": {"type": "has_privilege"}}])
+            self.dataset.delete_edges([(self.get_username(), current_role.get_name())], False)
+        self.dataset.save_edges(
+            [{"source": self.get_username(), "target": role_name, "properties": {"type": "has_privilege"}}])
         self.role = new_role
+        principal_cache(self.dataset).invalidate(self.get_username())
         return self
 
     @classmethod
@@ -265,7 +327,8 @@ class User(object):
         if found_vertex["found"]:
             raise AlreadyExistsError(f"User by username {username} already exists!", "User")
         check_password(password)
-        hashed_password = hash_password(password)
+        principal_cache(self.dataset).invalidate(username)
+        hashed_password = hashing_executor.run(hash_password, password)
         self.dataset.save_nodes({
             username: {
                 "username": username,
@@ -286,26 +349,27 @@ class User(object):
     def authenticate(self, username, password):
         """ Find user and match password """
         self.identify(username)
-        if not verify_password(self.get_password(), password):
+        password_hash = self.get_password()
+        if not hashing_executor.run(verify_password, password_hash, password):
             raise WrongPasswordError("Wrong password!", "User")
+        if needs_rehash(password_hash):
+            self._vertex["password"] = hashing_executor.run(hash_password, password)
         return self
 
     def identify(self, username):
         """ Get user record by username """
-        try:
-            self._vertex = self.dataset.search_nodes([username], {"type": "User"})["found"][0]["properties"]
-        except IndexError:
-            raise AuthRecordNotFoundError(f"User by username {username} not found!", "username")
+        self._vertex = principal_cache(self.dataset).get_user_vertex(username)
         self.get_role()
         return self
 
-    def create_dataset(self, dataset_name, dataset_description, file_name, from_file=False):
-        """ Creates a dataset for a user """
+    def create_dataset(self, dataset_name, dataset_description, file_name, from_file=False, dataset=None):
+        """ Creates a dataset for a user, dataset is the network of the file if already loaded """
         result = data_manager.add_dataset(
             self.get_username() + dataset_name,
             dataset_description,
             str(self.get_folder_path() / file_name) if file_name else None,
-            from_file=from_file)
+            from_file=from_file,
+            dataset=dataset)
         self._vertex["datasets"].add(dataset_name)
         if result["success"] == 0:
             raise DatasetCreationError.from_dataset_message(result)
@@ -317,6 +381,7 @@ class User(object):
             self._vertex["datasets"].remove(dataset_name)
         except KeyError:
             raise DatasetRemovalError(f"Couldn't find dataset by name {dataset_name}", "dataset name")
+        EmbeddingStore(str(config["embeddings_folder"])).remove(self.get_username() + dataset_name)
 
     def list_datasets(self):
         """ List all user's datasets """
@@ -329,12 +394,23 @@ class User(object):
         except KeyError:
             raise DatasetDoesNotExistError(f"Couldn't find dataset by name {dataset_name}", "dataset name")
 
+    def get_dataset_reference(self, dataset_name):
+        """ Get id and version of a dataset in the data manager, the version changes whenever the dataset is changed """
+        dataset_id = self.get_username() + dataset_name
+        dataset_version = data_manager.get_network_version(dataset_id)
+        if dataset_version is None:
+            raise DatasetDoesNotExistError(f"Couldn't find dataset by name {dataset_name}", "dataset name")
+        return {"dataset_id": dataset_id, "dataset_version": dataset_version}
+
     def delete(self):
         """ Delete user from datastore """
         shutil.rmtree(self.get_folder_path())
-        result = self.dataset.delete_edges([(self.get_username(), self.get_role().get_name())], False)
-        if result:
-            raise AuthRecordNotFoundError("Relationship not found", "user")
-        result = self.dataset.delete_nodes([self.get_username()])
-        if result:
-            raise AuthRecordNotFoundError("No user found", "username")
+        try:
+            result = self.dataset.delete_edges([(self.get_username(), self.get_role().get_name())], False)
+            if result:
+                raise AuthRecordNotFoundError("Relationship not found", "user")
+            result = self.dataset.delete_nodes([self.get_username()])
+            if result:
+                raise AuthRecordNotFoundError("No user found", "username")
+        finally:
+            principal_cache(self.dataset).invalidate(self.get_username())
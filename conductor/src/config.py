@@ -46,3 +46,12 @@ except FileNotFoundError:
 
 if not config.get("temp_file_folder"):
     config["temp_file_folder"] = current_dir.parent.parent / "serve/temp/"
+
+if not config.get("embeddings_folder"):
+    config["embeddings_folder"] = current_dir.parent.parent / "serve/embeddings/"
+
+if not config.get("wp5_states_folder"):
+    config["wp5_states_folder"] = current_dir.parent.parent / "serve/wp5_states/"
+
+if not config.get("metrics_folder"):
+    config["metrics_folder"] = current_dir.parent.parent / "serve/metrics/"
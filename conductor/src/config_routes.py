@@ -44,6 +44,7 @@ from .resources.tasks_collection import TasksCollectonResource
 from .resources.tasks import TaskResource
 from .resources.network_construction_tasks import NetworkConstructionTasksResource
 from .resources.operations import OperationsResource
+from .resources.metrics import MetricsResource
 
 login_resource = LoginResource()
 roles_collection_resource = RolesCollectionResource()
@@ -58,6 +59,7 @@ tasks_collection_resource = TasksCollectonResource()
 task_resource = TaskResource()
 operations_resource = OperationsResource()
 network_construction_task = NetworkConstructionTasksResource()
+metrics_resource = MetricsResource()
 
 api.add_route("/login", login_resource)
 api.add_route("/users", users_collection_resource)
@@ -72,3 +74,4 @@ api.add_route("/tasks", tasks_collection_resource)
 api.add_route("/tasks/network_construction/{task_name}", network_construction_task)
 api.add_route("/tasks/{task_name}", task_resource)
 api.add_route("/operations/{operation_id}", operations_resource)
+api.add_route("/metrics", metrics_resource)
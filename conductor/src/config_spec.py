@@ -45,7 +45,8 @@ from conductor.src.schemas.login_schemas import login_request, login_response
 from conductor.src.schemas.roles_collection_schemas import create_schema as roles_create, list_roles_schema
 from conductor.src.schemas.tasks_collection_schemas import list_algorithms_schema
 from conductor.src.schemas.users_collection_schemas import create_schema as users_create, list_users_schema
-from conductor.src.schemas.datasets_schemas import post_input, data_dto, delete_input, error_output
+from conductor.src.schemas.datasets_schemas import post_input, data_dto, delete_input, error_output, query_output, \
+    neighbor_schema, dataset_info
 from conductor.src.schemas.files_collection_schemas import files_list
 from conductor.src.schemas.operations_schemas import get_response
 from conductor.src.schemas.roles_schemas import role_info, role_create
@@ -204,6 +205,9 @@ spec.components.schema("CreateDataset", create_dataset)
 # DatasetsResource schemas
 spec.components.schema("DatasetNodeIds", post_input)
 spec.components.schema("DatasetNetwork", data_dto)
+spec.components.schema("DatasetQueryResult", query_output)
+spec.components.schema("DatasetNeighbor", neighbor_schema)
+spec.components.schema("DatasetInfo", dataset_info)
 spec.components.schema("DatasetErrors", error_output)
 spec.components.schema("DatasetDeleteContents", delete_input)
 # FilesCollectionResource schemas
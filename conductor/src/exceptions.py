@@ -32,7 +32,7 @@ SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
  Common application exceptions """
 from uuid import uuid4
 from collections import namedtuple
-from falcon import HTTPError, HTTP_400, HTTP_500, HTTP_401, HTTP_404, HTTP_409
+from falcon import HTTPError, HTTP_400, HTTP_500, HTTP_401, HTTP_404, HTTP_409, HTTP_429
 
 ErrorDetail = namedtuple("ErrorDetail", ["code", "target", "message"])
 
@@ -106,6 +106,12 @@ class ValidationError(APIError):
     response_code = HTTP_400
 
 
+class TooManyRequestsError(APIError):
+    """ Too many concurrent requests of a client or for an account """
+    code = "TooManyRequestsError"
+    response_code = HTTP_429
+
+
 class ResourceError(APIError):
     """ Resource either does not exists or unavalible """
     code = "ResourceError"
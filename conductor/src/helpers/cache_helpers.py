@@ -0,0 +1,109 @@
+"""
+=================================== LICENSE ==================================
+Copyright (c) 2021, Consortium Board ROXANNE
+All rights reserved.
+
+Redistribution and use in source and binary forms, with or without
+modification, are permitted provided that the following conditions are met:
+
+Redistributions of source code must retain the above copyright
+notice, this list of conditions and the following disclaimer.
+
+Redistributions in binary form must reproduce the above copyright
+notice, this list of conditions and the following disclaimer in the
+documentation and/or other materials provided with the distribution.
+
+Neither the name of the ROXANNE nor the
+names of its contributors may be used to endorse or promote products
+derived from this software without specific prior written permission.
+
+THIS SOFTWARE IS PROVIDED BY CONSORTIUM BOARD ROXANNE ``AS IS'' AND ANY
+EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+DISCLAIMED. IN NO EVENT SHALL CONSORTIUM BOARD TENCOMPETENCE BE LIABLE FOR ANY
+DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+(INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+(INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+==============================================================================
+
+ Entity tags and cache of responses for reads of datasets """
+import hashlib
+import threading
+from collections import OrderedDict
+import ujson
+from falcon import HTTP_304
+from ..config import config
+
+
+def content_digest(*parts):
+    """ Digest of JSON serializable parts, equal for equal parts """
+    return hashlib.sha1(ujson.dumps(parts, sort_keys=True).encode("utf-8")).hexdigest()[:20]
+
+
+def dataset_etag(dataset, *parts):
+    """ Entity tag of a read of the dataset, changes with every change of the dataset """
+    return f"{dataset.uid}-{dataset.version}-{content_digest(*parts)}"
+
+
+def not_modified(req, resp, etag):
+    """
+    Set ETag of the response, and status 304 if the client has the current representation already
+
+    :returns: True if the response is not modified and should be left without body
+    """
+    resp.etag = etag
+    if req.if_none_match and ("*" in req.if_none_match or etag in req.if_none_match):
+        resp.status = HTTP_304
+        resp.content_type = None  # no content
+        return True
+    return False
+
+
+class ResponseCache(object):
+    """
+    Bounded cache of response bodies, least recently used entries are dropped first.
+    Keys must contain the version of the data the response was computed from, entries of old versions are
+    never hit again and age out
+    """
+
+    def __init__(self, max_entries=256, max_elements=100000):
+        self.max_entries = max_entries
+        self.max_elements = max_elements
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """ Cached response of the key, None if not cached """
+        with self._lock:
+            media = self._entries.get(key)
+            if media is not None:
+                self._entries.move_to_end(key)
+            return media
+
+    def put(self, key, media, size=0):
+        """ Cache a response with size elements, responses larger than max_elements are not cached """
+        if self.max_entries <= 0 or size > self.max_elements:
+            return
+        with self._lock:
+            self._entries[key] = media
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        """ Drop all entries """
+        with self._lock:
+            self._entries.clear()
+
+
+response_cache = ResponseCache(
+    config.get("response_cache_size", 256),
+    config.get("response_cache_max_elements", 100000))
+
+# sorted elements of the paginated queries, the pages of a query are cut from them
+query_order_cache = ResponseCache(
+    config.get("query_order_cache_size", 16),
+    config.get("query_order_cache_max_elements", 10000000))
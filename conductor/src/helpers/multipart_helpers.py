@@ -0,0 +1,320 @@
+"""
+=================================== LICENSE ==================================
+Copyright (c) 2021, Consortium Board ROXANNE
+All rights reserved.
+
+Redistribution and use in source and binary forms, with or without
+modification, are permitted provided that the following conditions are met:
+
+Redistributions of source code must retain the above copyright
+notice, this list of conditions and the following disclaimer.
+
+Redistributions in binary form must reproduce the above copyright
+notice, this list of conditions and the following disclaimer in the
+documentation and/or other materials provided with the distribution.
+
+Neither the name of the ROXANNE nor the
+names of its contributors may be used to endorse or promote products
+derived from this software without specific prior written permission.
+
+THIS SOFTWARE IS PROVIDED BY CONSORTIUM BOARD ROXANNE ``AS IS'' AND ANY
+EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+DISCLAIMED. IN NO EVENT SHALL CONSORTIUM BOARD TENCOMPETENCE BE LIABLE FOR ANY
+DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+(INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+(INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+==============================================================================
+
+ Streaming parser of multipart/form-data request bodies
+
+The parts of a form are read from the request stream when a resource asks for them. A file asked for with
+StreamingForm.save_file is written straight to its destination and hashed in the same pass, its chunks can also be
+passed to consumers, e.g. a dataset builder. Parts passed over on the way to another field are kept: values in
+memory, files spooled to the temporary folder and moved to their destination later. Memory use is bounded by the
+chunk size, whatever the size of the upload. """
+import os
+import shutil
+import hashlib
+import tempfile
+from email.message import Message
+from email.utils import collapse_rfc2231_value
+from ..exceptions import FormValidationError
+from .file_helpers import FileExistsError
+
+CHUNK_SIZE = 64 * 1024
+MAX_HEADERS_SIZE = 16 * 1024
+MAX_FIELD_SIZE = 1024 * 1024
+
+
+def parse_header(value, header="content-type"):
+    """ Parse a header with parameters """
+    message = Message()
+    message[header] = value
+    return message
+
+
+class MultipartReader(object):
+    """ Reads the parts of a multipart body one after another """
+
+    def __init__(self, stream, boundary: bytes, content_length=None, chunk_size=CHUNK_SIZE):
+        self.stream = stream
+        self.remaining = content_length
+        self.chunk_size = chunk_size
+        self.delimiter = b"\r\n--" + boundary
+        self._buffer = b"\r\n"  # the first delimiter isn't preceded by a line break
+        self._in_part = True  # the preamble is skipped as a part
+        self._eof = False
+        self._finished = False
+
+    def _fill(self, size):
+        """ Read from the stream until the buffer holds size bytes, False if the stream ended before """
+        while len(self._buffer) < size:
+            to_read = self.chunk_size if self.remaining is None else min(self.chunk_size, self.remaining)
+            chunk = self.stream.read(to_read) if to_read > 0 and not self._eof else b""
+            if not chunk:
+                self._eof = True
+                return False
+            if self.remaining is not None:
+                self.remaining -= len(chunk)
+            self._buffer += chunk
+        return True
+
+    def read_chunk(self):
+        """ Next bytes of the body of the current part, b"" at its end """
+        if not self._in_part:
+            return b""
+        self._fill(self.chunk_size + len(self.delimiter))
+        index = self._buffer.find(self.delimiter)
+        if index >= 0:
+            data, self._buffer = self._buffer[:index], self._buffer[index + len(self.delimiter):]
+            self._in_part = False
+            return data
+        if self._eof:
+            raise FormValidationError("Form data ended before its closing boundary", "form")
+        keep = len(self.delimiter) - 1  # the start of a delimiter may be at the end of the buffer
+        data, self._buffer = self._buffer[:-keep], self._buffer[-keep:]
+        return data
+
+    def next_part(self):
+        """ Headers of the next part as email.message.Message, None after the last part """
+        while self.read_chunk():
+            pass
+        if self._finished:
+            return None
+        self._fill(2)
+        if self._buffer.startswith(b"--"):
+            self._finished = True
+            return None
+        end = self._buffer.find(b"\r\n\r\n")
+        while end < 0:
+            if len(self._buffer) > MAX_HEADERS_SIZE or not self._fill(len(self._buffer) + 1):
+                raise FormValidationError("Malformed form data part headers", "form")
+            end = self._buffer.find(b"\r\n\r\n")
+        lines = self._buffer[:end].split(b"\r\n")
+        self._buffer = self._buffer[end + 4:]
+        self._in_part = True
+        headers = Message()
+        for line in lines[1:]:  # the first line is the end of the delimiter line
+            name, separator, value = line.decode("utf-8", "replace").partition(":")
+            if separator:
+                headers[name.strip()] = value.strip()
+        return headers
+
+
+class FormField(object):
+    """ Value of a form field """
+
+    filename = None
+
+    def __init__(self, name, value):
+        self.name = name
+        self.value = value
+
+    def close(self):
+        """ Nothing to release """
+
+
+class FormFile(object):
+    """ File of a form, stored at path """
+
+    def __init__(self, name, filename, content_type):
+        self.name = name
+        self.filename = filename
+        self.content_type = content_type
+        self.path = None
+        self.size = 0
+        self.sha256 = None
+        self.spooled = False
+        self._file = None
+
+    @property
+    def file(self):
+        """ Stored file, opened on first access """
+        if self._file is None:
+            self._file = open(self.path, "rb")
+        return self._file
+
+    @property
+    def value(self):
+        """ Contents of the file """
+        with open(self.path, "rb") as file:
+            return file.read()
+
+    def close(self):
+        """ Close the stored file, spooled files are removed """
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        if self.spooled and self.path and os.path.isfile(self.path):
+            os.remove(self.path)
+
+
+class StreamingForm(object):
+    """ Fields of a multipart form, parsed from the request stream on demand """
+
+    def __init__(self, reader: MultipartReader, spool_folder, max_field_size=MAX_FIELD_SIZE):
+        self.reader = reader
+        self.spool_folder = spool_folder
+        self.max_field_size = max_field_size
+        self.fields = {}
+        self._done = False
+
+    def _next_part(self):
+        """ Name and headers of the next part, (None, None) after the last part """
+        headers = self.reader.next_part()
+        if headers is None:
+            self._done = True
+            return None, None
+        name = headers.get_param("name", header="content-disposition")
+        if name is None:
+            raise FormValidationError("Form data part without name", "form")
+        return collapse_rfc2231_value(name), headers
+
+    def _read_value(self, name):
+        """ Value of a field, in memory """
+        chunks, size = [], 0
+        chunk = self.reader.read_chunk()
+        while chunk:
+            size += len(chunk)
+            if size > self.max_field_size:
+                raise FormValidationError(f"Form field {name} is too large", "form")
+            chunks.append(chunk)
+            chunk = self.reader.read_chunk()
+        return b"".join(chunks).decode("utf-8")
+
+    def _write(self, field: FormFile, path, consumers=()):
+        """ Write the body of the current part to path, hashing it """
+        digest = hashlib.sha256()
+        file = open(path, "wb")
+        try:
+            chunk = self.reader.read_chunk()
+            while chunk:
+                file.write(chunk)
+                digest.update(chunk)
+                for consume in consumers:
+                    consume(chunk)
+                field.size += len(chunk)
+                chunk = self.reader.read_chunk()
+        except BaseException:
+            file.close()
+            os.remove(path)
+            raise
+        file.close()
+        field.path = str(path)
+        field.sha256 = digest.hexdigest()
+
+    def _keep(self, name, headers):
+        """ Keep a part passed over: value in memory, file spooled """
+        filename = headers.get_filename()
+        if filename is None:
+            field = FormField(name, self._read_value(name))
+        else:
+            field = FormFile(name, filename, headers.get_content_type())
+            descriptor, path = tempfile.mkstemp(prefix="upload-", dir=self.spool_folder)
+            os.close(descriptor)
+            field.spooled = True
+            self._write(field, path)
+        self.fields.setdefault(name, field)
+        return field
+
+    def _find(self, name):
+        """ Field by name, parsing the form up to it """
+        while name not in self.fields and not self._done:
+            part_name, headers = self._next_part()
+            if part_name is not None:
+                self._keep(part_name, headers)
+        return self.fields.get(name)
+
+    def save_file(self, name, destination, consumers=()):
+        """
+        Write the file of a field to its destination
+
+        :param name: name of the field
+        :param destination: path of the file, or function giving the path from the name of the uploaded file
+        :param consumers: functions called with each chunk of the file
+        :raises KeyError: if there is no such field
+        :raises FileExistsError: if the destination already exists
+        :returns: FormFile
+        """
+        field = self.fields.get(name)
+        while field is None and not self._done:
+            part_name, headers = self._next_part()
+            if part_name == name:
+                field = FormFile(name, headers.get_filename() or "", headers.get_content_type())
+                path = destination(field.filename) if callable(destination) else destination
+                if os.path.isfile(path):
+                    raise FileExistsError("File already exists!", "filename")
+                self._write(field, path, consumers)
+                self.fields[name] = field
+                return field
+            if part_name is not None:
+                self._keep(part_name, headers)
+            field = self.fields.get(name)
+        if field is None:
+            raise KeyError(name)
+        if not isinstance(field, FormFile):
+            raise FormValidationError(f"Form field {name} is not a file", "form")
+        path = destination(field.filename) if callable(destination) else destination
+        if os.path.isfile(path):
+            raise FileExistsError("File already exists!", "filename")
+        field.spooled = False
+        field.close()
+        shutil.move(field.path, str(path))
+        field.path = str(path)
+        if consumers:
+            with open(field.path, "rb") as file:
+                for chunk in iter(lambda: file.read(CHUNK_SIZE), b""):
+                    for consume in consumers:
+                        consume(chunk)
+        return field
+
+    def __getitem__(self, name):
+        field = self._find(name)
+        if field is None:
+            raise KeyError(name)
+        return field
+
+    def __contains__(self, name):
+        return self._find(name) is not None
+
+    def getvalue(self, name, default=None):
+        """ Value of a field, default if there is no such field """
+        field = self._find(name)
+        return default if field is None else field.value
+
+    def keys(self):
+        """ Names of all the fields """
+        while not self._done:
+            part_name, headers = self._next_part()
+            if part_name is not None:
+                self._keep(part_name, headers)
+        return list(self.fields)
+
+    def close(self):
+        """ Release the files of the fields """
+        for field in self.fields.values():
+            field.close()
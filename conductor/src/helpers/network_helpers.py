@@ -30,6 +30,15 @@ SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
 ==============================================================================
 
  Helpers to transform the network """
+import base64
+import binascii
+import bisect
+from itertools import islice
+import ujson
+from ..exceptions import ValidationError
+from .cache_helpers import content_digest, query_order_cache
+
+NEIGHBORS_BATCH_SIZE = 1024
 
 
 def network_to_split(network, is_parse_wp5=False):
@@ -67,3 +76,169 @@ def split_to_network(nodes, edges):
     for e in edges:
         e["type"] = "edge"
     return nodes + edges
+
+
+def encode_cursor(position):
+    """
+    Opaque cursor of a position in the elements of a query
+
+    :param position: JSON serializable position
+    :returns: cursor string
+    """
+    return base64.urlsafe_b64encode(ujson.dumps(position).encode("utf-8")).decode("ascii")
+
+
+def decode_cursor(cursor, query="network"):
+    """
+    Position of a cursor made by encode_cursor for a query
+
+    :param cursor: cursor string
+    :param query: kind of the query, "network", "nodes" or "neighbors"
+    :raises ValidationError: if the cursor is not valid, or not a position of the query
+    :returns: position
+    """
+    try:
+        position = ujson.loads(base64.urlsafe_b64decode(cursor.encode("ascii")).decode("utf-8"))
+    except (ValueError, binascii.Error):
+        position = None
+    if not valid_position(position, query):
+        raise ValidationError("Invalid cursor", "cursor")
+    return position
+
+
+def valid_position(position, query):
+    """
+    Tell if position is a position in the elements of a query: ["node", id] or ["edge", index] for a network,
+    ["node", id] for nodes, [node index, neighbor index, dataset version] for neighbors
+    """
+    if not isinstance(position, list):
+        return False
+    if query == "neighbors":
+        return (len(position) == 3 and all(type(p) is int and p >= 0 for p in position[:2]) and
+                isinstance(position[2], str))
+    kinds = {"node": str, "edge": int} if query == "network" else {"node": str}
+    return (len(position) == 2 and isinstance(position[0], str) and position[0] in kinds and
+            type(position[1]) is kinds[position[0]])
+
+
+def ordered_elements(dataset, query, load):
+    """
+    Sorted elements of a query, computed once for all the pages of the query until the dataset changes
+
+    :param dataset: BuiltinDataset or snapshot of it
+    :param query: JSON serializable parts of the query, but the cursor and the limit
+    :param load: function returning the sorted node ids, nodes and edges
+    :returns: sorted node ids, nodes and edges
+    """
+    key = (dataset.uid, dataset.version, content_digest(*query))
+    ordered = query_order_cache.get(key)
+    if ordered is None:
+        ordered = load()
+        query_order_cache.put(key, ordered, len(ordered[1]) + len(ordered[2]))
+    return ordered
+
+
+def sorted_nodes(nodes):
+    """ Nodes sorted by id, with their sorted ids """
+    nodes = sorted(nodes, key=lambda n: str(n["id"]))
+    return [str(n["id"]) for n in nodes], nodes
+
+
+def network_elements(dataset, node_ids, params=None, time_window=None, after=None, ordered=False):
+    """
+    Nodes then edges of the network of node_ids, as (position, element) pairs
+
+    :param dataset: BuiltinDataset
+    :param after: position of the last element already returned
+    :param ordered: sort nodes by id and edges by index so that positions are stable, implied by after
+    :returns: generator of (position, element)
+    """
+    def load():
+        network = dataset.get_network(node_ids, params, return_edge_index=True, time_window=time_window)
+        return sorted_nodes(network["nodes"]) + (sorted(network["edges"]),)
+
+    start_node, start_edge = 0, 0
+    if ordered or after is not None:
+        node_keys, nodes, edges = ordered_elements(dataset, ("network", node_ids, params, time_window), load)
+    else:
+        network = dataset.get_network(node_ids, params, return_edge_index=True, time_window=time_window)
+        nodes, edges = network["nodes"], network["edges"]
+    if after is not None:
+        kind, key = after
+        if kind == "node":
+            start_node = bisect.bisect_right(node_keys, key)
+        else:
+            start_node = len(nodes)
+            start_edge = bisect.bisect_right(edges, key)
+    for node in islice(nodes, start_node, None):
+        yield ["node", str(node["id"])], {"type": "node", "id": node["id"], "properties": node["properties"]}
+    for e in islice(edges, start_edge, None):
+        yield ["edge", e], dict(dataset.edges[e], type="edge")
+
+
+def node_elements(dataset, node_ids, params=None, after=None, ordered=False):
+    """
+    Nodes of node_ids, all nodes if empty, as (position, element) pairs
+
+    :param dataset: BuiltinDataset
+    :param after: position of the last element already returned
+    :param ordered: sort nodes by id so that positions are stable, implied by after
+    :returns: generator of (position, element)
+    """
+    def load():
+        return sorted_nodes(dataset.search_nodes(node_ids or None, params)["found"]) + ([],)
+
+    start = 0
+    if ordered or after is not None:
+        node_keys, nodes, _ = ordered_elements(dataset, ("nodes", node_ids, params), load)
+    else:
+        nodes = dataset.search_nodes(node_ids or None, params)["found"]
+    if after is not None:
+        start = bisect.bisect_right(node_keys, after[1])
+    for node in islice(nodes, start, None):
+        yield ["node", str(node["id"])], {"type": "node", "id": node["id"], "properties": node["properties"]}
+
+
+def neighbor_elements(dataset, node_ids, params=None, time_window=None, after=None):
+    """
+    Neighbors of each of node_ids, of all nodes if empty, as (position, neighbor) pairs. Neighbors are looked up
+    in batches of nodes, the first ones are returned without waiting for the others. Positions are indexes in the
+    nodes and in their neighbors, they only hold for the version of the dataset they were made from
+
+    :param dataset: BuiltinDataset
+    :param after: position of the last element already returned
+    :raises ValidationError: if after was made from another version of the dataset
+    :returns: generator of (position, neighbor)
+    """
+    version = f"{dataset.uid}-{dataset.version}"
+    if after is not None and after[2] != version:
+        raise ValidationError("The dataset changed since the cursor was returned, the query must be started again",
+                              "cursor")
+    node_ids = list(node_ids) if node_ids else list(dataset.nodes)
+    start, skip = after[:2] if after is not None else (0, -1)
+    for batch_start in range(start, len(node_ids), NEIGHBORS_BATCH_SIZE):
+        batch = node_ids[batch_start:batch_start + NEIGHBORS_BATCH_SIZE]
+        found = {n["id"]: n["neighbors"] for n in dataset.get_neighbors(batch, params, time_window)["found"]}
+        for i, node_id in enumerate(batch, batch_start):
+            for j, neighbor in enumerate(found.get(node_id, [])):
+                if i == start and j <= skip:
+                    continue
+                yield [i, j, version], dict(neighbor, id=node_id)
+
+
+def paginate(elements, limit):
+    """
+    First elements of a query and the cursor of the next ones
+
+    :param elements: generator of (position, element)
+    :param limit: maximum number of elements
+    :returns: list of elements, cursor or None after the last page
+    """
+    page = []
+    last_position = None
+    for position, element in elements:
+        if len(page) == limit:
+            return page, encode_cursor(last_position)
+        page.append(element)
+        last_position = position
+    return page, None
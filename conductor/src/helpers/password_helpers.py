@@ -0,0 +1,167 @@
+"""
+=================================== LICENSE ==================================
+Copyright (c) 2021, Consortium Board ROXANNE
+All rights reserved.
+
+Redistribution and use in source and binary forms, with or without
+modification, are permitted provided that the following conditions are met:
+
+Redistributions of source code must retain the above copyright
+notice, this list of conditions and the following disclaimer.
+
+Redistributions in binary form must reproduce the above copyright
+notice, this list of conditions and the following disclaimer in the
+documentation and/or other materials provided with the distribution.
+
+Neither the name of the ROXANNE nor the
+names of its contributors may be used to endorse or promote products
+derived from this software without specific prior written permission.
+
+THIS SOFTWARE IS PROVIDED BY CONSORTIUM BOARD ROXANNE ``AS IS'' AND ANY
+EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+DISCLAIMED. IN NO EVENT SHALL CONSORTIUM BOARD TENCOMPETENCE BE LIABLE FOR ANY
+DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+(INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+(INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+==============================================================================
+
+ Password hashing off the request threads
+
+Stored hashes are "algorithm$iterations$salt$hash", so that the algorithm and the number of iterations can be
+changed in settings.yaml: the hash of a user is upgraded on the next successful login. Hashes without "$" are the
+former format, the 64 characters salt followed by the hash, with 100000 iterations of PBKDF2-SHA512.
+
+Hashing runs on a small pool of threads, pbkdf2_hmac releases the GIL: at most password_hash_workers hashes are
+computed at once per process and at most password_hash_max_pending wait, other requests keep their CPU share during
+a burst of logins. Logins are also limited per client address and per username. """
+import os
+import hmac
+import hashlib
+import binascii
+import threading
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+from ..config import config
+from ..exceptions import TooManyRequestsError
+
+LEGACY_ALGORITHM = "pbkdf2_sha512"
+LEGACY_ITERATIONS = 100000
+
+
+def hashing_settings():
+    """ Algorithm and number of iterations of the new hashes """
+    return config.get("password_hash_algorithm", "pbkdf2_sha512"), int(config.get("password_hash_iterations", 100000))
+
+
+def _pbkdf2(algorithm, password, salt, iterations):
+    """ Hex digest of password """
+    if not algorithm.startswith("pbkdf2_"):
+        raise ValueError("Unsupported password hash algorithm: " + algorithm)
+    pwdhash = hashlib.pbkdf2_hmac(algorithm[len("pbkdf2_"):], password.encode("utf-8"), salt.encode("ascii"), iterations)
+    return binascii.hexlify(pwdhash).decode("ascii")
+
+
+def parse_password_hash(password_hash):
+    """ Algorithm, number of iterations, salt and hash of a stored password """
+    if "$" not in password_hash:
+        return LEGACY_ALGORITHM, LEGACY_ITERATIONS, password_hash[:64], password_hash[64:]
+    algorithm, iterations, salt, pwdhash = password_hash.split("$")
+    return algorithm, int(iterations), salt, pwdhash
+
+
+def hash_password(password, algorithm=None, iterations=None):
+    """ Hash password with a random salt, with the algorithm and iterations of the settings by default """
+    default_algorithm, default_iterations = hashing_settings()
+    algorithm = algorithm or default_algorithm
+    iterations = iterations or default_iterations
+    salt = hashlib.sha256(os.urandom(60)).hexdigest()
+    return "$".join((algorithm, str(iterations), salt, _pbkdf2(algorithm, password, salt, iterations)))
+
+
+def verify_password(password_hash, password):
+    """ Verify stored password hash against given password """
+    algorithm, iterations, salt, stored_password = parse_password_hash(password_hash)
+    return hmac.compare_digest(_pbkdf2(algorithm, password, salt, iterations), stored_password)
+
+
+def needs_rehash(password_hash):
+    """ Tell if stored password hash was made with other settings than the current ones """
+    return parse_password_hash(password_hash)[:2] != hashing_settings()
+
+
+class HashingExecutor(object):
+    """
+    Bounded pool of hashing threads. A request waiting more than timeout seconds for a slot is refused
+    """
+
+    def __init__(self, workers=2, max_pending=16, timeout=5.0):
+        self.workers = workers
+        self.timeout = timeout
+        self._slots = threading.BoundedSemaphore(workers + max_pending)
+        self._executor = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def _get_executor(self):
+        """ Pool of the current process, threads don't survive the fork of the workers """
+        if self._pid != os.getpid():
+            with self._lock:
+                if self._pid != os.getpid():
+                    self._executor = ThreadPoolExecutor(self.workers, thread_name_prefix="password-hashing")
+                    self._pid = os.getpid()
+        return self._executor
+
+    def run(self, function, *args):
+        """ Run function on the pool and wait for its result """
+        if not self._slots.acquire(timeout=self.timeout):
+            raise TooManyRequestsError("Too many password verifications in progress, retry later", "password")
+        try:
+            return self._get_executor().submit(function, *args).result()
+        finally:
+            self._slots.release()
+
+
+class ConcurrencyLimiter(object):
+    """ Limit of the number of concurrent operations per key """
+
+    def __init__(self, limit):
+        self.limit = limit
+        self._counts = {}
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def hold(self, key, target):
+        """ Hold one of the slots of key while in context """
+        with self._lock:
+            count = self._counts.get(key, 0)
+            if count >= self.limit:
+                raise TooManyRequestsError(f"Too many concurrent requests for this {target}", target)
+            self._counts[key] = count + 1
+        try:
+            yield
+        finally:
+            with self._lock:
+                count = self._counts[key] - 1
+                if count:
+                    self._counts[key] = count
+                else:
+                    del self._counts[key]
+
+
+hashing_executor = HashingExecutor(
+    int(config.get("password_hash_workers", 2)),
+    int(config.get("password_hash_max_pending", 16)),
+    float(config.get("password_hash_timeout", 5)))
+client_limiter = ConcurrencyLimiter(int(config.get("login_concurrency_per_client", 4)))
+username_limiter = ConcurrencyLimiter(int(config.get("login_concurrency_per_user", 2)))
+
+
+@contextmanager
+def login_slot(client, username):
+    """ Limit concurrent logins of a client address and for a username """
+    with client_limiter.hold(client, "client"), username_limiter.hold(username, "username"):
+        yield
@@ -0,0 +1,111 @@
+"""
+=================================== LICENSE ==================================
+Copyright (c) 2021, Consortium Board ROXANNE
+All rights reserved.
+
+Redistribution and use in source and binary forms, with or without
+modification, are permitted provided that the following conditions are met:
+
+Redistributions of source code must retain the above copyright
+notice, this list of conditions and the following disclaimer.
+
+Redistributions in binary form must reproduce the above copyright
+notice, this list of conditions and the following disclaimer in the
+documentation and/or other materials provided with the distribution.
+
+Neither the name of the ROXANNE nor the
+names of its contributors may be used to endorse or promote products
+derived from this software without specific prior written permission.
+
+THIS SOFTWARE IS PROVIDED BY CONSORTIUM BOARD ROXANNE ``AS IS'' AND ANY
+EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+DISCLAIMED. IN NO EVENT SHALL CONSORTIUM BOARD TENCOMPETENCE BE LIABLE FOR ANY
+DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+(INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+(INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+==============================================================================
+
+ Stream query results as NDJSON or as a sequence of msgpack objects """
+import ujson
+import msgpack
+from fastjsonschema.exceptions import JsonSchemaException
+from ..exceptions import ErrorDetail
+from .validate_schema import OutputMatchingError
+
+NDJSON = "application/x-ndjson"
+MSGPACK_STREAM = "application/x-msgpack-stream"
+BATCH_SIZE = 64 * 1024
+
+
+def accepted_stream_type(accept):
+    """
+    Streaming media type asked for in an Accept header
+
+    :param accept: value of the Accept header
+    :returns: NDJSON, MSGPACK_STREAM or None
+    """
+    for media_type in (NDJSON, MSGPACK_STREAM):
+        if media_type in (accept or ""):
+            return media_type
+    return None
+
+
+def stream_elements(elements, media_type, validator=None, validation_interval=0):
+    """
+    Serialize elements one after another, in batches of about BATCH_SIZE bytes. The first element is sent alone,
+    so that clients get it as soon as it is found
+
+    :param elements: generator of (position, element)
+    :param media_type: NDJSON or MSGPACK_STREAM
+    :param validator: compiled schema of an element
+    :param validation_interval: validate one element out of validation_interval, never if 0
+    :raises OutputMatchingError: if a validated element doesn't match the schema, the stream is cut
+    :returns: generator of bytes
+    """
+    def encode_ndjson(element):
+        return ujson.dumps(element).encode("utf-8") + b"\n"
+
+    encode = encode_ndjson if media_type == NDJSON else msgpack.Packer(use_bin_type=True).pack
+    batch, size = [], 0
+    for count, (_, element) in enumerate(elements):
+        if validator and validation_interval and count % validation_interval == 0:
+            try:
+                validator(element)
+            except JsonSchemaException as ex:
+                output_detail = ErrorDetail("UnmatchedOutput", element, "Failed output")
+                raise OutputMatchingError(ex.message, "response body", [output_detail])
+        data = encode(element)
+        batch.append(data)
+        size += len(data)
+        if size >= BATCH_SIZE or count == 0:
+            yield b"".join(batch)
+            batch, size = [], 0
+    if batch:
+        yield b"".join(batch)
+
+
+class ClosingStream(object):
+    """
+    Stream of a response calling on_close once the server closes it, whether it was sent entirely or not
+    """
+
+    def __init__(self, chunks, on_close):
+        self.chunks = chunks
+        self.on_close = on_close
+
+    def __iter__(self):
+        return iter(self.chunks)
+
+    def close(self):
+        """ Called by the WSGI server when the response is done """
+        try:
+            if hasattr(self.chunks, "close"):
+                self.chunks.close()
+        finally:
+            if self.on_close is not None:
+                self.on_close()
+                self.on_close = None
@@ -2,7 +2,6 @@
 from ..exceptions import FormValidationError
 from falcon import HTTP_202
 from werkzeug.utils import secure_filename
-from ..helpers.file_helpers import save_file
 
 
 def get_bool_field(form, field_name, default=None) -> False:
@@ -38,8 +37,6 @@ def save_form_file(form, user_folder, field_name="file"):
     :returns: path to the file
     """
     try:
-        filename = secure_filename(form[field_name].filename)
-        filepath = str(user_folder / filename)
-        return save_file(form[field_name].file, filepath)
+        return form.save_file(field_name, lambda filename: str(user_folder / secure_filename(filename))).path
     except KeyError:
         raise FormValidationError("file field not found", "form")
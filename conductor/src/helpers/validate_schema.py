@@ -31,7 +31,7 @@ SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
 
  Use fastjsonschema validation """
 from functools import wraps
-from falcon import HTTP_400, HTTP_500
+from falcon import HTTP_304, HTTP_400, HTTP_500
 import fastjsonschema
 from fastjsonschema.exceptions import JsonSchemaException
 from ..exceptions import ValidationError, ErrorDetail
@@ -70,7 +70,8 @@ def validate_schema(input_schema=None, output_schema=None):
                 raise InputMachingError(ex.message, "request body", [definition_detail])
             response = route(*args, **kwargs)
             try:
-                if output_validator and not args[2].stream:  # skip files
+                # skip files and responses without body
+                if output_validator and not args[2].stream and args[2].status != HTTP_304:
                     output_validator(args[2].media)
             except JsonSchemaException as ex:
                 definition_detail = ErrorDetail("UnmatchedSchema", output_schema, "Failed output validation schema")
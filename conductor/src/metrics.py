@@ -0,0 +1,349 @@
+"""
+=================================== LICENSE ==================================
+Copyright (c) 2021, Consortium Board ROXANNE
+All rights reserved.
+
+Redistribution and use in source and binary forms, with or without
+modification, are permitted provided that the following conditions are met:
+
+Redistributions of source code must retain the above copyright
+notice, this list of conditions and the following disclaimer.
+
+Redistributions in binary form must reproduce the above copyright
+notice, this list of conditions and the following disclaimer in the
+documentation and/or other materials provided with the distribution.
+
+Neither the name of the ROXANNE nor the
+names of its contributors may be used to endorse or promote products
+derived from this software without specific prior written permission.
+
+THIS SOFTWARE IS PROVIDED BY CONSORTIUM BOARD ROXANNE ``AS IS'' AND ANY
+EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+DISCLAIMED. IN NO EVENT SHALL CONSORTIUM BOARD TENCOMPETENCE BE LIABLE FOR ANY
+DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+(INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+(INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+==============================================================================
+
+ Metrics registry, exposed in the Prometheus text format
+
+Every process (uwsgi workers, celery workers) records its metrics in memory and pushes them to its own file in
+the metrics folder, at most every `metrics_flush_interval` seconds and at the end of each task. The metrics
+endpoint adds the files of all processes up: counters and histograms are summed, the most recent value of a
+gauge is kept. The files of processes that exited are folded into a single file, so their counts are kept. """
+import os
+import re
+import math
+import time
+import atexit
+import fcntl
+import tempfile
+import threading
+from uuid import uuid4
+from pathlib import Path
+import ujson
+from .config import config
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0, 900.0)
+SIZE_BUCKETS = tuple(float(2 ** i) for i in range(8, 32, 2))
+EXITED_PROCESSES_FILE = "exited.json"
+LOCK_FILE = ".lock"
+
+
+class Metric(object):
+    """ Metric of a registry, with values per label set """
+
+    kind = None
+
+    def __init__(self, registry, name, documentation, labels=(), buckets=None):
+        self.registry = registry
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self.buckets = tuple(buckets) if buckets is not None else None
+
+    def key(self, labels):
+        """ Label values, in the order of the label names """
+        if set(labels) != set(self.labels):
+            raise ValueError(f"{self.name} expects the labels {self.labels}")
+        return tuple(str(labels[label]) for label in self.labels)
+
+
+class Counter(Metric):
+    """ Monotonic count """
+
+    kind = "counter"
+
+    def inc(self, value=1, **labels):
+        """ Add value to the count of the labels """
+        self.registry.update(self, self.key(labels), value)
+
+
+class Gauge(Metric):
+    """ Value that can go up and down """
+
+    kind = "gauge"
+
+    def set(self, value, **labels):
+        """ Set the value of the labels """
+        self.registry.update(self, self.key(labels), value)
+
+
+class Histogram(Metric):
+    """ Distribution of observed values, in cumulative buckets """
+
+    kind = "histogram"
+
+    def __init__(self, registry, name, documentation, labels=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(registry, name, documentation, labels, sorted(buckets))
+
+    def observe(self, value, **labels):
+        """ Add an observation for the labels """
+        self.registry.update(self, self.key(labels), value)
+
+
+def _empty_value(metric):
+    if metric.kind == "histogram":
+        return {"buckets": [0] * len(metric.buckets), "sum": 0.0, "count": 0}
+    if metric.kind == "gauge":
+        return [0.0, 0.0]  # value, time of the update
+    return 0.0
+
+
+def _merge_values(kind, value, other):
+    """ Add the value of another process to value, return the result """
+    if kind == "histogram":
+        value["buckets"] = [a + b for a, b in zip(value["buckets"], other["buckets"])]
+        value["sum"] += other["sum"]
+        value["count"] += other["count"]
+        return value
+    if kind == "gauge":
+        return other if other[1] > value[1] else value
+    return value + other
+
+
+class MetricsRegistry(object):
+    """ Metrics of the process, pushed to files of a folder that the endpoint adds up """
+
+    def __init__(self, folder, flush_interval=5.0):
+        self.folder = Path(folder)
+        self.flush_interval = flush_interval
+        self.metrics = {}
+        self._lock = threading.Lock()
+        self._reset()
+
+    def _reset(self):
+        """ Start with empty values, in a new process """
+        self._pid = os.getpid()
+        self._values = {}
+        self._last_flush = time.monotonic()
+        self._file = self.folder / f"{self._pid}-{uuid4().hex[:8]}.json"
+
+    def counter(self, name, documentation, labels=()):
+        return self._register(Counter(self, name, documentation, labels))
+
+    def gauge(self, name, documentation, labels=()):
+        return self._register(Gauge(self, name, documentation, labels))
+
+    def histogram(self, name, documentation, labels=(), buckets=DEFAULT_BUCKETS):
+        return self._register(Histogram(self, name, documentation, labels, buckets))
+
+    def _register(self, metric):
+        if metric.name in self.metrics:
+            raise ValueError(f"Metric {metric.name} is already registered")
+        self.metrics[metric.name] = metric
+        return metric
+
+    def update(self, metric, key, value):
+        """ Record a value of a metric """
+        with self._lock:
+            if os.getpid() != self._pid:
+                # forked worker, the values of the parent are its own
+                self._reset()
+            values = self._values.setdefault(metric.name, {})
+            current = values.get(key)
+            if current is None:
+                current = values[key] = _empty_value(metric)
+            if metric.kind == "histogram":
+                for i, bound in enumerate(metric.buckets):
+                    if value <= bound:
+                        current["buckets"][i] += 1
+                        break
+                current["sum"] += value
+                current["count"] += 1
+            elif metric.kind == "gauge":
+                values[key] = [float(value), time.time()]
+            else:
+                values[key] = current + value
+            flush = time.monotonic() - self._last_flush >= self.flush_interval
+        if flush:
+            self.flush()
+
+    def flush(self):
+        """ Push the values of the process to its file """
+        with self._lock:
+            if os.getpid() != self._pid:
+                self._reset()
+            state = {"pid": self._pid,
+                     "values": {name: [[list(key), value] for key, value in values.items()]
+                                for name, values in self._values.items()}}
+            self._last_flush = time.monotonic()
+            path = self._file
+        try:
+            self.folder.mkdir(parents=True, exist_ok=True)
+            # threads of the process flush at the same time, each one through its own temporary file
+            with tempfile.NamedTemporaryFile("w", dir=self.folder, prefix=".", suffix=".tmp",
+                                             delete=False) as state_file:
+                ujson.dump(state, state_file)
+            os.replace(state_file.name, path)
+        except OSError:
+            # metrics never fail the requests and tasks
+            pass
+
+    def collect(self):
+        """
+        Values of all processes
+        :returns: dictionary, metric name -> {label values: value}
+        """
+        self.flush()
+        collected = {}
+        try:
+            with open(self.folder / LOCK_FILE, "a") as lock:
+                fcntl.flock(lock, fcntl.LOCK_EX)
+                try:
+                    exited = self._read(self.folder / EXITED_PROCESSES_FILE) or {"pid": None, "values": {}}
+                    self._merge(collected, exited["values"], skip_gauges=True)
+                    folded = False
+                    for path in sorted(self.folder.glob("*-*.json")):
+                        state = self._read(path)
+                        if state is None:
+                            continue
+                        running = _is_running(state["pid"])
+                        # gauges of exited processes are outdated
+                        self._merge(collected, state["values"], skip_gauges=not running)
+                        if not running:
+                            self._merge(exited["values"], state["values"], skip_gauges=True)
+                            path.unlink()
+                            folded = True
+                    if folded:
+                        temp_path = self.folder / (EXITED_PROCESSES_FILE + ".tmp")
+                        with open(temp_path, "w") as state_file:
+                            ujson.dump(exited, state_file)
+                        os.replace(temp_path, self.folder / EXITED_PROCESSES_FILE)
+                finally:
+                    fcntl.flock(lock, fcntl.LOCK_UN)
+        except OSError:
+            pass
+        return {name: {tuple(key): value for key, value in values} for name, values in collected.items()}
+
+    def _merge(self, collected, values, skip_gauges=False):
+        """ Add the values of a process to collected """
+        for name, samples in values.items():
+            metric = self.metrics.get(name)
+            if metric is None or (skip_gauges and metric.kind == "gauge"):
+                continue
+            merged = {tuple(key): value for key, value in collected.get(name, [])}
+            for key, value in samples:
+                key = tuple(key)
+                merged[key] = _merge_values(metric.kind, merged[key], value) if key in merged else value
+            collected[name] = [[list(key), value] for key, value in merged.items()]
+
+    @staticmethod
+    def _read(path):
+        try:
+            with open(path, "r") as state_file:
+                return ujson.load(state_file)
+        except (OSError, ValueError):
+            return None
+
+    def render(self):
+        """ Values of all processes in the Prometheus text format """
+        collected = self.collect()
+        lines = []
+        for name, metric in self.metrics.items():
+            lines.append(f"# HELP {name} {_escape_help(metric.documentation)}")
+            lines.append(f"# TYPE {name} {metric.kind}")
+            for key, value in sorted(collected.get(name, {}).items()):
+                labels = list(zip(metric.labels, key))
+                if metric.kind == "histogram":
+                    cumulative = 0
+                    for bound, count in zip(metric.buckets, value["buckets"]):
+                        cumulative += count
+                        lines.append(f"{name}_bucket{_labels(labels + [('le', _number(bound))])} {cumulative}")
+                    lines.append(f"{name}_bucket{_labels(labels + [('le', '+Inf')])} {value['count']}")
+                    lines.append(f"{name}_sum{_labels(labels)} {_number(value['sum'])}")
+                    lines.append(f"{name}_count{_labels(labels)} {value['count']}")
+                elif metric.kind == "gauge":
+                    lines.append(f"{name}{_labels(labels)} {_number(value[0])}")
+                else:
+                    lines.append(f"{name}{_labels(labels)} {_number(value)}")
+        return "\n".join(lines) + "\n"
+
+
+def _is_running(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except (PermissionError, TypeError):
+        pass
+    return True
+
+
+def _number(value):
+    if isinstance(value, float):
+        if math.isinf(value):
+            return "+Inf" if value > 0 else "-Inf"
+        if value.is_integer():
+            return str(int(value)) if abs(value) < 1e15 else repr(value)
+        return repr(value)
+    return str(value)
+
+
+_escaped = re.compile(r'[\\"\n]')
+_escapes = {"\\": "\\\\", "\"": "\\\"", "\n": "\\n"}
+
+
+def _labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{name}="{_escaped.sub(lambda m: _escapes[m.group()], value)}"'
+                          for name, value in labels) + "}"
+
+
+def _escape_help(text):
+    return text.replace("\\", r"\\").replace("\n", r"\n")
+
+
+registry = MetricsRegistry(config["metrics_folder"], config.get("metrics_flush_interval", 5.0))
+atexit.register(registry.flush)
+
+request_duration = registry.histogram(
+    "conductor_http_request_duration_seconds", "Time to handle HTTP requests", ("route", "method", "status"))
+request_size = registry.histogram(
+    "conductor_http_request_size_bytes", "Size of the bodies of HTTP requests", ("route", "method"), SIZE_BUCKETS)
+task_duration = registry.histogram(
+    "conductor_task_duration_seconds", "Run time of celery tasks", ("task", "method", "status"))
+task_result_size = registry.histogram(
+    "conductor_task_result_size_bytes", "Size of the results of celery tasks, as stored by the result backend",
+    ("task", "method"), SIZE_BUCKETS)
+cache_requests = registry.counter(
+    "conductor_cache_requests_total", "Lookups of caches", ("cache", "result"))
+queue_length = registry.gauge(
+    "conductor_queue_length", "Number of tasks waiting in a celery queue", ("queue",))
+dataset_nodes = registry.gauge(
+    "conductor_dataset_nodes", "Number of nodes of a loaded dataset", ("dataset",))
+dataset_edges = registry.gauge(
+    "conductor_dataset_edges", "Number of edges of a loaded dataset", ("dataset",))
+dataset_memory = registry.gauge(
+    "conductor_dataset_memory_bytes", "Estimated memory used by a loaded dataset", ("dataset",))
+
+
+def record_cache_lookup(cache, hit, count=1):
+    """ Count hits or misses of a cache """
+    if count:
+        cache_requests.inc(count, cache=cache, result="hit" if hit else "miss")
@@ -31,7 +31,7 @@ SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
 
  Authorize user if JWT is present """
 from falcon import Request, Response
-from ..auth_models import User
+from ..auth_models import User, principal_cache
 from ..auth_graph import auth_dataset
 from ..helpers.auth_helpers import read_token
 
@@ -50,8 +50,15 @@ class AuthorizationComponent(object):
         """
         if request.auth:
             token = request.auth.replace(self.auth_header_prefix, "")
-            claims = read_token(token, ["iat", "exp", "username"])
-            user = User(auth_dataset).identify(claims["username"])
+            cache = principal_cache(auth_dataset)
+            username = cache.get_token_username(token)
+            if username is None:
+                claims = read_token(token, ["iat", "exp", "username"])
+                username = claims["username"]
+                user = User(auth_dataset).identify(username)
+                cache.add_token(token, username, claims["exp"])
+            else:
+                user = User(auth_dataset).identify(username)
             request.context.user = user
         else:
             request.context.user = None
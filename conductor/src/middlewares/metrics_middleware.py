@@ -0,0 +1,57 @@
+"""
+=================================== LICENSE ==================================
+Copyright (c) 2021, Consortium Board ROXANNE
+All rights reserved.
+
+Redistribution and use in source and binary forms, with or without
+modification, are permitted provided that the following conditions are met:
+
+Redistributions of source code must retain the above copyright
+notice, this list of conditions and the following disclaimer.
+
+Redistributions in binary form must reproduce the above copyright
+notice, this list of conditions and the following disclaimer in the
+documentation and/or other materials provided with the distribution.
+
+Neither the name of the ROXANNE nor the
+names of its contributors may be used to endorse or promote products
+derived from this software without specific prior written permission.
+
+THIS SOFTWARE IS PROVIDED BY CONSORTIUM BOARD ROXANNE ``AS IS'' AND ANY
+EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+DISCLAIMED. IN NO EVENT SHALL CONSORTIUM BOARD TENCOMPETENCE BE LIABLE FOR ANY
+DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+(INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+(INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+==============================================================================
+
+ Middleware for recording request metrics """
+import time
+from falcon import Request, Response
+from ..metrics import request_duration, request_size
+
+
+class MetricsComponent(object):
+    """ Record latency and size of all requests, per route """
+
+    def process_request(self, req: Request, resp: Response):
+        """ Start timing the request """
+        req.context.received_at = time.perf_counter()
+
+    def process_response(self, req: Request, resp: Response, resource, req_succeeded):
+        """ Record latency and body size of the request """
+        received_at = getattr(req.context, "received_at", None)
+        if received_at is None:
+            return
+        route = req.uri_template or "unmatched"
+        request_duration.observe(
+            time.perf_counter() - received_at,
+            route=route,
+            method=req.method,
+            status=resp.status.split(" ", 1)[0])
+        if req.content_length:
+            request_size.observe(req.content_length, route=route, method=req.method)
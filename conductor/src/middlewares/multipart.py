@@ -30,23 +30,33 @@ SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
 ==============================================================================
 
  Process multipart/form-data requests """
-import cgi
 from falcon import Request, Response
+from ..config import config
+from ..exceptions import FormValidationError
+from ..helpers.multipart_helpers import MultipartReader, StreamingForm, parse_header
 
 
 class FormComponent(object):
-    """ If multipart/form-data header found, parse request body """
+    """ If multipart/form-data header found, parse request body as the resource reads the form """
 
     def process_request(self, request: Request, response: Response):
         """
-        Process multipart request and set FieldStorage in request.context.
+        Set StreamingForm reading the request stream in request.context.
 
         :param request: falcon.Request
         :param response: falcon.Response
         """
-        if "multipart/form-data" not in request.content_type:
+        if not request.content_type or "multipart/form-data" not in request.content_type:
             return
-        request.env.setdefault("QUERY_STRING", "")
+        boundary = parse_header(request.content_type).get_param("boundary")
+        if not boundary:
+            raise FormValidationError("Boundary of form data not found", "Content-Type header")
         stream = (request.stream.stream if hasattr(request.stream, "stream") else request.stream)
-        form = cgi.FieldStorage(fp=stream, environ=request.env, keep_blank_values=1)
-        request.context.form = form
+        reader = MultipartReader(stream, boundary.encode("latin-1"), request.content_length)
+        request.context.form = StreamingForm(reader, config["temp_file_folder"])
+
+    def process_response(self, request: Request, response: Response, resource, req_succeeded):
+        """ Remove the files spooled while parsing the form """
+        form = getattr(request.context, "form", None)
+        if form is not None:
+            form.close()
@@ -30,13 +30,25 @@ SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
 ==============================================================================
 
  Dataset resource handler """
+import fastjsonschema
 from falcon import Request, Response, before, HTTP_200
+from ..config import config
 from ..hooks.secure_resource import Secure
 from ..helpers.validate_schema import validate_schema
-from ..schemas.datasets_schemas import post_input, data_dto, delete_input, error_output
-from ..helpers.network_helpers import split_to_network, network_to_split
+from ..schemas.datasets_schemas import post_input, data_dto, delete_input, error_output, query_output, \
+    neighbor_schema, dataset_info
+from ..schemas.network_schema import network_schema
+from ..helpers.network_helpers import network_to_split, network_elements, node_elements, neighbor_elements, \
+    decode_cursor, paginate
+from ..helpers.stream_helpers import accepted_stream_type, stream_elements, ClosingStream
+from ..helpers.cache_helpers import content_digest, dataset_etag, not_modified, response_cache
 from ..helpers.log_helpers import log_event
 
+element_validators = {
+    "network": fastjsonschema.compile(network_schema),
+    "neighbors": fastjsonschema.compile(neighbor_schema)
+}
+
 
 @before(Secure("User"))
 class DatasetsResource(object):
@@ -45,10 +57,69 @@ class DatasetsResource(object):
     description: Allows managing the contents of the datasets
     """
 
-    @validate_schema(post_input, data_dto)
+    def query_elements(self, dataset, query, ordered):
+        """ Elements of the query as (position, element) pairs, with the key of the response holding them """
+        name = query.get("query", "network")
+        after = decode_cursor(query["cursor"], name) if query.get("cursor") else None
+        if name == "nodes":
+            return "network", node_elements(dataset, query["nodes"], query.get("params"), after, ordered)
+        if name == "neighbors":
+            return "neighbors", neighbor_elements(
+                dataset, query["nodes"], query.get("params"), query.get("time_window"), after)
+        return "network", network_elements(
+            dataset, query["nodes"], query.get("params"), query.get("time_window"), after, ordered)
+
+    @validate_schema(output_schema=dataset_info)
+    def on_get_v1_0(self, req: Request, resp: Response, dataset_name):
+        """
+        summary: Get dataset information
+        description: The version of the dataset changes whenever the dataset is changed
+        parameters:
+            -   in: path
+                name: dataset_name
+                required: true
+                schema:
+                    type: string
+                description: Dataset ID
+        responses:
+            200:
+                description: Name and version of the dataset
+                content:
+                    application/json:
+                        schema: DatasetInfo
+                        examples: DatasetGetResponseExample
+                    application/msgpack:
+                        schema: DatasetInfo
+                        examples: DatasetGetResponseExample
+            304:
+                description: The dataset didn't change since the response with the ETag in If-None-Match
+        security:
+            - jwt:
+                - User
+        errors:
+            - name: DatasetDoesNotExistError
+              message: "Couldn't find dataset by name ..."
+              target: dataset name
+        examples:
+            - ex_name: DatasetGetResponseExample
+              datasetName: TestDataset
+              version: 6f1c9d3e5b2a4c7d8e9f0a1b2c3d4e5f-42
+        """
+        dataset = req.context.user.get_dataset(dataset_name)
+        if not_modified(req, resp, dataset_etag(dataset, dataset_name, req.accept)):
+            log_event(req.context.request_id, "Dataset information not modified", dataset=dataset_name)
+            return
+        resp.media = {
+            "datasetName": dataset_name,
+            "version": f"{dataset.uid}-{dataset.version}"
+        }
+        resp.status = HTTP_200
+        log_event(req.context.request_id, "Dataset information returned", dataset=dataset_name)
+
+    @validate_schema(post_input, query_output)
     def on_post_v1_0(self, req: Request, resp: Response, dataset_name):
         """
-        summary: Get network by node ids
+        summary: Get network, nodes or neighbors by node ids
         externalDocs:
             description: Example of getting network by node IDs
             url: /docs/api_examples.html#get_network
@@ -60,7 +131,10 @@ class DatasetsResource(object):
                     type: string
                 description: Dataset ID
         requestBody:
-            description: Node IDs
+            description: |
+                Node IDs. query is network (default, the network of the nodes), nodes (the nodes, all nodes if
+                empty) or neighbors (the neighbors of each node). With limit, at most limit elements are returned
+                with the cursor of the next page, to be passed as cursor
             content:
                 application/json:
                     schema: DatasetNodeIds
@@ -70,14 +144,19 @@ class DatasetsResource(object):
                     examples: DatasetPostRequestExample
         responses:
             200:
-                description: Network constructed by found nodes
+                description: |
+                    Elements of the query, in network or neighbors. With an Accept header of application/x-ndjson
+                    or application/x-msgpack-stream, all the elements are streamed one after another instead.
+                    The ETag header changes whenever the dataset is changed
                 content:
                     application/json:
-                        schema: DatasetNetwork
+                        schema: DatasetQueryResult
                         examples: DatasetPostResponseExample
                     application/msgpack:
-                        schema: DatasetNetwork
+                        schema: DatasetQueryResult
                         examples: DatasetPostResponseExample
+            304:
+                description: The dataset didn't change since the response with the ETag in If-None-Match
         security:
             - jwt:
                 - User
@@ -85,10 +164,14 @@ class DatasetsResource(object):
             - name: DatasetDoesNotExistError
               message: "Couldn't find dataset by name ..."
               target: dataset name
+            - name: ValidationError
+              message: Invalid cursor
+              target: cursor
         examples:
             - ex_name: DatasetPostRequestExample
               nodes:
                 - Yayha_al_Azari
+              limit: 1000
             - ex_name: DatasetPostResponseExample
               network:
                 - id: Omar_al_Shishani
@@ -108,14 +191,48 @@ class DatasetsResource(object):
                     type: friendship
                     observed: true
                     weight: 1
+              nextCursor: WyJlZGdlIiw0Ml0=
         """
         dataset = req.context.user.get_dataset(dataset_name)
-        network = dataset.get_network(req.media["nodes"], req.media.get("params", None))
-        resp.media = {
-            "network": split_to_network(network["nodes"], network["edges"])
-        }
-        resp.status = HTTP_200
-        log_event(req.context.request_id, "Network returned", dataset=dataset_name)
+        limit = req.media.get("limit")
+        stream_type = accepted_stream_type(req.accept)
+        # the query reads a version of the dataset that isn't changed by the writers meanwhile
+        snapshot = dataset.snapshot()
+        try:
+            if not_modified(req, resp, dataset_etag(snapshot, req.media, req.accept)):
+                log_event(req.context.request_id, "Query not modified", dataset=dataset_name)
+                return
+            resp.status = HTTP_200
+            if stream_type:
+                key, elements = self.query_elements(snapshot, req.media, False)
+                resp.content_type = stream_type
+                resp.stream = ClosingStream(
+                    stream_elements(
+                        elements,
+                        stream_type,
+                        element_validators[key],
+                        config.get("stream_validation_interval", 1000)),
+                    snapshot.release)
+                snapshot = None  # released once the stream is closed
+                log_event(req.context.request_id, "Query streamed", dataset=dataset_name)
+                return
+            cache_key = (snapshot.uid, snapshot.version, content_digest(req.media))
+            resp.media = response_cache.get(cache_key)
+            if resp.media is not None:
+                log_event(req.context.request_id, "Query returned from cache", dataset=dataset_name)
+                return
+            key, elements = self.query_elements(snapshot, req.media, limit is not None)
+            if limit is not None:
+                page, next_cursor = paginate(elements, limit)
+                resp.media = {key: page, "nextCursor": next_cursor}
+                log_event(req.context.request_id, "Query page returned", dataset=dataset_name, size=len(page))
+            else:
+                resp.media = {key: [element for _, element in elements]}
+                log_event(req.context.request_id, "Network returned", dataset=dataset_name)
+            response_cache.put(cache_key, resp.media, len(resp.media[key]))
+        finally:
+            if snapshot is not None:
+                snapshot.release()
 
     @validate_schema(data_dto, error_output)
     def on_patch_v1_0(self, req: Request, resp: Response, dataset_name):
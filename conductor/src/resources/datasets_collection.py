@@ -34,11 +34,12 @@ from os import remove
 from falcon import Request, Response, before, HTTP_200, HTTP_201
 from werkzeug.utils import secure_filename
 from ..hooks.secure_resource import Secure
-from ..helpers.file_helpers import save_file
+from storage.builtin_datasets import BuiltinDatasetBuilder
 from ..helpers.validate_schema import validate_schema
 from ..schemas.datasets_collection_schemas import list_datasets, create_dataset, delete_dataset
 from ..exceptions import FormValidationError
 from ..helpers.log_helpers import log_event
+from ..helpers.cache_helpers import content_digest, not_modified
 
 
 @before(Secure("User"))
@@ -65,6 +66,8 @@ class DatasetsCollectionResource(object):
                     application/msgpack:
                         schema: ListDatasets
                         examples: DatasetCollectionGetExample
+            304:
+                description: The datasets didn't change since the response with the ETag in If-None-Match
         security:
             - jwt:
                 - User
@@ -73,8 +76,12 @@ class DatasetsCollectionResource(object):
               datasets:
                 - TestDataset
         """
+        datasets = req.context.user.list_datasets()
+        if not_modified(req, resp, content_digest(datasets, req.accept)):
+            log_event(req.context.request_id, "User's datasets not modified")
+            return
         resp.media = {
-            "datasets": req.context.user.list_datasets()
+            "datasets": datasets
         }
         resp.status = HTTP_200
         log_event(req.context.request_id, "User's datasets listed")
@@ -82,16 +89,24 @@ class DatasetsCollectionResource(object):
     def handle_form_post(self, form, user):
         """ Handle dataset creation from form """
         try:
-            filename = secure_filename(form["file"].filename)
-            filepath = user.get_folder_path() / filename
-            save_file(form["file"].file, filepath)
+            builder = BuiltinDatasetBuilder()
+            file = form.save_file(
+                "file",
+                lambda filename: user.get_folder_path() / secure_filename(filename),
+                [builder.feed])
+            try:
+                dataset = builder.finish(file.path)
+            except (ValueError, KeyError, TypeError):
+                raise FormValidationError("file must contain a network, one JSON object per line", "file")
+            finally:
+                remove(file.path)
             user.create_dataset(
                 form["datasetName"].value,
                 form.getvalue("datasetDescription", ""),
-                filename,
-                True
+                secure_filename(file.filename),
+                True,
+                dataset
             )
-            remove(filepath)
         except KeyError as err:
             raise FormValidationError(f"Form key not found: {err.args[0]}", "form")
 
@@ -149,6 +164,9 @@ class DatasetsCollectionResource(object):
             - name: FormValidationError
               message: "Form key not found: ..."
               target: form
+            - name: FormValidationError
+              message: file must contain a network, one JSON object per line
+              target: file
             - name: DatasetCreationError
               message: dataset_id is already existed
               target: dataset
@@ -182,7 +200,8 @@ class DatasetsCollectionResource(object):
             return
         if req.media.get("dumpFile"):
             dataset = req.context.user.get_dataset(req.media["datasetName"])
-            dataset.dump_network(req.media["dumpFile"], str(req.context.user.get_folder_path()))
+            with dataset.snapshot() as snapshot:
+                snapshot.dump_network(req.media["dumpFile"], str(req.context.user.get_folder_path()))
             resp.status = HTTP_201
             resp.set_header("Location", "/v1.0/files/" + req.media["dumpFile"])
             log_event(
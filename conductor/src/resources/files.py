@@ -31,12 +31,13 @@ SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
 
  Route to manage files """
 import mimetypes
+import uuid
 from os.path import getsize, isfile
-from os import remove
+from os import remove, replace
 from falcon import Request, Response, before, HTTP_200, HTTP_201
 from werkzeug.utils import secure_filename
 from ..hooks.secure_resource import Secure
-from ..helpers.file_helpers import save_file, stream_file
+from ..helpers.file_helpers import stream_file
 from ..exceptions import FileNotFoundError, FormValidationError, ValidationError
 from ..helpers.log_helpers import log_event
 
@@ -146,19 +147,20 @@ class FilesResource(object):
         if not hasattr(req.context, "form"):
             raise ValidationError("File form not found", "request body")
         file = None
+        secure_name = secure_filename(filename)
+        filepath = req.context.user.get_folder_path() / secure_name
         try:
-            file = req.context.form["file"]
+            file = req.context.form.save_file("file", filepath)
         except KeyError:
             raise FormValidationError("Field 'file' not found", "form")
-        secure_name = secure_filename(filename)
-        filepath = req.context.user.get_folder_path() / secure_name
-        save_file(file.file, filepath)
         resp.set_header("Location", "/v1.0/files/" + secure_name)
         resp.status = HTTP_201
         log_event(
             req.context.request_id,
             "File uploaded",
-            file=secure_name)
+            file=secure_name,
+            size=file.size,
+            sha256=file.sha256)
 
     def on_put_v1_0(self, req: Request, resp: Response, filename):
         """
@@ -210,26 +212,32 @@ class FilesResource(object):
         if not hasattr(req.context, "form"):
             raise ValidationError("File form not found", "request body")
         file = None
+        secure_name = secure_filename(filename)
+        filepath = req.context.user.get_folder_path() / secure_name
+        # the upload is written next to the file and replaces it once complete, the file is kept if it fails
+        temp_path = filepath.with_name(f".{secure_name}.{uuid.uuid4().hex}.part")
         try:
-            file = req.context.form["file"]
+            file = req.context.form.save_file("file", temp_path)
         except KeyError:
             raise FormValidationError("Field 'file' not found", "form")
-        secure_name = secure_filename(filename)
-        filepath = req.context.user.get_folder_path() / secure_name
+        finally:
+            if file is None and isfile(temp_path):
+                remove(temp_path)
         log_message = None
         if isfile(filepath):
-            remove(filepath)
             resp.status = HTTP_200
             log_message = "File replaced"
         else:
             resp.status = HTTP_201
             resp.set_header("Location", "/v1.0/files/" + secure_name)
             log_message = "File uploaded"
-        save_file(file.file, filepath)
+        replace(temp_path, filepath)
         log_event(
             req.context.request_id,
             log_message,
-            file=secure_name)
+            file=secure_name,
+            size=file.size,
+            sha256=file.sha256)
 
     def on_delete_v1_0(self, req: Request, resp: Response, filename):
         """
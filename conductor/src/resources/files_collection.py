@@ -34,7 +34,6 @@ from os import listdir
 from falcon import Request, Response, before, HTTP_200, HTTP_201
 from werkzeug.utils import secure_filename
 from ..hooks.secure_resource import Secure
-from ..helpers.file_helpers import save_file
 from ..helpers.validate_schema import validate_schema
 from ..exceptions import FormValidationError, ValidationError
 from ..schemas.files_collection_schemas import files_list
@@ -128,15 +127,17 @@ class FilesCollectionResource(object):
             raise ValidationError("File form not found", "request body")
         file = None
         try:
-            file = req.context.form["file"]
+            file = req.context.form.save_file(
+                "file",
+                lambda filename: req.context.user.get_folder_path() / secure_filename(filename))
         except KeyError:
             raise FormValidationError("Field 'file' not found", "form")
         filename = secure_filename(file.filename)
-        filepath = req.context.user.get_folder_path() / filename
-        save_file(file.file, filepath)
         resp.set_header("Location", "/v1.0/files/" + filename)
         resp.status = HTTP_201
         log_event(
             req.context.request_id,
             "File uploaded",
-            file=filename)
+            file=filename,
+            size=file.size,
+            sha256=file.sha256)
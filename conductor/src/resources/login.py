@@ -33,6 +33,7 @@ SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
 from falcon import Request, Response, HTTP_200
 from ..helpers.validate_schema import validate_schema
 from ..helpers.auth_helpers import create_token
+from ..helpers.password_helpers import login_slot
 from ..schemas.login_schemas import login_request, login_response
 from ..auth_models import User
 from ..auth_graph import auth_dataset
@@ -76,12 +77,16 @@ class LoginResource(object):
             - name: WrongPasswordError
               message: Wrong password!
               target: User
+            - name: TooManyRequestsError
+              message: Too many concurrent requests for this client
+              target: client
         examples:
             - ex_name: LoginRequestExample
               username: admin
               password: Pass1234
         """
-        user = User(auth_dataset).authenticate(req.media["username"], req.media["password"])
+        with login_slot(req.remote_addr, req.media["username"]):
+            user = User(auth_dataset).authenticate(req.media["username"], req.media["password"])
         access_token = create_token({"username": user.get_username()})
         resp.media = {"accessToken": access_token}
         resp.status = HTTP_200
@@ -0,0 +1,87 @@
+"""
+=================================== LICENSE ==================================
+Copyright (c) 2021, Consortium Board ROXANNE
+All rights reserved.
+
+Redistribution and use in source and binary forms, with or without
+modification, are permitted provided that the following conditions are met:
+
+Redistributions of source code must retain the above copyright
+notice, this list of conditions and the following disclaimer.
+
+Redistributions in binary form must reproduce the above copyright
+notice, this list of conditions and the following disclaimer in the
+documentation and/or other materials provided with the distribution.
+
+Neither the name of the ROXANNE nor the
+names of its contributors may be used to endorse or promote products
+derived from this software without specific prior written permission.
+
+THIS SOFTWARE IS PROVIDED BY CONSORTIUM BOARD ROXANNE ``AS IS'' AND ANY
+EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+DISCLAIMED. IN NO EVENT SHALL CONSORTIUM BOARD TENCOMPETENCE BE LIABLE FOR ANY
+DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+(INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+(INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+==============================================================================
+
+ Resource exposing the metrics of the conductor and of the celery workers """
+from falcon import Request, Response, before, HTTP_200
+from ..hooks.secure_resource import Secure
+from ..celery import celery
+from ..graph import data_manager
+from ..metrics import registry, queue_length, dataset_nodes, dataset_edges, dataset_memory
+
+
+def celery_queue_length(queue):
+    """ Number of tasks waiting in a queue of the broker, None if the broker cannot be reached """
+    try:
+        with celery.connection_for_read() as connection:
+            connection.ensure_connection(max_retries=1)
+            return connection.default_channel.queue_declare(queue=queue, passive=True).message_count
+    except Exception:
+        return None
+
+
+@before(Secure("Admin"))
+class MetricsResource(object):
+    """
+    summary: Metrics Resource
+    description: Metrics of the API and of the task workers, in the Prometheus text format
+    """
+
+    def update_gauges(self):
+        """ Set the gauges read at scrape time """
+        for dataset_id, statistics in data_manager.get_dataset_statistics().items():
+            dataset_nodes.set(statistics["nodes"], dataset=dataset_id)
+            dataset_edges.set(statistics["edges"], dataset=dataset_id)
+            dataset_memory.set(statistics["memory"], dataset=dataset_id)
+        queue = celery.conf.task_default_queue
+        length = celery_queue_length(queue)
+        if length is not None:
+            queue_length.set(length, queue=queue)
+
+    def on_get_v1_0(self, req: Request, resp: Response):
+        """
+        summary: Get metrics
+        description: Request latencies per route, task run times and result sizes per method, cache lookups,
+            queue length and size of the loaded datasets
+        responses:
+            200:
+                description: Metrics in the Prometheus text exposition format
+                content:
+                    text/plain:
+                        schema:
+                            type: string
+        security:
+            - jwt:
+                - Admin
+        """
+        self.update_gauges()
+        resp.body = registry.render()
+        resp.content_type = "text/plain; version=0.0.4; charset=utf-8"
+        resp.status = HTTP_200
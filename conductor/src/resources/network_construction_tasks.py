@@ -1,7 +1,10 @@
 """ Network construction tasks """
 from datetime import datetime, timezone
+from pathlib import Path
 from falcon import Request, Response, before, HTTP_202
-from ..tasks.celery_tasks import perform_parse_wp5_output, perform_parse_wp5_output_for_aegis
+from ..tasks.celery_tasks import perform_parse_wp5_output, perform_parse_wp5_output_for_aegis, \
+    perform_incremental_parse_wp5_output
+from ..config import config
 from ..hooks.secure_resource import Secure
 from ..helpers.validate_schema import validate_schema
 from ..schemas.tasks_schemas import network_construction_input
@@ -30,6 +33,56 @@ class NetworkConstructionTasksResource(object):
             raise FormValidationError("threshold must be a float value", "threshold field")
         return filepath, threshold, calibration, directed
 
+    def is_incremental(self, req: Request):
+        """ Tell if the request adds conversations to the network constructed from the previous requests """
+        if hasattr(req.context, "form"):
+            return "incremental" in req.context.form and get_bool_field(req.context.form, "incremental")
+        return bool(req.media.get("incremental", False))
+
+    def handle_incremental_parse(self, req: Request, resp: Response, aegis):
+        """ Create incremental wp5 output parsing task, the construction state is kept per user """
+        state_name = req.context.user.get_folder_path().name + ("_aegis" if aegis else "") + ".pkl"
+        state_path = str(Path(config["wp5_states_folder"]) / state_name)
+        task_result = None
+        if hasattr(req.context, "form"):
+            filepath, threshold, calibration, directed = self.parse_form_data(req.context)
+            recluster = "recluster" in req.context.form and get_bool_field(req.context.form, "recluster")
+            task_result = perform_incremental_parse_wp5_output.delay(
+                threshold,
+                calibration,
+                directed,
+                aegis,
+                recluster,
+                state_path,
+                timestamp_format(datetime.now(timezone.utc)),
+                filepath=filepath
+            )
+            generate_response(resp, task_result.id)
+            log_event(
+                req.context.request_id,
+                "Incremental network construction task dispatched from uploaded file",
+                id=task_result.id,
+                file=filepath)
+            return
+        if req.media.get("network"):
+            task_result = perform_incremental_parse_wp5_output.delay(
+                req.media.get("threshold", 50),
+                req.media.get("calibration", False),
+                req.media.get("directed", False),
+                aegis,
+                req.media.get("recluster", False),
+                state_path,
+                timestamp_format(datetime.now(timezone.utc)),
+                network=req.media["network"]
+            )
+            generate_response(resp, task_result.id)
+            log_event(
+                req.context.request_id,
+                "Incremental network construction task dispatched from provided network",
+                id=task_result.id)
+            return
+        raise ValidationError("Please provide network to construct with 'network' field", "request body")
+
     def handle_parse_wp5_output(self, req: Request, resp: Response):
         """ Create wp5 output parsing task """
         task_result = None
@@ -138,6 +191,10 @@ class NetworkConstructionTasksResource(object):
                                 type: boolean
                             directed:
                                 type: boolean
+                            incremental:
+                                type: boolean
+                            recluster:
+                                type: boolean
                     encoding:
                         file:
                             contentType: application/json
@@ -173,6 +230,9 @@ class NetworkConstructionTasksResource(object):
             - name: FormValidationError
               message: directed must be a boolean value
               target: directed field
+            - name: FormValidationError
+              message: incremental must be a boolean value
+              target: incremental field
 
         examples:
             - ex_name: TaskPostRequestNetworkConstructionJSONExample
@@ -206,7 +266,9 @@ class NetworkConstructionTasksResource(object):
               calibration: true
               directed: true
         """
-        if task_name == "parse_wp5_output":
+        if task_name in ("parse_wp5_output", "parse_wp5_output_for_aegis") and self.is_incremental(req):
+            self.handle_incremental_parse(req, resp, task_name == "parse_wp5_output_for_aegis")
+        elif task_name == "parse_wp5_output":
             self.handle_parse_wp5_output(req, resp)
         elif task_name == "parse_wp5_output_for_aegis":
             self.handle_parse_wp5_output_for_aegis(req, resp)
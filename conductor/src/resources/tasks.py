@@ -191,6 +191,7 @@ class TaskResource(object):
             self.handle_form(req.context.form, task_name, req, resp)
             return
         dataset = None
+        dataset_reference = {}
         log_message = None
         if req.media.get("network"):
             dataset = BuiltinDataset(None, from_file=False)
@@ -200,16 +201,27 @@ class TaskResource(object):
             log_message = "Analysis task dispatched from provided network"
         elif req.media.get("dataset"):
             dataset = req.context.user.get_dataset(req.media["dataset"])
+            # lets the worker reuse embeddings stored for this version of the dataset,
+            # which describe the whole dataset and not a time window of it
+            if not req.media.get("time_window"):
+                dataset_reference = req.context.user.get_dataset_reference(req.media["dataset"])
             log_message = "Analysis task dispatched from user dataset"
         else:
             raise ValidationError("No task creation method provided", "request body")
         if not req.media.get("options"):
             raise ValidationError("'options' field required for analysis", "request body")
+        # the elements read from a snapshot are never changed, the network stays consistent while it is sent
+        with dataset.snapshot() as snapshot:
+            network = snapshot.get_network(time_window=req.media.get("time_window"))
+        if dataset_reference:
+            # version of the network sent, the dataset may have been changed since the reference was made
+            dataset_reference["dataset_version"] = f"{snapshot.uid}-{snapshot.version}"
         task_result = perform_analysis_network.delay(
             {
                 "task_id": task_name,
-                "network": dataset.get_network(),
-                "options": req.media["options"]
+                "network": network,
+                "options": req.media["options"],
+                **dataset_reference
             },
             timestamp_format(datetime.now(timezone.utc)),
             req.media.get("parameters")
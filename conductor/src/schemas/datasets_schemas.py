@@ -30,7 +30,7 @@ SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
 ==============================================================================
 
  Validation schemas for dataset resource """
-from .network_schema import network_schema
+from .network_schema import network_schema, time_window_schema
 
 post_input = {
     "type": "object",
@@ -41,11 +41,57 @@ post_input = {
                 "type": "string"
             }
         },
-        "params": {}
+        "params": {},
+        "time_window": time_window_schema,
+        "query": {
+            "type": "string",
+            "enum": ["network", "nodes", "neighbors"]
+        },
+        "limit": {  # elements per page
+            "type": "integer",
+            "minimum": 1
+        },
+        "cursor": {"type": "string"}  # nextCursor of the previous page
     },
     "required": ["nodes"]
 }
 
+neighbor_schema = {
+    "type": "object",
+    "properties": {
+        "id": {"type": ["string", "integer"]},
+        "neighbor_id": {"type": ["string", "integer"]},
+        "properties": {"type": ["object", "null"]},
+        "edges_properties": {"type": ["object", "null"]}
+    },
+    "required": ["id", "neighbor_id"]
+}
+
+query_output = {
+    "type": "object",
+    "properties": {
+        "network": {
+            "type": "array",
+            "items": network_schema
+        },
+        "neighbors": {
+            "type": "array",
+            "items": neighbor_schema
+        },
+        "nextCursor": {"type": ["string", "null"]}
+    },
+    "anyOf": [{"required": ["network"]}, {"required": ["neighbors"]}]
+}
+
+dataset_info = {
+    "type": "object",
+    "properties": {
+        "datasetName": {"type": "string"},
+        "version": {"type": "string"}  # changes whenever the dataset is changed
+    },
+    "required": ["datasetName", "version"]
+}
+
 data_dto = {
     "type": "object",
     "properties": {
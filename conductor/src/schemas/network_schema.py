@@ -73,6 +73,14 @@ network_schema = {
     ]
 }
 
+time_window_schema = {
+    "type": "object",
+    "properties": {
+        "start": {"type": ["string", "number", "null"]},
+        "end": {"type": ["string", "number", "null"]}
+    }
+}
+
 network_schema_v2 = {
     "type": "object",
     "properties": {
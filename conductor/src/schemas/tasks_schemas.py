@@ -30,7 +30,7 @@ SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
 ==============================================================================
 
  Schemas for task resource """
-from .network_schema import network_schema
+from .network_schema import network_schema, time_window_schema
 
 post_input = {
     "type": "object",
@@ -40,6 +40,7 @@ post_input = {
             "items": network_schema
         },
         "dataset": {"type": "string"},
+        "time_window": time_window_schema,
         "options": {
             "type": "object",
             "properties": {
@@ -75,6 +76,8 @@ network_construction_input = {
         },
         "threshold": {"type": "number"},
         "calibration": {"type": "boolean"},
-        "directed": {"type": "boolean"}
+        "directed": {"type": "boolean"},
+        "incremental": {"type": "boolean"},  # add the conversations to the previously constructed network
+        "recluster": {"type": "boolean"}  # cluster all channels again in incremental mode
     }
 }
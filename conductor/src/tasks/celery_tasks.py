@@ -31,21 +31,32 @@ SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
 
  Long running analysis tasks """
 import os
+import fcntl
+import time
+import inspect
+import functools
 from datetime import datetime, timezone
 import ujson
 from ..celery import celery
+from ..config import config
 from ..exceptions import TaskError
 from ..helpers.format_helpers import timestamp_format
-from storage.fft_helpers import parse_wp5_output, parse_wp5_output_for_aegis
+from ..metrics import registry, task_duration, task_result_size, record_cache_lookup
+from storage.fft_helpers import parse_wp5_output, parse_wp5_output_for_aegis, IncrementalWP5Network
 from storage.builtin_datasets import BuiltinDataset
 from analyzer.request_taker import InMemoryAnalyzer
+from analyzer.embedding_store import EmbeddingStore
+from analyzer.common import instrumentation
+
+if config.get("instrumentation"):
+    instrumentation.enable(memory=config["instrumentation"] == "memory")
 
 
 def hanlde_task_result(result, started_at):
     """ Return different results, based on  """
     if not result["success"]:
         raise TaskError(result["message"], "Task")
-    analysis_result = {k: result[k] for k in result if not (k == "success" or k == "message")}
+    analysis_result = {k: result[k] for k in result if k not in ("success", "message", "stages")}
     return {
         "createdDateTime": started_at,
         "lastActionDateTime": timestamp_format(datetime.now(timezone.utc)),
@@ -55,7 +66,75 @@ def hanlde_task_result(result, started_at):
     }
 
 
+def with_stages(meta):
+    """ Add the stages recorded so far to the task state, when the instrumentation is enabled """
+    stages = instrumentation.current_stages()
+    if stages is not None:
+        meta["stages"] = stages
+    return meta
+
+
+def recorded(task_function):
+    """ Record the stages of the task when the instrumentation is enabled, they are added to its result """
+    @functools.wraps(task_function)
+    def wrapper(self, *args, **kwargs):
+        recorder = instrumentation.new_recorder()
+        if recorder is None:
+            return task_function(self, *args, **kwargs)
+        with recorder:
+            result = task_function(self, *args, **kwargs)
+            # what the result backend does with the returned result
+            with instrumentation.span("encode_result") as stage:
+                stage.set("bytes", len(self.backend.encode(result)))
+        result["stages"] = recorder.stages()
+        return result
+    return wrapper
+
+
+def metered(method_of):
+    """
+    Record the run time and the result size of the task, per method
+
+    :param method_of: function giving the method label from the arguments of the task, by name
+    """
+    def decorator(task_function):
+        signature = inspect.signature(task_function)
+
+        @functools.wraps(task_function)
+        def wrapper(self, *args, **kwargs):
+            task = self.name.rsplit(".", 1)[-1]
+            try:
+                method = method_of(signature.bind(self, *args, **kwargs).arguments)
+            except Exception:
+                method = "unknown"
+            started = time.perf_counter()
+            status = "FAILURE"
+            try:
+                result = task_function(self, *args, **kwargs)
+                status = "SUCCESS"
+                task_result_size.observe(len(self.backend.encode(result)), task=task, method=method)
+                return result
+            finally:
+                task_duration.observe(time.perf_counter() - started, task=task, method=method, status=status)
+                # the worker may not run another task for a while
+                registry.flush()
+        return wrapper
+    return decorator
+
+
+def analysis_method(task_id, options):
+    """ Label of an analysis method """
+    return f"{task_id}.{options['method']}"
+
+
+def network_input(arguments):
+    """ Label of how the wp5 output is given """
+    return "file" if arguments.get("filepath") else "network"
+
+
 @celery.task(bind=True, name="conductor.src.tasks.celery_tasks.perform_analysis_file")
+@metered(lambda arguments: analysis_method(arguments["task_id"], arguments["options"]))
+@recorded
 def perform_analysis_file(self, filepath, task_id, options, started_at, params=None):
     """
     Create dataset from file and perform analysis on it
@@ -67,23 +146,23 @@ def perform_analysis_file(self, filepath, task_id, options, started_at, params=N
     :param params: Task parameters
     :returns: Analyzer result
     """
-    self.update_state(state="STARTED", meta={
+    self.update_state(state="STARTED", meta=with_stages({
         "progress": 0,
         "status": "STARTED",
         "description": "Reading the dataset",
         "createdDateTime": started_at,
-        "lastActionDateTime": timestamp_format(datetime.now(timezone.utc))})
+        "lastActionDateTime": timestamp_format(datetime.now(timezone.utc))}))
     if not os.path.isfile(filepath):
         raise RuntimeError(f"File {filepath} not found!")
     dataset = BuiltinDataset(filepath)
     os.remove(filepath)
     analyzer = InMemoryAnalyzer()
-    self.update_state(state="PROGRESS", meta={
+    self.update_state(state="PROGRESS", meta=with_stages({
         "progress": 5,
         "status": "PROGRESS",
         "description": "Performing the analysis",
         "createdDateTime": started_at,
-        "lastActionDateTime": timestamp_format(datetime.now(timezone.utc))})
+        "lastActionDateTime": timestamp_format(datetime.now(timezone.utc))}))
     result = analyzer.perform_analysis({
         "task_id": task_id,
         "network": dataset.get_network(),
@@ -94,6 +173,8 @@ def perform_analysis_file(self, filepath, task_id, options, started_at, params=N
 
 
 @celery.task(bind=True, name="conductor.src.tasks.celery_tasks.perform_analysis_network")
+@metered(lambda arguments: analysis_method(arguments["task"]["task_id"], arguments["task"]["options"]))
+@recorded
 def perform_analysis_network(self, task, started_at, params=None):
     """
     Recieve network and analyse it
@@ -102,25 +183,31 @@ def perform_analysis_network(self, task, started_at, params=None):
     :param params: Parameters for analysis function
     :returns: Analyzer result
     """
-    self.update_state(state="STARTED", meta={
+    self.update_state(state="STARTED", meta=with_stages({
         "progress": 0,
         "status": "STARTED",
         "description": "Initializing the analyzer",
         "createdDateTime": started_at,
-        "lastActionDateTime": timestamp_format(datetime.now(timezone.utc))})
-    analyzer = InMemoryAnalyzer()
-    self.update_state(state="PROGRESS", meta={
+        "lastActionDateTime": timestamp_format(datetime.now(timezone.utc))}))
+    embedding_store = EmbeddingStore(str(config["embeddings_folder"]))
+    analyzer = InMemoryAnalyzer(embedding_store=embedding_store)
+    self.update_state(state="PROGRESS", meta=with_stages({
         "progress": 5,
         "status": "PROGRESS",
         "description": "Performing the analysis",
         "createdDateTime": started_at,
-        "lastActionDateTime": timestamp_format(datetime.now(timezone.utc))})
+        "lastActionDateTime": timestamp_format(datetime.now(timezone.utc))}))
     result = analyzer.perform_analysis(task, params=params)
+    for cache in set(embedding_store.hits) | set(embedding_store.misses):
+        record_cache_lookup(cache, True, embedding_store.hits[cache])
+        record_cache_lookup(cache, False, embedding_store.misses[cache])
     show_result = hanlde_task_result(result, started_at)
     return show_result
 
 
 @celery.task(bind=True, name="conductor.src.tasks.celery_tasks.perform_parse_wp5_output")
+@metered(network_input)
+@recorded
 def perform_parse_wp5_output(self, threshold, calibration, directed, started_at, network=None, filepath=None):
     """
     Construct network from wp5
@@ -132,31 +219,32 @@ def perform_parse_wp5_output(self, threshold, calibration, directed, started_at,
     :param started_at: Time, when task was started
     :returns: Constructed network
     """
-    self.update_state(state="STARTED", meta={
+    self.update_state(state="STARTED", meta=with_stages({
         "progress": 0,
         "status": "STARTED",
         "description": "Initializing network parsing",
         "createdDateTime": started_at,
-        "lastActionDateTime": timestamp_format(datetime.now(timezone.utc))})
+        "lastActionDateTime": timestamp_format(datetime.now(timezone.utc))}))
     if filepath:
-        self.update_state(state="PROGRESS", meta={
+        self.update_state(state="PROGRESS", meta=with_stages({
             "progress": 1,
             "status": "PROGRESS",
             "description": "Reading network file",
             "createdDateTime": started_at,
-            "lastActionDateTime": timestamp_format(datetime.now(timezone.utc))})
-        with open(filepath, "r") as network_file:
+            "lastActionDateTime": timestamp_format(datetime.now(timezone.utc))}))
+        with instrumentation.span("read_network_file"), open(filepath, "r") as network_file:
             network = ujson.load(network_file)
         os.remove(filepath)
-    self.update_state(state="PROGRESS", meta={
+    self.update_state(state="PROGRESS", meta=with_stages({
         "progress": 5,
         "status": "PROGRESS",
         "description": "Parsing the wp5 network",
         "createdDateTime": started_at,
-        "lastActionDateTime": timestamp_format(datetime.now(timezone.utc))})
+        "lastActionDateTime": timestamp_format(datetime.now(timezone.utc))}))
     result = None
     try:
-        result = parse_wp5_output(network, threshold, calibration, directed)
+        with instrumentation.span("parse_wp5_output"):
+            result = parse_wp5_output(network, threshold, calibration, directed)
     except Exception as ex:
         raise TaskError(str(ex), "Task")
     return {
@@ -169,6 +257,8 @@ def perform_parse_wp5_output(self, threshold, calibration, directed, started_at,
 
 
 @celery.task(bind=True, name="conductor.src.tasks.celery_tasks.perform_parse_wp5_output_for_aegis")
+@metered(network_input)
+@recorded
 def perform_parse_wp5_output_for_aegis(self, threshold, calibration, directed, started_at, network=None, filepath=None):
     """
     Construct network from wp5
@@ -178,31 +268,112 @@ def perform_parse_wp5_output_for_aegis(self, threshold, calibration, directed, s
     :param started_at: Time, when task was started
     :returns: Constructed network
     """
-    self.update_state(state="STARTED", meta={
+    self.update_state(state="STARTED", meta=with_stages({
         "progress": 0,
         "status": "STARTED",
         "description": "Initializing network parsing",
         "createdDateTime": started_at,
-        "lastActionDateTime": timestamp_format(datetime.now(timezone.utc))})
+        "lastActionDateTime": timestamp_format(datetime.now(timezone.utc))}))
     if filepath:
-        self.update_state(state="PROGRESS", meta={
+        self.update_state(state="PROGRESS", meta=with_stages({
             "progress": 1,
             "status": "PROGRESS",
             "description": "Reading network file",
             "createdDateTime": started_at,
-            "lastActionDateTime": timestamp_format(datetime.now(timezone.utc))})
-        with open(filepath, "r") as network_file:
+            "lastActionDateTime": timestamp_format(datetime.now(timezone.utc))}))
+        with instrumentation.span("read_network_file"), open(filepath, "r") as network_file:
             network = ujson.load(network_file)
         os.remove(filepath)
-    self.update_state(state="PROGRESS", meta={
+    self.update_state(state="PROGRESS", meta=with_stages({
         "progress": 5,
         "status": "PROGRESS",
         "description": "Parsing the wp5 network",
         "createdDateTime": started_at,
-        "lastActionDateTime": timestamp_format(datetime.now(timezone.utc))})
+        "lastActionDateTime": timestamp_format(datetime.now(timezone.utc))}))
+    result = None
+    try:
+        with instrumentation.span("parse_wp5_output_for_aegis"):
+            result = parse_wp5_output_for_aegis(network, threshold, calibration, directed)
+    except Exception as ex:
+        raise TaskError(str(ex), "Task")
+    return {
+        "createdDateTime": started_at,
+        "lastActionDateTime": timestamp_format(datetime.now(timezone.utc)),
+        "status": "SUCCESS",
+        "description": "Network parsed successfully",
+        "result": result
+    }
+
+
+def check_incremental_settings(builder, threshold, calibration, directed):
+    """ Reject a batch whose settings differ from the ones the network was constructed with """
+    settings = {"threshold": (builder.threhold, threshold),
+                "calibration": (builder.calibration, calibration),
+                "directed": (builder.directed, directed)}
+    for name, (kept, requested) in settings.items():
+        if kept != requested:
+            raise ValueError(f"{name} is {requested}, but the network was constructed with {name} {kept}")
+
+
+@celery.task(bind=True, name="conductor.src.tasks.celery_tasks.perform_incremental_parse_wp5_output")
+@metered(network_input)
+@recorded
+def perform_incremental_parse_wp5_output(self, threshold, calibration, directed, aegis, recluster, state_path,
+                                         started_at, network=None, filepath=None):
+    """
+    Add a batch of wp5 conversations to the network constructed from the previous batches
+    :param threshold: Parsing threshold
+    :param calibration: Calibration value
+    :param directed: Tells if the network is directed
+    :param aegis: Construct the network of parse_wp5_output_for_aegis
+    :param recluster: Cluster all channels again instead of assigning only the new ones
+    :param state_path: Path to the construction state of the previous batches
+    :param network: wp5 network as dictonary
+    :param filepath: Path to a wp5 network
+    :param started_at: Time, when task was started
+    :returns: Nodes and edges added or updated by the batch (all of them after a full clustering)
+    """
+    self.update_state(state="STARTED", meta=with_stages({
+        "progress": 0,
+        "status": "STARTED",
+        "description": "Initializing network parsing",
+        "createdDateTime": started_at,
+        "lastActionDateTime": timestamp_format(datetime.now(timezone.utc))}))
+    if filepath:
+        self.update_state(state="PROGRESS", meta=with_stages({
+            "progress": 1,
+            "status": "PROGRESS",
+            "description": "Reading network file",
+            "createdDateTime": started_at,
+            "lastActionDateTime": timestamp_format(datetime.now(timezone.utc))}))
+        with instrumentation.span("read_network_file"), open(filepath, "r") as network_file:
+            network = ujson.load(network_file)
+        os.remove(filepath)
+    self.update_state(state="PROGRESS", meta=with_stages({
+        "progress": 5,
+        "status": "PROGRESS",
+        "description": "Adding the wp5 conversations to the network",
+        "createdDateTime": started_at,
+        "lastActionDateTime": timestamp_format(datetime.now(timezone.utc))}))
     result = None
     try:
-        result = parse_wp5_output_for_aegis(network, threshold, calibration, directed)
+        os.makedirs(os.path.dirname(state_path) or ".", exist_ok=True)
+        # batches of the same state are added one at a time, each one on top of the state saved by the previous one
+        with open(state_path + ".lock", "a") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                if os.path.exists(state_path):
+                    builder = IncrementalWP5Network.load(state_path)
+                    check_incremental_settings(builder, threshold, calibration, directed)
+                else:
+                    builder = IncrementalWP5Network(threshold, calibration, directed, aegis)
+                with instrumentation.span("add_wp5_output"):
+                    summary = builder.add_wp5_output(network, recluster=recluster)
+                with instrumentation.span("save_state"):
+                    builder.save(state_path)
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+        result = dict(summary, network=builder.get_network(changed_only=True))
     except Exception as ex:
         raise TaskError(str(ex), "Task")
     return {
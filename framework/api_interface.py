@@ -29,14 +29,34 @@ ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
 SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
 ==============================================================================
 
+
  Interface implementation for conductor """
+import base64
+import json
+import random
+import threading
+import time
+import msgpack
 import requests
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from enum import Enum
+from requests.adapters import HTTPAdapter
 from yarl import URL
 from requests_toolbelt import MultipartEncoder
 from .interfaces import Connector, DataManager
 
+JSON = "application/json"
+MSGPACK = "application/msgpack"
+STREAM_TYPES = {JSON: "application/x-ndjson", MSGPACK: "application/x-msgpack-stream"}
+
+# the request was not processed: can be sent again even if it is not idempotent
+REFUSED_STATUSES = (429, 503)
+# the request may have been processed: sent again only if it is idempotent
+FAILED_STATUSES = (502, 504)
+
+FINISHED_STATES = ("SUCCESS", "FAILURE", "REVOKED")
+
 
 class Method(Enum):
     """ HTTP request types """
@@ -44,107 +64,229 @@ class Method(Enum):
     POST = 2
     PUT = 3
     DELETE = 4
+    PATCH = 5
+
+
+class ConductorError(RuntimeError):
+    """ Error response of the conductor """
+
+    def __init__(self, message, response=None):
+        super().__init__(message)
+        self.response = response
+
+
+def token_expiration(token):
+    """ Expiration timestamp of a JWT, read without verifying the token, None if it has none """
+    try:
+        payload = token.split(".")[1]
+        claims = json.loads(base64.urlsafe_b64decode(payload + "=" * (-len(payload) % 4)).decode("utf-8"))
+        return float(claims["exp"])
+    except (IndexError, KeyError, TypeError, ValueError):
+        return None
+
+
+def retry_after(response):
+    """ Seconds to wait given by the Retry-After header of the response, None if not given """
+    try:
+        return float(response.headers["Retry-After"])
+    except (KeyError, TypeError, ValueError):
+        return None
 
 
 class ConductorConnector(Connector):
-    """ Connector for conductor api """
+    """
+    Connector for conductor api. Requests share a pool of kept-alive connections, the access token is renewed
+    before it expires or when it is refused, and requests refused by an overloaded or unreachable server are sent
+    again with exponential backoff
+    """
 
-    def __init__(self, host, port, username, password, scheme="http", **params):
+    def __init__(self, host, port, username, password, scheme="http", version="1.0", transport=MSGPACK,
+                 pool_size=10, retries=3, backoff=0.5, max_backoff=30, timeout=300, refresh_margin=60, **params):
+        """
+        :param version: version of the api
+        :param transport: media type of request and response bodies, application/msgpack or application/json
+        :param pool_size: number of connections kept alive, at least the number of threads sharing the connector
+        :param retries: number of times a request is sent again
+        :param backoff: seconds to wait before the first retry, doubled for each next one up to max_backoff
+        :param timeout: seconds to wait for the server to respond
+        :param refresh_margin: seconds before expiration of the access token when it is renewed
+        """
         super().__init__(params)
         self._api_url = URL.build(scheme=scheme, host=host, port=port)
+        self._version_url = URL(f"/v{version}")
         self._username = username
         self._password = password
+        self.transport = transport
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.timeout = timeout
+        self.refresh_margin = refresh_margin
         self._request_headers = {
-            "Content-Type": "application/json",
-            "Accept": "application/json"
+            "Content-Type": transport,
+            "Accept": transport
         }
         self._file_headers = {
-            "Accept": "application/json"
+            "Accept": transport
         }
+        self._token = None
+        self._token_expiration = None
+        self._token_lock = threading.Lock()
+        self._session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self._session.mount("http://", adapter)
+        self._session.mount("https://", adapter)
         self._login()
 
+    def url(self, *segments):
+        """ Path of a resource of the api version, segments are quoted """
+        url = self._version_url
+        for segment in segments:
+            url = url / str(segment)
+        return url
+
+    def encode(self, payload):
+        """ Serialize request body """
+        if self.transport == MSGPACK:
+            return msgpack.packb(payload, use_bin_type=True)
+        return json.dumps(payload).encode("utf-8")
+
+    def decode(self, response):
+        """ Deserialize response body by its content type """
+        if not response.content:
+            return None
+        if response.headers.get("Content-Type", "").startswith(MSGPACK):
+            return msgpack.unpackb(response.content, raw=False)
+        return response.json()
+
     def _login(self):
         """ Login to conductor and save token """
-        response = requests.post(
-            self._api_url.join(URL("/login")),
-            headers=self._request_headers,
-            json={"username": self._username, "password": self._password}
-        )
+        response = self._send(
+            Method.POST,
+            self.url("login"),
+            self.encode({"username": self._username, "password": self._password}),
+            self._request_headers,
+            idempotent=True)
         if response.status_code >= 300:
-            raise RuntimeError(
-                f"Cannot authenticate user by username {self._username} and password {self._password}, response: {response.text}")
-        token = response.json().get("access_token")
+            raise ConductorError(
+                f"Cannot authenticate user by username {self._username}, response: {response.text}", response)
+        token = self.decode(response).get("accessToken")
         if not token:
-            raise RuntimeError("Couldn't find 'access_token' field in response: " + response.text)
-        self._request_headers["Authorization"] = "Bearer " + token
-        self._file_headers["Authorization"] = "Bearer " + token
-
-    def request(self, url: URL, method: Method, payload=None, stream=False):
-        """ Make http request that sends and recieves json """
-        result = None
-        if method is Method.GET:
-            result = requests.get(
-                self._api_url.join(url),
-                headers=self._request_headers,
-                stream=stream
-            )
-        if method is Method.POST:
-            result = requests.post(
-                self._api_url.join(url),
-                headers=self._request_headers,
-                json=payload,
-                stream=stream
-            )
-        if method is Method.PUT:
-            result = requests.put(
-                self._api_url.join(url),
-                headers=self._request_headers,
-                json=payload,
-                stream=stream
-            )
-        if method is Method.DELETE:
-            result = requests.delete(
-                self._api_url.join(url),
-                headers=self._request_headers,
-                json=payload,
-                stream=stream
-            )
-        return result
+            raise ConductorError("Couldn't find 'accessToken' field in response: " + response.text, response)
+        self._token = token
+        self._token_expiration = token_expiration(token)
+
+    def _current_token(self, refused_token=None):
+        """ Access token, renewed if it is about to expire or was refused by the server """
+        with self._token_lock:
+            expiring = (self._token_expiration is not None and
+                        self._token_expiration - time.time() < self.refresh_margin)
+            if expiring or (refused_token is not None and refused_token == self._token):
+                self._login()
+            return self._token
+
+    def _headers(self, token, accept=None):
+        """ Headers of an authorized request """
+        headers = dict(self._request_headers, Authorization="Bearer " + token)
+        if accept:
+            headers["Accept"] = accept
+        return headers
+
+    def _wait(self, attempt, response=None):
+        """ Exponential backoff with jitter, or the delay asked by the server """
+        delay = retry_after(response) if response is not None else None
+        if delay is None:
+            delay = min(self.max_backoff, self.backoff * 2 ** attempt) * random.uniform(0.5, 1.0)
+        time.sleep(delay)
+
+    def _send(self, method: Method, url: URL, data, headers, stream=False, idempotent=None, resendable=True):
+        """
+        Send request, again after a backoff as long as it is refused or fails in a way it can be retried
+
+        :param resendable: the data can be sent more than once, a request with data read while sent is never retried
+        """
+        if idempotent is None:
+            idempotent = method is not Method.POST
+        attempt = 0
+        while True:
+            try:
+                response = self._session.request(
+                    method.name,
+                    str(self._api_url.join(url)),
+                    data=data,
+                    headers=headers,
+                    stream=stream,
+                    timeout=self.timeout)
+            except (requests.ConnectionError, requests.Timeout):
+                if not idempotent or not resendable or attempt >= self.retries:
+                    raise
+                self._wait(attempt)
+            else:
+                retried = (response.status_code in REFUSED_STATUSES or
+                           (idempotent and response.status_code in FAILED_STATUSES))
+                if not retried or not resendable or attempt >= self.retries:
+                    return response
+                response.close()
+                self._wait(attempt, response)
+            attempt += 1
+
+    def request(self, url: URL, method: Method, payload=None, stream=False, idempotent=None, accept=None):
+        """
+        Make http request that sends and recieves json or msgpack
+
+        :param idempotent: the request can be sent again if it fails, default for all methods but POST
+        :param accept: media type of the response, default the transport
+        :returns: requests.Response
+        """
+        data = None if payload is None else self.encode(payload)
+        token = self._current_token()
+        response = self._send(method, url, data, self._headers(token, accept), stream, idempotent)
+        if response.status_code == 401:
+            # the token was revoked or expired meanwhile, renewed once
+            response.close()
+            token = self._current_token(refused_token=token)
+            response = self._send(method, url, data, self._headers(token, accept), stream, idempotent)
+        return response
+
+    def call(self, url: URL, method: Method, payload=None, idempotent=None):
+        """
+        Make request and return deserialized response body
+
+        :raises ConductorError: if the response is an error
+        """
+        response = self.request(url, method, payload, idempotent=idempotent)
+        if response.status_code >= 300:
+            raise ConductorError(f"{method.name} {url} failed with {response.status_code}: {response.text}", response)
+        return self.decode(response)
 
     def request_multipart(self, url: URL, method: Method, payload: dict, stream=False):
         """ Send or receive file from server """
-        result = None
         form_data = MultipartEncoder(fields=payload)
-        self._file_headers["Content-Type"] = form_data.content_type
-        if method is Method.POST:
-            result = requests.post(
-                self._api_url.join(url),
-                headers=self._file_headers,
-                data=form_data,
-                stream=stream
-            )
-        if method is Method.PUT:
-            result = requests.put(
-                self._api_url.join(url),
-                headers=self._file_headers,
-                data=form_data,
-                stream=stream
-            )
-        if method is Method.DELETE:
-            result = requests.delete(
-                self._api_url.join(url),
-                headers=self._file_headers,
-                data=form_data,
-                stream=stream
-            )
-        return result
+        headers = dict(self._file_headers, Authorization="Bearer " + self._current_token())
+        headers["Content-Type"] = form_data.content_type
+        # the form is read while sent, a refused request is returned as it is
+        return self._send(method, url, form_data, headers, stream, idempotent=False, resendable=False)
+
+    def close(self):
+        """ Close the connections of the pool """
+        self._session.close()
 
 
 class ConductorDataManager(DataManager):
-    """ Implementation of DataManager for conductor api """
+    """
+    Implementation of DataManager for conductor api, networks are datasets of the user of the connector.
+    Saves and deletions are sent in batches, queries are streamed
+    """
 
-    def __init__(self, connector, **params):
+    def __init__(self, connector, batch_size=1000, workers=8, **params):
+        """
+        :param connector: ConductorConnector
+        :param batch_size: number of nodes or edges saved or deleted per request
+        :param workers: number of concurrent requests of fan_out
+        """
         super().__init__(connector, params)
+        self.batch_size = batch_size
+        self.workers = workers
 
     def run_script(self, script: str, stream=False):
         """ Send script to the database and return response """
@@ -183,3 +325,201 @@ class ConductorDataManager(DataManager):
             return self._send_multipart_request(file_name, abspath, "application/json")
         else:
             raise RuntimeError("Only xml and json files are supported")
+
+    def _batches(self, items):
+        """ Split items in lists of batch_size """
+        items = list(items)
+        for start in range(0, len(items), self.batch_size):
+            yield items[start:start + self.batch_size]
+
+    def _query(self, network, query, node_ids=None, params=None, time_window=None):
+        """ Stream elements of a query on a dataset """
+        payload = {"nodes": list(node_ids or []), "query": query}
+        if params is not None:
+            payload["params"] = params
+        if time_window is not None:
+            payload["time_window"] = time_window
+        stream_type = STREAM_TYPES[self.connector.transport]
+        response = self.connector.request(
+            self.connector.url("datasets", network),
+            Method.POST,
+            payload,
+            stream=True,
+            idempotent=True,
+            accept=stream_type)
+        if response.status_code >= 300:
+            raise ConductorError(f"Query on {network} failed with {response.status_code}: {response.text}", response)
+        with response:
+            if stream_type == STREAM_TYPES[MSGPACK]:
+                unpacker = msgpack.Unpacker(raw=False)
+                for chunk in response.iter_content(65536):
+                    unpacker.feed(chunk)
+                    for element in unpacker:
+                        yield element
+            else:
+                for line in response.iter_lines():
+                    if line:
+                        yield json.loads(line)
+
+    def fan_out(self, function, arguments, workers=None):
+        """
+        Call function with each of arguments concurrently, e.g.
+        fan_out(manager.get_neighbors, [(["a"], "first"), (["b"], "second")])
+
+        :param function: function making requests through the connector
+        :param arguments: list of tuples of positional arguments
+        :param workers: number of concurrent calls, default workers of the manager
+        :returns: list of results in the order of arguments
+        """
+        with ThreadPoolExecutor(max_workers=workers or self.workers) as executor:
+            return list(executor.map(lambda args: function(*args), arguments))
+
+    def search_networks(self, networks=None):
+        """ Datasets of the user, only their names are known """
+        names = self.connector.call(self.connector.url("datasets"), Method.GET)["datasets"]
+        selected = names if networks is None else [n for n in networks if n in names]
+        return {
+            "found": [{"id": name, "properties": {"name": name}} for name in selected],
+            "not_found": [] if networks is None else [n for n in networks if n not in names]
+        }
+
+    def _save_elements(self, network, elements):
+        """ Save network elements in batches, returns errors """
+        errors = []
+        for batch in self._batches(elements):
+            result = self.connector.call(
+                self.connector.url("datasets", network), Method.PATCH, {"network": batch})
+            errors.extend(result["errors"])
+        return errors
+
+    def save_nodes(self, nodes, network, params=None):
+        """
+        Add or update nodes, given as a list of nodes, see DataManager.save_nodes, or as a dictionary of
+        node id: properties
+        :returns: errors of the nodes that could not be saved
+        """
+        if isinstance(nodes, dict):
+            nodes = [{"id": node_id, "properties": properties} for node_id, properties in nodes.items()]
+        elements = []
+        for node in nodes:
+            properties = node["properties"] if "properties" in node else {k: v for k, v in node.items() if k != "id"}
+            elements.append({"type": "node", "id": node["id"], "properties": properties or {}})
+        return self._save_elements(network, elements)
+
+    def save_edges(self, edges, network, params=None):
+        """
+        Create or update edges
+        :returns: errors of the edges that could not be saved
+        """
+        elements = [
+            {"type": "edge", "source": e["source"], "target": e["target"], "properties": e.get("properties") or {}}
+            for e in edges]
+        return self._save_elements(network, elements)
+
+    def delete_node(self, node_ids, network):
+        """ Delete nodes and their edges, returns errors of the nodes that could not be deleted """
+        errors = []
+        for batch in self._batches(node_ids):
+            result = self.connector.call(self.connector.url("datasets", network), Method.DELETE, {"nodes": batch})
+            errors.extend(result["errors"])
+        return errors
+
+    def delete_edges(self, edges, network):
+        """
+        Delete edges, given as dictionaries with source and target or as (source, target) pairs
+        :returns: errors of the edges that could not be deleted
+        """
+        edges = [{"source": e["source"], "target": e["target"]} if isinstance(e, dict) else
+                 {"source": e[0], "target": e[1]} for e in edges]
+        errors = []
+        for batch in self._batches(edges):
+            result = self.connector.call(self.connector.url("datasets", network), Method.DELETE, {"edges": batch})
+            errors.extend(result["errors"])
+        return errors
+
+    def get_network(self, network, node_ids=None, params=None, time_window=None):
+        """ Network of the nodes, the whole network if node_ids is None, see DataManager.get_network """
+        nodes, edges = [], []
+        for element in self._query(network, "network", node_ids, params, time_window):
+            if element.pop("type") == "edge":
+                edges.append(element)
+            else:
+                nodes.append(element)
+        return {"nodes": nodes, "edges": edges}
+
+    def dump_network(self, network, output_dir, params=None):
+        """
+        Dump the network into output_dir/<network>.json, one node or edge per line
+        :returns: 1 if the network is dumped successfully, or 0 otherwise
+        """
+        try:
+            with open(Path(output_dir) / f"{network}.json", "w") as file:
+                for element in self._query(network, "network", None, params):
+                    file.write(json.dumps(element) + "\n")
+        except (ConductorError, OSError, requests.RequestException):
+            return 0
+        return 1
+
+    def get_neighbors(self, node_ids, network, params=None, time_window=None):
+        """ Neighbors of the nodes, see DataManager.get_neighbors """
+        node_ids = list(node_ids)
+        neighbors = {node_id: [] for node_id in node_ids}
+        for neighbor in self._query(network, "neighbors", node_ids, params, time_window):
+            neighbors[neighbor.pop("id")].append(neighbor)
+        lonely = [node_id for node_id in node_ids if not neighbors[node_id]]
+        not_found = set(self.search_nodes(lonely, network)["not_found"]) if lonely else set()
+        return {
+            "found": [{"id": node_id, "neighbors": neighbors[node_id]} for node_id in node_ids
+                      if node_id not in not_found],
+            "not_found": [node_id for node_id in node_ids if node_id in not_found]
+        }
+
+    def search_nodes(self, node_ids, network, params=None):
+        """ Nodes by id, all nodes if node_ids is None, see DataManager.search_nodes """
+        found = list(self._query(network, "nodes", node_ids, params))
+        for node in found:
+            del node["type"]
+        found_ids = set(node["id"] for node in found)
+        return {"found": found, "not_found": [node_id for node_id in node_ids or [] if node_id not in found_ids]}
+
+    def get_network_version(self, network):
+        """ Version of the dataset, None if it does not exist """
+        response = self.connector.request(self.connector.url("datasets", network), Method.GET)
+        if response.status_code == 404:
+            return None
+        if response.status_code >= 300:
+            raise ConductorError(f"GET {network} failed with {response.status_code}: {response.text}", response)
+        return self.connector.decode(response)["version"]
+
+    def submit_task(self, task_name, payload):
+        """
+        Submit an analysis task
+        :returns: path of the operation of the task
+        """
+        response = self.connector.request(self.connector.url("tasks", task_name), Method.POST, payload)
+        if response.status_code >= 300:
+            raise ConductorError(f"Task {task_name} failed with {response.status_code}: {response.text}", response)
+        return URL(response.headers["Operation-Location"])
+
+    def wait_for_operation(self, operation, timeout=None, delay=0.1, max_delay=5.0):
+        """
+        Poll operation until its task is finished, waiting twice longer after each poll up to max_delay
+
+        :param operation: path of the operation, returned by submit_task
+        :param timeout: seconds to wait at most
+        :raises TimeoutError: if the task is not finished in time
+        :returns: task data of the finished task
+        """
+        deadline = None if timeout is None else time.time() + timeout
+        while True:
+            task_data = self.connector.call(URL(str(operation)), Method.GET)["taskData"]
+            if task_data is not None and task_data.get("status") in FINISHED_STATES:
+                return task_data
+            if deadline is not None and time.time() + delay > deadline:
+                raise TimeoutError(f"Operation {operation} not finished in {timeout} seconds")
+            time.sleep(delay)
+            delay = min(max_delay, delay * 2)
+
+    def run_task(self, task_name, payload, timeout=None):
+        """ Submit task and wait for its result """
+        return self.wait_for_operation(self.submit_task(task_name, payload), timeout)
@@ -0,0 +1,212 @@
+"""
+=================================== LICENSE ==================================
+Copyright (c) 2021, Consortium Board ROXANNE
+All rights reserved.
+
+Redistribution and use in source and binary forms, with or without
+modification, are permitted provided that the following conditions are met:
+
+Redistributions of source code must retain the above copyright
+notice, this list of conditions and the following disclaimer.
+
+Redistributions in binary form must reproduce the above copyright
+notice, this list of conditions and the following disclaimer in the
+documentation and/or other materials provided with the distribution.
+
+Neither the name of the ROXANNE nor the
+names of its contributors may be used to endorse or promote products
+derived from this software without specific prior written permission.
+
+THIS SOFTWARE IS PROVIDED BY CONSORTIUM BOARD ROXANNE ``AS IS'' AND ANY
+EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+DISCLAIMED. IN NO EVENT SHALL CONSORTIUM BOARD TENCOMPETENCE BE LIABLE FOR ANY
+DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+(INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+(INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+==============================================================================
+
+ Read cache for any DataManager """
+import json
+import threading
+import time
+from collections import OrderedDict
+from .interfaces import DataManager
+
+
+class CachingDataManager(DataManager):
+    """
+    DataManager answering repeated reads from a bounded cache, least recently used entries are dropped first.
+
+    Entries are keyed by method, arguments and version of the network (see DataManager.get_network_version), so
+    changes of a network made anywhere are seen as soon as its version changes. Saves and deletions made through the
+    cache drop the entries of the network, which is what keeps the cache correct for managers without versions.
+    Node ids not found in a version of a network are remembered, and not asked for again.
+    Cached results are shared between callers and must not be modified.
+    Methods of the wrapped manager outside of the interface, e.g. add_dataset, are called uncached
+    """
+
+    def __init__(self, data_manager, max_entries=1024, max_not_found=100000, version_ttl=0, params=None):
+        """
+        :param data_manager: DataManager to cache
+        :param max_entries: number of cached results
+        :param max_not_found: number of remembered ids not found, over all networks
+        :param version_ttl: seconds a version of a network is used before asking for it again, for managers where
+            asking is expensive, e.g. remote ones. Changes made elsewhere are seen up to version_ttl late
+        """
+        super().__init__(data_manager.connector, params)
+        self.data_manager = data_manager
+        self.max_entries = max_entries
+        self.max_not_found = max_not_found
+        self.version_ttl = version_ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()  # (network, version, method, arguments) -> result
+        self._not_found = OrderedDict()  # (network, version) -> ids not found
+        self._num_not_found = 0
+        self._versions = {}  # network -> (version, time it was asked for)
+        self._lock = threading.RLock()
+
+    def __getattr__(self, name):
+        if name == "data_manager":  # not set yet
+            raise AttributeError(name)
+        return getattr(self.data_manager, name)
+
+    def get_network_version(self, network):
+        if self.version_ttl > 0:
+            with self._lock:
+                version, asked = self._versions.get(network, (None, None))
+            if asked is not None and time.monotonic() - asked < self.version_ttl:
+                return version
+        version = self.data_manager.get_network_version(network)
+        if self.version_ttl > 0:
+            with self._lock:
+                self._versions[network] = (version, time.monotonic())
+        return version
+
+    def invalidate(self, network=None):
+        """ Drop the cached results of a network, of all networks if None """
+        with self._lock:
+            if network is None:
+                self._entries.clear()
+                self._not_found.clear()
+                self._versions.clear()
+                self._num_not_found = 0
+                return
+            for key in [key for key in self._entries if key[0] == network]:
+                del self._entries[key]
+            for key in [key for key in self._not_found if key[0] == network]:
+                self._num_not_found -= len(self._not_found.pop(key))
+            self._versions.pop(network, None)
+
+    def cache_info(self):
+        """ Numbers of hits, misses and cached results """
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "entries": len(self._entries),
+                    "not_found": self._num_not_found}
+
+    def _cached(self, method, network, version, arguments, compute):
+        """ Result of compute, cached by method, network, version and arguments """
+        key = (network, version, method, json.dumps(arguments, sort_keys=True, default=str))
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key]
+            self.misses += 1
+        # computed outside the lock, concurrent misses of a key compute it each
+        result = compute()
+        with self._lock:
+            self._entries[key] = result
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return result
+
+    def _remember_not_found(self, network, version, node_ids):
+        with self._lock:
+            known = self._not_found.setdefault((network, version), set())
+            self._not_found.move_to_end((network, version))
+            self._num_not_found -= len(known)
+            known.update(node_ids)
+            self._num_not_found += len(known)
+            while self._num_not_found > self.max_not_found and self._not_found:
+                self._num_not_found -= len(self._not_found.popitem(last=False)[1])
+
+    def _cached_lookup(self, method, node_ids, network, arguments, lookup):
+        """
+        Cached result of lookup(node_ids) with found and not_found lists, ids known not to be found are not looked up
+        """
+        version = self.get_network_version(network)
+        if node_ids is None:
+            return self._cached(method, network, version, [None, arguments], lambda: lookup(None))
+        node_ids = list(node_ids)
+        with self._lock:
+            known = set(self._not_found.get((network, version), ()))
+        remaining = [node_id for node_id in node_ids if node_id not in known]
+        if remaining:
+            result = self._cached(method, network, version, [remaining, arguments], lambda: lookup(remaining))
+            if result.get("not_found"):
+                self._remember_not_found(network, version, result["not_found"])
+        else:
+            result = {"found": [], "not_found": []}
+        if len(remaining) == len(node_ids):
+            return result
+        not_found = known.union(result.get("not_found", []))
+        return dict(result, not_found=[node_id for node_id in node_ids if node_id in not_found])
+
+    def get_network(self, network, node_ids=None, params=None, time_window=None):
+        return self._cached(
+            "get_network",
+            network,
+            self.get_network_version(network),
+            [node_ids, params, time_window],
+            lambda: self.data_manager.get_network(network, node_ids=node_ids, params=params, time_window=time_window))
+
+    def get_neighbors(self, node_ids, network, params=None, time_window=None):
+        return self._cached_lookup(
+            "get_neighbors",
+            node_ids,
+            network,
+            [params, time_window],
+            lambda ids: self.data_manager.get_neighbors(ids, network, params=params, time_window=time_window))
+
+    def search_nodes(self, node_ids, network, params=None):
+        return self._cached_lookup(
+            "search_nodes",
+            node_ids,
+            network,
+            [params],
+            lambda ids: self.data_manager.search_nodes(ids, network, params=params))
+
+    def search_networks(self, *args, **kwargs):
+        return self.data_manager.search_networks(*args, **kwargs)
+
+    def dump_network(self, network, output_dir, params=None):
+        return self.data_manager.dump_network(network, output_dir, params=params)
+
+    def save_nodes(self, nodes, network, params=None):
+        try:
+            return self.data_manager.save_nodes(nodes, network, params=params)
+        finally:
+            self.invalidate(network)
+
+    def save_edges(self, edges, network, params=None):
+        try:
+            return self.data_manager.save_edges(edges, network, params=params)
+        finally:
+            self.invalidate(network)
+
+    def delete_node(self, node_ids, network):
+        try:
+            return self.data_manager.delete_node(node_ids, network)
+        finally:
+            self.invalidate(network)
+
+    def delete_edges(self, edges, network):
+        try:
+            return self.data_manager.delete_edges(edges, network)
+        finally:
+            self.invalidate(network)
@@ -204,7 +204,7 @@ class DataManager:
         """
         pass
 
-    def get_network(self, network, node_ids=None, params=None):
+    def get_network(self, network, node_ids=None, params=None, time_window=None):
         """
         get network or sub-network induced by a list of nodes
         :param network: a string to identify a unique network
@@ -217,6 +217,8 @@ class DataManager:
                     "min_confidence": minimum confidence
                     ...
                 }
+        :param time_window: optional {"start": ..., "end": ...} (dates or timestamps, each bound optional), only
+                edges with an event in [start, end) or without time information are selected
         :return: dictionary that contains the list of edges in the (sub-) network and information of its nodes
                 {
                     "edges": list of dictionaries, each contains selected information about an edge, each in the
@@ -270,7 +272,7 @@ class DataManager:
         """
         pass
 
-    def get_neighbors(self, node_ids, network, params=None):
+    def get_neighbors(self, node_ids, network, params=None, time_window=None):
         """
         get neighbors of a list of nodes in a network
         :param node_ids: list of the node ids
@@ -283,6 +285,7 @@ class DataManager:
                     "min_confidence": minimum confidence
                     ...
                 }
+        :param time_window: optional time window, see `get_network`
         :return: dictionary that contains the list of nodes and their neighbors
                 {
                     "found": list of dictionaries, each contains information about neighbors of a node that can be
@@ -341,6 +344,14 @@ class DataManager:
         """
         pass
 
+    def get_network_version(self, network):
+        """
+        get the version of a network, which changes whenever the network is changed
+        :param network: a string to identify a unique network
+        :return: hashable version of the network, or None if the version is unknown or the network does not exist
+        """
+        pass
+
 
 class AnalysisRequester:
     """
@@ -34,10 +34,15 @@ import sys
 import os
 import json
 import networkx as nx
+import numpy as np
 import io
 import random
 import copy
 import ast
+import itertools
+import functools
+import threading
+import uuid
 from copy import deepcopy
 from pathlib import Path
 
@@ -55,11 +60,16 @@ if path2root not in sys.path:
 from framework.interfaces import DataManager
 from storage import helpers
 from analyzer.request_taker import InMemoryAnalyzer
+import analyzer.social_influence_analysis as social_influence_analysis
+from storage.temporal import TemporalIndex, parse_time_window, to_timestamp
+from storage import paged
+from analyzer.common import instrumentation
 import visualizer.io_utils as converter
 
 node_update_action = 'update_node'
 node_add_action = 'add_node'
 node_delete_action = 'delete_node'
+node_rename_action = 'rename_node'
 
 edge_update_action = 'update_edge'
 edge_add_action = 'add_edge'
@@ -69,131 +79,189 @@ max_num_recent_changes = 20
 max_num_recent_interactions = 20
 
 
+class ReadOnlySnapshotError(RuntimeError):
+    """
+    raised when a snapshot of a dataset is to be changed
+    """
+
+
+def _writer(method):
+    """
+    run a method changing a dataset under its write lock, once the containers it shares with a pinned snapshot are
+    forked, see `BuiltinDataset.snapshot`
+    """
+    @functools.wraps(method)
+    def write(self, *args, **kwargs):
+        with self._write_lock:
+            self._prepare_write()
+            return method(self, *args, **kwargs)
+    return write
+
+
 class BuiltinDataset:
     def __init__(self, path_2_data, uploaded=False, from_file=True):
         # dataset info
         self.name = None
-        self.nodes = {}
-        self.edges = []
-        self.adj_list = {}
-        self.in_adj_list = {}
+        self.nodes = paged.PagedDict()
+        self.edges = paged.PagedList()
+        self.adj_list = paged.PagedDict()
+        self.in_adj_list = paged.PagedDict()
         self.node_types = {}
         self.edge_types = {}
         self.recent_changes = []
         self.meta_info = {}
+        self._temporal_index = None
+        # identity of the loaded contents and number of changes made to them since, tagging cached reads
+        self.uid = uuid.uuid4().hex
+        self.version = 0
+        # copy-on-write state, see `snapshot`
+        self._write_lock = threading.RLock()
+        self._shared_snapshot = None  # pinned snapshot sharing the containers of the dataset
+        self._owned = None  # ids of the elements copied since the last snapshot, None if none was taken
         if from_file:
-            if uploaded:
-                file = path_2_data
-                for line in file.splitlines():
-                    line = line.strip()
-                    if len(line) == 0:
-                        continue
-                    if line.startswith('#'):  # ignore the comments
-                        continue
-                    line_object = json.loads(line)
-                    if line_object['type'] == 'node':
-                        node = line_object['properties']
-                        if 'community' in line_object:
-                            node['community'] = line_object['community']
-                            node['community_confidence'] = line_object['community_confidence']
-                        if 'social_influence_score' in line_object:
-                            node['social_influence_score'] = line_object['social_influence_score']
-                            node['normalized_social_influence'] = line_object['normalized_social_influence']
-                        self.nodes[line_object['id']] = node
-                        if 'type' in node:
-                            node_type = node['type']
-                            if node_type in self.node_types:
-                                self.node_types[node_type] += 1
-                            else:
-                                self.node_types[node_type] = 1
-
-                    elif line_object['type'] == 'edge':
-                        edge = {'source': line_object['source'], 'target': line_object['target'],
-                                'observed': True, 'properties': line_object['properties']}
-                        if 'observed' in line_object:
-                            if line_object['observed'] == 'false':
-                                edge['observed'] = 'false'
-                        self.edges.append(edge)
-                        e_index = len(self.edges) - 1
-                        source = edge['source']
-                        if source in self.adj_list:
-                            self.adj_list[source].append(e_index)
-                        else:
-                            self.adj_list[source] = [e_index]
-                        target = edge['target']
-                        if target in self.in_adj_list:
-                            self.in_adj_list[target].append(e_index)
-                        else:
-                            self.in_adj_list[target] = [e_index]
-
-                        if 'type' in line_object['properties']:
-                            edge_type = line_object['properties']['type']
-                            if edge_type in self.edge_types:
-                                self.edge_types[edge_type] += 1
-                            else:
-                                self.edge_types[edge_type] = 1
-                    else:
-                        continue
-            else:
-                file = open(path_2_data, 'r')
-                decoded = file.read()
-                if decoded.startswith("{\n"):
-                    in_data = json.loads(decoded)
-                    data_list = converter.new_to_old(in_data)
-                    try:
-                        self.meta_info['directed'] = in_data['directed']
-                        self.meta_info['multigraph'] = in_data['multigraph']
-                        self.meta_info['graph'] = in_data['graph']
-                    except KeyError:
-                        print(
-                            'Input JOSN must have directed, multigraph and graph fields. See specification for information.')
+            with instrumentation.span('load_dataset', uploaded=uploaded):
+                if uploaded:
+                    self._load_uploaded(path_2_data)
                 else:
-                    # a = json.loads(decoded)
-                    data_list = [json.loads(line.strip()) for line in decoded.split('\n') if
-                                 len(line) != 0 and not line.startswith('#')]
-
-                # print('decoded = ', decoded)
-                for line_object in data_list:
-                    if line_object['type'] == 'node':
-                        node = line_object['properties']
-                        node['id'] = line_object['id']
-                        self.nodes[line_object['id']] = node
-                        if 'type' in node:
-                            node_type = node['type']
-                            if node_type in self.node_types:
-                                self.node_types[node_type] += 1
-                            else:
-                                self.node_types[node_type] = 1
-                    elif line_object['type'] == 'edge':
-                        edge = {'source': line_object['source'], 'target': line_object['target'],
-                                'observed': True, 'properties': line_object['properties']}
-                        self.edges.append(edge)
-                        e_index = len(self.edges) - 1
-                        source = edge['source']
-                        if source in self.adj_list:
-                            self.adj_list[source].append(e_index)
-                        else:
-                            self.adj_list[source] = [e_index]
-                        target = edge['target']
-                        if target in self.in_adj_list:
-                            self.in_adj_list[target].append(e_index)
-                        else:
-                            self.in_adj_list[target] = [e_index]
-                        if 'type' in line_object['properties']:
-                            edge_type = line_object['properties']['type']
-                            if edge_type in self.edge_types:
-                                self.edge_types[edge_type] += 1
-                            else:
-                                self.edge_types[edge_type] = 1
-                    else:
-                        continue
-                file.close()
-
+                    self._load_file(path_2_data)
         else:
             # create network on-the-fly
             # TODO: supposed to be refactored
             pass
 
+    def __getstate__(self):
+        # the lock can't be pickled, and the snapshots of a dataset aren't part of its contents
+        state = self.__dict__.copy()
+        for name in ('_write_lock', '_shared_snapshot', '_owned'):
+            state.pop(name, None)
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._write_lock = threading.RLock()
+        self._shared_snapshot = None
+        self._owned = None
+
+    def _load_uploaded(self, file):
+        """
+        read the network from the content of an uploaded file in the old format
+        :param file: string, one JSON object per line
+        """
+        for line in file.splitlines():
+            line = line.strip()
+            if len(line) == 0:
+                continue
+            if line.startswith('#'):  # ignore the comments
+                continue
+            line_object = json.loads(line)
+            if line_object['type'] == 'node':
+                node = line_object['properties']
+                if 'community' in line_object:
+                    node['community'] = line_object['community']
+                    node['community_confidence'] = line_object['community_confidence']
+                if 'social_influence_score' in line_object:
+                    node['social_influence_score'] = line_object['social_influence_score']
+                    node['normalized_social_influence'] = line_object['normalized_social_influence']
+                self.nodes[line_object['id']] = node
+                if 'type' in node:
+                    node_type = node['type']
+                    if node_type in self.node_types:
+                        self.node_types[node_type] += 1
+                    else:
+                        self.node_types[node_type] = 1
+
+            elif line_object['type'] == 'edge':
+                edge = {'source': line_object['source'], 'target': line_object['target'],
+                        'observed': True, 'properties': line_object['properties']}
+                if 'observed' in line_object:
+                    if line_object['observed'] == 'false':
+                        edge['observed'] = 'false'
+                self.edges.append(edge)
+                e_index = len(self.edges) - 1
+                source = edge['source']
+                if source in self.adj_list:
+                    self.adj_list[source].append(e_index)
+                else:
+                    self.adj_list[source] = [e_index]
+                target = edge['target']
+                if target in self.in_adj_list:
+                    self.in_adj_list[target].append(e_index)
+                else:
+                    self.in_adj_list[target] = [e_index]
+
+                if 'type' in line_object['properties']:
+                    edge_type = line_object['properties']['type']
+                    if edge_type in self.edge_types:
+                        self.edge_types[edge_type] += 1
+                    else:
+                        self.edge_types[edge_type] = 1
+            else:
+                continue
+
+    def _load_file(self, path_2_data):
+        """
+        read the network from a file, in the old (one JSON object per line) or the new (node-link JSON) format
+        :param path_2_data: path to the file
+        """
+        with instrumentation.span('read'):
+            with open(path_2_data, 'r') as file:
+                decoded = file.read()
+        with instrumentation.span('parse'):
+            if decoded.startswith("{\n"):
+                in_data = json.loads(decoded)
+                data_list = converter.new_to_old(in_data)
+                try:
+                    self.meta_info['directed'] = in_data['directed']
+                    self.meta_info['multigraph'] = in_data['multigraph']
+                    self.meta_info['graph'] = in_data['graph']
+                except KeyError:
+                    print(
+                        'Input JOSN must have directed, multigraph and graph fields. See specification for information.')
+            else:
+                # a = json.loads(decoded)
+                data_list = [json.loads(line.strip()) for line in decoded.split('\n') if
+                             len(line) != 0 and not line.startswith('#')]
+        with instrumentation.span('index'):
+            for line_object in data_list:
+                self._index_line_object(line_object)
+
+    def _index_line_object(self, line_object):
+        """
+        add a node or an edge of a file to the dataset
+        :param line_object: dictionary, a JSON object of a file in the old format
+        """
+        if line_object['type'] == 'node':
+            node = line_object['properties']
+            node['id'] = line_object['id']
+            self.nodes[line_object['id']] = node
+            if 'type' in node:
+                node_type = node['type']
+                if node_type in self.node_types:
+                    self.node_types[node_type] += 1
+                else:
+                    self.node_types[node_type] = 1
+        elif line_object['type'] == 'edge':
+            edge = {'source': line_object['source'], 'target': line_object['target'],
+                    'observed': True, 'properties': line_object['properties']}
+            self.edges.append(edge)
+            e_index = len(self.edges) - 1
+            source = edge['source']
+            if source in self.adj_list:
+                self.adj_list[source].append(e_index)
+            else:
+                self.adj_list[source] = [e_index]
+            target = edge['target']
+            if target in self.in_adj_list:
+                self.in_adj_list[target].append(e_index)
+            else:
+                self.in_adj_list[target] = [e_index]
+            if 'type' in line_object['properties']:
+                edge_type = line_object['properties']['type']
+                if edge_type in self.edge_types:
+                    self.edge_types[edge_type] += 1
+                else:
+                    self.edge_types[edge_type] = 1
+
     def _generate_edges_nodes_and_node_ids_for_analyzing(self, network_edges, params):
         nx_nodes = {}
         nx_edges = []
@@ -223,23 +291,52 @@ class BuiltinDataset:
 
         return nx_edges, nx_nodes, nx_node_ids
 
-    def get_network(self, node_ids=None, params=None, return_edge_index=False):
+    def get_temporal_index(self):
+        """
+        index of the event times of the edges, built on first use and rebuilt after edges are changed
+        :return: TemporalIndex
+        """
+        if getattr(self, '_temporal_index', None) is None:
+            self._temporal_index = TemporalIndex(self.edges)
+        return self._temporal_index
+
+    def _invalidate_temporal_index(self):
+        self._temporal_index = None
+
+    def get_edges_in_time_window(self, time_window, mode='events'):
+        """
+        :param time_window: dictionary {'start': ..., 'end': ...} or pair (start, end) of dates or timestamps,
+                            see `storage.temporal.parse_time_window`, an open start gives the network as of end
+        :param mode: 'events' or 'span', see `TemporalIndex.edges_in_window`
+        :return: boolean array, True for the indices of the edges in the window
+        """
+        start, end = parse_time_window(time_window)
+        return self.get_temporal_index().edge_mask(start, end, mode=mode)
+
+    @instrumentation.traced()
+    def get_network(self, node_ids=None, params=None, return_edge_index=False, time_window=None):
         """
         mimic the get_network function of DataManager, i.e., getting ego-network surrounding node_ids
         :param node_ids:
         :param params:
+        :param time_window: optional time window, only edges with an event in the window (or without time
+                            information) are returned, see `get_edges_in_time_window`
         :return:
         """
-        if node_ids is None:
-            node_ids = list(self.nodes.keys())
-        else:
-            if len(list(node_ids)) == 0:
+        in_window = None if time_window is None else self.get_edges_in_time_window(time_window)
+        if node_ids is None or len(list(node_ids)) == 0:
+            if in_window is None:
                 node_ids = list(self.nodes.keys())
+            else:
+                # nodes active in the window
+                window_edges = [self.edges[e] for e in np.flatnonzero(in_window)]
+                node_ids = list(set([e['source'] for e in window_edges] + [e['target'] for e in window_edges]))
         edges = []
         for u in node_ids:
             if u in self.adj_list:
                 edges.extend(self.adj_list[u])
-        edges = [e for e in edges if helpers.is_valid_edge(self.edges[e], params)]
+        edges = [e for e in edges if helpers.is_valid_edge(self.edges[e], params) and
+                 (in_window is None or in_window[e])]
         involved_nodes = set([self.edges[e]['target'] for e in edges])
         node_ids = set(node_ids)
         involved_nodes = involved_nodes.union(node_ids)
@@ -247,7 +344,8 @@ class BuiltinDataset:
             if v in self.adj_list:
                 if v not in node_ids:
                     edges.extend([e for e in self.adj_list[v] if self.edges[e]['target'] in involved_nodes and
-                                  helpers.is_valid_edge(self.edges[e]['target'], params)])
+                                  helpers.is_valid_edge(self.edges[e]['target'], params) and
+                                  (in_window is None or in_window[e])])
         nodes = [{'id': u, 'properties': self.nodes[u]} for u in involved_nodes if u in self.nodes]
         if not return_edge_index:
             edges = [self.edges[e] for e in edges]
@@ -284,65 +382,82 @@ class BuiltinDataset:
 
         return {'found': nx_found_next_edges, 'not_found': nx_not_found_next_edges}
 
-    def get_neighbors(self, node_ids=None, params=None):
+    @instrumentation.traced()
+    def get_neighbors(self, node_ids=None, params=None, time_window=None):
         """
         mimic the get_neighbors function of DataManager
         :param node_ids:
         :param params:
+        :param time_window: optional time window, only neighbors linked by an edge in the window are returned,
+                            see `get_edges_in_time_window`
         :return:
         """
         if node_ids is None:
             node_ids = list(self.nodes.keys())
+        in_window = None if time_window is None else self.get_edges_in_time_window(time_window)
+        return self._get_neighbors_from_adjacency(node_ids, params, in_window)
 
-        nx_edges, nx_nodes, nx_node_ids = self._generate_edges_nodes_and_node_ids_for_analyzing(self.edges, params)
-        nx_graph = nx.DiGraph()
-        nx_graph.add_edges_from(nx_edges)
-
-        nx_found_neighbors = []
-        nx_not_found_neighbors = []
-
+    def _get_neighbors_from_adjacency(self, node_ids, params, in_window=None):
+        """
+        neighbors by out-going edges, selected by the boolean array `in_window` if given, read from the adjacency
+        lists: the cost is the degree of the nodes, not the size of the dataset
+        """
+        found = []
+        not_found = []
         for checking_node in node_ids:
             if checking_node in self.adj_list:
                 if helpers.is_valid_node(checking_node, params):
-                    nx_checking_node_id = nx_nodes.get(checking_node)
-                    nx_neighbors = []
-                    for nx_neighbor_node_id in nx_graph.neighbors(nx_checking_node_id):
-                        neighbor_node_id = nx_node_ids[nx_neighbor_node_id]
-                        temp_nx_edge = (nx_checking_node_id, nx_neighbor_node_id)
-                        temp_edge_properties = self.edges[nx_edges.index(temp_nx_edge)].get('properties')
-
-                        neighbor = {'neighbor_id': neighbor_node_id,
-                                    'properties': self.nodes[neighbor_node_id],
-                                    'edges_properties': temp_edge_properties}
-                        nx_neighbors.append(neighbor)
-                    nx_found_neighbors.append({'id': checking_node, 'neighbors': nx_neighbors})
+                    neighbors = {}
+                    for e in self.adj_list[checking_node]:
+                        edge = self.edges[e]
+                        if edge is None or (in_window is not None and not in_window[e]) or \
+                                not helpers.is_valid_edge(edge, params):
+                            continue
+                        if edge['target'] not in neighbors:
+                            neighbors[edge['target']] = {'neighbor_id': edge['target'],
+                                                         'properties': self.nodes.get(edge['target']),
+                                                         'edges_properties': edge.get('properties')}
+                    found.append({'id': checking_node, 'neighbors': list(neighbors.values())})
             else:
-                nx_not_found_neighbors.append(checking_node)
-
-        # for u in node_ids:
-        #     if u in self.adj_list:
-        #         edges = [e for e in self.adj_list[u] if helpers.is_valid_edge(self.edges[e], params)]             
-        #         edges = [e for e in edges if helpers.is_valid_node(self.nodes[self.edges[e]['target']], params)]
-
-        #         if len(edges) > 0:
-        #             groups = {}
-        #             for e in edges:
-        #                 v = self.edges[e]['target']
-        #                 if v in groups:
-        #                     groups[v].append(e)
-        #                 else:
-        #                     groups[v] = [e]
-        #             neighbors = []
-        #             for v in groups:
-        #                 v_edges = groups[v]
-        #                 v_edges = [self.edges[e]['properties'] for e in v_edges]
-        #                 neighbor = {'neighbor_id': v, 'properties': self.nodes[v], 'edges': v_edges}
-        #                 neighbors.append(neighbor)
-        #             found.append({'id': u, 'neighbors': neighbors})
-        #     else:
-        #         not_found.append(u)
-
-        return {'found': nx_found_neighbors, 'not_found': nx_not_found_neighbors}
+                not_found.append(checking_node)
+        return {'found': found, 'not_found': not_found}
+
+    def sliding_window_pagerank(self, start, end, width, step, alpha=0.85, tol=1.0e-6):
+        """
+        PageRank of the network of every time window [s, s + width), s = start, start + step, ... < end, as the
+        pagerank method of social influence analysis computes it on the network of the window. the edges of a
+        window are updated from the previous one, and its ranks start from those of the previous window
+        :param start, end: dates or timestamps, see `storage.temporal.to_timestamp`
+        :param width, step: in seconds
+        :return: generator of (window_start, window_end, scores), scores being a dictionary of node ranks
+        """
+        index = self.get_temporal_index()
+        valid = np.array([e is not None for e in self.edges], dtype=bool)
+        node_ids = list(set([e['source'] for e in self.edges if e is not None] +
+                            [e['target'] for e in self.edges if e is not None]))
+        node_index = dict([(u, i) for i, u in enumerate(node_ids)])
+        sources = np.array([node_index[e['source']] if e is not None else -1 for e in self.edges], dtype=np.int64)
+        targets = np.array([node_index[e['target']] if e is not None else -1 for e in self.edges], dtype=np.int64)
+
+        active = np.zeros(len(self.edges), dtype=bool)
+        active[index.untimed] = True
+        ranks = np.zeros(len(node_ids))
+        for window_start, window_end, _, entered, left in index.sliding_windows(
+                to_timestamp(start), to_timestamp(end), width, step):
+            active[entered] = True
+            active[left] = False
+            edges = np.flatnonzero(active & valid)
+            # distinct (source, target) pairs, nodes of the window indexed from 0
+            pairs = np.unique(sources[edges] * len(node_ids) + targets[edges])
+            window_nodes, compact = np.unique(np.concatenate([pairs // len(node_ids), pairs % len(node_ids)]),
+                                              return_inverse=True)
+            nstart = ranks[window_nodes]
+            nstart[nstart == 0] = 1.0 / max(len(window_nodes), 1)
+            window_ranks, _ = social_influence_analysis.pagerank_from_arrays(
+                compact[:len(pairs)], compact[len(pairs):], len(window_nodes), alpha=alpha, nstart=nstart, tol=tol)
+            ranks[:] = 0
+            ranks[window_nodes] = window_ranks
+            yield window_start, window_end, dict([(node_ids[u], r) for u, r in zip(window_nodes, window_ranks)])
 
     def search_nodes(self, node_ids=None, params=None):
         """
@@ -367,6 +482,88 @@ class BuiltinDataset:
         if len(self.recent_changes) > max_num_recent_changes:
             self.recent_changes = self.recent_changes[-max_num_recent_changes:]
 
+    def _record_change(self, action):
+        """
+        remember the action and move the dataset to its next version
+        :param action:
+        :return:
+        """
+        self.recent_changes.append(action)
+        self.forget_changes()
+        self.version += 1
+
+    def snapshot(self):
+        """
+        pin the current version of the dataset, to read it consistently while it is changed. the snapshot shares the
+        nodes, the edges and the adjacency lists of the dataset instead of copying them: these are stored in pages,
+        writers fork a container (copying its list of pages) the first time they change it while the snapshot is
+        pinned, then a page the first time they change it, and an element the first time they change it after the
+        snapshot was taken, so that the elements read from a snapshot are never changed
+        :return: DatasetSnapshot, to be released once read, e.g. `with dataset.snapshot() as snapshot:`
+        """
+        with self._write_lock:
+            if self._shared_snapshot is None:
+                self._shared_snapshot = DatasetSnapshot(self)
+                self._owned = {'nodes': set(), 'edges': set(), 'adj_list': set(), 'in_adj_list': set()}
+            self._shared_snapshot.pins += 1
+            return self._shared_snapshot
+
+    def _prepare_write(self):
+        """
+        fork the containers shared with a pinned snapshot before they are changed
+        :return:
+        """
+        if self._shared_snapshot is not None:
+            self.nodes = paged.fork(self.nodes)
+            self.edges = paged.fork(self.edges)
+            self.adj_list = paged.fork(self.adj_list)
+            self.in_adj_list = paged.fork(self.in_adj_list)
+            self.node_types = dict(self.node_types)
+            self.edge_types = dict(self.edge_types)
+            self._shared_snapshot = None
+
+    def _own_node(self, node):
+        """
+        properties of a node to be changed, copied first if a snapshot may share them
+        :param node:
+        :return:
+        """
+        properties = self.nodes[node]
+        if self._owned is not None and properties is not None and node not in self._owned['nodes']:
+            properties = dict(properties)
+            self.nodes[node] = properties
+            self._owned['nodes'].add(node)
+        return properties
+
+    def _own_edge(self, e_index):
+        """
+        edge to be changed, copied with its properties first if a snapshot may share it
+        :param e_index:
+        :return:
+        """
+        edge = self.edges[e_index]
+        if self._owned is not None and edge is not None and e_index not in self._owned['edges']:
+            edge = dict(edge)
+            if edge.get('properties') is not None:
+                edge['properties'] = dict(edge['properties'])
+            self.edges[e_index] = edge
+            self._owned['edges'].add(e_index)
+        return edge
+
+    def _own_adjacency(self, name, node):
+        """
+        adjacency list of a node to be changed, copied first if a snapshot may share it
+        :param name: 'adj_list' or 'in_adj_list'
+        :param node:
+        :return:
+        """
+        adj_list = getattr(self, name)
+        if self._owned is not None and node not in self._owned[name]:
+            adj_list[node] = list(adj_list[node])
+            self._owned[name].add(node)
+        return adj_list[node]
+
+    @_writer
     def update_a_node(self, node, properties):
         """
 
@@ -378,7 +575,7 @@ class BuiltinDataset:
         if node not in self.nodes:
             return {'success': 0, 'message': 'node not found!'}
         else:
-            node_properties = self.nodes[node]
+            node_properties = self._own_node(node)
             pre_properties = copy.deepcopy(node_properties)
             if node_properties is None:
                 self.nodes[node] = properties
@@ -411,13 +608,13 @@ class BuiltinDataset:
                     else:
                         self.node_types[node_type] = 1
             action = {'action': node_update_action, 'node': node, 'pre_properties': pre_properties}
-            self.recent_changes.append(action)
-            self.forget_changes()
+            self._record_change(action)
 
             print('after update: node = ', node, 'properties = ', self.nodes[node])
 
             return {'success': 1, 'message': 'node updated successfully!'}
 
+    @_writer
     def add_a_node(self, node, properties=None):
         """
 
@@ -436,8 +633,7 @@ class BuiltinDataset:
                 else:
                     self.node_types[node_type] = 1
             action = {'action': node_add_action, 'node': node, 'properties': copy.deepcopy(properties)}
-            self.recent_changes.append(action)
-            self.forget_changes()
+            self._record_change(action)
             return {'success': 1, 'message': 'node added successfully!'}
 
     def find_edge_index(self, source, target):
@@ -468,6 +664,7 @@ class BuiltinDataset:
                     return e_index
             return -1
 
+    @_writer
     def update_an_edge(self, e_index=None, source=None, target=None, is_index=True, properties=None):
         """
 
@@ -483,7 +680,7 @@ class BuiltinDataset:
         if is_index:
             if e_index is None:
                 return {'success': 0, 'message': 'is_index is True but e_index is None!'}
-            edge_properties = self.edges[e_index]['properties']
+            edge_properties = self._own_edge(e_index)['properties']
             pre_properties = copy.deepcopy(edge_properties)
             if edge_properties is None:
                 self.edges[e_index]['properties'] = properties
@@ -513,13 +710,14 @@ class BuiltinDataset:
                         self.edge_types[edge_type] += 1
                     else:
                         self.edge_types[edge_type] = 1
+            # the times of the edge may have changed
+            self._invalidate_temporal_index()
             action = {'action': edge_update_action,
                       'edge': {'e_index': e_index,
                                'source': self.edges[e_index]['source'],
                                'target': self.edges[e_index]['target']},
                       'pre_properties': pre_properties}
-            self.recent_changes.append(action)
-            self.forget_changes()
+            self._record_change(action)
             return {'success': 1, 'message': 'edge updated successfully!'}
         else:
             if source is None or target is None:
@@ -527,7 +725,7 @@ class BuiltinDataset:
             e_index = self.find_edge_index(source, target)
             if e_index < 0:
                 return {'success': 0, 'message': 'edge not found!'}
-            edge_properties = self.edges[e_index]['properties']
+            edge_properties = self._own_edge(e_index)['properties']
             pre_properties = copy.deepcopy(edge_properties)
             if edge_properties is None:
                 self.edges[e_index]['properties'] = properties
@@ -557,14 +755,16 @@ class BuiltinDataset:
                         self.edge_types[edge_type] += 1
                     else:
                         self.edge_types[edge_type] = 1
+            # the times of the edge may have changed
+            self._invalidate_temporal_index()
             # remember the action
             action = {'action': edge_update_action,
                       'edge': {'e_index': e_index, 'source': source, 'target': target},
                       'pre_properties': pre_properties}
-            self.recent_changes.append(action)
-            self.forget_changes()
+            self._record_change(action)
             return {'success': 1, 'message': 'edge updated successfully!'}
 
+    @_writer
     def add_an_edge(self, source, target, properties=None):
         """
 
@@ -583,15 +783,16 @@ class BuiltinDataset:
                 return {'success': 0, 'message': 'edge already exists!'}
         e_index = len(self.edges)
         if source in self.adj_list:
-            self.adj_list[source].append(e_index)
+            self._own_adjacency('adj_list', source).append(e_index)
         else:
             self.adj_list[source] = [e_index]
         if target in self.in_adj_list:
-            self.in_adj_list[target].append(e_index)
+            self._own_adjacency('in_adj_list', target).append(e_index)
         else:
             self.in_adj_list[target] = [e_index]
         edge = {'source': source, 'target': target, 'properties': properties}
         self.edges.append(edge)
+        self._invalidate_temporal_index()
         if 'type' in properties:
             edge_type = properties['type']
             if edge_type in self.edge_types:
@@ -602,10 +803,10 @@ class BuiltinDataset:
         action = {'action': edge_add_action,
                   'edge': {'e_index': e_index, 'source': source, 'target': target},
                   'properties': copy.deepcopy(properties)}
-        self.recent_changes.append(action)
-        self.forget_changes()
+        self._record_change(action)
         return {'success': 1, 'message': 'edge added successfully!'}
 
+    @_writer
     def delete_an_edge(self, e_index=None, source=None, target=None, is_index=True):
         """
 
@@ -627,12 +828,12 @@ class BuiltinDataset:
             # print('source: ', source)
             # print('self.adj_list: ', self.adj_list)
             if source in self.nodes:
-                self.adj_list[source].remove(e_index)
+                self._own_adjacency('adj_list', source).remove(e_index)
 
             # print('target: ', target)
             # print('self.in_adj_list', self.in_adj_list)
             if target in self.nodes:
-                self.in_adj_list[target].remove(e_index)
+                self._own_adjacency('in_adj_list', target).remove(e_index)
             # change edge types
             edge_type = edge['properties']['type']
             self.edge_types[edge_type] -= 1
@@ -640,12 +841,12 @@ class BuiltinDataset:
                 del self.edge_types[edge_type]
             # remove the edge
             self.edges[e_index] = None  # TODO ask?????
+            self._invalidate_temporal_index()
             # remember the action
             action = {'action': edge_delete_action,
                       'edge': {'e_index': e_index, 'source': source, 'target': target},
                       'properties': properties}
-            self.recent_changes.append(action)
-            self.forget_changes()
+            self._record_change(action)
             return {'success': 1, 'message': 'edge deleted successfully!'}
         else:
             if source is None or target is None:
@@ -655,9 +856,9 @@ class BuiltinDataset:
                 properties = copy.deepcopy(self.edges[e_index]['properties'])
                 # remove from adj lists
                 if source in self.nodes:
-                    self.adj_list[source].remove(e_index)
+                    self._own_adjacency('adj_list', source).remove(e_index)
                 if target in self.nodes:
-                    self.in_adj_list[target].remove(e_index)
+                    self._own_adjacency('in_adj_list', target).remove(e_index)
                 # change edge types
                 edge_type = self.edges[e_index]['properties']['type']
                 self.edge_types[edge_type] -= 1
@@ -665,16 +866,17 @@ class BuiltinDataset:
                     del self.edge_types[edge_type]
                 # remove the edge
                 self.edges[e_index] = None
+                self._invalidate_temporal_index()
                 # remember action
                 action = {'action': edge_delete_action,
                           'edge': {'e_index': e_index, 'source': source, 'target': target},
                           'properties': properties}
-                self.recent_changes.append(action)
-                self.forget_changes()
+                self._record_change(action)
                 return {'success': 1, 'message': 'edge deleted successfully!'}
             else:
                 return {'success': 0, 'message': 'edge does not exist!'}
 
+    @_writer
     def delete_edges(self, deleted_edges, is_indexes=True):
         """
         delete a list of edges from a network
@@ -699,6 +901,7 @@ class BuiltinDataset:
                     errors.append(result_temp)
         return errors
 
+    @_writer
     def delete_a_node(self, node):
         """
         delete the node by node id
@@ -725,13 +928,13 @@ class BuiltinDataset:
         # remember the action
         properties = copy.deepcopy(self.nodes[node])
         action = {'action': node_delete_action, 'node': node, 'properties': properties}
-        self.recent_changes.append(action)
-        self.forget_changes()
+        self._record_change(action)
         # delete the node
         del self.nodes[node]
 
         return {'success': 1, 'message': 'node deleted successfully!'}
 
+    @_writer
     def delete_nodes(self, nodes):
         """
         delete a list of nodes and their adjacent edges from a network
@@ -750,6 +953,55 @@ class BuiltinDataset:
         # self.print_dataset()
         # print('*******************')
 
+    @_writer
+    def rename_node(self, node, new_node, properties=None):
+        """
+        change the id of a node, in its edges too
+        :param node:
+        :param new_node: new id of the node
+        :param properties: new properties of the node, its current ones if None
+        :return:
+        """
+        if node not in self.nodes:
+            return {'success': 0, 'message': 'node not found!'}
+        if new_node in self.nodes:
+            return {'success': 0, 'message': 'node already exists!'}
+        pre_properties = self.nodes.pop(node)
+        if properties is None:
+            properties = pre_properties
+        if properties is not None and properties.get('id') == node:
+            properties = dict(properties, id=new_node)
+        self.nodes[new_node] = properties
+        pre_type = pre_properties.get('type') if pre_properties is not None else None
+        node_type = properties.get('type') if properties is not None else None
+        if pre_type != node_type:
+            if pre_type is not None:
+                self.node_types[pre_type] -= 1
+                if self.node_types[pre_type] == 0:
+                    del self.node_types[pre_type]
+            if node_type is not None:
+                self.node_types[node_type] = self.node_types.get(node_type, 0) + 1
+        for name, end in (('adj_list', 'source'), ('in_adj_list', 'target')):
+            adj_list = getattr(self, name)
+            if node in adj_list:
+                adj_list[new_node] = adj_list.pop(node)
+                for e_index in adj_list[new_node]:
+                    self._own_edge(e_index)[end] = new_node
+        if self._owned is not None:
+            # the elements keep whether a snapshot may share them under the new id
+            for name in ('nodes', 'adj_list', 'in_adj_list'):
+                owned = self._owned[name]
+                if node in owned or (name == 'nodes' and properties is not pre_properties):
+                    owned.add(new_node)
+                else:
+                    owned.discard(new_node)
+                owned.discard(node)
+        action = {'action': node_rename_action, 'node': node, 'new_node': new_node,
+                  'pre_properties': copy.deepcopy(pre_properties)}
+        self._record_change(action)
+        return {'success': 1, 'message': 'node renamed successfully!'}
+
+    @_writer
     def save_nodes(self, nodes, params=None):
         """
         add or update information for a list of nodes in a network
@@ -769,6 +1021,7 @@ class BuiltinDataset:
                 errors.append(result_temp)
         return errors
 
+    @_writer
     def save_edges(self, edges, params=None):
         """
         create or update information for a list of edges in a network
@@ -858,6 +1111,32 @@ class BuiltinDataset:
 
         return graph
 
+    def get_statistics(self, sample_size=100):
+        """
+        size of the dataset
+        :param sample_size: number of nodes and of edges whose size is measured to estimate the memory
+        :return: dictionary, in the following format
+            {
+                'nodes': number of nodes
+                'edges': number of edges
+                'memory': estimated number of bytes of the nodes, the edges and the adjacency lists
+            }
+        """
+        edges = [e for e in self.edges if e is not None]
+        memory = sys.getsizeof(self.nodes) + sys.getsizeof(self.edges) + sys.getsizeof(self.adj_list) + \
+            sys.getsizeof(self.in_adj_list)
+        if len(self.nodes) > 0:
+            sample = list(itertools.islice(self.nodes.items(), sample_size))
+            memory += len(self.nodes) * sum(helpers.object_size(item) for item in sample) // len(sample)
+        if len(edges) > 0:
+            sample = edges[::max(1, len(edges) // sample_size)]
+            memory += len(edges) * sum(helpers.object_size(e) for e in sample) // len(sample)
+        # a list of edge indices per node in each direction, whose items point to the same int of each edge
+        for adj_list in (self.adj_list, self.in_adj_list):
+            memory += len(adj_list) * sys.getsizeof([]) + len(self.edges) * 8
+        memory += len(self.edges) * sys.getsizeof(len(self.edges))
+        return {'nodes': len(self.nodes), 'edges': len(edges), 'memory': memory}
+
     def print_dataset(self):
         print('nodes: ', self.nodes)
         print('edges: ', self.edges)
@@ -868,6 +1147,70 @@ class BuiltinDataset:
         print('actions: ', self.recent_changes)
 
 
+class DatasetSnapshot(BuiltinDataset):
+    """
+    read-only version of a dataset, sharing the nodes, the edges and the adjacency lists of the dataset when it was
+    taken, see `BuiltinDataset.snapshot`. it is pinned by every call of `snapshot` and must be released as many times,
+    it cannot be read anymore once released
+    """
+
+    def __init__(self, dataset):
+        BuiltinDataset.__init__(self, None, from_file=False)
+        self.name = dataset.name
+        self.nodes = dataset.nodes
+        self.edges = dataset.edges
+        self.adj_list = dataset.adj_list
+        self.in_adj_list = dataset.in_adj_list
+        self.node_types = dataset.node_types
+        self.edge_types = dataset.edge_types
+        self.recent_changes = list(dataset.recent_changes)
+        self.meta_info = dataset.meta_info
+        self._temporal_index = dataset._temporal_index
+        self.uid = dataset.uid
+        self.version = dataset.version
+        self.pins = 0
+        self._dataset = dataset
+
+    def snapshot(self):
+        with self._dataset._write_lock:
+            self.pins += 1
+            return self
+
+    def get_temporal_index(self):
+        if self._temporal_index is None:
+            self._temporal_index = TemporalIndex(self.edges)
+            with self._dataset._write_lock:
+                # kept by the dataset for the next snapshots, unless it was changed meanwhile
+                if self._dataset.version == self.version and self._dataset._temporal_index is None:
+                    self._dataset._temporal_index = self._temporal_index
+        return self._temporal_index
+
+    def release(self):
+        """
+        unpin the snapshot, which drops its references to the elements once it is not pinned anymore, for the
+        versions of the elements changed since to be reclaimed
+        :return:
+        """
+        with self._dataset._write_lock:
+            self.pins -= 1
+            if self.pins > 0:
+                return
+            if self._dataset._shared_snapshot is self:
+                # the dataset can change its containers in place again
+                self._dataset._shared_snapshot = None
+        self.nodes = self.edges = self.adj_list = self.in_adj_list = None
+        self.node_types = self.edge_types = self._temporal_index = None
+
+    def _prepare_write(self):
+        raise ReadOnlySnapshotError('snapshot of version %d of a dataset cannot be changed' % self.version)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.release()
+
+
 #####################################
 active_element_default_values = {
     'label': 'not_defined',
@@ -1976,6 +2319,7 @@ class ActiveNetwork(BuiltinDataset):
             print('task {} is not supported', task_id)
 
     #################################
+    @instrumentation.traced()
     def get_active_edges(self, no_hidden_edges=True):
         """
         get list of edges
@@ -1994,6 +2338,19 @@ class ActiveNetwork(BuiltinDataset):
             edges = [self.edges[j] for j in self.active_edges]
             return edges
 
+    def get_community_membership(self):
+        """
+        get communities of active nodes assigned by community detection
+        :return: dictionary, membership[u] is the community of node u, nodes without community are left out
+        """
+        membership = {}
+        for node in self.active_nodes:
+            element = self.elements[self.active_nodes[node]['element_index']]
+            community = element['data'].get('community', active_element_default_values['community'])
+            if community != active_element_default_values['community']:
+                membership[node] = community
+        return membership
+
     def compare_tasks(self, task):
         # TODO: to check more on parameters
 
@@ -2012,6 +2369,7 @@ class ActiveNetwork(BuiltinDataset):
                         return False
         return True
 
+    @instrumentation.traced()
     def apply_analysis(self, task_id, method, params, get_result=False, add_default_params=True):
         """
         perform analysis on the active network and update the according properties of elements
@@ -2028,6 +2386,11 @@ class ActiveNetwork(BuiltinDataset):
         if add_default_params:
             if task_id == 'link_prediction':
                 params['sources'] = list(self.selected_nodes)
+                # communities found by the last community detection, so that community based predictors
+                # do not have to cluster the network again
+                membership = self.get_community_membership()
+                if len(membership) > 0:
+                    params['membership'] = membership
 
         options = {'method': method, 'parameters': params}
 
@@ -2047,6 +2410,15 @@ class ActiveNetwork(BuiltinDataset):
             # print(result['message'])
             return
         self.last_analysis = {'task_id': task['task_id'], 'options': task['options']}
+        self._update_elements_with_result(task_id, result)
+
+    @instrumentation.traced('update_elements')
+    def _update_elements_with_result(self, task_id, result):
+        """
+        update the properties of the active elements with the result of an analysis task
+        :param task_id: id of the analysis task
+        :param result: result of `InMemoryAnalyzer.perform_analysis`
+        """
         #################################
         if task_id == 'social_influence_analysis':
             # erase previous result
@@ -2195,6 +2567,7 @@ class ActiveNetwork(BuiltinDataset):
         except Exception as e:
             return e
 
+    @instrumentation.traced()
     def serialize_network(self):
         """
         serialize the whole network into a byte array
@@ -2279,6 +2652,7 @@ class ActiveNetwork(BuiltinDataset):
         # except Exception as e:
         #    return {'success': 0, 'exception': e}
 
+    @instrumentation.traced()
     def serialize_network_new_format(self):
         """
         serialize the whole network into a byte array
@@ -2318,9 +2692,12 @@ class ActiveNetwork(BuiltinDataset):
         # except Exception as e:
         #    return {'success': 0, 'exception': e}
 
+    @instrumentation.traced()
     def load_from_file(self, path_2_data):
         try:
             # reset the current containers
+            self.uid = uuid.uuid4().hex
+            self.version = 0
             self.nodes = {}
             self.edges = []
             self.adj_list = {}
@@ -2405,6 +2782,7 @@ class ActiveNetwork(BuiltinDataset):
         except Exception as e:
             return e
 
+    @instrumentation.traced()
     def deserialize_network(self, uploaded_file, initialize=True):
         """
 
@@ -2824,6 +3202,69 @@ class ActiveNetwork(BuiltinDataset):
         self.toggle_node_selection(new_node)
 
 
+class BuiltinDatasetBuilder:
+    """
+    builds a dataset from the content of a file while it is received, chunk by chunk: the lines of a file in the old
+    format (one JSON object per line) are indexed as soon as they are complete. files in the new (node-link JSON)
+    format can only be parsed as a whole, they are read from disk by `finish`
+    """
+
+    def __init__(self):
+        self.dataset = BuiltinDataset(None, from_file=False)
+        self.streaming = None  # unknown until the first bytes of the file
+        self.error = None
+        self._pending = b''
+
+    def feed(self, chunk):
+        """
+        index the lines completed by a chunk of the file
+        :param chunk: bytes, next part of the file
+        """
+        if self.streaming is False:
+            return
+        data = self._pending + chunk
+        if self.streaming is None:
+            if len(data) < 2:
+                self._pending = data
+                return
+            # same test of the format as `BuiltinDataset._load_file`
+            self.streaming = not data.startswith(b'{\n')
+            if not self.streaming:
+                self._pending = b''
+                return
+        lines = data.split(b'\n')
+        self._pending = lines.pop()
+        try:
+            for line in lines:
+                self._index_line(line)
+        except Exception as e:
+            # the rest of the file is ignored, the error is raised by `finish`
+            self.error = e
+            self.streaming = False
+
+    def _index_line(self, line):
+        line = line.strip()
+        if len(line) == 0 or line.startswith(b'#'):
+            return
+        self.dataset._index_line_object(json.loads(line))
+
+    def finish(self, path_2_data):
+        """
+        index the last line, or load the file if it could not be read while received
+        :param path_2_data: path to the whole file
+        :return: the dataset
+        """
+        if self.error is not None:
+            raise self.error
+        if self.streaming:
+            self._index_line(self._pending)
+            self._pending = b''
+        else:
+            with instrumentation.span('load_dataset', uploaded=False):
+                self.dataset._load_file(path_2_data)
+        return self.dataset
+
+
 class BuiltinDatasetsManager(DataManager):
     """
     class for managing builtin datasets
@@ -2860,12 +3301,13 @@ class BuiltinDatasetsManager(DataManager):
             self.add_dataset('rhodes_bombing', 'Rhodes Bombing',
                              '%s/datasets/preprocessed/rhodes_bombing.json' % path2root)
 
-    def add_dataset(self, datset_id, name, path_2_data, settings=None, uploaded=False, from_file=True):
+    def add_dataset(self, datset_id, name, path_2_data, settings=None, uploaded=False, from_file=True, dataset=None):
         """
         To add a dataset from file
         :param datset_id:
         :param name:
         :param settings: dict of dataset settings
+        :param dataset: BuiltinDataset already loaded from path_2_data, e.g. by a `BuiltinDatasetBuilder`
         :param path_2_data: file containing the dataset, each line is a JSON object about either a node or an edge
             node object is in the following format:
             {
@@ -2899,7 +3341,8 @@ class BuiltinDatasetsManager(DataManager):
         try:
             if datset_id in self.datasets:
                 return {'success': 0, 'message': 'dataset_id is already existed'}
-            dataset = BuiltinDataset(path_2_data, uploaded, from_file)
+            if dataset is None:
+                dataset = BuiltinDataset(path_2_data, uploaded, from_file)
             self.datasets[datset_id] = {
                 'name': name,
                 'data': dataset,
@@ -2913,6 +3356,13 @@ class BuiltinDatasetsManager(DataManager):
             print(e)
             return {'success': 0, 'message': 'there should be some error in IO'}
 
+    def get_dataset_statistics(self):
+        """
+        size of the loaded datasets
+        :return: dictionary, keys are datasets' id, values are in the format of `BuiltinDataset.get_statistics`
+        """
+        return {dataset_id: dataset['data'].get_statistics() for dataset_id, dataset in list(self.datasets.items())}
+
     def create_network(self, network_id, name, nodes, edges, settings=None):
         """
         create a network from node and edge lists
@@ -2991,9 +3441,10 @@ class BuiltinDatasetsManager(DataManager):
                 not_found.append(g)
         return {'found': found, 'not_found': not_found}
 
-    def get_network(self, network, node_ids=None, params=None):
+    def get_network(self, network, node_ids=None, params=None, time_window=None):
         if network in self.datasets:
-            return self.datasets[network]['data'].get_network(node_ids=node_ids, params=params)
+            return self.datasets[network]['data'].get_network(node_ids=node_ids, params=params,
+                                                              time_window=time_window)
         else:
             return {'edges': [], 'nodes': []}
 
@@ -3003,9 +3454,10 @@ class BuiltinDatasetsManager(DataManager):
         else:
             return {'found': [], 'not_found': node_ids}
 
-    def get_neighbors(self, node_ids, network, params=None):
+    def get_neighbors(self, node_ids, network, params=None, time_window=None):
         if network in self.datasets:
-            return self.datasets[network]['data'].get_neighbors(node_ids=node_ids, params=params)
+            return self.datasets[network]['data'].get_neighbors(node_ids=node_ids, params=params,
+                                                                time_window=time_window)
         else:
             return {'found': [], 'not_found': node_ids}
 
@@ -3015,6 +3467,13 @@ class BuiltinDatasetsManager(DataManager):
         else:
             return {'found': [], 'not_found': node_ids}
 
+    def get_network_version(self, network):
+        if network in self.datasets:
+            dataset = self.datasets[network]['data']
+            return '{}-{}'.format(dataset.uid, dataset.version)
+        else:
+            return None
+
     def save_nodes(self, nodes, network, params=None):
         if network in self.datasets:
             return self.datasets[network]['data'].save_nodes(nodes=nodes, params=params)
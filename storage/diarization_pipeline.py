@@ -0,0 +1,446 @@
+"""
+=================================== LICENSE ==================================
+Copyright (c) 2021, Consortium Board ROXANNE
+All rights reserved.
+
+Redistribution and use in source and binary forms, with or without
+modification, are permitted provided that the following conditions are met:
+
+Redistributions of source code must retain the above copyright
+notice, this list of conditions and the following disclaimer.
+
+Redistributions in binary form must reproduce the above copyright
+notice, this list of conditions and the following disclaimer in the
+documentation and/or other materials provided with the distribution.
+
+Neither the name of the ROXANNE nor the
+names of its contributors may be used to endorse or promote products
+derived from this software without specific prior written permission.
+
+THIS SOFTWARE IS PROVIDED BY CONSORTIUM BOARD ROXANNE ``AS IS'' AND ANY
+EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+DISCLAIMED. IN NO EVENT SHALL CONSORTIUM BOARD TENCOMPETENCE BE LIABLE FOR ANY
+DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+(INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+(INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+==============================================================================
+"""
+# driver of the VBx x-vector pipeline (storage/kit/VBx) over many recordings: fbank features and x-vectors are
+# computed by a pool of processes, cached by audio content hash, and turned into the WP5 voiceprint matrix
+
+import hashlib
+import os
+import sys
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import scipy.linalg as spl
+from scipy.special import softmax
+
+tokens = os.path.abspath(__file__).split('/')
+path2root = '/'.join(tokens[:-2])
+if path2root not in sys.path:
+    sys.path.append(path2root)
+
+from storage.kit.VBx import features, kaldi_io, diarization_lib
+
+VBX_FOLDER = os.path.join(path2root, 'storage', 'kit', 'VBx')
+
+# feature extraction settings of compute_fbanks_cmn.py
+SAMPLE_RATE = 16000
+NOVERLAP = 240
+WINLEN = 400
+LC = 150
+RC = 149
+SUBSEGMENT_LENGTH = 150  # 1.5 s window
+SUBSEGMENT_SHIFT = 25  # 0.25 s shift
+MIN_SUBSEGMENT_LENGTH = 10
+MIN_MODEL_INPUT = 25  # shorter subsegments are edge padded, as in extract.py
+
+_window = features.povey_window(WINLEN)
+_fbank_mx = features.mel_fbank_mx(WINLEN, SAMPLE_RATE, NUMCHANS=40, LOFREQ=20.0, HIFREQ=7600, htk_bug=False)
+
+# x-vector extractor of the worker process, loaded on its first cache miss
+_models = {}
+
+
+def audio_digest(path=None, signal=None, samplerate=None, vad=None):
+    """
+    content hash of a recording, used as its cache key: two copies of the same audio share their features
+    :param path: path of an audio file, hashed byte by byte
+    :param signal: alternatively, the samples of the recording
+    :param samplerate: sampling rate of `signal`
+    :param vad: optional list of (start, end) speech segments in seconds, part of the key
+    :return: hexadecimal sha1
+    """
+    digest = hashlib.sha1()
+    if path is not None:
+        with open(path, 'rb') as audio_file:
+            for block in iter(lambda: audio_file.read(1 << 20), b''):
+                digest.update(block)
+    else:
+        digest.update(np.ascontiguousarray(signal).tobytes())
+        digest.update(str(samplerate).encode())
+    if vad is not None:
+        digest.update(np.asarray(vad, dtype=np.float64).tobytes())
+    return digest.hexdigest()
+
+
+def file_digest(path):
+    """
+    :param path: path of a model file
+    :return: hexadecimal sha1 of the file content
+    """
+    return audio_digest(path=path)
+
+
+def _atomic_save(path, save):
+    # write next to the destination then rename, so that concurrent workers never read a partial file
+    folder = os.path.dirname(path)
+    os.makedirs(folder, exist_ok=True)
+    fd, temp_path = tempfile.mkstemp(dir=folder, suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as temp_file:
+            save(temp_file)
+        os.replace(temp_path, path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+
+def compute_features(signal, samplerate, vad=None, seed=0):
+    """
+    cmn fbank features of the speech segments of a recording, cut into the subsegments x-vectors are extracted
+    from, as done by compute_fbanks_cmn.py
+    :param signal: samples of the recording in [-1, 1]
+    :param samplerate: must be 16 kHz
+    :param vad: list of (start, end) speech segments in seconds, the whole recording if None
+    :param seed: seed of the dither, so that the features of a recording do not depend on the process computing them
+    :return: list of float64 arrays (num_frames, 40), one per subsegment
+    """
+    if samplerate != SAMPLE_RATE:
+        raise ValueError('recordings must be sampled at %d Hz, got %d Hz' % (SAMPLE_RATE, samplerate))
+    signal = np.asarray(signal)
+    if signal.ndim > 1:
+        signal = signal[:, 0]
+    state = np.random.get_state()
+    np.random.seed(seed)
+    try:
+        signal = features.add_dither((signal * 2 ** (samplerate / 1000 - 1)).astype(int))
+    finally:
+        np.random.set_state(state)
+    if vad is None:
+        labs = np.array([[0, len(signal)]])
+    else:
+        labs = (np.asarray(vad, dtype=np.float64).reshape(-1, 2) * SAMPLE_RATE).astype(int)
+
+    subsegments = []
+    for lab_start, lab_end in labs:
+        seg = signal[lab_start:lab_end]
+        if len(seg) < WINLEN:
+            continue
+        seg = np.r_[seg[NOVERLAP // 2 - 1::-1], seg, seg[-1:-WINLEN // 2 - 1:-1]]  # mirror initial and final samples
+        fea = features.fbank_htk(seg, _window, NOVERLAP, _fbank_mx, USEPOWER=True, ZMEANSOURCE=True)
+        fea = features.cmvn_floating_kaldi(fea, LC, RC, norm_vars=False)
+        slen = len(fea)
+        start = -SUBSEGMENT_SHIFT
+        for start in range(0, slen - SUBSEGMENT_LENGTH, SUBSEGMENT_SHIFT):
+            subsegments.append(fea[start:start + SUBSEGMENT_LENGTH])
+        if slen - start - SUBSEGMENT_SHIFT > MIN_SUBSEGMENT_LENGTH:
+            subsegments.append(fea[start + SUBSEGMENT_SHIFT:slen])
+    return subsegments
+
+
+def _load_model(model_path, num_threads):
+    if model_path not in _models:
+        import torch
+        from storage.kit.VBx.tdnn_model import load_kaldi_model
+        torch.set_num_threads(num_threads)
+        model = load_kaldi_model(model_path).double()
+        model.eval()
+        _models[model_path] = model
+    return _models[model_path]
+
+
+def extract_xvectors(subsegments, model, batch_size=64):
+    """
+    x-vectors of subsegments, the forward passes are batched over subsegments of the same length
+    :param subsegments: list of feature arrays (num_frames, 40)
+    :param model: TDNN of storage/kit/VBx/tdnn_model.py
+    :param batch_size: maximum number of subsegments per forward pass
+    :return: float64 array (len(subsegments), 512)
+    """
+    import torch
+    padded = []
+    for fea in subsegments:
+        if len(fea) < MIN_MODEL_INPUT:
+            left_pad = (MIN_MODEL_INPUT - len(fea)) // 2
+            fea = np.pad(fea, ((left_pad, MIN_MODEL_INPUT - len(fea) - left_pad), (0, 0)), 'edge')
+        padded.append(fea)
+    xvectors = np.zeros((len(padded), 512), dtype=np.float64)
+    lengths = np.array([len(fea) for fea in padded], dtype=np.int64)
+    with torch.no_grad():
+        for length in np.unique(lengths):
+            indices = np.flatnonzero(lengths == length)
+            for start in range(0, len(indices), batch_size):
+                batch = indices[start:start + batch_size]
+                data = torch.from_numpy(np.stack([padded[i] for i in batch]).transpose(0, 2, 1)).double()
+                _, embedding_a, _ = model(data)
+                xvectors[batch] = embedding_a.numpy()
+    return xvectors
+
+
+def _process_recording(task):
+    """
+    worker side: features and x-vectors of one recording, read from the cache when the audio was seen before
+    :param task: dictionary with 'path' (or 'signal' and 'samplerate'), 'vad', 'cache_dir', 'model_path',
+                 'model_key', 'batch_size' and 'num_threads'
+    :return: (digest, x-vectors, dictionary of cache hits)
+    """
+    digest = audio_digest(task.get('path'), task.get('signal'), task.get('samplerate'), task.get('vad'))
+    cache_dir = task['cache_dir']
+    hits = {'xvectors': False, 'features': False}
+    xvector_path = None
+    if cache_dir:
+        xvector_path = os.path.join(cache_dir, 'xvectors', '%s_%s.npy' % (digest, task['model_key']))
+        if os.path.exists(xvector_path):
+            hits['xvectors'] = True
+            return digest, np.load(xvector_path), hits
+
+    subsegments = None
+    feature_path = os.path.join(cache_dir, 'features', digest + '.npz') if cache_dir else None
+    if feature_path and os.path.exists(feature_path):
+        with np.load(feature_path) as cached:
+            offsets = cached['offsets']
+            subsegments = np.split(cached['frames'], offsets[1:-1]) if len(offsets) > 1 else []
+        hits['features'] = True
+    if subsegments is None:
+        if task.get('path') is not None:
+            import soundfile as sf
+            signal, samplerate = sf.read(task['path'])
+        else:
+            signal, samplerate = task['signal'], task['samplerate']
+        subsegments = compute_features(signal, samplerate, task.get('vad'), seed=int(digest[:8], 16))
+        if feature_path:
+            offsets = np.cumsum([0] + [len(fea) for fea in subsegments])
+            frames = np.concatenate(subsegments) if subsegments else np.zeros((0, 40))
+            _atomic_save(feature_path, lambda f: np.savez(f, frames=frames, offsets=offsets))
+
+    if subsegments:
+        model = _load_model(task['model_path'], task['num_threads'])
+        xvectors = extract_xvectors(subsegments, model, task['batch_size'])
+    else:
+        xvectors = np.zeros((0, 512))
+    if xvector_path:
+        _atomic_save(xvector_path, lambda f: np.save(f, xvectors))
+    return digest, xvectors, hits
+
+
+class DiarizationPipeline:
+    """
+    x-vector extraction, per channel diarization and voiceprint scoring of recordings:
+    - recordings are processed independently by a pool of processes, each one running the TDNN on a single thread,
+      so that the throughput grows with the number of cores
+    - fbank features and x-vectors are cached in `cache_dir` by sha1 of the audio (and of the model for x-vectors)
+    - channel voiceprints are compared with the PLDA model, the scores give WP5's voiceprintsMatrix
+    """
+
+    def __init__(self, model_path, cache_dir=None, workers=None, batch_size=64,
+                 mean_vec_file=os.path.join(VBX_FOLDER, 'mean.vec'),
+                 tran_mat_file=os.path.join(VBX_FOLDER, 'transform.mat'),
+                 plda_file=os.path.join(VBX_FOLDER, 'plda_voxceleb'),
+                 plda_adapt_file=os.path.join(VBX_FOLDER, 'plda_dihard'),
+                 alpha=0.55, threshold=0.0, target_energy=0.3, diarize=True, use_vb=False, init_smoothing=5.0,
+                 lda_dim=220, Fa=0.4, Fb=11, loop_prob=0.8):
+        """
+        :param model_path: x-vector extractor in Kaldi's nnet3 text format (see tdnn_model.load_kaldi_model)
+        :param cache_dir: folder of the feature and x-vector cache, no caching if None
+        :param workers: number of processes, all cpus if None
+        :param batch_size: maximum number of subsegments per TDNN forward pass
+        :param mean_vec_file, tran_mat_file: x-vector centering vector and whitening transformation
+        :param plda_file, plda_adapt_file, alpha: PLDA models interpolated with weight alpha
+        :param threshold, target_energy: AHC parameters (see diarization_PLDAadapt_AHCxvec_BHMMxvec.py)
+        :param diarize: keep the x-vectors of the dominant speaker of each channel only
+        :param use_vb: refine AHC with VB-HMM (requires numexpr)
+        :param init_smoothing, lda_dim, Fa, Fb, loop_prob: VB-HMM parameters
+        """
+        self.model_path = model_path
+        self.model_key = file_digest(model_path)[:16] if model_path and os.path.exists(model_path) else 'model'
+        self.cache_dir = cache_dir
+        self.workers = max(1, workers or os.cpu_count() or 1)
+        self.batch_size = batch_size
+        self.threshold = threshold
+        self.target_energy = target_energy
+        self.diarize = diarize
+        self.use_vb = use_vb
+        self.init_smoothing = init_smoothing
+        self.lda_dim = lda_dim
+        self.Fa = Fa
+        self.Fb = Fb
+        self.loop_prob = loop_prob
+
+        self.glob_tran = kaldi_io.read_mat(tran_mat_file)
+        self.glob_mean = kaldi_io.read_vec_flt(mean_vec_file)
+        self.plda_mu, self.plda_tr, self.plda_psi = self._interpolate_plda(
+            kaldi_io.read_plda(plda_file), kaldi_io.read_plda(plda_adapt_file), alpha)
+
+    @staticmethod
+    def _interpolate_plda(plda_train, plda_adapt, alpha):
+        # interpolation of across-class, within-class covariances and means, as in the VBx recipe
+        plda_train_mu, plda_train_tr, plda_train_psi = plda_train
+        plda_adapt_mu, plda_adapt_tr, plda_adapt_psi = plda_adapt
+        plda_mu = alpha * plda_train_mu + (1.0 - alpha) * plda_adapt_mu
+        W_train = np.linalg.inv(plda_train_tr.T.dot(plda_train_tr))
+        B_train = np.linalg.inv((plda_train_tr.T / plda_train_psi).dot(plda_train_tr))
+        W_adapt = np.linalg.inv(plda_adapt_tr.T.dot(plda_adapt_tr))
+        B_adapt = np.linalg.inv((plda_adapt_tr.T / plda_adapt_psi).dot(plda_adapt_tr))
+        W = alpha * W_train + (1.0 - alpha) * W_adapt
+        B = alpha * B_train + (1.0 - alpha) * B_adapt
+        acvar, wccn = spl.eigh(B, W)
+        return plda_mu, wccn.T[::-1], acvar[::-1]
+
+    def extract_xvectors(self, recordings):
+        """
+        :param recordings: list of dictionaries with 'path' (or 'signal' and 'samplerate') and optionally 'vad'
+        :return: (x-vectors, statistics): list of float64 arrays (num_subsegments, 512) in the order of recordings,
+                 and the counts of recordings, x-vector cache hits and feature cache hits
+        """
+        tasks = [dict(recording, cache_dir=self.cache_dir, model_path=self.model_path, model_key=self.model_key,
+                      batch_size=self.batch_size, num_threads=1) for recording in recordings]
+        # longest recordings first, so that no process is left with a long one at the end
+        order = sorted(range(len(tasks)), key=lambda i: -self._task_size(tasks[i]))
+        results = [None] * len(tasks)
+        if self.workers == 1 or len(tasks) <= 1:
+            for i in order:
+                tasks[i]['num_threads'] = self.workers
+                results[i] = _process_recording(tasks[i])
+        else:
+            with ProcessPoolExecutor(max_workers=self.workers) as executor:
+                for i, result in zip(order, executor.map(_process_recording, [tasks[i] for i in order])):
+                    results[i] = result
+        statistics = {
+            'recordings': len(results),
+            'xvector_cache_hits': sum(hits['xvectors'] for _, _, hits in results),
+            'feature_cache_hits': sum(hits['features'] for _, _, hits in results)
+        }
+        return [xvectors for _, xvectors, _ in results], statistics
+
+    @staticmethod
+    def _task_size(task):
+        if task.get('path') is not None:
+            return os.path.getsize(task['path']) if os.path.exists(task['path']) else 0
+        return len(task['signal'])
+
+    def normalize(self, xvectors):
+        """
+        Kaldi-like global normalization and length normalization of x-vectors
+        :param xvectors: array (n, 512)
+        :return: array (n, 512)
+        """
+        x = (np.asarray(xvectors, dtype=np.float64) - self.glob_mean).dot(self.glob_tran.T)
+        return x * np.sqrt(x.shape[1] / np.maximum((x ** 2).sum(axis=1), 1e-12))[:, np.newaxis]
+
+    def speaker_labels(self, x):
+        """
+        diarization of the normalized x-vectors of a recording: AHC, optionally refined by VB-HMM
+        :param x: array (n, 512) of normalized x-vectors
+        :return: int array of speaker labels
+        """
+        if len(x) < 2:
+            return np.zeros(len(x), dtype=int)
+        scr_mx = diarization_lib.kaldi_ivector_plda_scoring_dense(
+            (self.plda_mu, self.plda_tr, self.plda_psi), x, target_energy=self.target_energy)
+        thr, _ = diarization_lib.twoGMMcalib_lin(scr_mx.ravel())
+        labels = diarization_lib.AHC(scr_mx, thr + self.threshold)
+        if self.use_vb:
+            from storage.kit.VBx import VB_diarization
+            q_init = np.zeros((len(labels), np.max(labels) + 1))
+            q_init[range(len(labels)), labels] = 1.0
+            q_init = softmax(q_init * self.init_smoothing, axis=1)
+            fea = (x - self.plda_mu).dot(self.plda_tr.T)[:, :self.lda_dim]
+            V = np.diag(np.sqrt(self.plda_psi[:self.lda_dim]))[:, np.newaxis, :]
+            invSigma = np.ones((1, self.lda_dim))
+            q, _, _ = VB_diarization.VB_diarization(
+                fea, np.zeros((1, self.lda_dim)), invSigma, np.array([1.0]), V, pi=None, gamma=q_init,
+                maxSpeakers=q_init.shape[1], maxIters=40,
+                VtinvSigmaV=VB_diarization.precalculate_VtinvSigmaV(V, invSigma), downsample=None,
+                sparsityThr=0.001, epsilon=1e-6, loopProb=self.loop_prob, Fa=self.Fa, Fb=self.Fb)
+            labels = np.unique(q.argmax(1), return_inverse=True)[1]
+        return labels
+
+    def voiceprint(self, xvectors):
+        """
+        voiceprint of a channel: length normalized mean of the x-vectors of its dominant speaker
+        :param xvectors: array (n, 512) of raw x-vectors
+        :return: array (512,), or None for a channel without speech
+        """
+        if len(xvectors) == 0:
+            return None
+        x = self.normalize(xvectors)
+        if self.diarize:
+            labels = self.speaker_labels(x)
+            x = x[labels == np.bincount(labels).argmax()]
+        voiceprint = x.mean(axis=0)
+        return voiceprint * np.sqrt(len(voiceprint) / max((voiceprint ** 2).sum(), 1e-12))
+
+    def score(self, voiceprints, block_size=2048):
+        """
+        PLDA log likelihood ratios between all pairs of voiceprints, computed block by block in LDA space
+        :param voiceprints: array (n, 512) of voiceprints
+        :param block_size: number of rows scored at once
+        :return: generator of (start, scores) blocks, scores being an array (rows, n)
+        """
+        fea = (np.asarray(voiceprints) - self.plda_mu).dot(self.plda_tr.T)
+        for start in range(0, len(fea), block_size):
+            yield start, diarization_lib.PLDA_scoring_in_LDA_space(
+                fea[start:start + block_size], fea, self.plda_psi)
+
+    def voiceprints_matrix(self, channel_ids, voiceprints, top_k=None):
+        """
+        :param channel_ids: list of channel ids
+        :param voiceprints: array (n, 512) of voiceprints
+        :param top_k: keep the k highest scores of each channel (and its self score), all scores if None
+        :return: WP5's voiceprintsMatrix {channel_id: {channel_id: score}}
+        """
+        matrix = {}
+        for start, scores in self.score(voiceprints):
+            for offset, row in enumerate(scores):
+                i = start + offset
+                if top_k is not None and top_k < len(row):
+                    columns = np.argpartition(-row, top_k)[:top_k]
+                    columns = np.union1d(columns, [i])
+                else:
+                    columns = np.arange(len(row))
+                matrix[channel_ids[i]] = {channel_ids[j]: float(row[j]) for j in columns}
+        return matrix
+
+    def wp5_output(self, conversations, audio_dir='', vad=None, top_k=None):
+        """
+        WP5 output of conversations, ready for fft_helpers.parse_wp5_output
+        :param conversations: WP5 conversations, the audio of each channel is read from its 'fileName'
+        :param audio_dir: folder the file names are relative to
+        :param vad: optional dictionary channel id -> list of (start, end) speech segments in seconds
+        :param top_k: see voiceprints_matrix
+        :return: (WP5 output {'conversations': [...], 'voiceprintsMatrix': {...}}, statistics of extract_xvectors)
+        """
+        channel_ids = []
+        recordings = []
+        for conversation in conversations:
+            for channel in conversation['channels']:
+                channel_ids.append(channel['id'])
+                recordings.append({'path': os.path.join(audio_dir, channel['fileName']),
+                                   'vad': vad.get(channel['id']) if vad else None})
+        xvectors, statistics = self.extract_xvectors(recordings)
+        voiceprints = [self.voiceprint(x) for x in xvectors]
+        kept = [i for i, voiceprint in enumerate(voiceprints) if voiceprint is not None]
+        statistics['channels_without_speech'] = len(voiceprints) - len(kept)
+        matrix = self.voiceprints_matrix([channel_ids[i] for i in kept],
+                                         np.array([voiceprints[i] for i in kept]).reshape(len(kept), -1),
+                                         top_k=top_k)
+        return {'conversations': conversations, 'voiceprintsMatrix': matrix}, statistics
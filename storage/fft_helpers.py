@@ -37,7 +37,9 @@ import networkx as nx
 import numpy as np
 
 import os
+import pickle
 import sys
+import tempfile
 
 tokens = os.path.abspath(__file__).split('/')
 path2root = '/'.join(tokens[:-2])
@@ -48,7 +50,7 @@ print('fft_helpters: path2root = ', path2root)
 
 if path2root not in sys.path:
     sys.path.append(path2root)
-from storage.kit.VBx import diarization_lib
+from storage import voiceprint_clustering
 from storage.builtin_datasets import BuiltinDataset
 
 def _generate_channels_and_index(wp5_outputs):
@@ -66,28 +68,19 @@ def _generate_channels_and_index(wp5_outputs):
     return channels, channel2index
 
 def _cluster_from_voice_prints_matrix(channel2index, wp5_outputs, threhold, calibration):
-    # cluster
-    voiceprintsMatrix = np.zeros((len(channel2index), len(channel2index)))
-    for u, row in wp5_outputs['voiceprintsMatrix'].items():
-        u_index = channel2index[u]
-        for v, s in row.items():
-            v_index = channel2index[v]
-            voiceprintsMatrix[u_index, v_index] = s
-
-    for con in wp5_outputs['conversations']:
-        channel_ids = [channel['id'] for channel in con['channels']]
-        for s in channel_ids:
-            for l in channel_ids:
-                if s != l:
-                    s_index = channel2index[s]
-                    l_index = channel2index[l]
-                    voiceprintsMatrix[s_index, l_index] = -np.inf
+    # cluster: UPGMA on the sparse similarity graph, same labels as diarization_lib.AHC on the dense matrix
+    num_channels = len(channel2index)
+    rows, cols, scores = voiceprint_clustering.voiceprint_scores(channel2index, wp5_outputs['voiceprintsMatrix'])
+    cannot_rows, cannot_cols = voiceprint_clustering.cannot_link_pairs(channel2index, wp5_outputs['conversations'])
 
     if calibration:
-        thr, scr_cal = diarization_lib.twoGMMcalib_lin(voiceprintsMatrix[np.where(np.isfinite(voiceprintsMatrix))])
+        thr = voiceprint_clustering.calibration_threshold(num_channels, rows, cols, scores, cannot_rows, cannot_cols)
     else:
         thr = 0
-    labels = diarization_lib.AHC(voiceprintsMatrix, thr + threhold)
+    first, second, similarity = voiceprint_clustering.similarity_graph(num_channels, rows, cols, scores,
+                                                                       cannot_rows, cannot_cols)
+    labels = voiceprint_clustering.average_linkage_clusters(num_channels, first, second, similarity,
+                                                            thr + threhold)
 
     return labels 
 
@@ -182,8 +175,8 @@ def _generate_edges_aegis(channel2index, labels, wp5_outputs, directed):
             con_date = con['date']
         else:
             con_date = None
-        print(con_date)
-        print(channel_ids)
+        # print(con_date)
+        # print(channel_ids)
         for i in range(len(channel_ids)):
             s = channel_ids[i]
             for j in range(len(channel_ids)):
@@ -200,7 +193,7 @@ def _generate_edges_aegis(channel2index, labels, wp5_outputs, directed):
                             edges[s_cid][l_cid]['weight'] += 1
                             if 'timestamps' in edges[s_cid][l_cid]:
                                 temp_timestamps = edges[s_cid][l_cid]['timestamps']
-                                temp_timestamps = temp_timestamps.append(timestamp_val)
+                                temp_timestamps.append(timestamp_val)
                                 edges[s_cid][l_cid]['timestamps'] = temp_timestamps
                         else:
                             if con_date is not None:
@@ -314,7 +307,7 @@ def _construct_network_aegis(nodes, speaker_edges, phone_number_edges, directed)
 
             nx_graph.add_node(phone_number, type='node', properties=phone_node_properties)
             
-    print(dict_node_phone_number)
+    # print(dict_node_phone_number)
 
     # for node in nx_graph.nodes(data=True):
     #     print(node)
@@ -383,7 +376,7 @@ def _construct_network_aegis(nodes, speaker_edges, phone_number_edges, directed)
                 temp_weight = temp_weight + phone_number_edges[u][v]['weight']
                 nx_graph[temp_edge[0]][temp_edge[1]]['properties']['weight'] = temp_weight
                 temp_timestamps = nx_graph[temp_edge[0]][temp_edge[1]]['properties']['timestamps']
-                temp_timestamps.append(timestamps)
+                temp_timestamps = temp_timestamps + timestamps
                 nx_graph[temp_edge[0]][temp_edge[1]]['properties']['timestamps'] = temp_timestamps
 
     network = []
@@ -403,9 +396,9 @@ def _construct_network_aegis(nodes, speaker_edges, phone_number_edges, directed)
             'properties': edge_data['properties']
         }
         network.append(edge)
-        weight = edge_data['properties']['weight']
-        if weight > 1:
-            print(edge)
+        # weight = edge_data['properties']['weight']
+        # if weight > 1:
+        #     print(edge)
 
 
     # for edge in nx_graph.edges(data=True):
@@ -532,22 +525,22 @@ def parse_wp5_output_for_aegis(wp5_outputs, threhold=50, calibration=False, dire
 
     # cluster
     labels = _cluster_from_voice_prints_matrix(channel2index, wp5_outputs, threhold, calibration)
-    print('labels:', labels)
+    # print('labels:', labels)
 
     # generate nodes
     nodes = _generate_nodes_aegis(channels, channel2index, labels)
-    print("=================nodes==================")
-    print(nodes)
+    # print("=================nodes==================")
+    # print(nodes)
 
     # generate edges:
     # edges = _generate_edges(channel2index, labels, wp5_outputs, directed)
     edges = _generate_edges_aegis(channel2index, labels, wp5_outputs, directed)
-    print("=================edges==================")
-    print(edges)
+    # print("=================edges==================")
+    # print(edges)
 
     phone_number_edges = _generate_phone_number_edges_aegis(wp5_outputs, directed)
-    print("=================phone_number_edges==================")
-    print(phone_number_edges)
+    # print("=================phone_number_edges==================")
+    # print(phone_number_edges)
 
     # construct network
     network = _construct_network_aegis(nodes, edges, phone_number_edges, directed)
@@ -557,6 +550,231 @@ def parse_wp5_output_for_aegis(wp5_outputs, threhold=50, calibration=False, dire
     return network
 
 
+class IncrementalWP5Network(object):
+    """
+    network built from WP5 outputs that arrive in batches, e.g., the conversations of a day.
+    the first batch is parsed as by `parse_wp5_output` (or `parse_wp5_output_for_aegis`), the channels of the
+    following batches are assigned to the existing speaker clusters or to new ones
+    (see `voiceprint_clustering.IncrementalClusters`) and only the edges of the new conversations are added to
+    the constructed dataset, so that the cost of a batch depends on its size and not on the history.
+    every `full_recluster_interval` batches all channels are clustered again and the dataset is rebuilt
+    """
+
+    def __init__(self, threhold=50, calibration=False, directed=False, aegis=False, full_recluster_interval=10):
+        """
+        :param threhold, calibration, directed: see `parse_wp5_output`
+        :param aegis: build the network of `parse_wp5_output_for_aegis`
+        :param full_recluster_interval: number of incremental batches between two full clusterings, None to
+                                        never recluster on its own
+        """
+        self.threhold = threhold
+        self.calibration = calibration
+        self.directed = directed
+        self.aegis = aegis
+        self.full_recluster_interval = full_recluster_interval
+        self.calibrated_threshold = 0
+
+        self.channels = {}
+        self.channel2index = {}
+        self.conversations = []
+        # scores and cannot-link pairs of all batches, kept for the full clusterings
+        self.scores = []
+        self.cannot_links = []
+        self.clusters = voiceprint_clustering.IncrementalClusters()
+        self.num_batches_since_clustering = 0
+
+        self.dataset = dataset_from_wp5_output([])
+        self.edge_indexes = {}
+        self.changed_nodes = set()
+        self.changed_edges = set()
+
+    def add_wp5_output(self, wp5_outputs, recluster=False):
+        """
+        :param wp5_outputs: dictionary converted from WP5's JSON object, conversations whose channels are all
+                            known already are skipped, voiceprint scores may refer to known channels
+        :param recluster: cluster all channels again
+        :return: dictionary with the number of new channels and of new speakers, and whether all channels were
+                 clustered again (speaker ids are then renumbered)
+        """
+        conversations = [con for con in wp5_outputs['conversations']
+                         if any(channel['id'] not in self.channel2index for channel in con['channels'])]
+        new_outputs = {'conversations': conversations}
+        channels, new_channel2index = _generate_channels_and_index(new_outputs)
+        num_old = len(self.channel2index)
+        for channel_id, index in new_channel2index.items():
+            self.channel2index[channel_id] = num_old + index
+        self.channels.update(channels)
+        self.conversations.extend(conversations)
+
+        rows, cols, scores = voiceprint_clustering.voiceprint_scores(self.channel2index,
+                                                                     wp5_outputs['voiceprintsMatrix'])
+        cannot_rows, cannot_cols = voiceprint_clustering.cannot_link_pairs(self.channel2index, conversations)
+        self.scores.append((rows, cols, scores))
+        self.cannot_links.append((cannot_rows, cannot_cols))
+
+        self.changed_nodes = set()
+        self.changed_edges = set()
+        num_speakers = len(self.clusters.sizes)
+        threshold = self.calibrated_threshold + self.threhold
+        if recluster or num_old == 0 or threshold <= 0 or (
+                self.full_recluster_interval is not None and
+                self.num_batches_since_clustering >= self.full_recluster_interval):
+            self.recluster()
+            return {'new_channels': len(channels), 'new_speakers': len(self.clusters.sizes) - num_speakers,
+                    'reclustered': True}
+
+        labels = self.clusters.add_channels(len(channels), rows, cols, scores, cannot_rows, cannot_cols, threshold)
+        self.num_batches_since_clustering += 1
+        self._add_channels_to_speakers(list(new_channel2index), labels)
+        self._add_conversations(new_outputs)
+        self.dataset._invalidate_temporal_index()
+        return {'new_channels': len(channels), 'new_speakers': len(self.clusters.sizes) - num_speakers,
+                'reclustered': False}
+
+    def recluster(self):
+        """
+        cluster all channels and rebuild the dataset
+        """
+        num_channels = len(self.channel2index)
+        rows, cols, scores = [np.concatenate(arrays) for arrays in zip(*self.scores)]
+        cannot_rows, cannot_cols = [np.concatenate(arrays) for arrays in zip(*self.cannot_links)]
+        if self.calibration:
+            self.calibrated_threshold = voiceprint_clustering.calibration_threshold(
+                num_channels, rows, cols, scores, cannot_rows, cannot_cols)
+        first, second, similarity = voiceprint_clustering.similarity_graph(num_channels, rows, cols, scores,
+                                                                           cannot_rows, cannot_cols)
+        labels = voiceprint_clustering.average_linkage_clusters(num_channels, first, second, similarity,
+                                                                self.calibrated_threshold + self.threhold)
+        self.clusters.reset(labels)
+        self.num_batches_since_clustering = 0
+
+        wp5_outputs = {'conversations': self.conversations}
+        nodes = _generate_nodes(self.channels, self.channel2index, labels)
+        if self.aegis:
+            edges = _generate_edges_aegis(self.channel2index, labels, wp5_outputs, self.directed)
+            phone_number_edges = _generate_phone_number_edges_aegis(wp5_outputs, self.directed)
+            network = _construct_network_aegis(nodes, edges, phone_number_edges, self.directed)
+        else:
+            edges = _generate_edges(self.channel2index, labels, wp5_outputs, self.directed)
+            network = _construct_network(nodes, edges)
+        self.dataset = dataset_from_wp5_output(network)
+        self.edge_indexes = {}
+        for e_index, edge in enumerate(self.dataset.edges):
+            self.edge_indexes[self._edge_key(edge['source'], edge['target'])] = e_index
+        self.changed_nodes = set(self.dataset.nodes)
+        self.changed_edges = set(range(len(self.dataset.edges)))
+
+    def _edge_key(self, source, target):
+        # networkx merges both directions of an edge in the undirected aegis network
+        if self.aegis and not self.directed:
+            return frozenset((source, target))
+        return source, target
+
+    def _add_channels_to_speakers(self, channel_ids, labels):
+        for channel_id, c in zip(channel_ids, labels.tolist()):
+            channel_info = self.channels[channel_id]
+            if 'transcription' in channel_info:
+                del channel_info['transcription']  # ignore the transcription in first field test
+            speaker = 'speaker_{}'.format(c)
+            if speaker in self.dataset.nodes:
+                self.dataset.nodes[speaker]['channels'].append(channel_info)
+            else:
+                _add_wp5_element(self.dataset, {'type': 'node', 'id': speaker,
+                                                'properties': {'type': 'cluster', 'channels': [channel_info]}})
+            self.changed_nodes.add(speaker)
+            if self.aegis:
+                number = channel_info['number']
+                channels = self.dataset.nodes[speaker]['channels']
+                if number in self.dataset.nodes:
+                    self.dataset.nodes[number]['channels'] = channels
+                else:
+                    _add_wp5_element(self.dataset, {'type': 'node', 'id': number,
+                                                    'properties': {'type': 'phone_number', 'channels': channels}})
+                self.changed_nodes.add(number)
+
+    def _add_edge(self, source, target, properties):
+        """
+        add an edge, or add its weight and timestamps to the existing one
+        """
+        key = self._edge_key(source, target)
+        if key in self.edge_indexes:
+            e_index = self.edge_indexes[key]
+            edge_properties = self.dataset.edges[e_index]['properties']
+            edge_properties['weight'] += properties['weight']
+            if 'timestamps' in properties:
+                edge_properties['timestamps'] = edge_properties.get('timestamps', []) + properties['timestamps']
+        else:
+            e_index = _add_wp5_element(self.dataset, {'type': 'edge', 'source': source, 'target': target,
+                                                      'properties': properties})
+            self.edge_indexes[key] = e_index
+        self.changed_edges.add(e_index)
+
+    def _add_conversations(self, wp5_outputs):
+        labels = self.clusters.labels
+        if not self.aegis:
+            edges = _generate_edges(self.channel2index, labels, wp5_outputs, self.directed)
+            for u in edges:
+                for v in edges[u]:
+                    properties = {'type': 'conversations', 'weight': edges[u][v]['weight']}
+                    if 'timestamps' in edges[u][v]:
+                        properties['timestamps'] = edges[u][v]['timestamps']
+                    self._add_edge('speaker_{}'.format(u), 'speaker_{}'.format(v), properties)
+            return
+
+        speaker_edges = _generate_edges_aegis(self.channel2index, labels, wp5_outputs, self.directed)
+        for u in speaker_edges:
+            for v in speaker_edges[u]:
+                timestamps = speaker_edges[u][v].get('timestamps', [])
+                u_speaker, v_speaker = 'speaker_{}'.format(u), 'speaker_{}'.format(v)
+                for channel in self.dataset.nodes[u_speaker]['channels']:
+                    self._add_edge(u_speaker, channel['number'],
+                                   {'type': 'calling', 'weight': 1, 'timestamps': list(timestamps)})
+                for channel in self.dataset.nodes[v_speaker]['channels']:
+                    self._add_edge(channel['number'], v_speaker,
+                                   {'type': 'receiving', 'weight': 1, 'timestamps': list(timestamps)})
+
+        phone_number_edges = _generate_phone_number_edges_aegis(wp5_outputs, self.directed)
+        for u in phone_number_edges:
+            for v in phone_number_edges[u]:
+                self._add_edge(u, v, {'type': 'conversations', 'weight': phone_number_edges[u][v]['weight'],
+                                      'timestamps': list(phone_number_edges[u][v].get('timestamps', []))})
+
+    def save(self, path):
+        """
+        pickle the construction state, the file is replaced atomically
+        """
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        handle, temp_path = tempfile.mkstemp(dir=directory, prefix='.tmp-')
+        try:
+            with os.fdopen(handle, 'wb') as state_file:
+                pickle.dump(self, state_file, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(temp_path, path)
+        except BaseException:
+            os.remove(temp_path)
+            raise
+
+    @staticmethod
+    def load(path):
+        with open(path, 'rb') as state_file:
+            return pickle.load(state_file)
+
+    def get_network(self, changed_only=False):
+        """
+        :param changed_only: only the nodes and edges added or updated by the last batch
+        :return: list of nodes and edges in the format of `parse_wp5_output`
+        """
+        nodes = self.changed_nodes if changed_only else self.dataset.nodes
+        e_indexes = sorted(self.changed_edges) if changed_only else range(len(self.dataset.edges))
+        network = [{'type': 'node', 'id': node, 'properties': self.dataset.nodes[node]} for node in nodes]
+        for e_index in e_indexes:
+            edge = self.dataset.edges[e_index]
+            if edge is not None:
+                network.append({'type': 'edge', 'source': edge['source'], 'target': edge['target'],
+                                'properties': edge['properties']})
+        return network
+
+
 def dataset_from_wp5_output(network):
     """
 
@@ -572,47 +790,55 @@ def dataset_from_wp5_output(network):
     dataset.edge_types = {}
     dataset.recent_changes = []
     for element in network:
-        if element['type'] == 'node':
-            node = element['properties']
-            if 'community' in element:
-                node['community'] = element['community']
-                node['community_confidence'] = element['community_confidence']
-            if 'social_influence_score' in element:
-                node['social_influence_score'] = element['social_influence_score']
-                node['normalized_social_influence'] = element['normalized_social_influence']
-            dataset.nodes[element['id']] = node
-            if 'type' in node:
-                node_type = node['type']
-                if node_type in dataset.node_types:
-                    dataset.node_types[node_type] += 1
-                else:
-                    dataset.node_types[node_type] = 1
-
-        elif element['type'] == 'edge':
-            edge = {'source': element['source'], 'target': element['target'],
-                    'observed': True, 'properties': element['properties']}
-            if 'observed' in element:
-                if element['observed'] == 'false':
-                    edge['observed'] = 'false'
-            dataset.edges.append(edge)
-            e_index = len(dataset.edges) - 1
-            source = edge['source']
-            if source in dataset.adj_list:
-                dataset.adj_list[source].append(e_index)
-            else:
-                dataset.adj_list[source] = [e_index]
-            target = edge['target']
-            if target in dataset.in_adj_list:
-                dataset.in_adj_list[target].append(e_index)
-            else:
-                dataset.in_adj_list[target] = [e_index]
+        _add_wp5_element(dataset, element)
+    return dataset
 
-            if 'type' in element['properties']:
-                edge_type = element['properties']['type']
-                if edge_type in dataset.edge_types:
-                    dataset.edge_types[edge_type] += 1
-                else:
-                    dataset.edge_types[edge_type] = 1
+
+def _add_wp5_element(dataset, element):
+    """
+    add a node or an edge of a constructed network to a dataset
+    :return: index of the edge, None for a node
+    """
+    if element['type'] == 'node':
+        node = element['properties']
+        if 'community' in element:
+            node['community'] = element['community']
+            node['community_confidence'] = element['community_confidence']
+        if 'social_influence_score' in element:
+            node['social_influence_score'] = element['social_influence_score']
+            node['normalized_social_influence'] = element['normalized_social_influence']
+        dataset.nodes[element['id']] = node
+        if 'type' in node:
+            node_type = node['type']
+            if node_type in dataset.node_types:
+                dataset.node_types[node_type] += 1
+            else:
+                dataset.node_types[node_type] = 1
+
+    elif element['type'] == 'edge':
+        edge = {'source': element['source'], 'target': element['target'],
+                'observed': True, 'properties': element['properties']}
+        if 'observed' in element:
+            if element['observed'] == 'false':
+                edge['observed'] = 'false'
+        dataset.edges.append(edge)
+        e_index = len(dataset.edges) - 1
+        source = edge['source']
+        if source in dataset.adj_list:
+            dataset.adj_list[source].append(e_index)
         else:
-            continue
-    return dataset
+            dataset.adj_list[source] = [e_index]
+        target = edge['target']
+        if target in dataset.in_adj_list:
+            dataset.in_adj_list[target].append(e_index)
+        else:
+            dataset.in_adj_list[target] = [e_index]
+
+        if 'type' in element['properties']:
+            edge_type = element['properties']['type']
+            if edge_type in dataset.edge_types:
+                dataset.edge_types[edge_type] += 1
+            else:
+                dataset.edge_types[edge_type] = 1
+        return e_index
+    return None
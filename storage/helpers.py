@@ -128,3 +128,20 @@ def old_network_to_new_network(nodes, edges):
         "nodes": updated_nodes,
         "links": updated_edges
     }
+
+
+def object_size(obj):
+    """
+    size in bytes of a JSON-like object (dicts, lists, strings, numbers) and of everything it contains,
+    shared objects are counted each time they are found
+    :param obj: the object
+    :return: number of bytes
+    """
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        for key, value in obj.items():
+            size += object_size(key) + object_size(value)
+    elif isinstance(obj, (list, tuple, set)):
+        for value in obj:
+            size += object_size(value)
+    return size
@@ -0,0 +1,336 @@
+"""
+=================================== LICENSE ==================================
+Copyright (c) 2021, Consortium Board ROXANNE
+All rights reserved.
+
+Redistribution and use in source and binary forms, with or without
+modification, are permitted provided that the following conditions are met:
+
+Redistributions of source code must retain the above copyright
+notice, this list of conditions and the following disclaimer.
+
+Redistributions in binary form must reproduce the above copyright
+notice, this list of conditions and the following disclaimer in the
+documentation and/or other materials provided with the distribution.
+
+Neither the name of the ROXANNE nor the
+names of its contributors may be used to endorse or promote products
+derived from this software without specific prior written permission.
+
+THIS SOFTWARE IS PROVIDED BY CONSORTIUM BOARD ROXANNE ``AS IS'' AND ANY
+EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+DISCLAIMED. IN NO EVENT SHALL CONSORTIUM BOARD TENCOMPETENCE BE LIABLE FOR ANY
+DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+(INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+(INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+==============================================================================
+"""
+# random access to Kaldi ark files: an index of key -> record offset, and memory mapped readers returning numpy views
+# of binary float matrices and vectors, so that fetching an x-vector by key does not scan the ark
+
+import mmap
+import os
+import sys
+
+import numpy as np
+
+tokens = os.path.abspath(__file__).split('/')
+path2root = '/'.join(tokens[:-2])
+if path2root not in sys.path:
+    sys.path.append(path2root)
+
+from storage.kit.VBx import kaldi_io
+
+# kinds of records, the binary float ones are read from the memory map without copy
+FLOAT_MATRIX, DOUBLE_MATRIX, FLOAT_VECTOR, DOUBLE_VECTOR, OTHER_MATRIX, OTHER_VECTOR = range(6)
+_BINARY_HEADERS = {b'FM ': FLOAT_MATRIX, b'DM ': DOUBLE_MATRIX, b'FV ': FLOAT_VECTOR, b'DV ': DOUBLE_VECTOR}
+_DTYPES = {FLOAT_MATRIX: np.float32, DOUBLE_MATRIX: np.float64, FLOAT_VECTOR: np.float32, DOUBLE_VECTOR: np.float64}
+_WHITESPACE = b' \t\n\r'
+
+
+def _open_map(path):
+    with open(path, 'rb') as ark_file:
+        if os.fstat(ark_file.fileno()).st_size == 0:
+            return None
+        return mmap.mmap(ark_file.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+def _parse_record(data, offset, path):
+    """
+    read the header of the record whose value starts at `offset`
+    :return: (kind, rows, cols, data offset, end offset), rows is 1 for vectors
+    """
+    if data[offset:offset + 2] == b'\0B':
+        header = data[offset + 2:offset + 5]
+        if header in _BINARY_HEADERS:
+            kind = _BINARY_HEADERS[header]
+            itemsize = np.dtype(_DTYPES[kind]).itemsize
+            if kind in (FLOAT_MATRIX, DOUBLE_MATRIX):
+                _, rows, _, cols = np.frombuffer(data, dtype='int8,int32,int8,int32', count=1, offset=offset + 5)[0]
+                start = offset + 15
+            else:
+                _, cols = np.frombuffer(data, dtype='int8,int32', count=1, offset=offset + 5)[0]
+                rows, start = 1, offset + 10
+            return kind, int(rows), int(cols), start, start + int(rows) * int(cols) * itemsize
+        if header[:2] == b'CM':
+            # compressed matrices: global header (min, range, rows, cols), then per column headers for 'CM '
+            _, _, rows, cols = np.frombuffer(data, dtype='float32,float32,int32,int32', count=1, offset=offset + 5)[0]
+            size = {b'CM ': int(cols) * 8 + int(rows) * int(cols), b'CM2': 2 * int(rows) * int(cols),
+                    b'CM3': int(rows) * int(cols)}.get(header)
+            if size is None:
+                raise ValueError('unknown compressed matrix format %r in %s' % (header, path))
+            return OTHER_MATRIX, int(rows), int(cols), offset, offset + 21 + size
+    # ascii or sparse records have no fixed size: parse them to find their end
+    with open(path, 'rb') as ark_file:
+        ark_file.seek(offset)
+        if data[offset:offset + 2] == b'\0B' and data[offset + 2:offset + 4] == b'SM':
+            kind, value = OTHER_MATRIX, kaldi_io.read_mat(ark_file)
+        elif data[offset:offset + 2] == b'\0B':
+            raise ValueError('unsupported record header %r at offset %d of %s' % (
+                bytes(data[offset + 2:offset + 5]), offset, path))
+        elif data[offset:offset + 2] == b' [' and data[offset + 2:offset + 3] in (b'\n', b'\r'):
+            kind, value = OTHER_MATRIX, kaldi_io.read_mat(ark_file)
+        else:
+            kind, value = OTHER_VECTOR, kaldi_io.read_vec_flt(ark_file)
+        rows, cols = (value.shape if value.ndim == 2 else (1, value.shape[0]))
+        return kind, int(rows), int(cols), offset, ark_file.tell()
+
+
+class ArkIndex:
+    """
+    index of the records of one or more ark files. binary float matrices and vectors are returned as read-only numpy
+    views of a memory map of the ark, other records (compressed, sparse, ascii) are read with kaldi_io from their
+    offset. lookups are a dictionary access followed by a constant number of array reads
+    """
+
+    def __init__(self, paths, keys, file_ids, offsets, kinds, rows, cols, data_offsets):
+        self.paths = [os.path.abspath(path) for path in paths]
+        self.keys = list(keys)
+        self.file_ids = np.asarray(file_ids, dtype=np.int32)
+        self.offsets = np.asarray(offsets, dtype=np.int64)
+        self.kinds = np.asarray(kinds, dtype=np.int8)
+        self.rows = np.asarray(rows, dtype=np.int64)
+        self.cols = np.asarray(cols, dtype=np.int64)
+        self.data_offsets = np.asarray(data_offsets, dtype=np.int64)
+        self.positions = {key: i for i, key in enumerate(self.keys)}
+        if len(self.positions) != len(self.keys):
+            raise ValueError('duplicate keys in the indexed arks')
+        self._maps = [None] * len(self.paths)
+
+    @classmethod
+    def build(cls, ark_paths):
+        """
+        index ark files by scanning them once
+        :param ark_paths: path of an ark file, or list of paths
+        :return: ArkIndex
+        """
+        if isinstance(ark_paths, str):
+            ark_paths = [ark_paths]
+        columns = ([], [], [], [], [], [], [])
+        for file_id, path in enumerate(ark_paths):
+            data = _open_map(path)
+            if data is None:
+                continue
+            try:
+                position, size = 0, len(data)
+                while True:
+                    while position < size and data[position:position + 1] in _WHITESPACE:
+                        position += 1
+                    if position >= size:
+                        break
+                    end = data.find(b' ', position)
+                    if end < 0:
+                        raise ValueError('truncated record at offset %d of %s' % (position, path))
+                    key = data[position:end].decode('latin1')
+                    kind, rows, cols, data_offset, position = _parse_record(data, end + 1, path)
+                    if position > size:
+                        raise ValueError('truncated record %s in %s' % (key, path))
+                    for column, value in zip(columns, (key, file_id, end + 1, kind, rows, cols, data_offset)):
+                        column.append(value)
+            finally:
+                data.close()
+        return cls(ark_paths, *columns)
+
+    @classmethod
+    def from_scp(cls, scp_path):
+        """
+        index the records listed by a scp file ("key ark_path:offset" lines), without scanning the arks
+        :param scp_path: path of the scp file
+        :return: ArkIndex
+        """
+        paths, path_ids = [], {}
+        columns = ([], [], [], [], [], [], [])
+        maps = {}
+        try:
+            with open(scp_path, 'rb') as scp_file:
+                for line in scp_file:
+                    line = line.decode('latin1').strip()
+                    if not line:
+                        continue
+                    key, rxfile = line.split(None, 1)
+                    path, offset = rxfile.rsplit(':', 1)
+                    if path not in path_ids:
+                        path_ids[path] = len(paths)
+                        paths.append(path)
+                        maps[path] = _open_map(path)
+                    kind, rows, cols, data_offset, _ = _parse_record(maps[path], int(offset), path)
+                    for column, value in zip(columns, (key, path_ids[path], int(offset), kind, rows, cols,
+                                                       data_offset)):
+                        column.append(value)
+        finally:
+            for data in maps.values():
+                if data is not None:
+                    data.close()
+        return cls(paths, *columns)
+
+    def save(self, index_path):
+        """
+        :param index_path: path of the npz file, the sizes and modification times of the arks are stored with
+                           the index so that a stale index is detected by load()
+        """
+        stats = [os.stat(path) for path in self.paths]
+        with open(index_path, 'wb') as index_file:
+            np.savez(index_file, paths=np.array(self.paths, dtype=str), keys=np.array(self.keys, dtype=str),
+                     file_ids=self.file_ids, offsets=self.offsets, kinds=self.kinds, rows=self.rows, cols=self.cols,
+                     data_offsets=self.data_offsets,
+                     sizes=np.array([stat.st_size for stat in stats], dtype=np.int64),
+                     mtimes=np.array([stat.st_mtime_ns for stat in stats], dtype=np.int64))
+
+    @classmethod
+    def load(cls, index_path):
+        """
+        :param index_path: path of a npz file written by save()
+        :return: ArkIndex, or None if one of the arks changed since the index was saved
+        """
+        with np.load(index_path) as saved:
+            paths = [str(path) for path in saved['paths']]
+            for path, size, mtime in zip(paths, saved['sizes'], saved['mtimes']):
+                if not os.path.exists(path):
+                    return None
+                stat = os.stat(path)
+                if stat.st_size != size or stat.st_mtime_ns != mtime:
+                    return None
+            return cls(paths, [str(key) for key in saved['keys']], saved['file_ids'], saved['offsets'],
+                       saved['kinds'], saved['rows'], saved['cols'], saved['data_offsets'])
+
+    def __len__(self):
+        return len(self.keys)
+
+    def __contains__(self, key):
+        return key in self.positions
+
+    def __getitem__(self, key):
+        return self._read(self.positions[key])
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        """ release the memory maps, views returned before remain valid until they are garbage collected """
+        maps, self._maps = self._maps, [None] * len(self.paths)
+        for data in maps:
+            if data is not None:
+                try:
+                    data.close()
+                except BufferError:
+                    pass  # still exported to numpy views
+
+    def _map(self, file_id):
+        if self._maps[file_id] is None:
+            self._maps[file_id] = _open_map(self.paths[file_id])
+        return self._maps[file_id]
+
+    def _read(self, i):
+        kind = self.kinds[i]
+        if kind in _DTYPES:
+            count = int(self.rows[i] * self.cols[i])
+            value = np.frombuffer(self._map(self.file_ids[i]), dtype=_DTYPES[kind], count=count,
+                                  offset=int(self.data_offsets[i]))
+            return value.reshape(int(self.rows[i]), int(self.cols[i])) if kind in (FLOAT_MATRIX, DOUBLE_MATRIX) \
+                else value
+        rxfile = '%s:%d' % (self.paths[self.file_ids[i]], self.offsets[i])
+        return kaldi_io.read_mat(rxfile) if kind == OTHER_MATRIX else kaldi_io.read_vec_flt(rxfile)
+
+    def rxspec(self, key):
+        """
+        :param key: record key
+        :return: "ark_path:offset", as found in scp files and accepted by kaldi_io readers
+        """
+        i = self.positions[key]
+        return '%s:%d' % (self.paths[self.file_ids[i]], self.offsets[i])
+
+    def get(self, key, default=None):
+        """
+        :param key: record key
+        :param default: returned for unknown keys
+        :return: numpy array, a read-only view of the ark for binary float records
+        """
+        i = self.positions.get(key)
+        return default if i is None else self._read(i)
+
+    def get_batch(self, keys):
+        """
+        :param keys: list of record keys
+        :return: list of numpy arrays, in the order of keys
+        """
+        return [self._read(self.positions[key]) for key in keys]
+
+    def stack(self, keys, out=None):
+        """
+        batched lookup of records with the same shape and type, e.g. the x-vectors of the channels to score:
+        the records are copied from the memory maps straight into the result
+        :param keys: list of record keys
+        :param out: optional C-contiguous array receiving the result
+        :return: array (len(keys), dim) for vectors, (len(keys), rows, cols) for matrices
+        """
+        positions = np.fromiter((self.positions[key] for key in keys), dtype=np.int64, count=len(keys))
+        if len(positions) == 0:
+            raise ValueError('no key to stack')
+        kinds = self.kinds[positions]
+        rows, cols = self.rows[positions], self.cols[positions]
+        if np.any(kinds != kinds[0]) or np.any(rows != rows[0]) or np.any(cols != cols[0]):
+            raise ValueError('stacked records must share their type and shape')
+        kind = int(kinds[0])
+        shape = (len(positions), int(cols[0])) if kind in (FLOAT_VECTOR, DOUBLE_VECTOR, OTHER_VECTOR) \
+            else (len(positions), int(rows[0]), int(cols[0]))
+        if out is None:
+            out = np.empty(shape, dtype=_DTYPES.get(kind, np.float64))
+        if kind not in _DTYPES:
+            for j, i in enumerate(positions):
+                out[j] = self._read(i)
+            return out
+        dtype = np.dtype(_DTYPES[kind])
+        record_bytes = int(rows[0] * cols[0]) * dtype.itemsize
+        flat = out.reshape(len(positions), -1).view(np.uint8)
+        file_ids = self.file_ids[positions]
+        data_offsets = self.data_offsets[positions]
+        # one slice copy per record, visiting the arks in file order
+        for j in np.lexsort((data_offsets, file_ids)).tolist():
+            start = int(data_offsets[j])
+            flat[j] = np.frombuffer(self._map(file_ids[j]), dtype=np.uint8, count=record_bytes, offset=start)
+        return out
+
+
+def open_ark_index(ark_path, index_path=None):
+    """
+    index of an ark file, read from `index_path` (default: ark_path + '.idx.npz') when it is up to date, otherwise
+    built and saved there
+    :param ark_path: path of the ark file
+    :param index_path: path of the saved index
+    :return: ArkIndex
+    """
+    index_path = index_path or ark_path + '.idx.npz'
+    if os.path.exists(index_path):
+        index = ArkIndex.load(index_path)
+        if index is not None:
+            return index
+    index = ArkIndex.build(ark_path)
+    index.save(index_path)
+    return index
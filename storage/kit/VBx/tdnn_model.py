@@ -77,7 +77,8 @@ class TDNN(nn.Module):
     def forward(self, x):
         # Repeat first and last frames to allow an xvector to be computed even for short segments
         # 13 is obtained by summing all the time delays: (5/2)*1 + (5/2)*2 + (3/2)*3 + (3/2)*4
-        x = torch.cat([x[:,:,0].resize(1,40,1).repeat(1,1,13), x, x[:,:,-1].resize(1,40,1).repeat(1,1,13)], 2)
+        # works on batches of segments of the same length
+        x = torch.cat([x[:,:,:1].repeat(1,1,13), x, x[:,:,-1:].repeat(1,1,13)], 2)
 
         out = self.conv_1(x)
         out = F.relu(out)
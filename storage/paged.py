@@ -0,0 +1,256 @@
+"""
+=================================== LICENSE ==================================
+Copyright (c) 2021, Consortium Board ROXANNE
+All rights reserved.
+
+Redistribution and use in source and binary forms, with or without
+modification, are permitted provided that the following conditions are met:
+
+Redistributions of source code must retain the above copyright
+notice, this list of conditions and the following disclaimer.
+
+Redistributions in binary form must reproduce the above copyright
+notice, this list of conditions and the following disclaimer in the
+documentation and/or other materials provided with the distribution.
+
+Neither the name of the ROXANNE nor the
+names of its contributors may be used to endorse or promote products
+derived from this software without specific prior written permission.
+
+THIS SOFTWARE IS PROVIDED BY CONSORTIUM BOARD ROXANNE ``AS IS'' AND ANY
+EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+DISCLAIMED. IN NO EVENT SHALL CONSORTIUM BOARD TENCOMPETENCE BE LIABLE FOR ANY
+DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+(INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+(INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+==============================================================================
+"""
+from collections.abc import ItemsView, KeysView, Mapping, MutableMapping, Sequence, ValuesView
+from itertools import chain
+import operator
+
+PAGE_SHIFT = 10
+PAGE_SIZE = 1 << PAGE_SHIFT  # elements per page
+
+
+class PagedDict(MutableMapping):
+    """
+    dictionary stored in pages of at most PAGE_SIZE keys, in insertion order, with a key -> page index itself split
+    into pages by hash. `fork` copies the list of pages only: the fork and the original share every page until the
+    fork changes it, and then copies that page alone
+    """
+
+    def __init__(self, items=()):
+        self._pages = []  # dictionaries key -> value, a new key going into the last page
+        self._buckets = [{}]  # dictionaries key -> page number, by hash of the key
+        self._mask = 0
+        self._length = 0
+        self._tail = PAGE_SIZE  # number of keys ever put in the last page
+        self._owned_pages = set()  # pages changed since the fork, which no other container shares
+        self._owned_buckets = {0}
+        if isinstance(items, Mapping):
+            items = items.items()
+        for key, value in items:
+            self[key] = value
+
+    def fork(self):
+        """
+        :return: PagedDict with the contents of this one, sharing its pages
+        """
+        fork = PagedDict.__new__(PagedDict)
+        fork._pages = list(self._pages)
+        fork._buckets = list(self._buckets)
+        fork._mask = self._mask
+        fork._length = self._length
+        fork._tail = self._tail
+        fork._owned_pages = set()
+        fork._owned_buckets = set()
+        return fork
+
+    def _own_page(self, page_no):
+        if page_no not in self._owned_pages:
+            self._pages[page_no] = dict(self._pages[page_no])
+            self._owned_pages.add(page_no)
+        return self._pages[page_no]
+
+    def _own_bucket(self, bucket_no):
+        if bucket_no not in self._owned_buckets:
+            self._buckets[bucket_no] = dict(self._buckets[bucket_no])
+            self._owned_buckets.add(bucket_no)
+        return self._buckets[bucket_no]
+
+    def _grow(self):
+        # twice as many buckets, all new, so that a bucket keeps at most PAGE_SIZE keys on average
+        buckets = [{} for _ in range(2 * len(self._buckets))]
+        mask = len(buckets) - 1
+        for bucket in self._buckets:
+            for key, page_no in bucket.items():
+                buckets[hash(key) & mask][key] = page_no
+        self._buckets = buckets
+        self._mask = mask
+        self._owned_buckets = set(range(len(buckets)))
+
+    def __getitem__(self, key):
+        return self._pages[self._buckets[hash(key) & self._mask][key]][key]
+
+    def __contains__(self, key):
+        return key in self._buckets[hash(key) & self._mask]
+
+    def get(self, key, default=None):
+        page_no = self._buckets[hash(key) & self._mask].get(key)
+        if page_no is None:
+            return default
+        return self._pages[page_no][key]
+
+    def __setitem__(self, key, value):
+        bucket_no = hash(key) & self._mask
+        page_no = self._buckets[bucket_no].get(key)
+        if page_no is None:
+            if self._tail == PAGE_SIZE:
+                self._pages.append({})
+                self._owned_pages.add(len(self._pages) - 1)
+                self._tail = 0
+            page_no = len(self._pages) - 1
+            self._tail += 1
+            self._own_bucket(bucket_no)[key] = page_no
+            self._length += 1
+            if self._length > len(self._buckets) * PAGE_SIZE:
+                self._grow()
+        self._own_page(page_no)[key] = value
+
+    def __delitem__(self, key):
+        bucket_no = hash(key) & self._mask
+        if key not in self._buckets[bucket_no]:
+            raise KeyError(key)
+        page_no = self._own_bucket(bucket_no).pop(key)
+        del self._own_page(page_no)[key]
+        self._length -= 1
+
+    def __iter__(self):
+        return chain.from_iterable(self._pages)
+
+    def __len__(self):
+        return self._length
+
+    def keys(self):
+        return _PagedKeysView(self)
+
+    def items(self):
+        return _PagedItemsView(self)
+
+    def values(self):
+        return _PagedValuesView(self)
+
+    def __repr__(self):
+        return 'PagedDict(%r)' % dict(self.items())
+
+    def __reduce__(self):
+        # the buckets depend on the hashes of the keys, which may differ in another process
+        return PagedDict, (list(self.items()),)
+
+
+class _PagedKeysView(KeysView):
+    def __iter__(self):
+        return chain.from_iterable(self._mapping._pages)
+
+
+class _PagedItemsView(ItemsView):
+    def __iter__(self):
+        return chain.from_iterable(page.items() for page in self._mapping._pages)
+
+
+class _PagedValuesView(ValuesView):
+    def __iter__(self):
+        return chain.from_iterable(page.values() for page in self._mapping._pages)
+
+
+class PagedList(Sequence):
+    """
+    list stored in pages of PAGE_SIZE elements, which can only grow at its end. `fork` copies the list of pages
+    only: the fork and the original share every page until the fork changes it, and then copies that page alone
+    """
+
+    def __init__(self, items=()):
+        self._pages = []
+        self._length = 0
+        self._owned_pages = set()
+        for item in items:
+            self.append(item)
+
+    def fork(self):
+        """
+        :return: PagedList with the contents of this one, sharing its pages
+        """
+        fork = PagedList.__new__(PagedList)
+        fork._pages = list(self._pages)
+        fork._length = self._length
+        fork._owned_pages = set()
+        return fork
+
+    def _own_page(self, page_no):
+        if page_no not in self._owned_pages:
+            self._pages[page_no] = list(self._pages[page_no])
+            self._owned_pages.add(page_no)
+        return self._pages[page_no]
+
+    def _index(self, index):
+        index = operator.index(index)
+        if index < 0:
+            index += self._length
+        if not 0 <= index < self._length:
+            raise IndexError('list index out of range')
+        return index
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(self._length))]
+        index = self._index(index)
+        return self._pages[index >> PAGE_SHIFT][index & (PAGE_SIZE - 1)]
+
+    def __setitem__(self, index, value):
+        index = self._index(index)
+        self._own_page(index >> PAGE_SHIFT)[index & (PAGE_SIZE - 1)] = value
+
+    def append(self, value):
+        if self._length & (PAGE_SIZE - 1) == 0:
+            self._pages.append([])
+            self._owned_pages.add(len(self._pages) - 1)
+        self._own_page(len(self._pages) - 1).append(value)
+        self._length += 1
+
+    def extend(self, values):
+        for value in values:
+            self.append(value)
+
+    def __iter__(self):
+        return chain.from_iterable(self._pages)
+
+    def __len__(self):
+        return self._length
+
+    def __eq__(self, other):
+        if not isinstance(other, (PagedList, list)):
+            return NotImplemented
+        return len(self) == len(other) and all(a == b for a, b in zip(self, other))
+
+    def __repr__(self):
+        return 'PagedList(%r)' % list(self)
+
+    def __reduce__(self):
+        return PagedList, (list(self),)
+
+
+def fork(container):
+    """
+    :param container: PagedDict or PagedList, or a dictionary or a list, which is copied into pages
+    :return: paged copy of the container, sharing its pages
+    """
+    if isinstance(container, (PagedDict, PagedList)):
+        return container.fork()
+    if isinstance(container, dict):
+        return PagedDict(container)
+    return PagedList(container)
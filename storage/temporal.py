@@ -0,0 +1,198 @@
+"""
+=================================== LICENSE ==================================
+Copyright (c) 2021, Consortium Board ROXANNE
+All rights reserved.
+
+Redistribution and use in source and binary forms, with or without
+modification, are permitted provided that the following conditions are met:
+
+Redistributions of source code must retain the above copyright
+notice, this list of conditions and the following disclaimer.
+
+Redistributions in binary form must reproduce the above copyright
+notice, this list of conditions and the following disclaimer in the
+documentation and/or other materials provided with the distribution.
+
+Neither the name of the ROXANNE nor the
+names of its contributors may be used to endorse or promote products
+derived from this software without specific prior written permission.
+
+THIS SOFTWARE IS PROVIDED BY CONSORTIUM BOARD ROXANNE ``AS IS'' AND ANY
+EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+DISCLAIMED. IN NO EVENT SHALL CONSORTIUM BOARD TENCOMPETENCE BE LIABLE FOR ANY
+DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+(INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+(INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+==============================================================================
+"""
+from datetime import date, datetime, timezone
+import numpy as np
+
+
+def to_timestamp(value):
+    """
+    convert a point in time into seconds since 1970-01-01 UTC
+    :param value: number (already in seconds), datetime, date, or string such as '2020-01-29' or
+                  '2020-01-29 00:00:00', naive values being taken as UTC
+    :return: float, None if value is None
+    """
+    if value is None:
+        return None
+    if isinstance(value, (int, float, np.number)) and not isinstance(value, bool):
+        return float(value)
+    if isinstance(value, datetime):
+        if value.tzinfo is None:
+            value = value.replace(tzinfo=timezone.utc)
+        return value.timestamp()
+    if isinstance(value, date):
+        return datetime(value.year, value.month, value.day, tzinfo=timezone.utc).timestamp()
+    return float(np.datetime64(str(value).strip().replace(' ', 'T'), 's').astype(np.int64))
+
+
+def parse_time_window(time_window):
+    """
+    :param time_window: dictionary {'start': ..., 'end': ...} or pair (start, end), each bound being optional
+                        and in a format accepted by `to_timestamp`
+    :return: (start, end) in seconds, None for an open bound
+    """
+    if isinstance(time_window, dict):
+        start, end = time_window.get('start'), time_window.get('end')
+    else:
+        start, end = time_window
+    return to_timestamp(start), to_timestamp(end)
+
+
+def get_edge_timestamps(edge):
+    """
+    event times of an edge: the 'timestamps' list of its properties (as built for WP5 networks), or a single
+    'timestamp' or 'date' property
+    """
+    properties = edge.get('properties') or {}
+    if properties.get('timestamps') is not None:
+        return properties['timestamps']
+    for key in ('timestamp', 'date'):
+        if properties.get(key) is not None:
+            return [properties[key]]
+    return []
+
+
+class TemporalIndex:
+    """
+    event times of the edges of a dataset in arrays sorted by time, and the interval [first, last] of every edge
+    sorted by first event. a time window [start, end) selects edges with two binary searches, without copying
+    the edges. edges without any time information are part of every window
+    """
+
+    def __init__(self, edges):
+        """
+        :param edges: list of edges of a dataset, deleted edges being None
+        """
+        times = []
+        event_edges = []
+        exists = np.zeros(len(edges), dtype=bool)
+        for e, edge in enumerate(edges):
+            if edge is None:
+                continue
+            exists[e] = True
+            for value in get_edge_timestamps(edge):
+                try:
+                    times.append(to_timestamp(value))
+                except ValueError:
+                    continue
+                event_edges.append(e)
+        times = np.asarray(times, dtype=np.float64)
+        event_edges = np.asarray(event_edges, dtype=np.int64)
+        order = np.argsort(times, kind='stable')
+        self.num_edges = len(edges)
+        self.times = times[order]
+        self.event_edges = event_edges[order]
+
+        timed = np.zeros(len(edges), dtype=bool)
+        timed[self.event_edges] = True
+        self.untimed = np.flatnonzero(exists & ~timed)
+        # interval index: first and last event of every edge, edges ordered by first event
+        self.first = np.full(len(edges), np.nan)
+        self.last = np.full(len(edges), np.nan)
+        timed_edges, first_events = np.unique(self.event_edges, return_index=True)
+        self.first[timed_edges] = self.times[first_events]
+        _, last_events = np.unique(self.event_edges[::-1], return_index=True)
+        self.last[timed_edges] = self.times[::-1][last_events]
+        self.by_first = timed_edges[np.argsort(self.first[timed_edges], kind='stable')]
+        self._sorted_first = self.first[self.by_first]
+
+    def _event_range(self, start, end):
+        low = 0 if start is None else np.searchsorted(self.times, start, side='left')
+        high = len(self.times) if end is None else np.searchsorted(self.times, end, side='left')
+        return low, max(low, high)
+
+    def edge_counts(self, start=None, end=None):
+        """
+        :return: array, number of events of every edge in [start, end)
+        """
+        low, high = self._event_range(start, end)
+        return np.bincount(self.event_edges[low:high], minlength=self.num_edges)
+
+    def edges_in_window(self, start=None, end=None, mode='events', include_untimed=True):
+        """
+        indices of the edges in the time window [start, end), an open start gives the network "as of" end
+        :param mode: 'events' for edges having an event in the window, 'span' for edges whose interval from first
+                     to last event overlaps the window
+        :param include_untimed: add the edges without time information
+        :return: sorted array of edge indices
+        """
+        if mode == 'events':
+            low, high = self._event_range(start, end)
+            edges = np.unique(self.event_edges[low:high])
+        elif mode == 'span':
+            high = len(self.by_first) if end is None else np.searchsorted(self._sorted_first, end, side='left')
+            edges = self.by_first[:high]
+            if start is not None:
+                edges = edges[self.last[edges] >= start]
+            edges = np.sort(edges)
+        else:
+            raise ValueError('unknown time window mode: %s' % mode)
+        if include_untimed and len(self.untimed) > 0:
+            edges = np.union1d(edges, self.untimed)
+        return edges
+
+    def edge_mask(self, start=None, end=None, mode='events', include_untimed=True):
+        """
+        :return: boolean array, True for the edges in the time window, see `edges_in_window`
+        """
+        mask = np.zeros(self.num_edges, dtype=bool)
+        mask[self.edges_in_window(start, end, mode, include_untimed)] = True
+        return mask
+
+    def sliding_windows(self, start, end, width, step):
+        """
+        windows [s, s + width) for s = start, start + step, ... < end. the event counts of the edges are updated
+        with the events entering and leaving the window only, so overlapping windows share their work
+        :return: generator of (window_start, window_end, counts, entered, left): counts is the number of events
+            of every edge in the window (updated in place by the next step, copy it to keep it), entered and left
+            the edges that appear in or disappear from the window compared to the previous one
+        """
+        if width <= 0 or step <= 0:
+            raise ValueError('width and step must be positive')
+        counts = np.zeros(self.num_edges, dtype=np.int64)
+        previous_low = previous_high = 0
+        window_start = start
+        while window_start < end:
+            window_end = window_start + width
+            low, high = self._event_range(window_start, window_end)
+            # events leaving the window, then events entering it
+            leaving = self.event_edges[previous_low:min(low, previous_high)]
+            entering = self.event_edges[max(previous_high, low):high]
+            candidates = np.union1d(leaving, entering)
+            before = counts[candidates] > 0
+            np.subtract.at(counts, leaving, 1)
+            np.add.at(counts, entering, 1)
+            after = counts[candidates] > 0
+            entered = candidates[after & ~before]
+            left = candidates[before & ~after]
+            yield window_start, window_end, counts, entered, left
+            previous_low, previous_high = low, high
+            window_start += step
@@ -0,0 +1,320 @@
+"""
+=================================== LICENSE ==================================
+Copyright (c) 2021, Consortium Board ROXANNE
+All rights reserved.
+
+Redistribution and use in source and binary forms, with or without
+modification, are permitted provided that the following conditions are met:
+
+Redistributions of source code must retain the above copyright
+notice, this list of conditions and the following disclaimer.
+
+Redistributions in binary form must reproduce the above copyright
+notice, this list of conditions and the following disclaimer in the
+documentation and/or other materials provided with the distribution.
+
+Neither the name of the ROXANNE nor the
+names of its contributors may be used to endorse or promote products
+derived from this software without specific prior written permission.
+
+THIS SOFTWARE IS PROVIDED BY CONSORTIUM BOARD ROXANNE ``AS IS'' AND ANY
+EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+DISCLAIMED. IN NO EVENT SHALL CONSORTIUM BOARD TENCOMPETENCE BE LIABLE FOR ANY
+DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+(INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+(INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+==============================================================================
+"""
+# clustering of WP5 channels into speakers from their pairwise voiceprint scores
+
+import heapq
+import os
+import sys
+
+import numpy as np
+from scipy.special import expit
+
+tokens = os.path.abspath(__file__).split('/')
+path2root = '/'.join(tokens[:-2])
+if path2root not in sys.path:
+    sys.path.append(path2root)
+
+from storage.kit.VBx import diarization_lib
+
+
+def voiceprint_scores(channel2index, voiceprints_matrix):
+    """
+    read WP5's voiceprint matrix into arrays of (row, column, score) entries
+    :param channel2index: dictionary channel id -> index
+    :param voiceprints_matrix: either a nested dictionary {channel_id: {channel_id: score}}, a dense matrix
+                               {'channels': [channel_id], 'scores': [[score]]}, or a list of pairs
+                               {'sources': [channel_id], 'targets': [channel_id], 'scores': [score]}
+    :return: (rows, cols, scores): int64, int64 and float64 arrays
+    """
+    if 'channels' in voiceprints_matrix and 'scores' in voiceprints_matrix:
+        index = np.array([channel2index[c] for c in voiceprints_matrix['channels']], dtype=np.int64)
+        scores = np.asarray(voiceprints_matrix['scores'], dtype=np.float64).reshape(len(index), len(index))
+        row_positions, col_positions = np.nonzero(scores)
+        return index[row_positions], index[col_positions], scores[row_positions, col_positions]
+
+    if 'sources' in voiceprints_matrix and 'targets' in voiceprints_matrix:
+        rows = np.array([channel2index[c] for c in voiceprints_matrix['sources']], dtype=np.int64)
+        cols = np.array([channel2index[c] for c in voiceprints_matrix['targets']], dtype=np.int64)
+        return rows, cols, np.asarray(voiceprints_matrix['scores'], dtype=np.float64)
+
+    rows, cols, scores = [], [], []
+    for u, row in voiceprints_matrix.items():
+        rows.append(np.full(len(row), channel2index[u], dtype=np.int64))
+        cols.append(np.fromiter((channel2index[v] for v in row), dtype=np.int64, count=len(row)))
+        scores.append(np.fromiter(row.values(), dtype=np.float64, count=len(row)))
+    if len(rows) == 0:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64), np.zeros(0)
+    return np.concatenate(rows), np.concatenate(cols), np.concatenate(scores)
+
+
+def cannot_link_pairs(channel2index, conversations):
+    """
+    channels of the same conversation are different speakers
+    :return: (rows, cols): int64 arrays of all ordered pairs of distinct channels sharing a conversation
+    """
+    rows, cols = [], []
+    for con in conversations:
+        index = np.array([channel2index[channel['id']] for channel in con['channels']], dtype=np.int64)
+        if len(index) < 2:
+            continue
+        u, v = np.meshgrid(index, index, indexing='ij')
+        distinct = u != v
+        rows.append(u[distinct])
+        cols.append(v[distinct])
+    if len(rows) == 0:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+    return np.concatenate(rows), np.concatenate(cols)
+
+
+def calibration_threshold(num_channels, rows, cols, scores, cannot_rows, cannot_cols, niters=20):
+    """
+    the threshold of `diarization_lib.twoGMMcalib_lin` over the finite entries of the dense score matrix (missing
+    entries being zeros and cannot-link pairs -inf), computed from the stored scores plus a single zero weighted
+    by the number of missing entries instead of the num_channels^2 entries
+    """
+    keys = rows * num_channels + cols
+    cannot_keys = np.unique(cannot_rows * num_channels + cannot_cols)
+    keep = np.isfinite(scores) & ~np.isin(keys, cannot_keys)
+    values = scores[keep]
+    counts = np.ones(len(values))
+    num_missing = num_channels * num_channels - len(np.union1d(keys, cannot_keys))
+    if num_missing > 0:
+        values = np.append(values, 0.0)
+        counts = np.append(counts, num_missing)
+
+    total = counts.sum()
+    mean = counts.dot(values) / total
+    std = np.sqrt(counts.dot((values - mean) ** 2) / total)
+    weights = np.array([0.5, 0.5])
+    means = mean + std * np.array([-1, 1])
+    var = std ** 2
+    for _ in range(niters):
+        lls = np.log(weights) - 0.5 * np.log(var) - 0.5 * (values[:, np.newaxis] - means) ** 2 / var
+        # softmax over the two components
+        second = expit(lls[:, 1] - lls[:, 0])
+        gammas = np.column_stack([1 - second, second]) * counts[:, np.newaxis]
+        cnts = np.sum(gammas, axis=0)
+        weights = cnts / cnts.sum()
+        means = values.dot(gammas) / cnts
+        var = ((values ** 2).dot(gammas) / cnts - means ** 2).dot(weights)
+    return -0.5 * (np.log(weights ** 2 / var) - means ** 2 / var).dot([1, -1]) / (means / var).dot([1, -1])
+
+
+def similarity_graph(num_channels, rows, cols, scores, cannot_rows=None, cannot_cols=None):
+    """
+    undirected sparse similarity graph: a score given in both directions is averaged, cannot-link pairs get -inf,
+    zero scores and the diagonal are dropped (a missing pair has similarity 0)
+    :return: (first, second, similarity) with first < second
+    """
+    if cannot_rows is not None and len(cannot_rows) > 0:
+        rows = np.concatenate([rows, cannot_rows])
+        cols = np.concatenate([cols, cannot_cols])
+        scores = np.concatenate([scores, np.full(len(cannot_rows), -np.inf)])
+    off_diagonal = rows != cols
+    rows, cols, scores = rows[off_diagonal], cols[off_diagonal], scores[off_diagonal]
+    keys = np.minimum(rows, cols) * num_channels + np.maximum(rows, cols)
+    unique_keys, inverse = np.unique(keys, return_inverse=True)
+    similarity = np.bincount(inverse, weights=scores, minlength=len(unique_keys)).astype(np.float64)
+    similarity /= np.maximum(np.bincount(inverse, minlength=len(unique_keys)), 1)
+    # cannot-link pairs override any score, as in the dense matrix
+    similarity[np.isin(unique_keys, keys[np.isneginf(scores)])] = -np.inf
+    nonzero = similarity != 0
+    unique_keys, similarity = unique_keys[nonzero], similarity[nonzero]
+    return unique_keys // num_channels, unique_keys % num_channels, similarity
+
+
+def average_linkage_clusters(num_channels, first, second, similarity, threshold):
+    """
+    UPGMA clustering stopped at a similarity threshold, with the labels of `diarization_lib.AHC` on the dense
+    matrix: the most similar pair of clusters (lowest channel indices first on ties) is merged as long as its
+    average similarity is >= threshold, clusters are numbered by their lowest channel index.
+    the average similarity of two clusters is the sum of their pairwise similarities over the product of their
+    sizes, so only pairs of clusters linked by a stored score need to be tracked and only the ones above the
+    threshold enter the heap; cost is about O(m log m) for m stored scores instead of O(n^3)
+    :param num_channels: n
+    :param first, second, similarity: sparse similarity graph, see `similarity_graph`
+    :param threshold: stopping threshold
+    :return: int array of n labels
+    """
+    if num_channels == 0:
+        return np.zeros(0, dtype=int)
+    if threshold <= 0:
+        # unlinked clusters (average similarity 0) may merge too: fall back to the dense algorithm
+        matrix = np.zeros((num_channels, num_channels))
+        matrix[first, second] = similarity
+        matrix[second, first] = similarity
+        return diarization_lib.AHC(matrix, threshold)
+    roots = _agglomerate(num_channels, first, second, similarity, [1] * num_channels, threshold)
+    return np.unique(roots, return_inverse=True)[1]
+
+
+def _agglomerate(num_units, first, second, sums, sizes, threshold, frozen=None):
+    """
+    merge units (channels or clusters of channels) by average linkage
+    :param num_units: number of units
+    :param first, second, sums: sum of the similarities between the channels of each linked pair of units
+    :param sizes: number of channels of each unit
+    :param threshold: stopping threshold, > 0
+    :param frozen: optional list of booleans, two frozen units are never merged and a unit merged with a frozen
+                   one becomes frozen
+    :return: int64 array, for each unit the lowest index of the units merged with it
+    """
+    # clusters live in slots (initially their unit index), links[slot] maps the slots of linked clusters to the
+    # sum of the similarities between the two clusters
+    links = [dict() for _ in range(num_units)]
+    sizes = list(sizes)
+    heap = []
+    for u, v, s in zip(first.tolist(), second.tolist(), sums.tolist()):
+        links[u][v] = s
+        links[v][u] = s
+        average = s / (sizes[u] * sizes[v])
+        if average >= threshold and (frozen is None or not (frozen[u] and frozen[v])):
+            heap.append((-average, u, v, u, v, 0, 0))
+    heapq.heapify(heap)
+    lowest = list(range(num_units))
+    versions = [0] * num_units
+    parents = list(range(num_units))
+
+    while heap:
+        _, _, _, a, b, a_version, b_version = heapq.heappop(heap)
+        if versions[a] != a_version or versions[b] != b_version:
+            continue
+        # the slot with more links absorbs the other one, so that fewer neighbors have to be relabeled
+        keep, gone = (a, b) if len(links[a]) >= len(links[b]) else (b, a)
+        keep_links, gone_links = links[keep], links[gone]
+        del keep_links[gone], gone_links[keep]
+        for w, s in gone_links.items():
+            s += keep_links.get(w, 0.0)
+            keep_links[w] = s
+            w_links = links[w]
+            del w_links[gone]
+            w_links[keep] = s
+        links[gone] = None
+        sizes[keep] += sizes[gone]
+        lowest[keep] = min(lowest[a], lowest[b])
+        parents[gone] = keep
+        versions[keep] += 1
+        versions[gone] += 1
+        is_frozen = False
+        if frozen is not None:
+            is_frozen = frozen[keep] = frozen[a] or frozen[b]
+
+        size = sizes[keep]
+        for w, s in keep_links.items():
+            if is_frozen and frozen[w]:
+                continue
+            average = s / (size * sizes[w])
+            if average >= threshold:
+                if lowest[keep] < lowest[w]:
+                    entry = (-average, lowest[keep], lowest[w], keep, w, versions[keep], versions[w])
+                else:
+                    entry = (-average, lowest[w], lowest[keep], w, keep, versions[w], versions[keep])
+                heapq.heappush(heap, entry)
+
+    roots = np.empty(num_units, dtype=np.int64)
+    for w in range(num_units):
+        root = w
+        while parents[root] != root:
+            parents[root] = parents[parents[root]]
+            root = parents[root]
+        roots[w] = lowest[root]
+    return roots
+
+
+class IncrementalClusters(object):
+    """
+    speaker clusters that grow as new channels arrive: the new channels are clustered by average linkage among
+    themselves and with the existing clusters, which are not merged with each other.
+    the state is one label per channel and one size per cluster, so the cost of an update only depends on the
+    scores of the new channels. clusters can drift from a full clustering of all channels, `reset` replaces them
+    with the labels of a full clustering
+    """
+
+    def __init__(self, labels=None):
+        """
+        :param labels: labels of the channels known so far, e.g., from `average_linkage_clusters`
+        """
+        self.labels = np.zeros(0, dtype=np.int64)
+        self.sizes = np.zeros(0, dtype=np.int64)
+        if labels is not None:
+            self.reset(labels)
+
+    def reset(self, labels):
+        self.labels = np.asarray(labels, dtype=np.int64)
+        self.sizes = np.bincount(self.labels) if len(self.labels) > 0 else np.zeros(0, dtype=np.int64)
+
+    def add_channels(self, num_new, rows, cols, scores, cannot_rows, cannot_cols, threshold):
+        """
+        :param num_new: number of new channels, whose indices follow the ones of the known channels
+        :param rows, cols, scores: scores as returned by `voiceprint_scores`, only the ones involving a new
+                                   channel are used
+        :param cannot_rows, cannot_cols: cannot-link pairs as returned by `cannot_link_pairs`
+        :param threshold: stopping threshold, > 0
+        :return: int64 array with the labels of the new channels, new clusters get the next free labels
+        """
+        num_old = len(self.labels)
+        num_channels = num_old + num_new
+        involved = (rows >= num_old) | (cols >= num_old)
+        first, second, similarity = similarity_graph(num_channels, rows[involved], cols[involved], scores[involved],
+                                                     cannot_rows, cannot_cols)
+        # units: the new channels, then the existing clusters linked to them
+        touched = np.unique(np.concatenate([self.labels[first[first < num_old]],
+                                            self.labels[second[second < num_old]]]))
+
+        def to_units(indices):
+            result = indices - num_old
+            old = indices < num_old
+            result[old] = num_new + np.searchsorted(touched, self.labels[indices[old]])
+            return result
+
+        num_units = num_new + len(touched)
+        first_units, second_units = to_units(first), to_units(second)
+        pair_keys = np.minimum(first_units, second_units) * num_units + np.maximum(first_units, second_units)
+        keys, inverse = np.unique(pair_keys, return_inverse=True)
+        sums = np.bincount(inverse, weights=similarity, minlength=len(keys))
+        sums[np.isin(keys, pair_keys[np.isneginf(similarity)])] = -np.inf
+        sizes = [1] * num_new + self.sizes[touched].tolist()
+        frozen = [False] * num_new + [True] * len(touched)
+        roots = _agglomerate(num_units, keys // num_units, keys % num_units, sums, sizes, threshold, frozen)
+
+        # a merged cluster is named by its lowest unit, which is a new channel when one joined an existing cluster
+        owners = np.full(num_units, -1, dtype=np.int64)
+        owners[roots[num_new:]] = touched
+        new_roots = roots[:num_new]
+        labels = owners[new_roots]
+        joined = labels >= 0
+        fresh, fresh_labels = np.unique(new_roots[~joined], return_inverse=True)
+        labels[~joined] = len(self.sizes) + fresh_labels
+        self.labels = np.concatenate([self.labels, labels])
+        self.sizes = np.concatenate([self.sizes, np.zeros(len(fresh), dtype=np.int64)])
+        np.add.at(self.sizes, labels, 1)
+        return labels
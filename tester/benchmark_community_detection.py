@@ -0,0 +1,134 @@
+"""
+=================================== LICENSE ==================================
+Copyright (c) 2021, Consortium Board ROXANNE
+All rights reserved.
+
+Redistribution and use in source and binary forms, with or without
+modification, are permitted provided that the following conditions are met:
+
+Redistributions of source code must retain the above copyright
+notice, this list of conditions and the following disclaimer.
+
+Redistributions in binary form must reproduce the above copyright
+notice, this list of conditions and the following disclaimer in the
+documentation and/or other materials provided with the distribution.
+
+Neither the name of the ROXANNE nor the
+names of its contributors may be used to endorse or promote products
+derived from this software without specific prior written permission.
+
+THIS SOFTWARE IS PROVIDED BY CONSORTIUM BOARD ROXANNE ``AS IS'' AND ANY
+EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+DISCLAIMED. IN NO EVENT SHALL CONSORTIUM BOARD TENCOMPETENCE BE LIABLE FOR ANY
+DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+(INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+(INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+==============================================================================
+"""
+import os
+import sys
+
+# find path to root directory of the project so as to import from other packages
+tokens = os.path.abspath(__file__).split('/')
+# print('tokens = ', tokens)
+path2root = '/'.join(tokens[:-2])
+# print('path2root = ', path2root)
+if path2root not in sys.path:
+    sys.path.append(path2root)
+
+import time
+import numpy as np
+from scipy.sparse import csr_matrix
+
+import networkx
+from analyzer.common.helpers import convert_to_csr_sparse_matrix, convert_to_nx_undirected_graph
+from analyzer.common.louvain import louvain, modularity
+from analyzer.common.spectral import symmetrize
+from analyzer.community_detection import CommunityDetector
+from storage.builtin_datasets import BuiltinDatasetsManager
+
+
+def _membership_to_labels(membership, node_ids):
+    return np.array([min(membership[u].keys()) for u in node_ids])
+
+
+def compare_on_builtin_datasets(methods=('modularity', 'label_propagation', 'asyn_lpa', 'louvain', 'leiden')):
+    """
+    modularity and running time of the community detection methods on the bundled datasets
+    """
+    data_manager = BuiltinDatasetsManager(connector=None, params=None, load_on_construcion=True)
+    print('dataset\tmethod\tcommunities\tmodularity\tseconds')
+    for dataset_id in data_manager.datasets:
+        network = data_manager.get_network(network=dataset_id)
+        matrix, node_ids = convert_to_csr_sparse_matrix(network)
+        adjacency = symmetrize(matrix)
+        for method in methods:
+            start = time.perf_counter()
+            result = CommunityDetector(method).perform(network, {})
+            elapsed = time.perf_counter() - start
+            if result['success'] == 0:
+                print('%s\t%s\tfailed' % (dataset_id, method))
+                continue
+            labels = _membership_to_labels(result['membership'], node_ids)
+            print('%s\t%s\t%d\t%.4f\t%.3f' % (dataset_id, method, len(result['communities']),
+                                              modularity(adjacency, labels), elapsed))
+
+
+def compare_k_clique_communities_with_networkx(ks=(3, 4, 5, 6, 7)):
+    """
+    the k-clique percolation engine must find the same communities as networkx on the bundled datasets
+    """
+    data_manager = BuiltinDatasetsManager(connector=None, params=None, load_on_construcion=True)
+    print('dataset\tK\tcommunities\tsame as networkx\tseconds\tnetworkx seconds')
+    for dataset_id in data_manager.datasets:
+        network = data_manager.get_network(network=dataset_id)
+        graph, node_ids = convert_to_nx_undirected_graph(network)
+        for k in ks:
+            start = time.perf_counter()
+            expected = set(frozenset(node_ids[u] for u in c)
+                           for c in networkx.algorithms.community.k_clique_communities(graph, k))
+            networkx_time = time.perf_counter() - start
+            start = time.perf_counter()
+            result = CommunityDetector('k_cliques').perform(network, {'K': k})
+            elapsed = time.perf_counter() - start
+            found = set(frozenset(c) for c in result['communities'])
+            print('%s\t%d\t%d\t%s\t%.3f\t%.3f' % (dataset_id, k, len(found), found == expected, elapsed,
+                                                   networkx_time))
+
+
+def planted_partition(num_nodes, num_edges, community_size=100, noise=0.2, seed=0):
+    """
+    random graph whose edges fall inside blocks of `community_size` nodes, except a fraction `noise` of them
+    """
+    random_state = np.random.RandomState(seed)
+    rows = random_state.randint(0, num_nodes, num_edges)
+    cols = (rows // community_size) * community_size + random_state.randint(0, community_size, num_edges)
+    cols = np.minimum(cols, num_nodes - 1)
+    noisy = random_state.random_sample(num_edges) < noise
+    cols[noisy] = random_state.randint(0, num_nodes, noisy.sum())
+    return symmetrize(csr_matrix((np.ones(num_edges), (rows, cols)), shape=(num_nodes, num_nodes)))
+
+
+def scale_on_synthetic_graphs(sizes=((10000, 30000), (100000, 300000), (1000000, 3000000))):
+    """
+    running time of louvain and leiden on planted partition graphs of growing size
+    """
+    print('nodes\tedges\tmethod\tcommunities\tmodularity\tseconds')
+    for num_nodes, num_edges in sizes:
+        adjacency = planted_partition(num_nodes, num_edges)
+        for name, refine in (('louvain', False), ('leiden', True)):
+            start = time.perf_counter()
+            labels = louvain(adjacency, refine=refine)
+            elapsed = time.perf_counter() - start
+            print('%d\t%d\t%s\t%d\t%.4f\t%.2f' % (num_nodes, num_edges, name, labels.max() + 1,
+                                                  modularity(adjacency, labels), elapsed))
+
+
+if __name__ == '__main__':
+    compare_on_builtin_datasets()
+    compare_k_clique_communities_with_networkx()
+    scale_on_synthetic_graphs()
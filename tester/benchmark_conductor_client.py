@@ -0,0 +1,142 @@
+"""
+=================================== LICENSE ==================================
+Copyright (c) 2021, Consortium Board ROXANNE
+All rights reserved.
+
+Redistribution and use in source and binary forms, with or without
+modification, are permitted provided that the following conditions are met:
+
+Redistributions of source code must retain the above copyright
+notice, this list of conditions and the following disclaimer.
+
+Redistributions in binary form must reproduce the above copyright
+notice, this list of conditions and the following disclaimer in the
+documentation and/or other materials provided with the distribution.
+
+Neither the name of the ROXANNE nor the
+names of its contributors may be used to endorse or promote products
+derived from this software without specific prior written permission.
+
+THIS SOFTWARE IS PROVIDED BY CONSORTIUM BOARD ROXANNE ``AS IS'' AND ANY
+EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+DISCLAIMED. IN NO EVENT SHALL CONSORTIUM BOARD TENCOMPETENCE BE LIABLE FOR ANY
+DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+(INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+(INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+==============================================================================
+"""
+import os
+import sys
+
+# find path to root directory of the project so as to import from other packages
+tokens = os.path.abspath(__file__).split('/')
+path2root = '/'.join(tokens[:-2])
+if path2root not in sys.path:
+    sys.path.append(path2root)
+
+import argparse
+import logging
+import threading
+import time
+import requests
+from waitress.server import create_server
+
+from conductor import api
+from framework.api_interface import ConductorConnector, ConductorDataManager, Method, JSON, MSGPACK
+
+
+class ConnectionCounter:
+    """ number of connections opened to the api, like nginx in front of the conductor waitress keeps them alive """
+    connections = 0
+
+    def __init__(self, app):
+        self.app = app
+        self.seen = set()
+
+    def __call__(self, environ, start_response):
+        channel = environ['waitress.client_disconnected'].__self__
+        if channel not in self.seen:
+            self.seen.add(channel)
+            ConnectionCounter.connections += 1
+        return self.app(environ, start_response)
+
+    def log_request(self, *args, **kwargs):
+        pass
+
+
+def synthetic_network(num_nodes, degree=5):
+    nodes = {'n%d' % i: {'type': 'person', 'name': 'Person %d' % i} for i in range(num_nodes)}
+    edges = [{'source': 'n%d' % i, 'target': 'n%d' % ((i * 7 + k * 13 + 1) % num_nodes),
+              'properties': {'type': 'call', 'weight': k + 1}}
+             for i in range(num_nodes) for k in range(degree)]
+    return nodes, edges
+
+
+def check_manager(manager, num_nodes):
+    """ save a network in batches and read it back with every query of the manager """
+    nodes, edges = synthetic_network(num_nodes)
+    start = time.perf_counter()
+    assert manager.save_nodes(nodes, 'bench') == []
+    assert manager.save_edges(edges, 'bench') == []
+    print('saved %d nodes and %d edges in %.2f s' % (len(nodes), len(edges), time.perf_counter() - start))
+    start = time.perf_counter()
+    network = manager.get_network('bench')
+    print('read network of %d nodes and %d edges in %.2f s' % (
+        len(network['nodes']), len(network['edges']), time.perf_counter() - start))
+    assert len(network['nodes']) == len(nodes)
+    neighbors = manager.get_neighbors(['n1', 'n2', 'missing'], 'bench')
+    assert neighbors['not_found'] == ['missing'] and len(neighbors['found']) == 2
+    assert manager.search_nodes(['n3', 'missing'], 'bench')['not_found'] == ['missing']
+    results = manager.fan_out(manager.search_nodes, [(['n%d' % i], 'bench') for i in range(16)])
+    assert [r['found'][0]['id'] for r in results] == ['n%d' % i for i in range(16)]
+    assert manager.delete_edges([('n0', 'n1')], 'bench') == []
+
+
+def small_requests(port, token, count, session=None):
+    """ time of count small queries and connections opened, each on its own connection unless a session is given """
+    send = session.request if session is not None else requests.request
+    connections = ConnectionCounter.connections
+    start = time.perf_counter()
+    for i in range(count):
+        response = send('POST', 'http://127.0.0.1:%d/v1.0/datasets/bench' % port,
+                        json={'nodes': ['n%d' % i], 'query': 'nodes'},
+                        headers={'Authorization': 'Bearer ' + token})
+        assert response.status_code == 200
+    return time.perf_counter() - start, ConnectionCounter.connections - connections
+
+
+def run(port, num_nodes, count):
+    for transport in (JSON, MSGPACK):
+        print(transport)
+        connector = ConductorConnector('127.0.0.1', port, 'admin', 'Pass1234', transport=transport)
+        manager = ConductorDataManager(connector)
+        connector.call(connector.url('datasets'), Method.POST, {'datasetName': 'bench'})
+        try:
+            check_manager(manager, num_nodes)
+        finally:
+            connector.call(connector.url('datasets'), Method.DELETE, {'datasetName': 'bench'})
+    connector.call(connector.url('datasets'), Method.POST, {'datasetName': 'bench'})
+    manager.save_nodes(synthetic_network(num_nodes)[0], 'bench')
+    token = connector._current_token()
+    for name, session in (('new connection each', None), ('pooled connections', requests.Session())):
+        print('%d small queries, %s: %.2f s, %d connections opened' % (
+            (count, name) + small_requests(port, token, count, session)))
+    connector.call(connector.url('datasets'), Method.DELETE, {'datasetName': 'bench'})
+    connector.close()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='conductor client against a local conductor')
+    parser.add_argument('--nodes', type=int, default=20000, help='number of nodes of the saved network')
+    parser.add_argument('--requests', type=int, default=1000, help='number of small queries timed')
+    args = parser.parse_args()
+    logging.getLogger('api').setLevel(logging.CRITICAL)
+
+    server = create_server(ConnectionCounter(api), host='127.0.0.1', port=0, threads=8)
+    threading.Thread(target=server.run, daemon=True).start()
+    run(int(server.effective_port), args.nodes, args.requests)
+    server.close()
@@ -0,0 +1,101 @@
+"""
+=================================== LICENSE ==================================
+Copyright (c) 2021, Consortium Board ROXANNE
+All rights reserved.
+
+Redistribution and use in source and binary forms, with or without
+modification, are permitted provided that the following conditions are met:
+
+Redistributions of source code must retain the above copyright
+notice, this list of conditions and the following disclaimer.
+
+Redistributions in binary form must reproduce the above copyright
+notice, this list of conditions and the following disclaimer in the
+documentation and/or other materials provided with the distribution.
+
+Neither the name of the ROXANNE nor the
+names of its contributors may be used to endorse or promote products
+derived from this software without specific prior written permission.
+
+THIS SOFTWARE IS PROVIDED BY CONSORTIUM BOARD ROXANNE ``AS IS'' AND ANY
+EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+DISCLAIMED. IN NO EVENT SHALL CONSORTIUM BOARD TENCOMPETENCE BE LIABLE FOR ANY
+DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+(INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+(INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+==============================================================================
+"""
+import os
+import sys
+
+# find path to root directory of the project so as to import from other packages
+tokens = os.path.abspath(__file__).split('/')
+path2root = '/'.join(tokens[:-2])
+if path2root not in sys.path:
+    sys.path.append(path2root)
+
+import copy
+import random
+import time
+
+from storage.builtin_datasets import BuiltinDataset
+from synthetic_networks import synthetic_network
+
+
+def synthetic_dataset(num_nodes=2000, seed=0):
+    dataset = BuiltinDataset(None, from_file=False)
+    nodes, edges = synthetic_network(num_nodes, seed=seed)
+    for node in nodes:
+        dataset._index_line_object({'type': 'node', 'id': node['id'], 'properties': node['properties']})
+    for edge in edges:
+        dataset._index_line_object(dict(edge, type='edge'))
+    return dataset
+
+
+def random_writes(dataset, num_writes, random_state):
+    """ updates of nodes and edges, new edges, deleted edges and renamed nodes """
+    for i in range(num_writes):
+        node_ids = list(dataset.nodes)
+        u, v = random_state.choice(node_ids), random_state.choice(node_ids)
+        choice = i % 5
+        if choice == 0:
+            dataset.update_a_node(u, dict(dataset.nodes[u], score=i))
+        elif choice == 1:
+            dataset.add_an_edge(u, v, {'type': 'meets', 'weight': i})
+        elif choice == 2 and dataset.adj_list.get(u):
+            e_index = dataset.adj_list[u][0]
+            dataset.update_an_edge(e_index=e_index, properties=dict(dataset.edges[e_index]['properties'], weight=i))
+        elif choice == 3 and dataset.adj_list.get(u):
+            dataset.delete_an_edge(e_index=dataset.adj_list[u][0])
+        elif choice == 4:
+            dataset.rename_node(u, '%s_%d' % (u, i))
+
+
+def benchmark_snapshots(num_nodes=50000, num_writes=1000):
+    """ consistent reads from a snapshot vs from a deep copy of the dataset """
+    dataset = synthetic_dataset(num_nodes)
+    print('%d nodes, %d edges' % (len(dataset.nodes), len(dataset.edges)))
+    begin = time.perf_counter()
+    copy.deepcopy((dataset.nodes, dataset.edges, dataset.adj_list, dataset.in_adj_list))
+    print('deep copy: %.3f s' % (time.perf_counter() - begin))
+    begin = time.perf_counter()
+    snapshot = dataset.snapshot()
+    print('snapshot: %.6f s' % (time.perf_counter() - begin))
+    begin = time.perf_counter()
+    random_writes(dataset, 1, random.Random(3))
+    print('first write after the snapshot, forking the containers: %.3f s' % (time.perf_counter() - begin))
+    begin = time.perf_counter()
+    random_writes(dataset, num_writes, random.Random(4))
+    print('%d writes: %.3f s' % (num_writes, time.perf_counter() - begin))
+    snapshot.release()
+    begin = time.perf_counter()
+    random_writes(dataset, num_writes, random.Random(4))
+    print('%d writes without snapshot: %.3f s' % (num_writes, time.perf_counter() - begin))
+
+
+if __name__ == '__main__':
+    benchmark_snapshots()
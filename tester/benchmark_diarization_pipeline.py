@@ -0,0 +1,87 @@
+"""
+=================================== LICENSE ==================================
+Copyright (c) 2021, Consortium Board ROXANNE
+All rights reserved.
+
+Redistribution and use in source and binary forms, with or without
+modification, are permitted provided that the following conditions are met:
+
+Redistributions of source code must retain the above copyright
+notice, this list of conditions and the following disclaimer.
+
+Redistributions in binary form must reproduce the above copyright
+notice, this list of conditions and the following disclaimer in the
+documentation and/or other materials provided with the distribution.
+
+Neither the name of the ROXANNE nor the
+names of its contributors may be used to endorse or promote products
+derived from this software without specific prior written permission.
+
+THIS SOFTWARE IS PROVIDED BY CONSORTIUM BOARD ROXANNE ``AS IS'' AND ANY
+EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+DISCLAIMED. IN NO EVENT SHALL CONSORTIUM BOARD TENCOMPETENCE BE LIABLE FOR ANY
+DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+(INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+(INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+==============================================================================
+"""
+import os
+import sys
+
+# find path to root directory of the project so as to import from other packages
+tokens = os.path.abspath(__file__).split('/')
+path2root = '/'.join(tokens[:-2])
+if path2root not in sys.path:
+    sys.path.append(path2root)
+
+import shutil
+import tempfile
+import time
+import numpy as np
+
+from storage.diarization_pipeline import DiarizationPipeline, compute_features
+
+
+def synthetic_recordings(num_recordings=32, seconds=60, seed=0):
+    """ noise recordings of 16 kHz, only the running time of the pipeline is meaningful on them """
+    random_state = np.random.RandomState(seed)
+    return [{'signal': random_state.uniform(-0.3, 0.3, 16000 * seconds), 'samplerate': 16000}
+            for _ in range(num_recordings)]
+
+
+def benchmark_features(recordings):
+    begin = time.perf_counter()
+    num_subsegments = sum(len(compute_features(r['signal'], r['samplerate'])) for r in recordings)
+    print('features of %d recordings (%d subsegments): %.2f s' % (
+        len(recordings), num_subsegments, time.perf_counter() - begin))
+
+
+def benchmark_scaling(model_path, recordings, max_workers=None):
+    """ throughput with a growing number of processes, with a cold then a warm cache """
+    max_workers = max_workers or os.cpu_count() or 1
+    workers = 1
+    while workers <= max_workers:
+        cache_dir = tempfile.mkdtemp()
+        try:
+            pipeline = DiarizationPipeline(model_path, cache_dir=cache_dir, workers=workers)
+            for run in ('cold', 'warm'):
+                begin = time.perf_counter()
+                _, statistics = pipeline.extract_xvectors(recordings)
+                elapsed = time.perf_counter() - begin
+                print('%d workers, %s cache: %.2f s (%.2f recordings/s), %s' % (
+                    workers, run, elapsed, len(recordings) / elapsed, statistics))
+        finally:
+            shutil.rmtree(cache_dir)
+        workers *= 2
+
+
+if __name__ == '__main__':
+    # usage: python benchmark_diarization_pipeline.py [path to the x-vector extractor model]
+    recordings = synthetic_recordings()
+    benchmark_features(recordings)
+    if len(sys.argv) > 1:
+        benchmark_scaling(sys.argv[1], recordings)
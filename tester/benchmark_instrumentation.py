@@ -0,0 +1,73 @@
+"""
+=================================== LICENSE ==================================
+Copyright (c) 2021, Consortium Board ROXANNE
+All rights reserved.
+
+Redistribution and use in source and binary forms, with or without
+modification, are permitted provided that the following conditions are met:
+
+Redistributions of source code must retain the above copyright
+notice, this list of conditions and the following disclaimer.
+
+Redistributions in binary form must reproduce the above copyright
+notice, this list of conditions and the following disclaimer in the
+documentation and/or other materials provided with the distribution.
+
+Neither the name of the ROXANNE nor the
+names of its contributors may be used to endorse or promote products
+derived from this software without specific prior written permission.
+
+THIS SOFTWARE IS PROVIDED BY CONSORTIUM BOARD ROXANNE ``AS IS'' AND ANY
+EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+DISCLAIMED. IN NO EVENT SHALL CONSORTIUM BOARD TENCOMPETENCE BE LIABLE FOR ANY
+DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+(INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+(INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+==============================================================================
+"""
+import os
+import sys
+
+# find path to root directory of the project so as to import from other packages
+tokens = os.path.abspath(__file__).split('/')
+path2root = '/'.join(tokens[:-2])
+if path2root not in sys.path:
+    sys.path.append(path2root)
+
+import time
+
+from analyzer.common import instrumentation
+
+
+def benchmark_disabled_overhead(num_calls=10 ** 6):
+    """ cost of a span and of a traced call when nothing is recorded """
+    @instrumentation.traced()
+    def traced_function():
+        pass
+
+    def function():
+        pass
+
+    begin = time.perf_counter()
+    for _ in range(num_calls):
+        function()
+    reference = time.perf_counter() - begin
+    begin = time.perf_counter()
+    for _ in range(num_calls):
+        with instrumentation.span('stage'):
+            pass
+    spans = time.perf_counter() - begin
+    begin = time.perf_counter()
+    for _ in range(num_calls):
+        traced_function()
+    traced = time.perf_counter() - begin
+    print('per call: function %.0f ns, disabled span %.0f ns, disabled traced function %.0f ns' % (
+        1e9 * reference / num_calls, 1e9 * spans / num_calls, 1e9 * traced / num_calls))
+
+
+if __name__ == '__main__':
+    benchmark_disabled_overhead()
@@ -0,0 +1,81 @@
+"""
+=================================== LICENSE ==================================
+Copyright (c) 2021, Consortium Board ROXANNE
+All rights reserved.
+
+Redistribution and use in source and binary forms, with or without
+modification, are permitted provided that the following conditions are met:
+
+Redistributions of source code must retain the above copyright
+notice, this list of conditions and the following disclaimer.
+
+Redistributions in binary form must reproduce the above copyright
+notice, this list of conditions and the following disclaimer in the
+documentation and/or other materials provided with the distribution.
+
+Neither the name of the ROXANNE nor the
+names of its contributors may be used to endorse or promote products
+derived from this software without specific prior written permission.
+
+THIS SOFTWARE IS PROVIDED BY CONSORTIUM BOARD ROXANNE ``AS IS'' AND ANY
+EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+DISCLAIMED. IN NO EVENT SHALL CONSORTIUM BOARD TENCOMPETENCE BE LIABLE FOR ANY
+DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+(INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+(INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+==============================================================================
+"""
+import os
+import sys
+
+# find path to root directory of the project so as to import from other packages
+tokens = os.path.abspath(__file__).split('/')
+path2root = '/'.join(tokens[:-2])
+if path2root not in sys.path:
+    sys.path.append(path2root)
+
+import shutil
+import tempfile
+import time
+import numpy as np
+
+from storage.kit.VBx import kaldi_io
+from storage.kaldi_ark_index import ArkIndex
+
+
+def write_xvector_ark(folder, num_records, seed=0):
+    """ an ark of x-vector like float vectors """
+    random_state = np.random.RandomState(seed)
+    xvector_ark = os.path.join(folder, 'xvectors.ark')
+    with open(xvector_ark, 'wb') as ark_file:
+        for i in range(num_records):
+            kaldi_io.write_vec_flt(ark_file, random_state.randn(512).astype(np.float32), key='rec%05d_%04d' % (i, i))
+    return xvector_ark
+
+
+def benchmark_kaldi_ark_index(num_records=100000, num_lookups=5000):
+    folder = tempfile.mkdtemp()
+    try:
+        xvector_ark = write_xvector_ark(folder, num_records)
+        keys = ['rec%05d_%04d' % (i, i) for i in np.random.RandomState(1).choice(num_records, num_lookups)]
+        begin = time.perf_counter()
+        index = ArkIndex.build(xvector_ark)
+        print('index of %d x-vectors: %.2f s' % (num_records, time.perf_counter() - begin))
+        begin = time.perf_counter()
+        index.stack(keys)
+        print('batched lookup of %d keys: %.4f s' % (num_lookups, time.perf_counter() - begin))
+        begin = time.perf_counter()
+        reference = {key: value for key, value in kaldi_io.read_vec_flt_ark(xvector_ark)}
+        np.array([reference[key] for key in keys])
+        print('sequential read of the ark: %.2f s' % (time.perf_counter() - begin))
+        index.close()
+    finally:
+        shutil.rmtree(folder)
+
+
+if __name__ == '__main__':
+    benchmark_kaldi_ark_index()
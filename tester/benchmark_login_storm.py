@@ -0,0 +1,139 @@
+"""
+=================================== LICENSE ==================================
+Copyright (c) 2021, Consortium Board ROXANNE
+All rights reserved.
+
+Redistribution and use in source and binary forms, with or without
+modification, are permitted provided that the following conditions are met:
+
+Redistributions of source code must retain the above copyright
+notice, this list of conditions and the following disclaimer.
+
+Redistributions in binary form must reproduce the above copyright
+notice, this list of conditions and the following disclaimer in the
+documentation and/or other materials provided with the distribution.
+
+Neither the name of the ROXANNE nor the
+names of its contributors may be used to endorse or promote products
+derived from this software without specific prior written permission.
+
+THIS SOFTWARE IS PROVIDED BY CONSORTIUM BOARD ROXANNE ``AS IS'' AND ANY
+EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+DISCLAIMED. IN NO EVENT SHALL CONSORTIUM BOARD TENCOMPETENCE BE LIABLE FOR ANY
+DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+(INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+(INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+==============================================================================
+"""
+import os
+import sys
+
+# find path to root directory of the project so as to import from other packages
+tokens = os.path.abspath(__file__).split('/')
+path2root = '/'.join(tokens[:-2])
+if path2root not in sys.path:
+    sys.path.append(path2root)
+
+import json
+import logging
+import time
+import threading
+import http.client
+import argparse
+import numpy as np
+from socketserver import ThreadingMixIn
+from wsgiref.simple_server import make_server, WSGIServer, WSGIRequestHandler
+
+from conductor import api
+from conductor.src.helpers import password_helpers
+from conductor.src.helpers.auth_helpers import create_token
+
+
+class ThreadingWSGIServer(ThreadingMixIn, WSGIServer):
+    daemon_threads = True
+    request_queue_size = 256
+
+
+class QuietHandler(WSGIRequestHandler):
+    def log_message(self, *args):
+        pass
+
+
+def request(port, method, path, body=None, headers=None):
+    connection = http.client.HTTPConnection('127.0.0.1', port)
+    start = time.perf_counter()
+    connection.request(method, path, body=json.dumps(body) if body is not None else None,
+                       headers=dict({'Content-Type': 'application/json'}, **(headers or {})))
+    status = connection.getresponse()
+    status.read()
+    connection.close()
+    return status.status, time.perf_counter() - start
+
+
+def login_storm(port, stop, statuses):
+    """ one client logging in as fast as it can, waiting a bit when refused """
+    while not stop.is_set():
+        status, _ = request(port, 'POST', '/v1.0/login', {'username': 'admin', 'password': 'Pass1234'})
+        statuses.append(status)
+        if status == 429:
+            stop.wait(0.1)
+
+
+def measure_latencies(port, duration, token):
+    latencies = []
+    end = time.time() + duration
+    while time.time() < end:
+        status, latency = request(port, 'GET', '/v1.0/datasets', headers={'Authorization': 'Bearer ' + token})
+        assert status == 200
+        latencies.append(latency)
+    return np.array(latencies)
+
+
+def run(port, login_clients, duration, offload):
+    """ p50/p99 latency of listing datasets while login_clients clients log in continuously """
+    run_hashing = password_helpers.HashingExecutor.run
+    limits = password_helpers.client_limiter.limit, password_helpers.username_limiter.limit
+    if not offload:
+        # hashing on the request thread, without limits
+        password_helpers.HashingExecutor.run = lambda self, function, *args: function(*args)
+        password_helpers.client_limiter.limit = password_helpers.username_limiter.limit = 10 ** 6
+    token = create_token({'username': 'admin'})
+    stop = threading.Event()
+    statuses = []
+    storm = [threading.Thread(target=login_storm, args=(port, stop, statuses), daemon=True)
+             for _ in range(login_clients)]
+    for thread in storm:
+        thread.start()
+    try:
+        latencies = measure_latencies(port, duration, token)
+    finally:
+        stop.set()
+        for thread in storm:
+            thread.join()
+        password_helpers.HashingExecutor.run = run_hashing
+        password_helpers.client_limiter.limit, password_helpers.username_limiter.limit = limits
+    refused = sum(1 for status in statuses if status == 429)
+    print('%s, %d login clients: %d requests, p50 %.1f ms, p99 %.1f ms, %d logins (%d refused)' % (
+        'offloaded' if offload else 'inline', login_clients, len(latencies), 1000 * np.percentile(latencies, 50),
+        1000 * np.percentile(latencies, 99), len(statuses), refused))
+    return np.percentile(latencies, 99)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='latency of the API during a burst of logins')
+    parser.add_argument('--clients', type=int, default=32, help='number of clients logging in concurrently')
+    parser.add_argument('--duration', type=float, default=10, help='seconds of measurement per run')
+    args = parser.parse_args()
+    logging.getLogger('api').setLevel(logging.CRITICAL)
+
+    server = make_server('127.0.0.1', 0, api, server_class=ThreadingWSGIServer, handler_class=QuietHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    port = server.server_address[1]
+    run(port, 0, args.duration, True)
+    run(port, args.clients, args.duration, False)
+    run(port, args.clients, args.duration, True)
+    server.shutdown()
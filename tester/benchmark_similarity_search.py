@@ -0,0 +1,80 @@
+"""
+=================================== LICENSE ==================================
+Copyright (c) 2021, Consortium Board ROXANNE
+All rights reserved.
+
+Redistribution and use in source and binary forms, with or without
+modification, are permitted provided that the following conditions are met:
+
+Redistributions of source code must retain the above copyright
+notice, this list of conditions and the following disclaimer.
+
+Redistributions in binary form must reproduce the above copyright
+notice, this list of conditions and the following disclaimer in the
+documentation and/or other materials provided with the distribution.
+
+Neither the name of the ROXANNE nor the
+names of its contributors may be used to endorse or promote products
+derived from this software without specific prior written permission.
+
+THIS SOFTWARE IS PROVIDED BY CONSORTIUM BOARD ROXANNE ``AS IS'' AND ANY
+EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+DISCLAIMED. IN NO EVENT SHALL CONSORTIUM BOARD TENCOMPETENCE BE LIABLE FOR ANY
+DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+(INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+(INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+==============================================================================
+"""
+import os
+import sys
+
+# find path to root directory of the project so as to import from other packages
+tokens = os.path.abspath(__file__).split('/')
+# print('tokens = ', tokens)
+path2root = '/'.join(tokens[:-2])
+# print('path2root = ', path2root)
+if path2root not in sys.path:
+    sys.path.append(path2root)
+
+import time
+import numpy as np
+
+from analyzer.common.nearest_neighbors import normalize_rows, exact_top_k, IVFIndex
+
+
+def benchmark_similarity_search(num_nodes=200000, dim=64, num_queries=200, top_k=10, num_topics=500, seed=0):
+    """
+    recall vs latency of the ivf index against the exact blocked search, on clustered synthetic embeddings
+    """
+    random_state = np.random.RandomState(seed)
+    topics = random_state.standard_normal((num_topics, dim)).astype(np.float32)
+    matrix = topics[random_state.randint(0, num_topics, num_nodes)] + \
+        1.5 * random_state.standard_normal((num_nodes, dim)).astype(np.float32)
+    matrix = normalize_rows(matrix)
+    query_rows = random_state.choice(num_nodes, num_queries, replace=False)
+    queries = matrix[query_rows]
+
+    start = time.perf_counter()
+    _, exact = exact_top_k(queries, matrix, top_k, exclude=query_rows)
+    exact_time = time.perf_counter() - start
+    print('exact: %.2f ms/query' % (1000 * exact_time / num_queries))
+
+    start = time.perf_counter()
+    index = IVFIndex.build(matrix)
+    print('ivf build (%d lists): %.2f s' % (len(index.centroids), time.perf_counter() - start))
+
+    print('n_probe\trecall@%d\tms/query' % top_k)
+    for n_probe in (1, 2, 4, 8, 16, 32, 64):
+        start = time.perf_counter()
+        _, approximate = index.search(queries, matrix, top_k, n_probe=n_probe, exclude=query_rows)
+        elapsed = time.perf_counter() - start
+        recall = np.mean([len(set(a) & set(e)) / len(e) for a, e in zip(approximate, exact)])
+        print('%d\t%.3f\t\t%.2f' % (n_probe, recall, 1000 * elapsed / num_queries))
+
+
+if __name__ == '__main__':
+    benchmark_similarity_search()
@@ -0,0 +1,394 @@
+"""
+=================================== LICENSE ==================================
+Copyright (c) 2021, Consortium Board ROXANNE
+All rights reserved.
+
+Redistribution and use in source and binary forms, with or without
+modification, are permitted provided that the following conditions are met:
+
+Redistributions of source code must retain the above copyright
+notice, this list of conditions and the following disclaimer.
+
+Redistributions in binary form must reproduce the above copyright
+notice, this list of conditions and the following disclaimer in the
+documentation and/or other materials provided with the distribution.
+
+Neither the name of the ROXANNE nor the
+names of its contributors may be used to endorse or promote products
+derived from this software without specific prior written permission.
+
+THIS SOFTWARE IS PROVIDED BY CONSORTIUM BOARD ROXANNE ``AS IS'' AND ANY
+EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+DISCLAIMED. IN NO EVENT SHALL CONSORTIUM BOARD TENCOMPETENCE BE LIABLE FOR ANY
+DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+(INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+(INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+==============================================================================
+"""
+import os
+import sys
+
+# find path to root directory of the project so as to import from other packages
+tokens = os.path.abspath(__file__).split('/')
+path2root = '/'.join(tokens[:-2])
+if path2root not in sys.path:
+    sys.path.append(path2root)
+
+import argparse
+import base64
+import contextlib
+import io
+import json
+import platform
+import random
+import subprocess
+import tempfile
+import time
+import tracemalloc
+import warnings
+from datetime import datetime, timezone
+
+import numpy as np
+
+from analyzer import request_taker
+from analyzer.request_taker import InMemoryAnalyzer
+from storage.builtin_datasets import BuiltinDataset, BuiltinDatasetsManager, ActiveNetwork
+from synthetic_networks import write_synthetic_datasets
+
+SCALES = {'small': 1000, 'medium': 10000, 'large': 100000}
+GROUPS = ('loaders', 'queries', 'analysis', 'serialization', 'callbacks')
+
+
+class BenchmarkRunner:
+    """
+    times functions (wall clock and cpu time, best of `repeat` runs) and measures their peak Python allocations
+    with tracemalloc in an extra run, so that tracing does not distort the timings
+    """
+
+    def __init__(self, repeat=3, memory=True, max_seconds=60.0, growth=2.0):
+        """
+        :param repeat: maximum number of timed runs, runs stop once they took a second in total
+        :param memory: measure peak allocations in an extra run
+        :param max_seconds: benchmarks whose running time, extrapolated from a smaller scale, exceeds this are skipped
+        :param growth: exponent of the extrapolation: time grows as (number of nodes) ** growth
+        """
+        self.repeat = repeat
+        self.memory = memory
+        self.max_seconds = max_seconds
+        self.growth = growth
+        self.results = []
+        self._last = {}  # (group, name) -> (number of nodes, wall seconds) of the last run
+
+    def run(self, scale, num_nodes, group, name, function, setup=None):
+        """
+        :param scale: name of the scale
+        :param num_nodes: number of nodes at this scale, used to extrapolate the running time of slow benchmarks
+        :param group: group of the benchmark
+        :param name: name of the benchmark
+        :param function: function to time, called with the value returned by `setup`
+        :param setup: optional function preparing the argument of `function`, not timed and called before each run
+        :return: the result record
+        """
+        record = {'scale': scale, 'nodes': num_nodes, 'group': group, 'name': name}
+        last = self._last.get((group, name))
+        if last is not None:
+            estimate = last[1] * (float(num_nodes) / last[0]) ** self.growth
+            if estimate > self.max_seconds:
+                record.update(status='skipped', message='estimated %.0f s' % estimate)
+                self.results.append(record)
+                return record
+        walls, cpus = [], []
+        try:
+            for run in range(self.repeat):
+                argument = setup() if setup is not None else None
+                printed = io.StringIO()
+                with contextlib.redirect_stdout(printed), warnings.catch_warnings():
+                    warnings.simplefilter('ignore')
+                    wall, cpu = time.perf_counter(), time.process_time()
+                    output = function(argument)
+                    walls.append(time.perf_counter() - wall)
+                    cpus.append(time.process_time() - cpu)
+                if isinstance(output, dict) and output.get('success') == 0:
+                    # the analyzers print the exception before returning their error
+                    lines = printed.getvalue().strip().splitlines()
+                    raise RuntimeError('%s%s' % (output.get('message', 'failed'), ' (%s)' % lines[-1] if lines else ''))
+                if sum(walls) > 1.0:
+                    break  # slow enough for the runs so far to be meaningful
+            record.update(status='ok', wall_seconds=min(walls), cpu_seconds=min(cpus), runs=len(walls))
+            if self.memory and min(walls) < self.max_seconds / 4:
+                # tracing slows allocations down several times
+                argument = setup() if setup is not None else None
+                tracemalloc.start()
+                try:
+                    with contextlib.redirect_stdout(io.StringIO()), warnings.catch_warnings():
+                        warnings.simplefilter('ignore')
+                        function(argument)
+                    record['peak_memory_bytes'] = tracemalloc.get_traced_memory()[1]
+                finally:
+                    tracemalloc.stop()
+            self._last[(group, name)] = (num_nodes, min(walls))
+        except Exception as e:
+            record.update(status='failed', message='%s: %s' % (type(e).__name__, e))
+        self.results.append(record)
+        return record
+
+
+def default_parameters(task_id, method, info, network, random_state):
+    """ parameters of an analysis method: first accepted value of each parameter, and a few sources if needed """
+    params = {}
+    for name, parameter in info.get('parameter', {}).items():
+        options = parameter.get('options', {})
+        if 'Integer' in options:
+            params[name] = options['Integer'][0] if isinstance(options['Integer'], list) else 16
+        elif options:
+            params[name] = next(iter(options))
+    if task_id in ('link_prediction', 'similarity_search'):
+        # the analyzers only know the nodes with edges
+        node_ids = sorted(set(edge['source'] for edge in network['edges']))
+        params['sources'] = random_state.sample(node_ids, min(10, len(node_ids)))
+    return params
+
+
+def benchmark_scale(runner, scale, paths, groups, log):
+    num_nodes = paths['nodes']
+    random_state = random.Random(0)
+
+    def bench(group, name, function, setup=None):
+        if group not in groups:
+            return
+        record = runner.run(scale, num_nodes, group, name, function, setup)
+        log(record)
+
+    # loaders
+    with open(paths['old']) as dataset_file:
+        old_content = dataset_file.read()
+    bench('loaders', 'builtin_dataset_old_format', lambda _: BuiltinDataset(paths['old']))
+    bench('loaders', 'builtin_dataset_new_format', lambda _: BuiltinDataset(paths['new']))
+    bench('loaders', 'builtin_dataset_uploaded', lambda _: BuiltinDataset(old_content, uploaded=True))
+    bench('loaders', 'datasets_manager_add_dataset',
+          lambda manager: manager.add_dataset('synthetic', 'Synthetic', paths['old']),
+          setup=lambda: BuiltinDatasetsManager(connector=None, params=None))
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        dataset = BuiltinDataset(paths['old'])
+    node_ids = list(dataset.nodes)
+    few_nodes = random_state.sample(node_ids, min(10, len(node_ids)))
+    many_nodes = random_state.sample(node_ids, min(1000, len(node_ids)))
+
+    # queries
+    bench('queries', 'get_network_all', lambda _: dataset.get_network())
+    bench('queries', 'get_network_10_nodes', lambda _: dataset.get_network(node_ids=few_nodes))
+    bench('queries', 'get_network_1000_nodes', lambda _: dataset.get_network(node_ids=many_nodes))
+    bench('queries', 'get_neighbors_1000_nodes', lambda _: dataset.get_neighbors(node_ids=many_nodes))
+    bench('queries', 'search_nodes_1000_nodes', lambda _: dataset.search_nodes(node_ids=many_nodes))
+    bench('queries', 'get_network_time_window',
+          lambda _: dataset.get_network(time_window={'start': '2020-03-01', 'end': '2020-04-01'}))
+
+    def active_network():
+        with contextlib.redirect_stdout(io.StringIO()):
+            active = ActiveNetwork(path_2_data=paths['old'])
+            active.initialize(selected_nodes=few_nodes, params={'network_name': scale})
+        return active
+
+    if 'queries' in groups or 'callbacks' in groups:
+        with contextlib.redirect_stdout(io.StringIO()):
+            active = active_network()
+
+        def reinitialized():
+            with contextlib.redirect_stdout(io.StringIO()):
+                active.initialize(selected_nodes=few_nodes, params={'network_name': scale})
+            return active
+
+        bench('queries', 'expand_nodes_10_nodes', lambda network: network.expand_nodes(few_nodes),
+              setup=reinitialized)
+
+    # every method of every analysis task
+    if 'analysis' in groups:
+        network = dataset.get_network()
+        analyzer = InMemoryAnalyzer()
+        for task_id, task_info in request_taker.get_info().items():
+            for method, method_info in task_info['methods'].items():
+                params = default_parameters(task_id, method, method_info, network, random_state)
+                task = {'task_id': task_id, 'network': network, 'options': {'method': method, 'parameters': params}}
+                bench('analysis', '%s.%s' % (task_id, method),
+                      lambda task: analyzer.perform_analysis(task=task, params=None), setup=lambda task=task: task)
+
+    # serialization
+    bench('serialization', 'get_network_json_dumps', lambda _: json.dumps(dataset.get_network()))
+    try:
+        import msgpack
+        bench('serialization', 'get_network_msgpack', lambda _: msgpack.packb(dataset.get_network()))
+    except ImportError:
+        pass
+    if 'serialization' in groups or 'callbacks' in groups:
+        active = active_network()
+        session = active.serialize_network()['mem_object'].getvalue()
+        with open(paths['new'], 'rb') as dataset_file:
+            new_content = dataset_file.read()
+        uploads = {name: 'data:application/json;base64,' + base64.b64encode(content).decode()
+                   for name, content in (('session', session), ('new_format', new_content))}
+        bench('serialization', 'serialize_network', lambda _: active.serialize_network())
+        bench('serialization', 'serialize_network_new_format', lambda network: network.serialize_network_new_format(),
+              setup=active_network)
+        for name, upload in uploads.items():
+            bench('serialization', 'deserialize_network_%s' % name,
+                  lambda network, upload=upload: network.deserialize_network(upload),
+                  setup=lambda: ActiveNetwork(path_2_data=None, from_file=False))
+
+    # the work done by the main Dash callback (visualizer/app.py) for the most frequent interactions
+    if 'callbacks' in groups:
+        try:
+            from visualizer import dash_formatter
+        except ImportError:
+            dash_formatter = None
+
+        def network_info(network):
+            info = network.get_active_network_info()
+            return dash_formatter.dash_network_info(info) if dash_formatter is not None else info
+
+        def load_network_button(_):
+            network = ActiveNetwork(path_2_data=paths['old'], initialize=True, selected_nodes=few_nodes,
+                                    params={'network_name': scale})
+            return network_info(network)
+
+        def expand_all_button(network):
+            network.expand_nodes([node for node in network.active_nodes if network.active_nodes[node]['expandable']])
+            return network_info(network)
+
+        def analysis_button(arguments):
+            network, task_id, method = arguments
+            return network.apply_analysis(task_id, method, params={})
+
+        def toggle_type_checkboxes(network):
+            for node_type in network.get_active_node_types():
+                network.hide_elements(node_types=[node_type])
+                network.unhide_elements(node_types=[node_type])
+                network.highlight_elements(node_types=[node_type])
+                network.unhighlight_elements(node_types=[node_type])
+
+        def expanded():
+            network = active_network()
+            with contextlib.redirect_stdout(io.StringIO()):
+                network.expand_nodes(list(network.active_nodes))
+            return network
+
+        def tap_nodes(network):
+            for node in list(network.active_nodes)[:20]:
+                network.toggle_node_selection(node)
+
+        bench('callbacks', 'load_network_button', load_network_button)
+        bench('callbacks', 'expand_all_button', expand_all_button, setup=active_network)
+        bench('callbacks', 'tap_node', tap_nodes, setup=expanded)
+        bench('callbacks', 'type_checkboxes', toggle_type_checkboxes, setup=expanded)
+        for task_id, method in (('community_detection', 'louvain'), ('social_influence_analysis', 'pagerank')):
+            bench('callbacks', 'analysis_button.%s.%s' % (task_id, method), analysis_button,
+                  setup=lambda task_id=task_id, method=method: (expanded(), task_id, method))
+        bench('callbacks', 'upload', lambda network: network.deserialize_network(uploads['session']),
+              setup=lambda: ActiveNetwork(path_2_data=None, from_file=False))
+
+
+def environment():
+    """ description of the machine and of the code that produced the results """
+    try:
+        commit = subprocess.check_output(['git', 'rev-parse', 'HEAD'], cwd=path2root,
+                                         stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {'date': datetime.now(timezone.utc).isoformat(), 'commit': commit, 'python': platform.python_version(),
+            'platform': platform.platform(), 'cpus': os.cpu_count(), 'numpy': np.__version__}
+
+
+def compare(results, baseline, tolerance=1.25, min_seconds=0.01):
+    """
+    compare results with those of a baseline run
+    :param results: records of this run
+    :param baseline: records of the baseline run
+    :param tolerance: ratio of wall time (or peak memory) above which a benchmark is reported as a regression
+    :param min_seconds: differences of wall time below this are ignored as noise
+    :return: list of (record, baseline record, time ratio, memory ratio, regression) for benchmarks run in both
+    """
+    previous = {(r['scale'], r['group'], r['name']): r for r in baseline}
+    comparisons = []
+    for record in results:
+        before = previous.get((record['scale'], record['group'], record['name']))
+        if before is None or record['status'] != 'ok' or before['status'] != 'ok':
+            continue
+        time_ratio = record['wall_seconds'] / max(before['wall_seconds'], 1e-9)
+        memory_ratio = None
+        if record.get('peak_memory_bytes') and before.get('peak_memory_bytes'):
+            memory_ratio = record['peak_memory_bytes'] / before['peak_memory_bytes']
+        regression = (time_ratio > tolerance and record['wall_seconds'] - before['wall_seconds'] > min_seconds) or \
+                     (memory_ratio is not None and memory_ratio > tolerance and
+                      record['peak_memory_bytes'] - before['peak_memory_bytes'] > 1 << 20)
+        comparisons.append((record, before, time_ratio, memory_ratio, regression))
+    return comparisons
+
+
+def _print_record(record):
+    if record['status'] == 'ok':
+        print('%-7s %-14s %-60s %9.4f s %9.4f s cpu %10.1f KiB' % (
+            record['scale'], record['group'], record['name'], record['wall_seconds'], record['cpu_seconds'],
+            record.get('peak_memory_bytes', 0) / 1024.0))
+    else:
+        print('%-7s %-14s %-60s %s (%s)' % (record['scale'], record['group'], record['name'], record['status'],
+                                           record.get('message', '')))
+    sys.stdout.flush()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='benchmarks of the loaders, queries, analyzers, serialization and '
+                                                 'visualizer callbacks on synthetic criminal networks')
+    parser.add_argument('--scales', nargs='+', default=['small', 'medium'], choices=list(SCALES))
+    parser.add_argument('--groups', nargs='+', default=list(GROUPS), choices=list(GROUPS))
+    parser.add_argument('--output', default='benchmark_results.json', help='JSON file receiving the results')
+    parser.add_argument('--baseline', help='JSON results of a previous run to compare with')
+    parser.add_argument('--tolerance', type=float, default=1.25, help='slowdown ratio reported as a regression')
+    parser.add_argument('--repeat', type=int, default=3, help='number of timed runs, the best one is kept')
+    parser.add_argument('--max-seconds', type=float, default=60.0,
+                        help='benchmarks extrapolated to run longer than this at a larger scale are skipped')
+    parser.add_argument('--growth', type=float, default=2.0,
+                        help='exponent of the running time in the number of nodes used by the extrapolation')
+    parser.add_argument('--no-memory', action='store_true', help='do not measure peak allocations')
+    parser.add_argument('--data-dir', help='folder of the synthetic datasets, a temporary folder by default')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args(argv)
+
+    runner = BenchmarkRunner(repeat=args.repeat, memory=not args.no_memory, max_seconds=args.max_seconds,
+                             growth=args.growth)
+    with tempfile.TemporaryDirectory() as temp_dir:
+        data_dir = args.data_dir or temp_dir
+        scales = {scale: SCALES[scale] for scale in sorted(args.scales, key=SCALES.get)}
+        datasets = write_synthetic_datasets(data_dir, scales, seed=args.seed)
+        for scale in scales:
+            print('# %s: %d nodes, %d edges' % (scale, datasets[scale]['nodes'], datasets[scale]['edges']))
+            benchmark_scale(runner, scale, datasets[scale], set(args.groups), _print_record)
+
+    report = {'environment': environment(), 'datasets': {scale: {'nodes': d['nodes'], 'edges': d['edges']}
+                                                          for scale, d in datasets.items()},
+              'results': runner.results}
+    with open(args.output, 'w') as output_file:
+        json.dump(report, output_file, indent=2)
+    print('results written to %s' % args.output)
+
+    if args.baseline:
+        with open(args.baseline) as baseline_file:
+            baseline = json.load(baseline_file)
+        comparisons = compare(runner.results, baseline['results'], tolerance=args.tolerance)
+        regressions = 0
+        for record, before, time_ratio, memory_ratio, regression in comparisons:
+            regressions += regression
+            print('%-7s %-14s %-60s x%.2f time%s%s' % (
+                record['scale'], record['group'], record['name'], time_ratio,
+                ', x%.2f memory' % memory_ratio if memory_ratio is not None else '',
+                '  REGRESSION' if regression else ''))
+        print('%d regressions out of %d compared benchmarks' % (regressions, len(comparisons)))
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
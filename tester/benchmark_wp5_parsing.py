@@ -0,0 +1,162 @@
+"""
+=================================== LICENSE ==================================
+Copyright (c) 2021, Consortium Board ROXANNE
+All rights reserved.
+
+Redistribution and use in source and binary forms, with or without
+modification, are permitted provided that the following conditions are met:
+
+Redistributions of source code must retain the above copyright
+notice, this list of conditions and the following disclaimer.
+
+Redistributions in binary form must reproduce the above copyright
+notice, this list of conditions and the following disclaimer in the
+documentation and/or other materials provided with the distribution.
+
+Neither the name of the ROXANNE nor the
+names of its contributors may be used to endorse or promote products
+derived from this software without specific prior written permission.
+
+THIS SOFTWARE IS PROVIDED BY CONSORTIUM BOARD ROXANNE ``AS IS'' AND ANY
+EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+DISCLAIMED. IN NO EVENT SHALL CONSORTIUM BOARD TENCOMPETENCE BE LIABLE FOR ANY
+DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+(INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+(INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+==============================================================================
+"""
+import os
+import sys
+
+# find path to root directory of the project so as to import from other packages
+tokens = os.path.abspath(__file__).split('/')
+path2root = '/'.join(tokens[:-2])
+if path2root not in sys.path:
+    sys.path.append(path2root)
+
+import time
+import numpy as np
+
+from storage.fft_helpers import parse_wp5_output, parse_wp5_output_for_aegis, _generate_channels_and_index, \
+    IncrementalWP5Network
+from storage import voiceprint_clustering
+from storage.kit.VBx import diarization_lib
+
+
+def synthetic_wp5_output(num_conversations=10000, num_speakers=2000, scores_per_channel=30, seed=0):
+    """
+    two-channel conversations between random speakers, each speaker calling from one of a few phone numbers.
+    every channel is scored against `scores_per_channel` random channels and all channels of the same speaker
+    that are close in the list: high scores for the same speaker, low ones otherwise
+    """
+    random_state = np.random.RandomState(seed)
+    speaker_numbers = [['+%d' % (1000000 + 10 * s + i) for i in range(random_state.randint(1, 3))]
+                       for s in range(num_speakers)]
+    conversations, speakers = [], []
+    for c in range(num_conversations):
+        channels = []
+        for k, s in enumerate(random_state.choice(num_speakers, 2, replace=False)):
+            channels.append({'id': 'ch_%d_%d' % (c, k),
+                             'number': speaker_numbers[s][random_state.randint(len(speaker_numbers[s]))]})
+            speakers.append(s)
+        conversations.append({'id': 'con_%d' % c, 'channels': channels,
+                              'date': '2021-%02d-%02d' % (1 + c % 12, 1 + c % 28)})
+    speakers = np.array(speakers)
+    channel_ids = ['ch_%d_%d' % (c, k) for c in range(num_conversations) for k in range(2)]
+
+    order = np.argsort(speakers, kind='stable')
+    matrix = {}
+    for position, u in enumerate(order):
+        candidates = set(random_state.choice(len(channel_ids), scores_per_channel).tolist())
+        for v in order[position + 1:position + 6]:
+            if speakers[v] == speakers[u]:
+                candidates.add(int(v))
+        candidates.discard(int(u))
+        row = {}
+        for v in candidates:
+            mean = 60.0 if speakers[u] == speakers[v] else -20.0
+            row[channel_ids[v]] = float(random_state.normal(mean, 20.0))
+        matrix[channel_ids[u]] = row
+    return {'conversations': conversations, 'voiceprintsMatrix': matrix}, speakers
+
+
+def compare_with_dense_ahc(num_conversations=300, threshold=50, seed=0):
+    """
+    labels of the sparse UPGMA vs diarization_lib.AHC on the dense matrix
+    """
+    wp5_outputs, _ = synthetic_wp5_output(num_conversations, num_conversations // 4, seed=seed)
+    _, channel2index = _generate_channels_and_index(wp5_outputs)
+    num_channels = len(channel2index)
+    dense = np.zeros((num_channels, num_channels))
+    for u, row in wp5_outputs['voiceprintsMatrix'].items():
+        for v, s in row.items():
+            dense[channel2index[u], channel2index[v]] = s
+    rows, cols, scores = voiceprint_clustering.voiceprint_scores(channel2index, wp5_outputs['voiceprintsMatrix'])
+    cannot_rows, cannot_cols = voiceprint_clustering.cannot_link_pairs(channel2index, wp5_outputs['conversations'])
+    dense[cannot_rows, cannot_cols] = -np.inf
+    # AHC averages the rows of the matrix, which is only meaningful for symmetric scores
+    dense = np.where(dense == 0, dense.T, dense)
+    dense = np.where(np.isneginf(dense.T), -np.inf, (dense + dense.T) / 2)
+
+    start = time.perf_counter()
+    expected = diarization_lib.AHC(dense.copy(), threshold)
+    dense_time = time.perf_counter() - start
+    start = time.perf_counter()
+    first, second, similarity = voiceprint_clustering.similarity_graph(num_channels, rows, cols, scores,
+                                                                       cannot_rows, cannot_cols)
+    labels = voiceprint_clustering.average_linkage_clusters(num_channels, first, second, similarity, threshold)
+    sparse_time = time.perf_counter() - start
+    print('%d channels: same labels %s, dense %.2f s, sparse %.3f s' % (
+        num_channels, np.array_equal(expected, labels), dense_time, sparse_time))
+
+
+def benchmark_parsing(scales=(1000, 5000, 20000)):
+    for num_conversations in scales:
+        wp5_outputs, _ = synthetic_wp5_output(num_conversations, num_conversations // 5)
+        for name, parse in (('parse_wp5_output', parse_wp5_output),
+                            ('parse_wp5_output_for_aegis', parse_wp5_output_for_aegis)):
+            start = time.perf_counter()
+            network = parse(wp5_outputs)
+            print('%s: %d channels -> %d elements in %.2f s' % (
+                name, 2 * num_conversations, len(network), time.perf_counter() - start))
+
+
+def benchmark_incremental_parsing(num_conversations=20000, num_batches=10, aegis=True):
+    """
+    daily batches of conversations: time of each incremental batch vs a full parse of the history
+    """
+    wp5_outputs, _ = synthetic_wp5_output(num_conversations, num_conversations // 5)
+    matrix = wp5_outputs['voiceprintsMatrix']
+    builder = IncrementalWP5Network(aegis=aegis, full_recluster_interval=None)
+    batch_size = num_conversations // num_batches
+    for start in range(0, num_conversations, batch_size):
+        conversations = wp5_outputs['conversations'][start:start + batch_size]
+        known = set(builder.channel2index)
+        batch_ids = set(channel['id'] for con in conversations for channel in con['channels'])
+        # scores of the new channels, and of the known channels against them
+        batch_matrix = {}
+        for u, row in matrix.items():
+            if u in batch_ids:
+                batch_matrix[u] = {v: s for v, s in row.items() if v in known or v in batch_ids}
+            elif u in known:
+                scores = {v: s for v, s in row.items() if v in batch_ids}
+                if scores:
+                    batch_matrix[u] = scores
+        begin = time.perf_counter()
+        summary = builder.add_wp5_output({'conversations': conversations, 'voiceprintsMatrix': batch_matrix})
+        print('batch %d: %s in %.2f s, %d speakers' % (
+            start // batch_size, summary, time.perf_counter() - begin, len(builder.clusters.sizes)))
+    begin = time.perf_counter()
+    builder.recluster()
+    print('full clustering of %d channels: %.2f s, %d speakers' % (
+        len(builder.channel2index), time.perf_counter() - begin, len(builder.clusters.sizes)))
+
+
+if __name__ == '__main__':
+    compare_with_dense_ahc()
+    benchmark_parsing()
+    benchmark_incremental_parsing()
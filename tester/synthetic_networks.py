@@ -0,0 +1,177 @@
+"""
+=================================== LICENSE ==================================
+Copyright (c) 2021, Consortium Board ROXANNE
+All rights reserved.
+
+Redistribution and use in source and binary forms, with or without
+modification, are permitted provided that the following conditions are met:
+
+Redistributions of source code must retain the above copyright
+notice, this list of conditions and the following disclaimer.
+
+Redistributions in binary form must reproduce the above copyright
+notice, this list of conditions and the following disclaimer in the
+documentation and/or other materials provided with the distribution.
+
+Neither the name of the ROXANNE nor the
+names of its contributors may be used to endorse or promote products
+derived from this software without specific prior written permission.
+
+THIS SOFTWARE IS PROVIDED BY CONSORTIUM BOARD ROXANNE ``AS IS'' AND ANY
+EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+DISCLAIMED. IN NO EVENT SHALL CONSORTIUM BOARD TENCOMPETENCE BE LIABLE FOR ANY
+DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+(INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+(INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+==============================================================================
+"""
+import os
+import sys
+
+# find path to root directory of the project so as to import from other packages
+tokens = os.path.abspath(__file__).split('/')
+path2root = '/'.join(tokens[:-2])
+if path2root not in sys.path:
+    sys.path.append(path2root)
+
+import json
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+
+# share of each node type, and the type of the edges between two node types
+NODE_TYPES = (('person', 0.7), ('phone', 0.15), ('location', 0.1), ('organization', 0.05))
+EDGE_TYPES = {
+    ('person', 'person'): ('knows', 'calls', 'meets'),
+    ('person', 'phone'): ('uses',),
+    ('phone', 'phone'): ('calls',),
+    ('person', 'location'): ('visits',),
+    ('person', 'organization'): ('member_of',),
+}
+ROLES = ('leader', 'operational', 'support', 'financier', 'courier')
+
+
+def synthetic_network(num_nodes, mean_degree=6, mixing=0.1, exponent=2.5, seed=0, start=datetime(2020, 1, 1)):
+    """
+    random network with the structure of criminal networks: communities of power-law sizes, heavy-tailed degrees
+    (degree-corrected stochastic block model), typed nodes and edges, and call timestamps on 'calls' edges
+    :param num_nodes: number of nodes
+    :param mean_degree: average number of edges per node
+    :param mixing: fraction of edges between communities
+    :param exponent: exponent of the power law of the node weights (expected degrees)
+    :param seed: seed of the generator, the network is reproducible for a given seed
+    :param start: first day of the timestamps
+    :return: (nodes, edges): list of {'id', 'properties'} and list of {'source', 'target', 'properties'}
+    """
+    random_state = np.random.RandomState(seed)
+    # community sizes from a power law, at least 3 nodes each
+    sizes = []
+    while sum(sizes) < num_nodes:
+        sizes.append(int(min(3 + random_state.pareto(1.5) * 5, max(num_nodes // 10, 3))))
+    sizes[-1] -= sum(sizes) - num_nodes
+    if sizes[-1] < 1:
+        sizes.pop()
+        sizes[-1] += num_nodes - sum(sizes)
+    communities = np.repeat(np.arange(len(sizes)), sizes)
+    random_state.shuffle(communities)
+    weights = 1.0 + random_state.pareto(exponent - 1.0, num_nodes)
+
+    type_names = [name for name, _ in NODE_TYPES]
+    types = random_state.choice(len(NODE_TYPES), num_nodes, p=[share for _, share in NODE_TYPES])
+    nodes = []
+    for u in range(num_nodes):
+        node_type = type_names[types[u]]
+        properties = {'type': node_type, 'name': '%s %d' % (node_type, u), 'group': 'group_%d' % communities[u]}
+        if node_type == 'person':
+            properties['role'] = ROLES[random_state.randint(len(ROLES))]
+            properties['gender'] = 'm' if random_state.random_sample() < 0.8 else 'f'
+            properties['age'] = int(random_state.randint(16, 70))
+        elif node_type == 'phone':
+            properties['number'] = '+%d' % (1000000000 + u)
+        nodes.append({'id': 'n%d' % u, 'properties': properties})
+
+    # sources by weight, targets by weight inside the source's community, or anywhere for a fraction `mixing`
+    num_edges = num_nodes * mean_degree // 2
+    probabilities = weights / weights.sum()
+    sources = random_state.choice(num_nodes, num_edges, p=probabilities)
+    order = np.argsort(communities, kind='stable')
+    bounds = np.searchsorted(communities[order], np.arange(len(sizes) + 1))
+    cumulative = np.cumsum(weights[order])
+    offsets = np.concatenate([[0.0], cumulative])
+    low, high = offsets[bounds[communities[sources]]], offsets[bounds[communities[sources] + 1]]
+    draws = low + random_state.random_sample(num_edges) * (high - low)
+    targets = order[np.minimum(np.searchsorted(cumulative, draws, side='right'), num_nodes - 1)]
+    mixed = random_state.random_sample(num_edges) < mixing
+    targets[mixed] = random_state.choice(num_nodes, mixed.sum(), p=probabilities)
+
+    edges, seen = [], set()
+    for source, target in zip(sources.tolist(), targets.tolist()):
+        if source == target or (source, target) in seen or (target, source) in seen:
+            continue
+        seen.add((source, target))
+        pair = (type_names[types[source]], type_names[types[target]])
+        if pair not in EDGE_TYPES:
+            pair = pair[::-1]
+            if pair not in EDGE_TYPES:
+                pair = ('person', 'person')
+        edge_type = EDGE_TYPES[pair][random_state.randint(len(EDGE_TYPES[pair]))]
+        properties = {'type': edge_type, 'weight': int(1 + random_state.geometric(0.3)),
+                      'confidence': round(float(random_state.uniform(0.5, 1.0)), 3)}
+        if edge_type == 'calls':
+            days = np.sort(random_state.randint(0, 365, properties['weight']))
+            properties['timestamps'] = [(start + timedelta(days=int(day))).replace(tzinfo=timezone.utc).isoformat()
+                                        for day in days]
+        edges.append({'source': 'n%d' % source, 'target': 'n%d' % target, 'properties': properties})
+    return nodes, edges
+
+
+def to_old_format(nodes, edges, name='synthetic'):
+    """
+    :return: content of a dataset file in the line-by-line format: a comment, then one JSON object per node or edge
+    """
+    lines = ['#%s' % name]
+    lines.extend(json.dumps({'type': 'node', 'id': node['id'], 'properties': node['properties']}) for node in nodes)
+    lines.extend(json.dumps({'type': 'edge', 'source': edge['source'], 'target': edge['target'],
+                             'properties': edge['properties']}) for edge in edges)
+    return '\n'.join(lines) + '\n'
+
+
+def to_new_format(nodes, edges, name='synthetic', directed=True):
+    """
+    :return: content of a dataset file in the node-link format (networkx's json_graph)
+    """
+    data = {'directed': directed, 'multigraph': False, 'graph': {'id': name, 'name': name},
+            'nodes': [dict(node['properties'], id=node['id']) for node in nodes],
+            'links': [dict(edge['properties'], source=edge['source'], target=edge['target']) for edge in edges]}
+    return json.dumps(data, indent=4)
+
+
+def write_synthetic_datasets(folder, scales, seed=0):
+    """
+    write a network of each scale in both formats
+    :param folder: output folder
+    :param scales: dictionary scale name -> number of nodes
+    :return: dictionary scale name -> {'old': path, 'new': path, 'nodes': int, 'edges': int}
+    """
+    os.makedirs(folder, exist_ok=True)
+    datasets = {}
+    for scale, num_nodes in scales.items():
+        nodes, edges = synthetic_network(num_nodes, seed=seed)
+        paths = {'nodes': len(nodes), 'edges': len(edges)}
+        for format_name, writer in (('old', to_old_format), ('new', to_new_format)):
+            paths[format_name] = os.path.join(folder, 'synthetic_%s_%s.json' % (scale, format_name))
+            with open(paths[format_name], 'w') as dataset_file:
+                dataset_file.write(writer(nodes, edges, name='synthetic_%s' % scale))
+        datasets[scale] = paths
+    return datasets
+
+
+if __name__ == '__main__':
+    # usage: python synthetic_networks.py output_folder [number of nodes]
+    output_folder = sys.argv[1] if len(sys.argv) > 1 else '%s/datasets/synthetic' % path2root
+    size = int(sys.argv[2]) if len(sys.argv) > 2 else 10000
+    print(write_synthetic_datasets(output_folder, {str(size): size}))
@@ -0,0 +1,75 @@
+"""
+=================================== LICENSE ==================================
+Copyright (c) 2021, Consortium Board ROXANNE
+All rights reserved.
+
+Redistribution and use in source and binary forms, with or without
+modification, are permitted provided that the following conditions are met:
+
+Redistributions of source code must retain the above copyright
+notice, this list of conditions and the following disclaimer.
+
+Redistributions in binary form must reproduce the above copyright
+notice, this list of conditions and the following disclaimer in the
+documentation and/or other materials provided with the distribution.
+
+Neither the name of the ROXANNE nor the
+names of its contributors may be used to endorse or promote products
+derived from this software without specific prior written permission.
+
+THIS SOFTWARE IS PROVIDED BY CONSORTIUM BOARD ROXANNE ``AS IS'' AND ANY
+EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+DISCLAIMED. IN NO EVENT SHALL CONSORTIUM BOARD TENCOMPETENCE BE LIABLE FOR ANY
+DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+(INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+(INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+==============================================================================
+
+
+ Tests for the k-clique percolation """
+import networkx as nx
+import pytest
+from analyzer.common.clique_percolation import degeneracy_ordering, k_clique_communities
+
+
+def neighbors_of(graph):
+    return [set(graph[v]) for v in range(graph.number_of_nodes())]
+
+
+def graphs():
+    yield nx.karate_club_graph()
+    yield nx.gnp_random_graph(80, 0.12, seed=0)
+    yield nx.powerlaw_cluster_graph(150, 4, 0.6, seed=1)
+    yield nx.disjoint_union(nx.ring_of_cliques(5, 6), nx.complete_graph(4))
+
+
+@pytest.mark.parametrize("k", [2, 3, 4, 5])
+def test_communities_should_match_networkx(k):
+    """ the communities should be the ones of networkx's k-clique percolation """
+    for graph in graphs():
+        communities, complete = k_clique_communities(neighbors_of(graph), k)
+        expected = nx.community.k_clique_communities(graph, k)
+        assert complete
+        assert sorted(map(sorted, communities)) == sorted(map(sorted, expected))
+
+
+def test_degeneracy_ordering_should_give_core_numbers():
+    """ core numbers should be the ones of networkx """
+    graph = nx.powerlaw_cluster_graph(150, 4, 0.6, seed=1)
+    order, core = degeneracy_ordering(neighbors_of(graph))
+    assert sorted(order) == list(graph.nodes())
+    assert {v: core[v] for v in graph.nodes()} == nx.core_number(graph)
+
+
+def test_budget_should_return_partial_communities():
+    """ a bounded enumeration should report that the communities are incomplete """
+    graph = nx.ring_of_cliques(5, 6)
+    communities, complete = k_clique_communities(neighbors_of(graph), 3, max_cliques=1)
+    assert not complete
+    assert len(communities) < 5
+    with pytest.raises(ValueError):
+        k_clique_communities(neighbors_of(graph), 1)
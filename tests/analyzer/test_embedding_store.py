@@ -0,0 +1,95 @@
+"""
+=================================== LICENSE ==================================
+Copyright (c) 2021, Consortium Board ROXANNE
+All rights reserved.
+
+Redistribution and use in source and binary forms, with or without
+modification, are permitted provided that the following conditions are met:
+
+Redistributions of source code must retain the above copyright
+notice, this list of conditions and the following disclaimer.
+
+Redistributions in binary form must reproduce the above copyright
+notice, this list of conditions and the following disclaimer in the
+documentation and/or other materials provided with the distribution.
+
+Neither the name of the ROXANNE nor the
+names of its contributors may be used to endorse or promote products
+derived from this software without specific prior written permission.
+
+THIS SOFTWARE IS PROVIDED BY CONSORTIUM BOARD ROXANNE ``AS IS'' AND ANY
+EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+DISCLAIMED. IN NO EVENT SHALL CONSORTIUM BOARD TENCOMPETENCE BE LIABLE FOR ANY
+DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+(INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+(INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+==============================================================================
+
+
+ Tests for the versioned store of node embeddings """
+import os
+import gensim
+import numpy as np
+import pytest
+from analyzer.embedding_store import EmbeddingStore, _changed_nodes, _network_to_graph
+
+PARAMS = {'K': 8}
+# DeepWalk is trained with the gensim 3 API of the requirements
+gensim_3 = pytest.mark.skipif(not gensim.__version__.startswith('3.'), reason='requires gensim 3')
+
+
+def network(edges):
+    return {'nodes': [], 'edges': [{'source': u, 'target': v, 'properties': {}} for u, v in edges]}
+
+
+def two_paths():
+    """ two components: a path 0..9 and a path 100..109 """
+    return [(i, i + 1) for i in range(9)] + [(100 + i, 101 + i) for i in range(9)]
+
+
+@pytest.fixture
+def store(tmp_path):
+    return EmbeddingStore(str(tmp_path), keep_versions=2, walk_length=5, num_walks=5, workers=1)
+
+
+def test_embeddings_should_be_stored_per_version(store):
+    """ a version is embedded once, then loaded from its files """
+    first = store.get_embeddings('d', 1, network(two_paths()), 'svd', PARAMS)
+    assert first.matrix.shape == (20, 8) and sorted(first.node_ids) == list(range(10)) + list(range(100, 110))
+    again = store.get_embeddings('d', 1, network(two_paths()), 'svd', PARAMS)
+    assert (store.misses['embeddings'], store.hits['embeddings']) == (1, 1)
+    assert np.array_equal(first.matrix, again.matrix) and again.directory == first.directory
+    assert store.versions('d', 'svd', 8) == ['1.0']
+
+
+@gensim_3
+def test_refresh_should_only_retrain_around_changed_nodes(store):
+    """ a new version is derived from the latest one, the vectors of the component without changes are kept """
+    first = store.get_embeddings('d', 1, network(two_paths()), 'deepwalk', PARAMS)
+    second = store.get_embeddings('d', 2, network(two_paths() + [(0, 5), (9, 10)]), 'deepwalk', PARAMS)
+    assert second.vector(10) is not None and first.vector(10) is None
+    for node_id in range(100, 110):
+        assert np.array_equal(first.vector(node_id), second.vector(node_id))
+    assert not np.array_equal(first.vector(0), second.vector(0))
+
+
+def test_old_versions_should_be_removed(store):
+    """ only the last `keep_versions` versions are kept, and `remove` drops the dataset """
+    for version in range(1, 4):
+        store.get_embeddings('d', version, network(two_paths()), 'svd', PARAMS)
+    assert store.versions('d', 'svd', 8) == ['2.0', '3.0']
+    assert store.load('d', 'svd', 8, 1) is None
+    assert store.load('d', 'svd', 8).directory.endswith('3.0')
+    store.remove('d')
+    assert store.versions('d', 'svd', 8) == [] and not os.path.exists(os.path.join(store.root_dir, 'd'))
+
+
+def test_changed_nodes_should_be_new_nodes_or_with_new_neighbors(store):
+    """ nodes whose neighborhood changed since the stored version """
+    previous = store.save('d', 'node2vec', 8, 1, [0, 1, 2], np.zeros((3, 8)), [(0, 1), (1, 2)])
+    graph, _ = _network_to_graph(network([(0, 1), (1, 2), (2, 3)]))
+    assert sorted(_changed_nodes(previous, graph)) == ['2', '3']
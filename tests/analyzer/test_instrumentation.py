@@ -0,0 +1,116 @@
+"""
+=================================== LICENSE ==================================
+Copyright (c) 2021, Consortium Board ROXANNE
+All rights reserved.
+
+Redistribution and use in source and binary forms, with or without
+modification, are permitted provided that the following conditions are met:
+
+Redistributions of source code must retain the above copyright
+notice, this list of conditions and the following disclaimer.
+
+Redistributions in binary form must reproduce the above copyright
+notice, this list of conditions and the following disclaimer in the
+documentation and/or other materials provided with the distribution.
+
+Neither the name of the ROXANNE nor the
+names of its contributors may be used to endorse or promote products
+derived from this software without specific prior written permission.
+
+THIS SOFTWARE IS PROVIDED BY CONSORTIUM BOARD ROXANNE ``AS IS'' AND ANY
+EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+DISCLAIMED. IN NO EVENT SHALL CONSORTIUM BOARD TENCOMPETENCE BE LIABLE FOR ANY
+DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+(INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+(INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+==============================================================================
+
+ Tests for the stage instrumentation of the analysis path """
+import sys
+import numpy as np
+import pytest
+from analyzer.common import instrumentation
+from analyzer.request_taker import InMemoryAnalyzer
+from storage.builtin_datasets import BuiltinDataset, ActiveNetwork
+from tester.synthetic_networks import write_synthetic_datasets
+
+TASK = {"task_id": "community_detection", "options": {"method": "louvain", "parameters": {}}}
+
+
+def stage_names(stages):
+    return [stage["name"] for stage in stages]
+
+
+@pytest.fixture
+def enabled():
+    instrumentation.enable()
+    yield
+    instrumentation.disable()
+
+
+@pytest.fixture
+def dataset_paths(tmp_path):
+    return write_synthetic_datasets(str(tmp_path), {"small": 500})["small"]
+
+
+def test_spans_should_record_nested_stages_with_time_and_memory():
+    """ nested spans should be recorded as stages with their calls, wall time, peak memory and attributes """
+    with instrumentation.Recorder(memory=True) as recorder:
+        for _ in range(3):
+            with instrumentation.span("outer"):
+                with instrumentation.span("inner", size=10) as inner:
+                    buffer = np.ones(10 ** 6)
+                    inner.set("sum", float(buffer.sum()))
+                    del buffer
+                with instrumentation.span("small"):
+                    buffer = np.ones(10 ** 3)
+    stages = {stage["name"]: stage for stage in recorder.stages()}
+    assert stage_names(recorder.stages()) == ["outer", "outer/inner", "outer/small"]
+    assert all(stage["calls"] == 3 for stage in stages.values())
+    assert stages["outer"]["wall_time"] >= stages["outer/inner"]["wall_time"] + stages["outer/small"]["wall_time"]
+    assert stages["outer/inner"]["peak_memory"] >= 8 * 10 ** 6
+    assert stages["outer"]["peak_memory"] >= stages["outer/inner"]["peak_memory"]
+    if sys.version_info >= (3, 9):
+        # the peak of the large allocation is not counted in the next span
+        assert stages["outer/small"]["peak_memory"] < 10 ** 5
+    assert stages["outer/inner"]["attributes"] == {"size": 10, "sum": 1.0e6}
+
+
+def test_spans_should_record_nothing_out_of_a_recorder():
+    """ a span out of any recorder should leave no stages """
+    with instrumentation.span("outer"):
+        pass
+    assert instrumentation.current_stages() is None
+
+
+def test_analysis_result_should_hold_no_stages_when_disabled(dataset_paths):
+    """ results of a disabled instrumentation should be unchanged """
+    network = BuiltinDataset(dataset_paths["new"]).get_network()
+    result = InMemoryAnalyzer().perform_analysis(dict(TASK, network=network), params=None)
+    assert result["success"] == 1 and "stages" not in result
+
+
+def test_analysis_result_should_hold_its_stages_when_enabled(dataset_paths, enabled):
+    """ results should hold the stages of the analysis, without memory unless asked for """
+    network = BuiltinDataset(dataset_paths["new"]).get_network()
+    result = InMemoryAnalyzer().perform_analysis(dict(TASK, network=network), params=None)
+    assert stage_names(result["stages"]) == [
+        "perform_analysis", "perform_analysis/community_detection.louvain",
+        "perform_analysis/community_detection.louvain/convert_to_csr_sparse_matrix"]
+    assert result["stages"][0]["peak_memory"] is None
+
+
+def test_recorder_should_hold_the_stages_of_loaders_and_active_network(dataset_paths, enabled):
+    """ stages of an enclosing recorder should include the ones of loading the dataset and of the active network """
+    with instrumentation.Recorder() as recorder:
+        network = ActiveNetwork(dataset_paths["old"], initialize=True)
+        network.apply_analysis("community_detection", "louvain", {})
+    names = stage_names(recorder.stages())
+    for name in ("load_dataset", "load_dataset/read", "load_dataset/parse", "load_dataset/index",
+                 "apply_analysis", "apply_analysis/get_active_edges", "apply_analysis/perform_analysis",
+                 "apply_analysis/perform_analysis/community_detection.louvain", "apply_analysis/update_elements"):
+        assert name in names, name
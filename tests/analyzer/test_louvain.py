@@ -0,0 +1,85 @@
+"""
+=================================== LICENSE ==================================
+Copyright (c) 2021, Consortium Board ROXANNE
+All rights reserved.
+
+Redistribution and use in source and binary forms, with or without
+modification, are permitted provided that the following conditions are met:
+
+Redistributions of source code must retain the above copyright
+notice, this list of conditions and the following disclaimer.
+
+Redistributions in binary form must reproduce the above copyright
+notice, this list of conditions and the following disclaimer in the
+documentation and/or other materials provided with the distribution.
+
+Neither the name of the ROXANNE nor the
+names of its contributors may be used to endorse or promote products
+derived from this software without specific prior written permission.
+
+THIS SOFTWARE IS PROVIDED BY CONSORTIUM BOARD ROXANNE ``AS IS'' AND ANY
+EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+DISCLAIMED. IN NO EVENT SHALL CONSORTIUM BOARD TENCOMPETENCE BE LIABLE FOR ANY
+DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+(INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+(INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+==============================================================================
+
+
+ Tests for the sparse Louvain community detection """
+import random
+import networkx as nx
+import numpy as np
+import pytest
+from analyzer.common.louvain import louvain, modularity
+
+
+def weighted_graph(n=60, p=0.1, seed=0):
+    graph = nx.gnp_random_graph(n, p, seed=seed)
+    random_state = random.Random(seed)
+    for u, v in graph.edges():
+        graph[u][v]['weight'] = random_state.uniform(0.5, 2)
+    return graph
+
+
+def communities(labels):
+    return [set(np.flatnonzero(labels == c)) for c in np.unique(labels)]
+
+
+@pytest.mark.parametrize("resolution", [0.5, 1.0, 2.0])
+def test_modularity_should_match_networkx(resolution):
+    """ the modularity of any partition should be the one computed by networkx """
+    graph = weighted_graph()
+    labels = np.random.RandomState(0).randint(5, size=graph.number_of_nodes())
+    expected = nx.community.modularity(graph, communities(labels), weight='weight', resolution=resolution)
+    assert modularity(nx.to_scipy_sparse_array(graph), labels, resolution) == pytest.approx(expected)
+
+
+@pytest.mark.parametrize("refine", [False, True])
+def test_louvain_should_reach_networkx_modularity(refine):
+    """ the partition found should be about as good as the one of networkx's Louvain """
+    for graph in (nx.karate_club_graph(), weighted_graph(200, 0.03)):
+        adjacency = nx.to_scipy_sparse_array(graph)
+        labels = louvain(adjacency, seed=0, refine=refine)
+        expected = nx.community.modularity(graph, nx.community.louvain_communities(graph, seed=0))
+        assert nx.community.modularity(graph, communities(labels)) >= expected - 0.02
+        assert np.array_equal(labels, louvain(adjacency, seed=0, refine=refine))
+
+
+def test_louvain_should_find_planted_communities():
+    """ a ring of cliques should be split into its cliques """
+    graph = nx.ring_of_cliques(8, 5)
+    labels = louvain(nx.to_scipy_sparse_array(graph))
+    assert sorted(map(sorted, communities(labels))) == [list(range(5 * c, 5 * c + 5)) for c in range(8)]
+
+
+def test_refined_communities_should_be_connected():
+    """ with the refinement, every community should induce a connected subgraph """
+    graph = weighted_graph(300, 0.01, seed=1)
+    labels = louvain(nx.to_scipy_sparse_array(graph), refine=True)
+    for community in communities(labels):
+        assert nx.is_connected(graph.subgraph(community))
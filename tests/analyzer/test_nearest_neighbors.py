@@ -0,0 +1,93 @@
+"""
+=================================== LICENSE ==================================
+Copyright (c) 2021, Consortium Board ROXANNE
+All rights reserved.
+
+Redistribution and use in source and binary forms, with or without
+modification, are permitted provided that the following conditions are met:
+
+Redistributions of source code must retain the above copyright
+notice, this list of conditions and the following disclaimer.
+
+Redistributions in binary form must reproduce the above copyright
+notice, this list of conditions and the following disclaimer in the
+documentation and/or other materials provided with the distribution.
+
+Neither the name of the ROXANNE nor the
+names of its contributors may be used to endorse or promote products
+derived from this software without specific prior written permission.
+
+THIS SOFTWARE IS PROVIDED BY CONSORTIUM BOARD ROXANNE ``AS IS'' AND ANY
+EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+DISCLAIMED. IN NO EVENT SHALL CONSORTIUM BOARD TENCOMPETENCE BE LIABLE FOR ANY
+DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+(INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+(INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+==============================================================================
+
+
+ Tests for the exact and the inverted file top-k searches """
+import numpy as np
+from analyzer.common.nearest_neighbors import IVFIndex, exact_top_k, normalize_rows
+
+
+def clustered_rows(n=2000, d=16, n_clusters=20, seed=0):
+    random_state = np.random.RandomState(seed)
+    centers = random_state.randn(n_clusters, d) * 5
+    rows = centers[random_state.randint(n_clusters, size=n)] + random_state.randn(n, d)
+    return normalize_rows(rows)
+
+
+def brute_force_top_k(queries, matrix, k, exclude=()):
+    scores = queries @ matrix.T
+    scores[:, list(exclude)] = -np.inf
+    return np.argsort(-scores, axis=1, kind='stable')[:, :k]
+
+
+def test_exact_top_k_should_match_brute_force():
+    """ the blocked search should return the k best rows of every query, sorted, whatever the block sizes """
+    matrix = clustered_rows(500)
+    queries = matrix[:7]
+    exclude = [0, 1, 2, 250]
+    expected = brute_force_top_k(queries, matrix, 10, exclude)
+    for block_size, query_block_size in ((65536, 1024), (64, 3), (1, 1)):
+        scores, indices = exact_top_k(queries, matrix, 10, exclude, block_size, query_block_size)
+        assert np.array_equal(indices, expected)
+        assert np.all(np.diff(scores, axis=1) <= 0)
+    scores, indices = exact_top_k(queries, matrix[:6], 10, exclude=[0])
+    assert indices.shape == (7, 5)
+
+
+def test_ivf_search_should_be_exact_when_probing_every_list():
+    """ probing all the clusters scores every row, as the exact search """
+    matrix = clustered_rows()
+    index = IVFIndex.build(matrix, n_lists=16)
+    queries = matrix[:20]
+    _, exact = exact_top_k(queries, matrix, 10, exclude=np.arange(20))
+    _, approximate = index.search(queries, matrix, 10, n_probe=16, exclude=np.arange(20))
+    assert np.array_equal(approximate, exact)
+
+
+def test_ivf_search_should_recall_most_neighbors():
+    """ a few probed clusters should find most of the exact top-k on clustered rows """
+    matrix = clustered_rows()
+    index = IVFIndex.build(matrix)
+    queries = matrix[::50]
+    _, exact = exact_top_k(queries, matrix, 10)
+    _, approximate = index.search(queries, matrix, 10, n_probe=4)
+    recall = np.mean([len(set(a) & set(e)) / 10 for a, e in zip(approximate, exact)])
+    assert recall >= 0.9
+
+
+def test_ivf_index_should_be_saved_and_loaded(tmp_path):
+    """ a loaded index answers as the built one """
+    matrix = clustered_rows(300)
+    index = IVFIndex.build(matrix, n_lists=8)
+    index.save(str(tmp_path / 'ivf.npz'))
+    loaded = IVFIndex.load(str(tmp_path / 'ivf.npz'))
+    for a, b in zip(index.search(matrix[:5], matrix, 5, n_probe=2), loaded.search(matrix[:5], matrix, 5, n_probe=2)):
+        assert np.array_equal(a, b)
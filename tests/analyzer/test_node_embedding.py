@@ -0,0 +1,55 @@
+"""
+=================================== LICENSE ==================================
+Copyright (c) 2021, Consortium Board ROXANNE
+All rights reserved.
+
+Redistribution and use in source and binary forms, with or without
+modification, are permitted provided that the following conditions are met:
+
+Redistributions of source code must retain the above copyright
+notice, this list of conditions and the following disclaimer.
+
+Redistributions in binary form must reproduce the above copyright
+notice, this list of conditions and the following disclaimer in the
+documentation and/or other materials provided with the distribution.
+
+Neither the name of the ROXANNE nor the
+names of its contributors may be used to endorse or promote products
+derived from this software without specific prior written permission.
+
+THIS SOFTWARE IS PROVIDED BY CONSORTIUM BOARD ROXANNE ``AS IS'' AND ANY
+EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+DISCLAIMED. IN NO EVENT SHALL CONSORTIUM BOARD TENCOMPETENCE BE LIABLE FOR ANY
+DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+(INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+(INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+==============================================================================
+
+ Tests for the node embedding methods """
+import os
+from unittest.mock import patch
+from analyzer.node_embedding import struc2vec
+
+NETWORK = {
+    "nodes": [{"id": n, "properties": {}} for n in ["a", "b", "c", "d"]],
+    "edges": [{"source": s, "target": t, "properties": {}} for s, t in [("a", "b"), ("b", "c"), ("c", "d")]]
+}
+
+
+def test_struc2vec_should_read_walks_and_training_from_params():
+    """ walks, training epochs and workers should be taken from params, with defaults sized to the machine """
+    with patch("analyzer.node_embedding.Struc2Vec") as model:
+        model.return_value.get_embeddings.return_value = {}
+        assert struc2vec(NETWORK, {"K": 2, "walk_length": 5, "num_walks": 3, "iter": 2, "workers": 1})["success"] == 1
+        assert struc2vec(NETWORK, {"K": 2})["success"] == 1
+    custom, default = model.call_args_list
+    assert (custom.kwargs["walk_length"], custom.kwargs["num_walks"], custom.kwargs["workers"]) == (5, 3, 1)
+    assert (default.kwargs["walk_length"], default.kwargs["num_walks"]) == (10, 80)
+    assert default.kwargs["workers"] == os.cpu_count()
+    trainings = model.return_value.train.call_args_list
+    assert [t.kwargs["iter"] for t in trainings] == [2, 5]
+    assert [t.kwargs["workers"] for t in trainings] == [1, os.cpu_count()]
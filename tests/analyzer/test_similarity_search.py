@@ -0,0 +1,59 @@
+"""
+=================================== LICENSE ==================================
+Copyright (c) 2021, Consortium Board ROXANNE
+All rights reserved.
+
+Redistribution and use in source and binary forms, with or without
+modification, are permitted provided that the following conditions are met:
+
+Redistributions of source code must retain the above copyright
+notice, this list of conditions and the following disclaimer.
+
+Redistributions in binary form must reproduce the above copyright
+notice, this list of conditions and the following disclaimer in the
+documentation and/or other materials provided with the distribution.
+
+Neither the name of the ROXANNE nor the
+names of its contributors may be used to endorse or promote products
+derived from this software without specific prior written permission.
+
+THIS SOFTWARE IS PROVIDED BY CONSORTIUM BOARD ROXANNE ``AS IS'' AND ANY
+EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+DISCLAIMED. IN NO EVENT SHALL CONSORTIUM BOARD TENCOMPETENCE BE LIABLE FOR ANY
+DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+(INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+(INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+==============================================================================
+
+ Tests for the similar node search """
+from unittest.mock import patch
+import numpy as np
+from analyzer.common.nearest_neighbors import IVFIndex
+from analyzer.similarity_search import cosine
+
+
+class Embeddings(object):
+    """ Stored embeddings as seen by the search """
+
+    def __init__(self, matrix):
+        self.matrix = matrix
+        self.node_ids = [f"n{i}" for i in range(len(matrix))]
+
+
+def random_embeddings(n=300, k=8, seed=0):
+    return Embeddings(np.random.RandomState(seed).randn(n, k).astype(np.float32))
+
+
+def test_ivf_search_without_stored_index_should_be_exact():
+    """ an ivf search without a stored index should not build one, and return the exact top-k """
+    embeddings = random_embeddings()
+    params = {"embeddings": embeddings, "sources": ["n0", "n1"], "top_k": 5}
+    exact = cosine(None, params)["similar_nodes"]
+    with patch.object(IVFIndex, "build") as build:
+        approximate = cosine(None, dict(params, index="ivf"))["similar_nodes"]
+    build.assert_not_called()
+    assert approximate == exact
@@ -0,0 +1,115 @@
+"""
+=================================== LICENSE ==================================
+Copyright (c) 2021, Consortium Board ROXANNE
+All rights reserved.
+
+Redistribution and use in source and binary forms, with or without
+modification, are permitted provided that the following conditions are met:
+
+Redistributions of source code must retain the above copyright
+notice, this list of conditions and the following disclaimer.
+
+Redistributions in binary form must reproduce the above copyright
+notice, this list of conditions and the following disclaimer in the
+documentation and/or other materials provided with the distribution.
+
+Neither the name of the ROXANNE nor the
+names of its contributors may be used to endorse or promote products
+derived from this software without specific prior written permission.
+
+THIS SOFTWARE IS PROVIDED BY CONSORTIUM BOARD ROXANNE ``AS IS'' AND ANY
+EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+DISCLAIMED. IN NO EVENT SHALL CONSORTIUM BOARD TENCOMPETENCE BE LIABLE FOR ANY
+DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+(INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+(INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+==============================================================================
+
+ Tests for the sparse spectral decompositions """
+import numpy as np
+import networkx as nx
+import pytest
+from scipy.sparse import csr_matrix
+from analyzer.common.spectral import laplacian_eigenmap, randomized_svd, spectral_embedding
+from analyzer.community_detection import hierarchical_communities, spectral_communities
+
+
+def normalized_laplacian(adjacency):
+    degrees = adjacency.sum(axis=1)
+    scale = np.zeros_like(degrees)
+    scale[degrees > 0] = degrees[degrees > 0] ** -0.5
+    return np.eye(len(adjacency)) - scale[:, None] * adjacency * scale[None, :], degrees
+
+
+def rayleigh_quotients(embedding, adjacency):
+    """ eigenvalues of L of the columns of an eigenmap, with the largest residual of L v = lambda v """
+    laplacian, degrees = normalized_laplacian(adjacency)
+    vectors = embedding * np.sqrt(degrees)[:, None]
+    vectors = vectors / np.linalg.norm(vectors, axis=0)
+    values = np.einsum("ij,ij->j", vectors, laplacian @ vectors)
+    residual = np.abs(laplacian @ vectors - vectors * values).max()
+    return values, residual
+
+
+def test_laplacian_eigenmap_should_match_dense_eigenvectors_of_connected_graph():
+    """ columns should be the eigenvectors of the smallest non-trivial eigenvalues of the normalized Laplacian """
+    adjacency = nx.to_numpy_array(nx.connected_watts_strogatz_graph(60, 4, 0.3, seed=1))
+    embedding = laplacian_eigenmap(csr_matrix(adjacency), 4)
+    values, residual = rayleigh_quotients(embedding, adjacency)
+    expected = np.linalg.eigvalsh(normalized_laplacian(adjacency)[0])[1:5]
+    assert embedding.shape == (60, 4)
+    assert values == pytest.approx(expected, abs=1e-4)
+    assert residual < 1e-3
+
+
+def test_laplacian_eigenmap_should_drop_the_trivial_vectors_of_every_component():
+    """ no column of a disconnected graph should be constant on its components, isolated nodes at the origin """
+    graph = nx.disjoint_union(nx.cycle_graph(20), nx.path_graph(15))
+    graph.add_node(35)
+    adjacency = nx.to_numpy_array(graph)
+    embedding = laplacian_eigenmap(csr_matrix(adjacency), 3)
+    values, residual = rayleigh_quotients(embedding, adjacency)
+    expected = np.linalg.eigvalsh(normalized_laplacian(adjacency)[0])
+    # two zero eigenvalues of the components, the isolated node has eigenvalue 1
+    assert expected[:2] == pytest.approx([0, 0], abs=1e-8)
+    assert values == pytest.approx(expected[2:5], abs=1e-4)
+    assert residual < 1e-3
+    assert not embedding[35].any()
+
+
+def test_randomized_svd_should_match_exact_singular_values():
+    """ leading singular values of a low rank matrix should be exact """
+    random_state = np.random.RandomState(0)
+    matrix = random_state.rand(80, 5) @ random_state.rand(5, 60)
+    _, s, _ = randomized_svd(csr_matrix(matrix), 5)
+    assert s == pytest.approx(np.linalg.svd(matrix, compute_uv=False)[:5], rel=1e-4)
+
+
+@pytest.mark.parametrize("solver", ["arpack", "lobpcg"])
+def test_spectral_embedding_should_span_the_smallest_eigenvectors(solver):
+    """ columns should span the eigenvectors of the k smallest eigenvalues of the normalized Laplacian """
+    adjacency = nx.to_numpy_array(nx.connected_watts_strogatz_graph(200, 6, 0.1, seed=2))
+    values, vectors = spectral_embedding(csr_matrix(adjacency), 4, solver=solver, tol=1e-8, return_values=True)
+    expected_values, expected_vectors = np.linalg.eigh(normalized_laplacian(adjacency)[0])
+    assert 2 - values == pytest.approx(expected_values[:4], abs=1e-5)
+    projection = vectors @ np.linalg.pinv(vectors)
+    assert np.abs(projection @ expected_vectors[:, :4] - expected_vectors[:, :4]).max() < 1e-3
+
+
+def ring_of_cliques_network(num_cliques, clique_size):
+    graph = nx.ring_of_cliques(num_cliques, clique_size)
+    return {"nodes": [{"id": "n%d" % u, "properties": {}} for u in graph.nodes()],
+            "edges": [{"source": "n%d" % u, "target": "n%d" % v, "properties": {}} for u, v in graph.edges()]}
+
+
+@pytest.mark.parametrize("detect", [spectral_communities, hierarchical_communities])
+def test_spectral_communities_should_find_planted_cliques(detect):
+    """ k communities of a ring of k cliques should be its cliques """
+    result = detect(ring_of_cliques_network(6, 8), {"K": 6})
+    assert result["success"] == 1
+    found = sorted(sorted(int(u[1:]) for u in community) for community in result["communities"])
+    assert found == [list(range(8 * c, 8 * c + 8)) for c in range(6)]
@@ -0,0 +1,83 @@
+"""
+=================================== LICENSE ==================================
+Copyright (c) 2021, Consortium Board ROXANNE
+All rights reserved.
+
+Redistribution and use in source and binary forms, with or without
+modification, are permitted provided that the following conditions are met:
+
+Redistributions of source code must retain the above copyright
+notice, this list of conditions and the following disclaimer.
+
+Redistributions in binary form must reproduce the above copyright
+notice, this list of conditions and the following disclaimer in the
+documentation and/or other materials provided with the distribution.
+
+Neither the name of the ROXANNE nor the
+names of its contributors may be used to endorse or promote products
+derived from this software without specific prior written permission.
+
+THIS SOFTWARE IS PROVIDED BY CONSORTIUM BOARD ROXANNE ``AS IS'' AND ANY
+EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+DISCLAIMED. IN NO EVENT SHALL CONSORTIUM BOARD TENCOMPETENCE BE LIABLE FOR ANY
+DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+(INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+(INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+==============================================================================
+
+
+ Tests for the vectorized DTW distances of struc2vec """
+import math
+import random
+import numpy as np
+import pytest
+from analyzer.ge.models.struc2vec import compute_dtw_dist, pack_degree_lists
+
+
+def naive_dtw(a, b, reduced):
+    """ textbook DTW with the struc2vec cost, on lists of degrees or of (degree, frequency) pairs """
+    if not reduced:
+        a, b = [(x, 1) for x in a], [(y, 1) for y in b]
+    distances = np.full((len(a) + 1, len(b) + 1), np.inf)
+    distances[0, 0] = 0
+    for i, (x, count_x) in enumerate(a, 1):
+        for j, (y, count_y) in enumerate(b, 1):
+            cost = ((max(x, y) + 0.5) / (min(x, y) + 0.5) - 1) * max(count_x, count_y)
+            distances[i, j] = cost + min(distances[i - 1, j], distances[i - 1, j - 1], distances[i, j - 1])
+    return distances[len(a), len(b)]
+
+
+def random_degree_lists(num_nodes, reduced, random_state):
+    """ ordered degree lists of 3 layers, some nodes stopping before the last layers """
+    degree_list = {}
+    for v in range(num_nodes):
+        layers = {}
+        for layer in range(random_state.randint(1, 3)):
+            degrees = sorted(random_state.randint(1, 20) for _ in range(random_state.randint(1, 8)))
+            layers[layer] = [(d, degrees.count(d)) for d in sorted(set(degrees))] if reduced else degrees
+        degree_list[v] = layers
+    return degree_list
+
+
+@pytest.mark.parametrize("reduced", [True, False])
+@pytest.mark.parametrize("max_cells", [1 << 22, 16])
+def test_dtw_should_match_naive_dtw(reduced, max_cells):
+    """ the batched DTW distances should be the ones of the textbook recurrence, nan where a layer is missing """
+    random_state = random.Random(0)
+    degree_list = random_degree_lists(30, reduced, random_state)
+    sources = np.array([u for u in range(30) for v in range(u + 1, 30)])
+    targets = np.array([v for u in range(30) for v in range(u + 1, 30)])
+    packed = pack_degree_lists(degree_list, 30, reduced)
+    assert len(packed) == 3
+    for layer, (degrees, counts, offsets) in enumerate(packed):
+        distances = compute_dtw_dist(degrees, counts, offsets, sources, targets, max_cells=max_cells)
+        for u, v, distance in zip(sources, targets, distances):
+            if layer in degree_list[u] and layer in degree_list[v]:
+                expected = naive_dtw(degree_list[u][layer], degree_list[v][layer], reduced)
+                assert distance == pytest.approx(expected)
+            else:
+                assert math.isnan(distance)
@@ -30,7 +30,10 @@ SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
 ==============================================================================
 """
 import pytest
-from conductor.src.helpers.network_helpers import network_to_split, split_to_network
+from unittest.mock import MagicMock
+from conductor.src.helpers.network_helpers import network_to_split, split_to_network, network_elements, \
+    decode_cursor, paginate
+from storage.builtin_datasets import BuiltinDataset
 
 
 def test_network_to_split_should_return_nodes_and_edges_dictionaries():
@@ -59,3 +62,20 @@ def test_split_to_network_should_return_list_of_nodes_and_edges_combined():
     }
     result = split_to_network(example_split["nodes"], example_split["edges"])
     assert all(el in result for el in example_split["edges"] + example_split["nodes"])
+
+
+def test_network_elements_should_compute_the_query_once_for_all_pages():
+    """ pages of a query should be cut from the sorted network of the first page, until the dataset changes """
+    dataset = BuiltinDataset(None, from_file=False)
+    dataset.save_nodes({f"n{i}": {"type": "person"} for i in range(10)})
+    dataset.save_edges([{"source": f"n{i}", "target": f"n{i + 1}", "properties": {"type": "call"}} for i in range(9)])
+    dataset.get_network = MagicMock(wraps=dataset.get_network)
+    elements, cursor = paginate(network_elements(dataset, None, ordered=True), 4)
+    while cursor:
+        page, cursor = paginate(network_elements(dataset, None, after=decode_cursor(cursor)), 4)
+        elements.extend(page)
+    assert len(elements) == 19
+    assert dataset.get_network.call_count == 1
+    dataset.save_nodes({"n10": {"type": "person"}})
+    assert len(list(network_elements(dataset, None, ordered=True))) == 20
+    assert dataset.get_network.call_count == 2
@@ -30,34 +30,97 @@ SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
 ==============================================================================
 
  FormComponent tests  """
+import hashlib
 import pytest
 from io import BytesIO
-from unittest.mock import MagicMock, patch
-from ....conductor.src.middlewares.multipart import FormComponent
+from unittest.mock import MagicMock
+from conductor.src.middlewares.multipart import FormComponent
+from conductor.src.helpers.multipart_helpers import MultipartReader, StreamingForm
+from conductor.src.helpers.file_helpers import FileExistsError
+from storage.builtin_datasets import BuiltinDataset, BuiltinDatasetBuilder
+
+BOUNDARY = b"a1b2c3"
+NETWORK = b"""{"type": "node", "id": "a", "properties": {"type": "person"}}
+# comment
+{"type": "node", "id": "b", "properties": {"type": "person"}}
+{"type": "edge", "source": "a", "target": "b", "properties": {"type": "call"}}"""
+
+
+def multipart_body(parts):
+    """ Encode (name, filename, contents) parts """
+    body = b"preamble"
+    for name, filename, contents in parts:
+        disposition = b'form-data; name="' + name + b'"'
+        if filename:
+            disposition += b'; filename="' + filename + b'"'
+        body += b"\r\n--" + BOUNDARY + b"\r\nContent-Disposition: " + disposition + b"\r\n\r\n" + contents
+    return body + b"\r\n--" + BOUNDARY + b"--\r\n"
+
+
+def make_form(parts, folder, chunk_size=7):
+    """ Form read in small chunks, so that delimiters are split between chunks """
+    body = multipart_body(parts)
+    return StreamingForm(MultipartReader(BytesIO(body), BOUNDARY, len(body), chunk_size), folder)
 
 
 @pytest.fixture
 def prepared_request():
     """ Set multipart request """
+    body = multipart_body([(b"threshold", None, b"50")])
     request = MagicMock()
-    request.stream = BytesIO(b"form")
-    request.content_type = "multipart/form-data"
-    request.env = MagicMock()
+    request.stream = BytesIO(body)
+    request.content_type = "multipart/form-data; boundary=" + BOUNDARY.decode()
+    request.content_length = len(body)
     return request
 
-def test_form_component_should_process_request_stream_as_FieldStorage(prepared_request):
-    """ FormComponent should take Request.stream and read it with cgi.FieldStorage if content-type is 'multipart/form-data'"""
-    with patch("cgi.FieldStorage") as field_mock:
-        form_storage = MagicMock()
-        field_mock.return_value = form_storage
-        middleware = FormComponent()
-        middleware.process_request(prepared_request, MagicMock())
-        assert prepared_request.context.form == form_storage
-
-
-def test_form_component_should_set_request_context_form_with_FieldStorage(prepared_request):
-    """ FormComponent should take Request.stream and read it with cgi.FieldStorage and put it in Request.context.form if content-type is 'multipart/form-data'"""
-    with patch("cgi.FieldStorage") as field_mock:
-        middleware = FormComponent()
-        middleware.process_request(prepared_request, MagicMock())
-        field_mock.assert_called_once_with(fp=prepared_request.stream, environ=prepared_request.env, keep_blank_values=1)
+
+def test_form_component_should_set_request_context_form(prepared_request):
+    """ FormComponent should put a form reading Request.stream in Request.context.form """
+    middleware = FormComponent()
+    middleware.process_request(prepared_request, MagicMock())
+    assert prepared_request.context.form["threshold"].value == "50"
+    assert "file" not in prepared_request.context.form
+
+
+def test_form_should_write_file_to_destination_while_hashing(tmp_path):
+    """ the file should be written where the resource asks, with its hash, and the next fields still readable """
+    contents = b"\r\n--" + BOUNDARY[:-1] + b"\r\n" * 1000
+    form = make_form([(b"name", None, b"value"), (b"file", b"up.json", contents), (b"after", None, b"x")], tmp_path)
+    chunks = []
+    file = form.save_file("file", lambda filename: tmp_path / ("saved_" + filename), [chunks.append])
+    assert (tmp_path / "saved_up.json").read_bytes() == contents
+    assert b"".join(chunks) == contents
+    assert file.sha256 == hashlib.sha256(contents).hexdigest() and file.size == len(contents)
+    assert form["name"].value == "value" and form.getvalue("after") == "x"
+
+
+def test_form_should_spool_files_passed_over(tmp_path):
+    """ a file before the asked field should be spooled, then moved to its destination """
+    form = make_form([(b"file", b"up.json", b"contents"), (b"name", None, b"value")], tmp_path)
+    assert form["name"].value == "value"
+    assert form["file"].spooled
+    form.save_file("file", tmp_path / "saved.json")
+    assert (tmp_path / "saved.json").read_bytes() == b"contents"
+    form.close()
+    assert sorted(path.name for path in tmp_path.iterdir()) == ["saved.json"]
+
+
+def test_form_should_not_overwrite_files(tmp_path):
+    """ saving to an existing file should fail """
+    (tmp_path / "saved.json").write_bytes(b"")
+    form = make_form([(b"file", b"up.json", b"contents")], tmp_path)
+    with pytest.raises(FileExistsError):
+        form.save_file("file", tmp_path / "saved.json")
+    with pytest.raises(KeyError):
+        make_form([(b"name", None, b"value")], tmp_path).save_file("file", tmp_path / "other.json")
+
+
+def test_form_should_build_dataset_while_receiving_file(tmp_path):
+    """ the dataset built from the chunks should be the dataset loaded from the file """
+    form = make_form([(b"file", b"network.json", NETWORK)], tmp_path)
+    builder = BuiltinDatasetBuilder()
+    file = form.save_file("file", tmp_path / "network.json", [builder.feed])
+    dataset = builder.finish(file.path)
+    expected = BuiltinDataset(file.path)
+    assert dataset.nodes == expected.nodes and dataset.edges == expected.edges
+    assert dataset.adj_list == expected.adj_list and dataset.edge_types == expected.edge_types
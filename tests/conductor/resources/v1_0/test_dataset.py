@@ -31,11 +31,15 @@ SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
 
  Unit tests for dataset resource """
 import pytest
+import ujson
+import msgpack
+from io import BytesIO
+from unittest.mock import MagicMock
 from os.path import isfile
 from unittest.mock import patch
 from falcon.testing import TestClient
 from conductor.src.auth_models import User
-from conductor.src.helpers.network_helpers import split_to_network
+from conductor.src.helpers.network_helpers import split_to_network, neighbor_elements, encode_cursor
 
 
 @pytest.fixture
@@ -71,6 +75,35 @@ def test_dataset_resource_should_return_network_by_node_ids_on_post_request(clie
     assert response.json["network"] == split_to_network(network_comparison["nodes"], network_comparison["edges"])
 
 
+def test_dataset_resource_should_return_network_in_time_window_on_post_request(client: TestClient, prepared_header, prepared_dataset, prepared_user: User):
+    """ post request with a time window on dataset resource should return only edges with events in the window """
+    prepared_dataset.save_edges([
+        {"source": "Majed_Moqed", "target": "Satam_Suqami", "properties": {"type": "call", "timestamps": ["2020-01-05", "2020-03-02"]}},
+        {"source": "Nawaf_Alhazmi", "target": "Satam_Suqami", "properties": {"type": "call", "timestamps": ["2020-02-10"]}}
+    ])
+    payload = {
+        "nodes": [],
+        "time_window": {"start": "2020-03-01", "end": "2020-04-01"}
+    }
+    response = client.simulate_post("/v1.0/datasets/data", headers=prepared_header, json=payload)
+    edges = [(item["source"], item["target"]) for item in response.json["network"] if item["type"] == "edge"]
+    # edges without timestamps belong to every window
+    assert sorted(edges) == [("Majed_Moqed", "Khalid_Al-Mihdhar"), ("Majed_Moqed", "Nawaf_Alhazmi"), ("Majed_Moqed", "Satam_Suqami")]
+
+
+def test_dataset_resource_should_return_updated_edge_in_time_window(client: TestClient, prepared_header, prepared_dataset, prepared_user: User):
+    """ an edge whose times are updated should be found in its new time window """
+    edge = {"source": "Majed_Moqed", "target": "Satam_Suqami", "properties": {"type": "call", "timestamps": ["2020-01-05"]}}
+    prepared_dataset.save_edges([edge])
+    payload = {"nodes": ["Majed_Moqed"], "query": "neighbors", "time_window": {"start": "2020-03-01", "end": "2020-04-01"}}
+    response = client.simulate_post("/v1.0/datasets/data", headers=prepared_header, json=payload)
+    assert [n["neighbor_id"] for n in response.json["neighbors"]] == ["Khalid_Al-Mihdhar", "Nawaf_Alhazmi"]
+    prepared_dataset.get_temporal_index()  # index built before the update
+    prepared_dataset.save_edges([dict(edge, properties={"type": "call", "timestamps": ["2020-03-02"]})])
+    response = client.simulate_post("/v1.0/datasets/data", headers=prepared_header, json=payload)
+    assert [n["neighbor_id"] for n in response.json["neighbors"]] == ["Khalid_Al-Mihdhar", "Nawaf_Alhazmi", "Satam_Suqami"]
+
+
 def test_dataset_resource_should_save_network_on_patch_request(client: TestClient, prepared_header, prepared_dataset, prepared_user: User):
     """ patch request on dataset resource should save or update all network items """
     payload = {
@@ -104,3 +137,136 @@ def test_dataset_resource_should_delete_nodes_and_edges_by_provided_ids(client:
         prepared_dataset.nodes["Satam_Suqami"]
     with pytest.raises(StopIteration):
         next(e for e in prepared_dataset.edges if e["source"] == "Majed_Moqed" and e["target"] == "Nawaf_Alhazmi")
+
+
+def test_dataset_resource_should_paginate_network_with_cursor(client: TestClient, prepared_header, prepared_dataset, prepared_user: User):
+    """ pages of a query should hold limit elements each and make up the whole network """
+    payload = {"nodes": ["Majed_Moqed", "Nawaf_Alhazmi"], "limit": 2}
+    elements = []
+    for _ in range(10):
+        response = client.simulate_post("/v1.0/datasets/data", headers=prepared_header, json=payload)
+        assert len(response.json["network"]) <= 2
+        elements.extend(response.json["network"])
+        if response.json["nextCursor"] is None:
+            break
+        payload["cursor"] = response.json["nextCursor"]
+    full = client.simulate_post("/v1.0/datasets/data", headers=prepared_header, json={"nodes": payload["nodes"]})
+    key = lambda element: str(element.get("id", element.get("source")) + element.get("target", ""))
+    assert len(elements) == 5
+    assert sorted(elements, key=key) == sorted(full.json["network"], key=key)
+
+
+def test_dataset_resource_should_stream_neighbors_as_ndjson(client: TestClient, prepared_header, prepared_dataset, prepared_user: User):
+    """ neighbors query with ndjson accept header should stream one neighbor per line """
+    prepared_header["Accept"] = "application/x-ndjson"
+    payload = {"nodes": ["Majed_Moqed"], "query": "neighbors"}
+    response = client.simulate_post("/v1.0/datasets/data", headers=prepared_header, json=payload)
+    assert response.headers["content-type"] == "application/x-ndjson"
+    neighbors = [ujson.loads(line) for line in response.text.splitlines()]
+    assert [(n["id"], n["neighbor_id"]) for n in neighbors] == [
+        ("Majed_Moqed", "Khalid_Al-Mihdhar"), ("Majed_Moqed", "Nawaf_Alhazmi")]
+
+
+def test_dataset_resource_should_stream_nodes_as_msgpack(client: TestClient, prepared_header, prepared_dataset, prepared_user: User):
+    """ nodes query with msgpack stream accept header should stream all nodes """
+    prepared_header["Accept"] = "application/x-msgpack-stream"
+    response = client.simulate_post("/v1.0/datasets/data", headers=prepared_header, json={"nodes": [], "query": "nodes"})
+    nodes = list(msgpack.Unpacker(BytesIO(response.content), raw=False))
+    assert sorted(n["id"] for n in nodes) == sorted(prepared_dataset.nodes)
+
+
+def test_dataset_resource_should_release_snapshot_of_query(client: TestClient, prepared_header, prepared_dataset, prepared_user: User):
+    """ queries should read a snapshot of the dataset, unpinned once the response is sent """
+    client.simulate_post("/v1.0/datasets/data", headers=prepared_header, json={"nodes": [], "cursor": "not a cursor"})
+    prepared_header["Accept"] = "application/x-ndjson"
+    client.simulate_post("/v1.0/datasets/data", headers=prepared_header, json={"nodes": [], "query": "nodes"})
+    with prepared_dataset.snapshot() as snapshot:
+        assert snapshot.pins == 1
+
+
+def test_dataset_resource_should_refuse_invalid_cursor(client: TestClient, prepared_header, prepared_dataset, prepared_user: User):
+    """ a cursor not made by the resource should be refused """
+    payload = {"nodes": [], "limit": 2, "cursor": "not a cursor"}
+    response = client.simulate_post("/v1.0/datasets/data", headers=prepared_header, json=payload)
+    assert response.status_code == 400
+
+
+@pytest.mark.parametrize("query,position", [
+    ("network", ["node", 5]),
+    ("network", [{"a": 1}, [1]]),
+    ("network", ["edge", "Majed_Moqed"]),
+    ("network", ["edge", True]),
+    ("nodes", ["edge", 1]),
+    ("neighbors", ["node", "Majed_Moqed"]),
+    ("neighbors", [0, -1, "version"]),
+    ("neighbors", [0, 1]),
+])
+def test_dataset_resource_should_refuse_cursor_of_other_query(client: TestClient, prepared_header, prepared_dataset, prepared_user: User, query, position):
+    """ a cursor whose position doesn't fit the query should be refused """
+    payload = {"nodes": [], "query": query, "limit": 2, "cursor": encode_cursor(position)}
+    response = client.simulate_post("/v1.0/datasets/data", headers=prepared_header, json=payload)
+    assert response.status_code == 400
+
+
+def test_dataset_resource_should_refuse_neighbors_cursor_of_changed_dataset(client: TestClient, prepared_header, prepared_dataset, prepared_user: User):
+    """ the neighbors cursor should hold until the dataset is changed, then the query should be started again """
+    payload = {"nodes": ["Majed_Moqed"], "query": "neighbors", "limit": 1}
+    first = client.simulate_post("/v1.0/datasets/data", headers=prepared_header, json=payload)
+    payload["cursor"] = first.json["nextCursor"]
+    second = client.simulate_post("/v1.0/datasets/data", headers=prepared_header, json=payload)
+    assert second.status_code == 200
+    assert second.json["neighbors"] != first.json["neighbors"]
+    prepared_dataset.save_nodes({"Majed_Moqed": {"type": "person", "name": "Majed Moqed"}})
+    response = client.simulate_post("/v1.0/datasets/data", headers=prepared_header, json=payload)
+    assert response.status_code == 400
+
+
+def test_dataset_resource_should_answer_not_modified_until_dataset_changes(client: TestClient, prepared_header, prepared_dataset, prepared_user: User):
+    """ query with the ETag of the previous response should return 304 until the dataset is changed """
+    payload = {"nodes": ["Majed_Moqed", "Nawaf_Alhazmi"]}
+    first = client.simulate_post("/v1.0/datasets/data", headers=prepared_header, json=payload)
+    etag = first.headers["etag"]
+    prepared_header["If-None-Match"] = etag
+    response = client.simulate_post("/v1.0/datasets/data", headers=prepared_header, json=payload)
+    assert response.status_code == 304
+    assert response.content == b""
+    prepared_dataset.save_nodes({"Majed_Moqed": {"type": "person", "name": "Majed Moqed"}})
+    response = client.simulate_post("/v1.0/datasets/data", headers=prepared_header, json=payload)
+    assert response.status_code == 200
+    assert response.headers["etag"] != etag
+
+
+def test_dataset_resource_should_return_cached_response_of_unchanged_dataset(client: TestClient, prepared_header, prepared_dataset, prepared_user: User, monkeypatch):
+    """ repeated query on unchanged dataset should not be computed again """
+    payload = {"nodes": ["Majed_Moqed"], "query": "neighbors"}
+    first = client.simulate_post("/v1.0/datasets/data", headers=prepared_header, json=payload)
+    spy = MagicMock(wraps=neighbor_elements)
+    monkeypatch.setattr("conductor.src.resources.datasets.neighbor_elements", spy)
+    second = client.simulate_post("/v1.0/datasets/data", headers=prepared_header, json=payload)
+    assert second.json == first.json
+    assert spy.call_count == 0
+    prepared_dataset.delete_edges([("Majed_Moqed", "Nawaf_Alhazmi")], False)
+    third = client.simulate_post("/v1.0/datasets/data", headers=prepared_header, json=payload)
+    assert spy.call_count == 1
+    assert len(third.json["neighbors"]) == len(first.json["neighbors"]) - 1
+
+
+def test_dataset_resource_should_return_version_changing_with_dataset(client: TestClient, prepared_header, prepared_dataset, prepared_user: User):
+    """ get request on dataset resource should return its version, which changes when the dataset is changed """
+    version = client.simulate_get("/v1.0/datasets/data", headers=prepared_header).json["version"]
+    assert client.simulate_get("/v1.0/datasets/data", headers=prepared_header).json["version"] == version
+    prepared_dataset.delete_edges([("Majed_Moqed", "Nawaf_Alhazmi")], False)
+    assert client.simulate_get("/v1.0/datasets/data", headers=prepared_header).json["version"] != version
+
+
+def test_dataset_resource_should_answer_not_modified_information_until_dataset_changes(client: TestClient, prepared_header, prepared_dataset, prepared_user: User):
+    """ get request with the ETag of the previous response should return 304 until the dataset is changed """
+    etag = client.simulate_get("/v1.0/datasets/data", headers=prepared_header).headers["etag"]
+    prepared_header["If-None-Match"] = etag
+    response = client.simulate_get("/v1.0/datasets/data", headers=prepared_header)
+    assert response.status_code == 304
+    assert response.content == b""
+    prepared_dataset.save_nodes({"Majed_Moqed": {"type": "person", "name": "Majed Moqed"}})
+    response = client.simulate_get("/v1.0/datasets/data", headers=prepared_header)
+    assert response.status_code == 200
+    assert response.headers["etag"] != etag
@@ -31,6 +31,8 @@ SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
 
  Tests for datasets collection resource """
 import pytest
+import msgpack
+import numpy as np
 import tempfile
 import shutil
 from os.path import isfile
@@ -38,6 +40,8 @@ from unittest.mock import patch
 from falcon.testing import TestClient
 from requests_toolbelt import MultipartEncoder
 from conductor.src.auth_models import User, DatasetDoesNotExistError
+from conductor.src.config import config
+from analyzer.embedding_store import EmbeddingStore
 from .conftest import EXAMPLE_NETWORK
 from storage.builtin_datasets import BuiltinDataset
 
@@ -134,3 +138,34 @@ def test_datasets_should_remove_dataset_on_delete_request(client: TestClient, pr
     with pytest.raises(DatasetDoesNotExistError):
         prepared_user.get_dataset(dataset_info["datasetName"])
     assert response.status_code == 200
+
+
+
+def test_datasets_should_remove_stored_embeddings_of_removed_dataset(client: TestClient, prepared_header, prepared_user: User):
+    """ delete on datasets collection should remove the embeddings stored for the dataset """
+    prepared_user.create_dataset("dataset", "stuff", None)
+    dataset_id = prepared_user.get_username() + "dataset"
+    store = EmbeddingStore(str(config["embeddings_folder"]))
+    store.save(dataset_id, "svd", 2, 1.0, ["a", "b"], np.ones((2, 2), dtype=np.float32), np.array([[0, 1]]))
+    assert store.versions(dataset_id, "svd", 2)
+    response = client.simulate_delete("/v1.0/datasets", headers=prepared_header, json={"datasetName": "dataset"})
+    assert response.status_code == 200
+    assert not store.versions(dataset_id, "svd", 2)
+
+def test_datasets_should_answer_not_modified_if_datasets_did_not_change(client: TestClient, prepared_header, prepared_user: User):
+    """ get on datasets collection with the ETag of the previous response should return 304 """
+    prepared_user.create_dataset("first", "Test dataset 1", None)
+    etag = client.simulate_get("/v1.0/datasets", headers=prepared_header).headers["etag"]
+    prepared_header["If-None-Match"] = etag
+    assert client.simulate_get("/v1.0/datasets", headers=prepared_header).status_code == 304
+    prepared_user.create_dataset("second", "Test dataset 2", None)
+    assert client.simulate_get("/v1.0/datasets", headers=prepared_header).status_code == 200
+
+
+def test_datasets_should_respond_with_msgpack_if_client_prefers_it(client: TestClient, prepared_header, prepared_user: User):
+    """ get on datasets collection accepting msgpack should return msgpack body """
+    prepared_user.create_dataset("first", "Test dataset 1", None)
+    prepared_header["Accept"] = "application/msgpack"
+    response = client.simulate_get("/v1.0/datasets", headers=prepared_header)
+    assert response.headers["content-type"] == "application/msgpack"
+    assert "first" in msgpack.unpackb(response.content, raw=False)["datasets"]
@@ -93,6 +93,20 @@ def test_file_resource_should_upload_file_by_filename_if_file_does_not_exist_on_
         assert response.status_code == 200
 
 
+def test_file_resource_should_keep_file_on_put_without_file_field(client: TestClient, prepared_header, prepared_user: User):
+    """ put request on file resource without file field should fail and keep the existing file """
+    filename = "testfile.json"
+    multipart_file = MultipartEncoder(fields={"description": "no file"})
+    prepared_header["Content-Type"] = multipart_file.content_type
+    with open(prepared_user.get_folder_path() / filename, "w+") as saved_file:
+        saved_file.write(r"""{"id": "some other data!"}""")
+    response = client.simulate_put("/v1.0/files/" + filename, body=multipart_file.to_string(), headers=prepared_header)
+    assert response.status_code == 400
+    with open(prepared_user.get_folder_path() / filename, "r") as saved_file:
+        assert saved_file.read() == r"""{"id": "some other data!"}"""
+    assert [path.name for path in prepared_user.get_folder_path().iterdir()] == [filename]
+
+
 def test_file_resource_should_replace_file_by_filename_if_file_exists_on_put(client: TestClient, prepared_header, prepared_file, prepared_user: User):
     """  """
     """ put request on file resource should add new file if it doesn't exists """
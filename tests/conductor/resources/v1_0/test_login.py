@@ -30,8 +30,11 @@ SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
 ==============================================================================
 
  Test login resource """
+from unittest.mock import patch
 from falcon.testing import TestClient
+from conductor.src.auth_models import User
 from conductor.src.helpers.auth_helpers import read_token
+from conductor.src.helpers.password_helpers import hash_password, verify_password, username_limiter
 from conductor.src.helpers.validate_schema import InputMachingError
 
 
@@ -44,3 +47,25 @@ def test_login_should_return_access_token_on_post(client: TestClient, headers):
     response = client.simulate_post("/v1.0/login", json=payload, headers=headers)
     decoded_claims = read_token(response.json["accessToken"], ["username"])
     assert decoded_claims["username"] == payload["username"]
+
+
+def test_login_should_upgrade_password_hash(client: TestClient, headers, prepared_user: User):
+    """ hash of the former format should be replaced by one with the current settings after login """
+    _, _, salt, pwdhash = hash_password("Superpassword1111", iterations=1000).split("$")
+    prepared_user._vertex["password"] = salt + pwdhash
+    payload = {"username": "l3s", "password": "Superpassword1111"}
+    with patch("conductor.src.helpers.password_helpers.LEGACY_ITERATIONS", 1000), \
+            patch("conductor.src.resources.login.auth_dataset", prepared_user.dataset):
+        response = client.simulate_post("/v1.0/login", json=payload, headers=headers)
+    assert response.status_code == 200
+    assert prepared_user.get_password().startswith("pbkdf2_sha512$100000$")
+    assert verify_password(prepared_user.get_password(), "Superpassword1111")
+
+
+def test_login_should_refuse_too_many_concurrent_logins(client: TestClient, headers):
+    """ logins beyond the limit per username should get 429 """
+    with patch.object(username_limiter, "limit", 0):
+        response = client.simulate_post("/v1.0/login", json={"username": "admin", "password": "Pass1234"},
+                                        headers=headers)
+    assert response.status_code == 429
+    assert response.json["code"] == "TooManyRequestsError"
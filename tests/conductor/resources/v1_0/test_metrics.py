@@ -0,0 +1,54 @@
+"""
+=================================== LICENSE ==================================
+Copyright (c) 2021, Consortium Board ROXANNE
+All rights reserved.
+
+Redistribution and use in source and binary forms, with or without
+modification, are permitted provided that the following conditions are met:
+
+Redistributions of source code must retain the above copyright
+notice, this list of conditions and the following disclaimer.
+
+Redistributions in binary form must reproduce the above copyright
+notice, this list of conditions and the following disclaimer in the
+documentation and/or other materials provided with the distribution.
+
+Neither the name of the ROXANNE nor the
+names of its contributors may be used to endorse or promote products
+derived from this software without specific prior written permission.
+
+THIS SOFTWARE IS PROVIDED BY CONSORTIUM BOARD ROXANNE ``AS IS'' AND ANY
+EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+DISCLAIMED. IN NO EVENT SHALL CONSORTIUM BOARD TENCOMPETENCE BE LIABLE FOR ANY
+DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+(INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+(INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+==============================================================================
+
+ Test metrics resource """
+from unittest.mock import patch
+from falcon.testing import TestClient
+from conductor.src.auth_models import User
+
+
+def test_metrics_resource_should_return_prometheus_text(client: TestClient, auth_headers):
+    """ get request on metrics resource should return request latencies and dataset gauges as text """
+    with patch("conductor.src.resources.metrics.celery_queue_length", return_value=3):
+        client.simulate_get("/v1.0/datasets", headers=auth_headers)
+        result = client.simulate_get("/v1.0/metrics", headers=auth_headers)
+    assert result.status_code == 200
+    assert result.headers["content-type"].startswith("text/plain")
+    assert 'conductor_http_request_duration_seconds_count{route="/v1.0/datasets",method="GET",status="200"}' \
+        in result.text
+    assert 'conductor_queue_length{queue="celery"} 3' in result.text
+    assert 'conductor_dataset_nodes{dataset="g"}' in result.text
+
+
+def test_metrics_resource_should_require_admin_role(client: TestClient, prepared_header, prepared_user: User):
+    """ get request on metrics resource should be refused to users """
+    result = client.simulate_get("/v1.0/metrics", headers=prepared_header)
+    assert result.status_code == 403
@@ -128,3 +128,26 @@ def test_network_construction_task_should_return_error_message_if_network_constr
     result = client.simulate_post("/v1.0/tasks/network_construction/randoom", json=wp5_data, headers=prepared_header)
     assert result.status_code == 404
     assert "ResourceError" in str(result.content)
+
+
+def test_network_construction_task_should_call_perform_incremental_parse_wp5_output_and_request_is_incremental(client: TestClient, prepared_header):
+    """ post request on network construction task resource with incremental flag should create perform_incremental_parse_wp5_output task with the user's construction state """
+    result_mock = MagicMock()
+    result_mock.id = "super-id"
+    data = dict(wp5_data, incremental=True, recluster=True)
+    with patch("conductor.src.resources.network_construction_tasks.perform_incremental_parse_wp5_output") as task_mock:
+        task_mock.delay.return_value = result_mock
+        result = client.simulate_post("/v1.0/tasks/network_construction/parse_wp5_output_for_aegis", json=data, headers=prepared_header)
+        task_mock.delay.assert_called_once_with(
+            wp5_data["threshold"],
+            wp5_data["calibration"],
+            wp5_data["directed"],
+            True,
+            True,
+            ANY,
+            ANY,
+            network=wp5_data["network"]
+        )
+        assert task_mock.delay.call_args[0][5].endswith("_aegis.pkl")
+        assert result.status_code == 202
+        assert result_mock.id in result.headers["Operation-Location"]
@@ -159,10 +159,16 @@ def test_task_should_create_perform_analysis_network_when_dataset_in_request_bod
             {
                 "task_id": "pepe",
                 "network": compare_dataset.get_network(),
-                "options": data["options"]
+                "options": data["options"],
+                "dataset_id": prepared_user.get_username() + data["dataset"],
+                "dataset_version": f"{compare_dataset.uid}-{compare_dataset.version}"
             },
             ANY,
             None
         )
         assert result.status_code == 202
         assert result_mock.id in result.headers["Operation-Location"]
+        reference = prepared_user.get_dataset_reference(data["dataset"])
+        patch_data = {"network": [{"type": "node", "id": "Satam_Suqami", "properties": {"type": "person"}}]}
+        assert client.simulate_patch("/v1.0/datasets/test", headers=prepared_header, json=patch_data).status_code == 200
+        assert prepared_user.get_dataset_reference(data["dataset"])["dataset_version"] != reference["dataset_version"]
@@ -0,0 +1,90 @@
+"""
+=================================== LICENSE ==================================
+Copyright (c) 2021, Consortium Board ROXANNE
+All rights reserved.
+
+Redistribution and use in source and binary forms, with or without
+modification, are permitted provided that the following conditions are met:
+
+Redistributions of source code must retain the above copyright
+notice, this list of conditions and the following disclaimer.
+
+Redistributions in binary form must reproduce the above copyright
+notice, this list of conditions and the following disclaimer in the
+documentation and/or other materials provided with the distribution.
+
+Neither the name of the ROXANNE nor the
+names of its contributors may be used to endorse or promote products
+derived from this software without specific prior written permission.
+
+THIS SOFTWARE IS PROVIDED BY CONSORTIUM BOARD ROXANNE ``AS IS'' AND ANY
+EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+DISCLAIMED. IN NO EVENT SHALL CONSORTIUM BOARD TENCOMPETENCE BE LIABLE FOR ANY
+DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+(INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+(INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+==============================================================================
+
+ Unit tests for the incremental network construction task """
+import threading
+from unittest.mock import patch
+import pytest
+from conductor.src.exceptions import TaskError
+from conductor.src.tasks.celery_tasks import perform_incremental_parse_wp5_output
+from storage.fft_helpers import IncrementalWP5Network
+
+
+def wp5_batch(first, count):
+    """ conversations first...first + count between two channels, the first channels scoring high together """
+    conversations = [{
+        "id": f"con{c}",
+        "date": f"2021-01-{c + 1:02d}",
+        "channels": [{"id": f"ch{c}_0", "number": f"+1{c % 3}"}, {"id": f"ch{c}_1", "number": f"+2{c % 3}"}]
+    } for c in range(first, first + count)]
+    matrix = {f"ch{c}_0": {f"ch{d}_0": 80.0 for d in range(first, first + count) if d != c}
+              for c in range(first, first + count)}
+    return {"conversations": conversations, "voiceprintsMatrix": matrix}
+
+
+def run_batch(state_path, network, threshold=50, calibration=False, directed=False):
+    """ Run the task in the current process """
+    with patch.object(perform_incremental_parse_wp5_output, "update_state"):
+        return perform_incremental_parse_wp5_output(
+            threshold, calibration, directed, False, False, str(state_path), "now", network=network)["result"]
+
+
+def test_incremental_parse_should_save_and_load_the_construction_state(tmp_path):
+    """ the state of the first batch should be saved, and loaded to add the second batch """
+    state_path = tmp_path / "user.pkl"
+    first = run_batch(state_path, wp5_batch(0, 3))
+    assert state_path.exists()
+    second = run_batch(state_path, wp5_batch(3, 3))
+    assert first["new_channels"] == second["new_channels"] == 6
+    assert {e["id"] for e in second["network"] if e["type"] == "node"} - \
+        {e["id"] for e in first["network"] if e["type"] == "node"}
+
+
+def test_incremental_parse_should_add_concurrent_batches_to_the_same_state(tmp_path):
+    """ batches of the same state running at the same time should all be kept """
+    state_path = tmp_path / "user.pkl"
+    threads = [threading.Thread(target=run_batch, args=(state_path, wp5_batch(3 * b, 3))) for b in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(IncrementalWP5Network.load(str(state_path)).channels) == 24
+
+
+def test_incremental_parse_should_reject_settings_differing_from_the_state(tmp_path):
+    """ a batch with other settings than the constructed network should fail, and keep the state """
+    state_path = tmp_path / "user.pkl"
+    run_batch(state_path, wp5_batch(0, 3))
+    with pytest.raises(TaskError, match="threshold"):
+        run_batch(state_path, wp5_batch(3, 3), threshold=70)
+    with pytest.raises(TaskError, match="directed"):
+        run_batch(state_path, wp5_batch(3, 3), directed=True)
+    assert len(IncrementalWP5Network.load(str(state_path)).channels) == 6
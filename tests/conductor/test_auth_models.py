@@ -0,0 +1,118 @@
+"""
+=================================== LICENSE ==================================
+Copyright (c) 2021, Consortium Board ROXANNE
+All rights reserved.
+
+Redistribution and use in source and binary forms, with or without
+modification, are permitted provided that the following conditions are met:
+
+Redistributions of source code must retain the above copyright
+notice, this list of conditions and the following disclaimer.
+
+Redistributions in binary form must reproduce the above copyright
+notice, this list of conditions and the following disclaimer in the
+documentation and/or other materials provided with the distribution.
+
+Neither the name of the ROXANNE nor the
+names of its contributors may be used to endorse or promote products
+derived from this software without specific prior written permission.
+
+THIS SOFTWARE IS PROVIDED BY CONSORTIUM BOARD ROXANNE ``AS IS'' AND ANY
+EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+DISCLAIMED. IN NO EVENT SHALL CONSORTIUM BOARD TENCOMPETENCE BE LIABLE FOR ANY
+DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+(INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+(INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+==============================================================================
+
+ Unit tests for the principal cache of the auth graph """
+import time
+import pytest
+from unittest.mock import MagicMock, patch
+from conductor.src.auth_models import Role, User, AuthRecordNotFoundError, principal_cache
+from conductor.src.config import config
+from conductor.src.helpers.auth_helpers import create_token
+from conductor.src.middlewares.authorization import AuthorizationComponent
+from storage.builtin_datasets import BuiltinDataset
+
+
+@pytest.fixture
+def dataset(tmp_path, monkeypatch):
+    """ Auth graph with two roles and one user """
+    monkeypatch.setitem(config, "temp_file_folder", tmp_path)
+    dataset = BuiltinDataset("", from_file=False)
+    Role(dataset).add_role("User", 0)
+    Role(dataset).add_role("Admin", 1)
+    User(dataset).store_user("alice", "Pass1234", "User")
+    return dataset
+
+
+def authorize(dataset, token):
+    """ Run authorization middleware on a request with token """
+    request = MagicMock()
+    request.auth = AuthorizationComponent.auth_header_prefix + token
+    with patch("conductor.src.middlewares.authorization.auth_dataset", dataset):
+        AuthorizationComponent().process_request(request, MagicMock())
+    return request.context.user
+
+
+def test_identify_should_use_cached_role(dataset):
+    """ the role should be found once, and again after set_role """
+    with patch.object(dataset, "get_neighbors") as get_neighbors:
+        assert User(dataset).identify("alice").get_role().get_name() == "User"
+        User(dataset).identify("alice").set_role("Admin")
+        assert User(dataset).identify("alice").get_role().get_name() == "Admin"
+        get_neighbors.assert_not_called()
+
+
+def test_identify_should_fail_for_deleted_and_renamed_users(dataset):
+    """ invalidated users should not be found """
+    User(dataset).store_user("carol", "Pass1234", "Admin")
+    User(dataset).identify("carol").delete()
+    with pytest.raises(AuthRecordNotFoundError):
+        User(dataset).identify("carol")
+    User(dataset).identify("alice").set_username("bob")
+    with pytest.raises(AuthRecordNotFoundError):
+        User(dataset).identify("alice")
+    assert User(dataset).identify("bob").get_role().get_name() == "User"
+
+
+def test_renamed_user_should_stay_in_snapshot(dataset):
+    """ renaming a user should not change a snapshot of the auth graph """
+    with dataset.snapshot() as snapshot:
+        User(dataset).identify("alice").set_username("bob")
+        assert "alice" in snapshot.nodes and "bob" not in snapshot.nodes
+        assert [snapshot.edges[e]["source"] for e in snapshot.adj_list["alice"]] == ["alice"]
+    assert [dataset.edges[e]["source"] for e in dataset.adj_list["bob"]] == ["bob"]
+    assert User(dataset).identify("bob").get_username() == "bob"
+
+
+def test_authorization_should_verify_token_once(dataset):
+    """ a known token should not be decoded again until the user changes """
+    token = create_token({"username": "alice"})
+    with patch("conductor.src.middlewares.authorization.read_token",
+               side_effect=lambda token, claims: {"username": "alice", "exp": time.time() + 60}) as read_token:
+        assert authorize(dataset, token).get_username() == "alice"
+        assert authorize(dataset, token).get_username() == "alice"
+        assert read_token.call_count == 1
+        User(dataset).identify("alice").set_password("Pass5678")
+        authorize(dataset, token)
+        assert read_token.call_count == 2
+
+
+def test_principal_cache_should_drop_expired_and_least_recently_used_tokens(dataset):
+    """ the token cache should be bounded """
+    cache = principal_cache(dataset)
+    cache.max_tokens = 2
+    cache.add_token("expired", "alice", time.time() - 1)
+    assert cache.get_token_username("expired") is None
+    for token in ("a", "b", "c"):
+        cache.add_token(token, "alice", time.time() + 60)
+    assert cache.get_token_username("a") is None
+    assert cache.get_token_username("c") == "alice"
+    cache.invalidate("alice")
+    assert cache.get_token_username("c") is None
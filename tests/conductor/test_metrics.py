@@ -0,0 +1,134 @@
+"""
+=================================== LICENSE ==================================
+Copyright (c) 2021, Consortium Board ROXANNE
+All rights reserved.
+
+Redistribution and use in source and binary forms, with or without
+modification, are permitted provided that the following conditions are met:
+
+Redistributions of source code must retain the above copyright
+notice, this list of conditions and the following disclaimer.
+
+Redistributions in binary form must reproduce the above copyright
+notice, this list of conditions and the following disclaimer in the
+documentation and/or other materials provided with the distribution.
+
+Neither the name of the ROXANNE nor the
+names of its contributors may be used to endorse or promote products
+derived from this software without specific prior written permission.
+
+THIS SOFTWARE IS PROVIDED BY CONSORTIUM BOARD ROXANNE ``AS IS'' AND ANY
+EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+DISCLAIMED. IN NO EVENT SHALL CONSORTIUM BOARD TENCOMPETENCE BE LIABLE FOR ANY
+DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+(INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+(INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+==============================================================================
+
+ Unit tests for the metrics registry """
+import os
+import re
+import threading
+from unittest.mock import patch
+import ujson
+import pytest
+from conductor.src.metrics import MetricsRegistry
+
+
+@pytest.fixture
+def registry(tmp_path):
+    """ Registry pushing to a temporary folder """
+    registry = MetricsRegistry(tmp_path, flush_interval=3600)
+    registry.histogram("latency_seconds", "Latency", ("route",), buckets=(0.1, 1.0))
+    registry.counter("lookups_total", "Cache lookups", ("cache", "result"))
+    registry.gauge("nodes", "Number of nodes", ("dataset",))
+    return registry
+
+
+def sample(text, line_start):
+    """ Value of the sample line starting with line_start """
+    match = re.search("^" + re.escape(line_start) + r" (\S+)$", text, re.MULTILINE)
+    return float(match.group(1)) if match else None
+
+
+def test_registry_should_render_metrics_in_prometheus_text_format(registry):
+    """ histogram buckets should be cumulative, with sum and count, and label values escaped """
+    latency = registry.metrics["latency_seconds"]
+    for value in (0.05, 0.5, 0.7, 3.0):
+        latency.observe(value, route="/v1.0/datasets")
+    registry.metrics["nodes"].set(12, dataset='a "quoted"\\name')
+    text = registry.render()
+    assert "# TYPE latency_seconds histogram" in text
+    assert sample(text, 'latency_seconds_bucket{route="/v1.0/datasets",le="0.1"}') == 1
+    assert sample(text, 'latency_seconds_bucket{route="/v1.0/datasets",le="1"}') == 3
+    assert sample(text, 'latency_seconds_bucket{route="/v1.0/datasets",le="+Inf"}') == 4
+    assert sample(text, 'latency_seconds_count{route="/v1.0/datasets"}') == 4
+    assert sample(text, 'latency_seconds_sum{route="/v1.0/datasets"}') == pytest.approx(4.25)
+    assert sample(text, 'nodes{dataset="a \\"quoted\\"\\\\name"}') == 12
+
+
+def test_registry_should_require_declared_labels(registry):
+    """ observing with other labels than the declared ones should fail """
+    with pytest.raises(ValueError):
+        registry.metrics["lookups_total"].inc(cache="embeddings")
+
+
+def test_registry_should_add_up_the_values_of_all_processes(registry, tmp_path):
+    """ values pushed by other processes should be summed, gauges should keep the latest value """
+    registry.metrics["lookups_total"].inc(2, cache="embeddings", result="hit")
+    registry.metrics["nodes"].set(10, dataset="d")
+    other_process = {"pid": os.getpid(), "values": {
+        "lookups_total": [[["embeddings", "hit"], 3.0], [["embeddings", "miss"], 1.0]],
+        "nodes": [[["d"], [99.0, 0.0]]],
+        "latency_seconds": [[["/v1.0/login"], {"buckets": [1, 0], "sum": 0.01, "count": 1}]]}}
+    with open(tmp_path / "1-other.json", "w") as state_file:
+        ujson.dump(other_process, state_file)
+    text = registry.render()
+    assert sample(text, 'lookups_total{cache="embeddings",result="hit"}') == 5
+    assert sample(text, 'lookups_total{cache="embeddings",result="miss"}') == 1
+    assert sample(text, 'nodes{dataset="d"}') == 10
+    assert sample(text, 'latency_seconds_count{route="/v1.0/login"}') == 1
+
+
+def test_registry_should_keep_counts_of_exited_processes(registry, tmp_path):
+    """ files of exited processes should be folded into one file, without their gauges """
+    exited_process = {"pid": 2 ** 22 + 1, "values": {
+        "lookups_total": [[["embeddings", "hit"], 3.0]],
+        "nodes": [[["d"], [99.0, 0.0]]]}}
+    with open(tmp_path / "4194305-exited.json", "w") as state_file:
+        ujson.dump(exited_process, state_file)
+    for _ in range(2):
+        text = registry.render()
+        assert sample(text, 'lookups_total{cache="embeddings",result="hit"}') == 3
+        assert sample(text, 'nodes{dataset="d"}') is None
+    assert not (tmp_path / "4194305-exited.json").exists()
+
+
+def test_registry_should_start_empty_in_forked_processes(registry, tmp_path):
+    """ a forked worker should not report the values of its parent again """
+    registry.metrics["lookups_total"].inc(cache="embeddings", result="hit")
+    registry.flush()
+    registry._pid = -1  # as seen from a forked child
+    registry.metrics["lookups_total"].inc(cache="embeddings", result="miss")
+    registry.flush()
+    states = [ujson.load(open(path)) for path in tmp_path.glob("*-*.json")]
+    assert len(states) == 2
+    assert sorted(len(state["values"]["lookups_total"]) for state in states) == [1, 1]
+
+
+def test_registry_should_flush_from_concurrent_threads(registry, tmp_path):
+    """ threads flushing at the same time should each replace the file of the process with a whole state """
+    registry.metrics["lookups_total"].inc(cache="embeddings", result="hit")
+    with patch("conductor.src.metrics.os.replace", wraps=os.replace) as replace:
+        threads = [threading.Thread(target=registry.flush) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    assert len({source for source, _ in (call.args for call in replace.call_args_list)}) == 8
+    assert [path.name for path in tmp_path.iterdir()] == [registry._file.name]
+    assert ujson.load(open(registry._file))["values"]["lookups_total"] == [[["embeddings", "hit"], 1.0]]
@@ -0,0 +1,81 @@
+"""
+=================================== LICENSE ==================================
+Copyright (c) 2021, Consortium Board ROXANNE
+All rights reserved.
+
+Redistribution and use in source and binary forms, with or without
+modification, are permitted provided that the following conditions are met:
+
+Redistributions of source code must retain the above copyright
+notice, this list of conditions and the following disclaimer.
+
+Redistributions in binary form must reproduce the above copyright
+notice, this list of conditions and the following disclaimer in the
+documentation and/or other materials provided with the distribution.
+
+Neither the name of the ROXANNE nor the
+names of its contributors may be used to endorse or promote products
+derived from this software without specific prior written permission.
+
+THIS SOFTWARE IS PROVIDED BY CONSORTIUM BOARD ROXANNE ``AS IS'' AND ANY
+EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+DISCLAIMED. IN NO EVENT SHALL CONSORTIUM BOARD TENCOMPETENCE BE LIABLE FOR ANY
+DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+(INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+(INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+==============================================================================
+
+ Fixtures serving the conductor over HTTP """
+import threading
+import pytest
+from socketserver import ThreadingMixIn
+from unittest.mock import patch
+from wsgiref.simple_server import make_server, WSGIServer, WSGIRequestHandler
+from framework.api_interface import ConductorConnector, ConductorDataManager
+from conductor.src.auth_models import Role, User
+from storage.builtin_datasets import BuiltinDataset, BuiltinDatasetsManager
+
+
+class ThreadingWSGIServer(ThreadingMixIn, WSGIServer):
+    daemon_threads = True
+
+
+class QuietHandler(WSGIRequestHandler):
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def serve():
+    """ Serve WSGI apps on local ports """
+    servers = []
+
+    def start(app):
+        server = make_server("127.0.0.1", 0, app, server_class=ThreadingWSGIServer, handler_class=QuietHandler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        servers.append(server)
+        return server.server_address[1]
+    yield start
+    for server in servers:
+        server.shutdown()
+
+
+@pytest.fixture
+def conductor_manager(serve):
+    """ Data manager connected to the conductor served over HTTP, as a user with an empty dataset """
+    from conductor import api
+    auth_dataset = BuiltinDataset("", from_file=False)
+    with patch("conductor.src.middlewares.authorization.auth_dataset", auth_dataset), \
+            patch("conductor.src.resources.login.auth_dataset", auth_dataset), \
+            patch("conductor.src.auth_models.data_manager", BuiltinDatasetsManager(None, None)):
+        Role(auth_dataset).add_role("User", 0)
+        user = User(auth_dataset).store_user("l3s", "Superpassword1111", "User")
+        user.create_dataset("data", "stuff", None, from_file=False)
+        connector = ConductorConnector("127.0.0.1", serve(api), "l3s", "Superpassword1111", backoff=0)
+        yield ConductorDataManager(connector, batch_size=2)
+        connector.close()
+        user.delete()
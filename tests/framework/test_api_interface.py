@@ -0,0 +1,119 @@
+"""
+=================================== LICENSE ==================================
+Copyright (c) 2021, Consortium Board ROXANNE
+All rights reserved.
+
+Redistribution and use in source and binary forms, with or without
+modification, are permitted provided that the following conditions are met:
+
+Redistributions of source code must retain the above copyright
+notice, this list of conditions and the following disclaimer.
+
+Redistributions in binary form must reproduce the above copyright
+notice, this list of conditions and the following disclaimer in the
+documentation and/or other materials provided with the distribution.
+
+Neither the name of the ROXANNE nor the
+names of its contributors may be used to endorse or promote products
+derived from this software without specific prior written permission.
+
+THIS SOFTWARE IS PROVIDED BY CONSORTIUM BOARD ROXANNE ``AS IS'' AND ANY
+EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+DISCLAIMED. IN NO EVENT SHALL CONSORTIUM BOARD TENCOMPETENCE BE LIABLE FOR ANY
+DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+(INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+(INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+==============================================================================
+
+ Tests for the conductor client over HTTP """
+import time
+from datetime import datetime, timedelta
+import pytest
+import msgpack
+from framework.api_interface import ConductorConnector, ConductorDataManager, ConductorError, Method, JSON
+from conductor.src.helpers.auth_helpers import create_token
+
+
+def scripted_app(responses, requests):
+    """ App logging in anybody and answering other requests with the next of (status, media) responses """
+    def app(environ, start_response):
+        if environ["PATH_INFO"] == "/v1.0/login":
+            status, media = "200 OK", {"accessToken": create_token({"username": "admin"})}
+        else:
+            requests.append((environ["REQUEST_METHOD"], environ["PATH_INFO"], environ.get("HTTP_AUTHORIZATION")))
+            status, media = responses.pop(0)
+        start_response(status, [("Content-Type", "application/msgpack"), ("Retry-After", "0")])
+        return [msgpack.packb(media, use_bin_type=True)]
+    return app
+
+
+def test_manager_should_save_and_read_network_in_batches(conductor_manager):
+    """ nodes and edges saved in batches should be read back by every query """
+    nodes = {n: {"type": "person", "name": n} for n in ["a", "b", "c"]}
+    assert conductor_manager.save_nodes(nodes, "data") == []
+    assert conductor_manager.save_edges(
+        [{"source": "a", "target": "b", "properties": {"type": "call"}},
+         {"source": "b", "target": "c", "properties": {"type": "call"}}], "data") == []
+    network = conductor_manager.get_network("data")
+    assert sorted(n["id"] for n in network["nodes"]) == ["a", "b", "c"]
+    assert sorted((e["source"], e["target"]) for e in network["edges"]) == [("a", "b"), ("b", "c")]
+    neighbors = conductor_manager.get_neighbors(["a", "c", "x"], "data")
+    assert [n["id"] for n in neighbors["found"]] == ["a", "c"]
+    assert neighbors["found"][0]["neighbors"][0]["neighbor_id"] == "b"
+    assert neighbors["not_found"] == ["x"]
+    assert conductor_manager.search_nodes(["a", "x"], "data")["not_found"] == ["x"]
+    assert conductor_manager.delete_edges([("a", "b")], "data") == []
+    results = conductor_manager.fan_out(conductor_manager.get_network, [("data", ["a"]), ("data", ["b"])])
+    assert [len(r["edges"]) for r in results] == [0, 1]
+
+
+def test_connector_should_renew_refused_token(conductor_manager):
+    """ request with a token the server refuses should be sent again with a new token """
+    connector = conductor_manager.connector
+    # expired for the server but not for the client, e.g. because their clocks differ
+    connector._token = create_token({"username": "l3s", "exp": datetime.utcnow() - timedelta(minutes=1)})
+    connector._token_expiration = None
+    assert connector.call(connector.url("datasets"), Method.GET)["datasets"] == ["data"]
+
+
+def test_connector_should_retry_refused_requests_with_backoff(serve):
+    """ requests refused by an overloaded server should be sent again, failed POST only if idempotent """
+    requests = []
+    responses = [("503 Service Unavailable", {}), ("200 OK", {"datasets": []}), ("502 Bad Gateway", {})]
+    connector = ConductorConnector("127.0.0.1", serve(scripted_app(responses, requests)), "admin", "x", backoff=0)
+    assert connector.call(connector.url("datasets"), Method.POST, {}) == {"datasets": []}
+    with pytest.raises(ConductorError):
+        connector.call(connector.url("datasets"), Method.POST, {})
+    assert len(requests) == 3
+    assert all(authorization.startswith("Bearer ") for _, _, authorization in requests)
+
+
+def test_manager_should_poll_operation_until_task_is_finished(serve):
+    """ operation should be polled with growing delays until its task is finished """
+    requests = []
+    responses = [("200 OK", {"taskData": None}), ("200 OK", {"taskData": {"status": "PROGRESS"}}),
+                 ("200 OK", {"taskData": {"status": "SUCCESS"}})]
+    connector = ConductorConnector("127.0.0.1", serve(scripted_app(responses, requests)), "admin", "x", transport=JSON)
+    manager = ConductorDataManager(connector)
+    start = time.perf_counter()
+    assert manager.wait_for_operation(connector.url("operations", "42"), delay=0.05) == {"status": "SUCCESS"}
+    assert time.perf_counter() - start >= 0.05 + 0.1
+    assert [path for _, path, _ in requests] == ["/v1.0/operations/42"] * 3
+
+
+def test_connector_should_not_send_refused_multipart_request_again(serve, tmp_path):
+    """ refused upload should be returned as it is, since its form was read while sent """
+    requests = []
+    responses = [("503 Service Unavailable", {}), ("200 OK", {})]
+    connector = ConductorConnector("127.0.0.1", serve(scripted_app(responses, requests)), "admin", "x", backoff=0)
+    path = tmp_path / "network.json"
+    path.write_text("{}")
+    with open(path, "rb") as network_file:
+        response = connector.request_multipart(
+            connector.url("query", "upload"), Method.POST, {"network": ("network.json", network_file, JSON)})
+    assert response.status_code == 503
+    assert len(requests) == 1
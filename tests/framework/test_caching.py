@@ -0,0 +1,102 @@
+"""
+=================================== LICENSE ==================================
+Copyright (c) 2021, Consortium Board ROXANNE
+All rights reserved.
+
+Redistribution and use in source and binary forms, with or without
+modification, are permitted provided that the following conditions are met:
+
+Redistributions of source code must retain the above copyright
+notice, this list of conditions and the following disclaimer.
+
+Redistributions in binary form must reproduce the above copyright
+notice, this list of conditions and the following disclaimer in the
+documentation and/or other materials provided with the distribution.
+
+Neither the name of the ROXANNE nor the
+names of its contributors may be used to endorse or promote products
+derived from this software without specific prior written permission.
+
+THIS SOFTWARE IS PROVIDED BY CONSORTIUM BOARD ROXANNE ``AS IS'' AND ANY
+EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+DISCLAIMED. IN NO EVENT SHALL CONSORTIUM BOARD TENCOMPETENCE BE LIABLE FOR ANY
+DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+(INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+(INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+==============================================================================
+
+ Tests for the read cache of data managers """
+import pytest
+from unittest.mock import MagicMock
+from framework.caching import CachingDataManager
+from storage.builtin_datasets import BuiltinDataset, BuiltinDatasetsManager
+
+
+@pytest.fixture
+def dataset():
+    """ Network of a, b and c """
+    dataset = BuiltinDataset(None, from_file=False)
+    dataset.save_nodes({n: {"type": "person", "name": n} for n in ["a", "b", "c"]})
+    dataset.save_edges([{"source": "a", "target": "b", "properties": {"type": "call"}}])
+    return dataset
+
+
+@pytest.fixture
+def cached_manager(dataset):
+    """ Cache of a manager of the dataset, spying on the lookups of the dataset """
+    manager = BuiltinDatasetsManager(None, None)
+    manager.add_dataset("data", "data", None, from_file=False, dataset=dataset)
+    dataset.search_nodes = MagicMock(wraps=dataset.search_nodes)
+    dataset.get_network = MagicMock(wraps=dataset.get_network)
+    return CachingDataManager(manager, max_entries=2)
+
+
+def test_cache_should_answer_repeated_reads_until_dataset_changes(cached_manager, dataset):
+    """ repeated reads should be computed once, a change of the dataset made elsewhere should be seen """
+    first = cached_manager.search_nodes(node_ids=None, network="data")
+    assert cached_manager.search_nodes(node_ids=None, network="data") is first
+    assert dataset.search_nodes.call_count == 1
+    dataset.save_nodes({"d": {"type": "person"}})
+    assert len(cached_manager.search_nodes(node_ids=None, network="data")["found"]) == 4
+    assert dataset.search_nodes.call_count == 2
+    assert cached_manager.cache_info()["hits"] == 1
+
+
+def test_cache_should_remember_nodes_not_found(cached_manager, dataset):
+    """ ids not found should not be looked up again until the node is saved """
+    assert cached_manager.search_nodes(["a", "x"], "data")["not_found"] == ["x"]
+    assert cached_manager.search_nodes(["x"], "data") == {"found": [], "not_found": ["x"]}
+    result = cached_manager.search_nodes(["x", "b", "y"], "data")
+    assert [n["id"] for n in result["found"]] == ["b"] and result["not_found"] == ["x", "y"]
+    assert [c.kwargs["node_ids"] for c in dataset.search_nodes.call_args_list] == [["a", "x"], ["b", "y"]]
+    cached_manager.save_nodes({"x": {"type": "person"}}, "data")
+    assert cached_manager.search_nodes(["x"], "data")["not_found"] == []
+
+
+def test_cache_should_drop_least_recently_used_results(cached_manager, dataset):
+    """ cache should hold at most max_entries results """
+    for node_ids in (["a"], ["b"], ["a"], ["c"], ["a"], ["b"]):
+        cached_manager.get_network("data", node_ids)
+    assert dataset.get_network.call_count == 4
+    assert cached_manager.cache_info()["entries"] == 2
+
+
+def test_cache_should_pass_other_methods_to_manager(cached_manager):
+    """ methods of the manager outside of the interface should be available """
+    assert cached_manager.add_dataset("other", "other", None, from_file=False)["success"] == 1
+    assert cached_manager.get_network("other") == {"nodes": [], "edges": []}
+
+
+def test_cache_should_see_changes_of_remote_datasets(conductor_manager):
+    """ reads of a conductor dataset should be cached until the dataset changes on the server """
+    cached_manager = CachingDataManager(conductor_manager)
+    conductor_manager.save_nodes({"a": {"type": "person"}}, "data")
+    assert len(cached_manager.get_network("data")["nodes"]) == 1
+    assert len(cached_manager.get_network("data")["nodes"]) == 1
+    conductor_manager.save_nodes({"b": {"type": "person"}}, "data")
+    assert len(cached_manager.get_network("data")["nodes"]) == 2
+    assert cached_manager.cache_info()["hits"] == 1
@@ -0,0 +1,158 @@
+"""
+=================================== LICENSE ==================================
+Copyright (c) 2021, Consortium Board ROXANNE
+All rights reserved.
+
+Redistribution and use in source and binary forms, with or without
+modification, are permitted provided that the following conditions are met:
+
+Redistributions of source code must retain the above copyright
+notice, this list of conditions and the following disclaimer.
+
+Redistributions in binary form must reproduce the above copyright
+notice, this list of conditions and the following disclaimer in the
+documentation and/or other materials provided with the distribution.
+
+Neither the name of the ROXANNE nor the
+names of its contributors may be used to endorse or promote products
+derived from this software without specific prior written permission.
+
+THIS SOFTWARE IS PROVIDED BY CONSORTIUM BOARD ROXANNE ``AS IS'' AND ANY
+EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+DISCLAIMED. IN NO EVENT SHALL CONSORTIUM BOARD TENCOMPETENCE BE LIABLE FOR ANY
+DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+(INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+(INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+==============================================================================
+
+ Tests for the copy-on-write snapshots of builtin datasets """
+import copy
+import random
+import threading
+import pytest
+from storage.builtin_datasets import BuiltinDataset, ReadOnlySnapshotError
+from tester.synthetic_networks import synthetic_network
+
+
+def synthetic_dataset(num_nodes=2000, seed=0):
+    dataset = BuiltinDataset(None, from_file=False)
+    nodes, edges = synthetic_network(num_nodes, seed=seed)
+    for node in nodes:
+        dataset._index_line_object({'type': 'node', 'id': node['id'], 'properties': node['properties']})
+    for edge in edges:
+        dataset._index_line_object(dict(edge, type='edge'))
+    return dataset
+
+
+def contents(dataset):
+    return copy.deepcopy((dataset.nodes, dataset.edges, dataset.adj_list, dataset.in_adj_list,
+                          dataset.node_types, dataset.edge_types))
+
+
+def random_writes(dataset, num_writes, random_state):
+    """ updates of nodes and edges, new edges, deleted edges and renamed nodes """
+    for i in range(num_writes):
+        node_ids = list(dataset.nodes)
+        u, v = random_state.choice(node_ids), random_state.choice(node_ids)
+        choice = i % 5
+        if choice == 0:
+            dataset.update_a_node(u, dict(dataset.nodes[u], score=i))
+        elif choice == 1:
+            dataset.add_an_edge(u, v, {'type': 'meets', 'weight': i})
+        elif choice == 2 and dataset.adj_list.get(u):
+            e_index = dataset.adj_list[u][0]
+            dataset.update_an_edge(e_index=e_index, properties=dict(dataset.edges[e_index]['properties'], weight=i))
+        elif choice == 3 and dataset.adj_list.get(u):
+            dataset.delete_an_edge(e_index=dataset.adj_list[u][0])
+        elif choice == 4:
+            dataset.rename_node(u, '%s_%d' % (u, i))
+
+
+def assert_consistent(dataset):
+    """ the adjacency lists and the edges agree """
+    for name, end in (('adj_list', 'source'), ('in_adj_list', 'target')):
+        for node, e_indexes in getattr(dataset, name).items():
+            for e_index in e_indexes:
+                assert dataset.edges[e_index][end] == node
+    for e_index, edge in enumerate(dataset.edges):
+        if edge is not None:
+            assert e_index in dataset.adj_list[edge['source']]
+            assert e_index in dataset.in_adj_list[edge['target']]
+
+
+def test_snapshot_should_not_change():
+    """ a snapshot should keep the contents it was taken with while the dataset is written, and share the rest """
+    dataset = synthetic_dataset()
+    before = contents(dataset)
+    with dataset.snapshot() as snapshot:
+        random_writes(dataset, 500, random.Random(0))
+        assert contents(snapshot) == before
+        assert snapshot.version < dataset.version
+        assert_consistent(dataset)
+        # the elements not changed by the writes are shared
+        unchanged = [u for u in snapshot.nodes if dataset.nodes.get(u) == snapshot.nodes[u]]
+        assert unchanged and all(dataset.nodes[u] is snapshot.nodes[u] for u in unchanged)
+        with pytest.raises(ReadOnlySnapshotError):
+            snapshot.save_nodes({'new': {'type': 'person'}})
+    # released: the references to the previous version are dropped and the writers change the containers in place
+    assert snapshot.nodes is None
+    nodes = dataset.nodes
+    random_writes(dataset, 10, random.Random(1))
+    assert dataset.nodes is nodes
+
+
+def test_snapshot_should_be_shared_until_changed():
+    """ snapshots taken before a write should be the same, a write should start a new one """
+    dataset = synthetic_dataset(200)
+    first, second = dataset.snapshot(), dataset.snapshot()
+    assert first is second and first.pins == 2
+    first.release()
+    dataset.update_a_node('n0', {'type': 'person'})
+    third = dataset.snapshot()
+    assert third is not second and third.version == dataset.version
+    assert second.nodes['n0'] != third.nodes['n0']
+    second.release()
+    third.release()
+
+
+def test_snapshots_should_be_consistent_while_written():
+    """ readers check snapshots while a writer changes the dataset """
+    dataset = synthetic_dataset(500)
+    done = threading.Event()
+    errors = []
+
+    def read():
+        try:
+            while not done.is_set():
+                with dataset.snapshot() as snapshot:
+                    assert_consistent(snapshot)
+        except Exception as e:
+            errors.append(e)
+
+    readers = [threading.Thread(target=read) for _ in range(2)]
+    for reader in readers:
+        reader.start()
+    random_writes(dataset, 2000, random.Random(2))
+    done.set()
+    for reader in readers:
+        reader.join()
+    assert not errors, errors
+    assert_consistent(dataset)
+
+
+def test_write_after_snapshot_should_copy_only_changed_pages():
+    """ the first write after a snapshot was taken should copy the page it changes, not the whole containers """
+    dataset = synthetic_dataset(5000)
+    with dataset.snapshot() as snapshot:
+        dataset.update_a_node('n0', dict(dataset.nodes['n0'], score=1))
+        dataset.add_an_edge('n1', 'n2', {'type': 'meets', 'weight': 1})
+        for name in ('nodes', 'edges', 'adj_list', 'in_adj_list'):
+            pages, snapshot_pages = getattr(dataset, name)._pages, getattr(snapshot, name)._pages
+            assert len(snapshot_pages) > 2
+            copied = [page for page, snapshot_page in zip(pages, snapshot_pages) if page is not snapshot_page]
+            assert len(copied) == 1, name
+        assert snapshot.nodes['n0'].get('score') != 1 and len(snapshot.edges) == len(dataset.edges) - 1
@@ -0,0 +1,126 @@
+"""
+=================================== LICENSE ==================================
+Copyright (c) 2021, Consortium Board ROXANNE
+All rights reserved.
+
+Redistribution and use in source and binary forms, with or without
+modification, are permitted provided that the following conditions are met:
+
+Redistributions of source code must retain the above copyright
+notice, this list of conditions and the following disclaimer.
+
+Redistributions in binary form must reproduce the above copyright
+notice, this list of conditions and the following disclaimer in the
+documentation and/or other materials provided with the distribution.
+
+Neither the name of the ROXANNE nor the
+names of its contributors may be used to endorse or promote products
+derived from this software without specific prior written permission.
+
+THIS SOFTWARE IS PROVIDED BY CONSORTIUM BOARD ROXANNE ``AS IS'' AND ANY
+EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+DISCLAIMED. IN NO EVENT SHALL CONSORTIUM BOARD TENCOMPETENCE BE LIABLE FOR ANY
+DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+(INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+(INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+==============================================================================
+
+
+ Tests for the process-pool diarization pipeline """
+import os
+from unittest.mock import patch
+import numpy as np
+import pytest
+from storage import diarization_pipeline
+from storage.diarization_pipeline import DiarizationPipeline, SAMPLE_RATE, SUBSEGMENT_LENGTH, compute_features
+
+
+def tone(seconds, frequency=440.0, seed=0):
+    """ a tone with some noise, in [-1, 1] """
+    t = np.arange(int(seconds * SAMPLE_RATE)) / SAMPLE_RATE
+    noise = np.random.RandomState(seed).randn(len(t))
+    return 0.5 * np.sin(2 * np.pi * frequency * t) + 0.05 * noise
+
+
+def fake_xvectors(subsegments, model, batch_size=64):
+    """ stands for the TDNN: one 512-dimensional vector per subsegment """
+    return np.array([np.resize(fea.mean(axis=0), 512) for fea in subsegments]).reshape(-1, 512)
+
+
+def test_features_should_be_cut_into_subsegments():
+    """ features are cut into 1.5 s subsegments, only inside the speech segments long enough """
+    subsegments = compute_features(tone(4), SAMPLE_RATE)
+    assert len(subsegments) > 5
+    assert all(fea.shape == (SUBSEGMENT_LENGTH, 40) for fea in subsegments[:-1])
+    assert 0 < len(subsegments[-1]) <= SUBSEGMENT_LENGTH
+    assert compute_features(tone(4), SAMPLE_RATE, vad=[(0.5, 0.51)]) == []
+    assert len(compute_features(tone(4), SAMPLE_RATE, vad=[(0, 1), (2, 4)])) < len(subsegments)
+    with pytest.raises(ValueError):
+        compute_features(tone(4), 8000)
+
+
+def test_features_should_not_depend_on_the_global_random_state():
+    """ the dither is seeded, so the features of a recording are the same in every process """
+    np.random.seed(1)
+    first = compute_features(tone(2), SAMPLE_RATE, seed=3)
+    np.random.seed(2)
+    state = np.random.get_state()[1].copy()
+    second = compute_features(tone(2), SAMPLE_RATE, seed=3)
+    assert all(np.array_equal(a, b) for a, b in zip(first, second))
+    # and the global random state is left as it was
+    assert np.array_equal(np.random.get_state()[1], state)
+
+
+def test_recordings_should_be_read_from_the_cache(tmp_path):
+    """ x-vectors are cached by audio content, then features when the x-vectors of the model are missing """
+    task = {'signal': tone(3), 'samplerate': SAMPLE_RATE, 'vad': None, 'cache_dir': str(tmp_path),
+            'model_path': None, 'model_key': 'm', 'batch_size': 8, 'num_threads': 1}
+    with patch.object(diarization_pipeline, '_load_model'), \
+            patch.object(diarization_pipeline, 'extract_xvectors', side_effect=fake_xvectors) as extract:
+        digest, xvectors, hits = diarization_pipeline._process_recording(task)
+        assert hits == {'xvectors': False, 'features': False} and len(xvectors) > 0
+        _, cached, hits = diarization_pipeline._process_recording(dict(task, signal=task['signal'].copy()))
+        assert hits['xvectors'] and np.array_equal(cached, xvectors)
+        _, other_model, hits = diarization_pipeline._process_recording(dict(task, model_key='other'))
+        assert hits == {'xvectors': False, 'features': True} and np.array_equal(other_model, xvectors)
+        assert extract.call_count == 2
+    assert sorted(os.listdir(tmp_path / 'xvectors')) == sorted(['%s_m.npy' % digest, '%s_other.npy' % digest])
+
+
+@pytest.fixture
+def pipeline():
+    return DiarizationPipeline(None, workers=1, diarize=False)
+
+
+def test_voiceprints_matrix_should_keep_top_scores(pipeline):
+    """ each channel keeps its self score and its k best scores, which do not depend on the block size """
+    voiceprints = np.random.RandomState(0).randn(12, 512)
+    channel_ids = ['c%d' % i for i in range(12)]
+    full = pipeline.voiceprints_matrix(channel_ids, voiceprints)
+    blocks = np.vstack([scores for _, scores in pipeline.score(voiceprints, block_size=5)])
+    assert np.allclose(blocks, [[full[u][v] for v in channel_ids] for u in channel_ids])
+    top = pipeline.voiceprints_matrix(channel_ids, voiceprints, top_k=3)
+    for u in channel_ids:
+        assert u in top[u] and 3 <= len(top[u]) <= 4
+        best = sorted(full[u].values(), reverse=True)[:3]
+        assert all(full[u][v] >= best[-1] for v in top[u] if v != u)
+
+
+def test_wp5_output_should_skip_channels_without_speech(pipeline):
+    """ a channel without x-vectors has no voiceprint and no row in the matrix """
+    conversations = [{'channels': [{'id': 'a', 'fileName': 'a.wav'}, {'id': 'b', 'fileName': 'b.wav'}]},
+                     {'channels': [{'id': 'c', 'fileName': 'c.wav'}]}]
+    random_state = np.random.RandomState(0)
+    xvectors = [random_state.randn(4, 512), np.zeros((0, 512)), random_state.randn(6, 512)]
+    with patch.object(pipeline, 'extract_xvectors', return_value=(xvectors, {'recordings': 3})):
+        output, statistics = pipeline.wp5_output(conversations)
+    assert statistics['channels_without_speech'] == 1
+    assert output['conversations'] is conversations
+    assert sorted(output['voiceprintsMatrix']) == ['a', 'c']
+    assert sorted(output['voiceprintsMatrix']['a']) == ['a', 'c']
+    voiceprint = pipeline.voiceprint(xvectors[0])
+    assert np.sum(voiceprint ** 2) == pytest.approx(512)
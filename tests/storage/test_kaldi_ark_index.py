@@ -0,0 +1,140 @@
+"""
+=================================== LICENSE ==================================
+Copyright (c) 2021, Consortium Board ROXANNE
+All rights reserved.
+
+Redistribution and use in source and binary forms, with or without
+modification, are permitted provided that the following conditions are met:
+
+Redistributions of source code must retain the above copyright
+notice, this list of conditions and the following disclaimer.
+
+Redistributions in binary form must reproduce the above copyright
+notice, this list of conditions and the following disclaimer in the
+documentation and/or other materials provided with the distribution.
+
+Neither the name of the ROXANNE nor the
+names of its contributors may be used to endorse or promote products
+derived from this software without specific prior written permission.
+
+THIS SOFTWARE IS PROVIDED BY CONSORTIUM BOARD ROXANNE ``AS IS'' AND ANY
+EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+DISCLAIMED. IN NO EVENT SHALL CONSORTIUM BOARD TENCOMPETENCE BE LIABLE FOR ANY
+DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+(INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+(INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+==============================================================================
+
+ Tests for the index of Kaldi ark files """
+import os
+import numpy as np
+import pytest
+from storage.kit.VBx import kaldi_io
+from storage.kaldi_ark_index import ArkIndex, open_ark_index
+
+
+def write_test_arks(folder, num_records=200, seed=0):
+    """ an ark of x-vector like float vectors, and an ark mixing matrices and vectors of both precisions """
+    random_state = np.random.RandomState(seed)
+    xvector_ark = str(folder / "xvectors.ark")
+    with open(xvector_ark, "wb") as ark_file:
+        for i in range(num_records):
+            kaldi_io.write_vec_flt(ark_file, random_state.randn(512).astype(np.float32), key="rec%05d_%04d" % (i, i))
+    mixed_ark = str(folder / "mixed.ark")
+    with open(mixed_ark, "wb") as ark_file:
+        for i in range(num_records // 10):
+            kaldi_io.write_mat(ark_file, random_state.randn(random_state.randint(1, 150), 40).astype(np.float32),
+                               key="fbank_%d" % i)
+            kaldi_io.write_mat(ark_file, random_state.randn(3, 5), key="double_mat_%d" % i)
+            kaldi_io.write_vec_flt(ark_file, random_state.randn(7), key="double_vec_%d" % i)
+        kaldi_io.write_vec_flt(ark_file, np.zeros(0, dtype=np.float32), key="empty_vec")
+        ark_file.write(b"ascii_mat  [\n  1 2 3 \n  4 5 6 ]\n")
+        ark_file.write(b"ascii_vec [ 1.5 2.5 ]\n")
+    return xvector_ark, mixed_ark
+
+
+def read_mixed_ark(path):
+    """ records of the mixed ark read sequentially by kaldi_io """
+    mixed = {}
+    with open(path, "rb") as ark_file:
+        key = kaldi_io.read_key(ark_file)
+        while key:
+            mixed[key] = kaldi_io.read_vec_flt(ark_file) if "vec" in key else kaldi_io.read_mat(ark_file)
+            key = kaldi_io.read_key(ark_file)
+    return mixed
+
+
+def assert_same_records(index, reference):
+    assert len(index) == len(reference)
+    assert sorted(index.keys) == sorted(reference)
+    for key, value in reference.items():
+        found = index[key]
+        assert found.dtype == value.dtype or found.size == 0, key
+        assert found.shape == value.shape, key
+        assert np.array_equal(found, value), key
+        assert np.array_equal(kaldi_io.read_mat(index.rxspec(key)) if value.ndim == 2
+                              else kaldi_io.read_vec_flt(index.rxspec(key)), value), key
+
+
+@pytest.fixture
+def arks(tmp_path):
+    return write_test_arks(tmp_path)
+
+
+def test_ark_index_should_read_vectors_through_memory_map_views(arks):
+    """ vectors should be read back as read-only views, one by one and in batches """
+    xvector_ark, _ = arks
+    xvectors = {key: value for key, value in kaldi_io.read_vec_flt_ark(xvector_ark)}
+    with ArkIndex.build(xvector_ark) as index:
+        assert_same_records(index, xvectors)
+        view = index["rec00003_0003"]
+        assert not view.flags.writeable and not view.flags.owndata
+        keys = list(xvectors)[::-3]
+        assert np.array_equal(index.stack(keys), np.array([xvectors[key] for key in keys]))
+        assert all(np.array_equal(a, xvectors[key]) for a, key in zip(index.get_batch(keys), keys))
+        assert index.get("unknown") is None and "unknown" not in index
+
+
+def test_ark_index_should_read_matrices_vectors_of_both_precisions_and_ascii_records(arks):
+    """ binary matrices and vectors in float and double, and ascii records, should be read as kaldi_io does """
+    _, mixed_ark = arks
+    mixed = read_mixed_ark(mixed_ark)
+    with ArkIndex.build(mixed_ark) as index:
+        assert_same_records(index, mixed)
+        keys = ["double_mat_%d" % i for i in range(5)]
+        assert np.array_equal(index.stack(keys), np.array([mixed[key] for key in keys]))
+
+
+def test_ark_index_should_read_several_arks_from_scp_file(arks, tmp_path):
+    """ records of an scp file pointing into several arks should all be found """
+    xvector_ark, mixed_ark = arks
+    scp_path = str(tmp_path / "all.scp")
+    with open(scp_path, "w") as scp_file:
+        for index in (ArkIndex.build(xvector_ark), ArkIndex.build(mixed_ark)):
+            for key in index.keys:
+                scp_file.write("%s %s\n" % (key, index.rxspec(key)))
+            index.close()
+    reference = dict({key: value for key, value in kaldi_io.read_vec_flt_ark(xvector_ark)}, **read_mixed_ark(mixed_ark))
+    with ArkIndex.from_scp(scp_path) as index:
+        assert_same_records(index, reference)
+
+
+def test_ark_index_should_be_saved_and_rebuilt_once_the_ark_changes(arks):
+    """ the saved index should be loaded while the ark is unchanged, and rebuilt after a record is appended """
+    xvector_ark, _ = arks
+    xvectors = {key: value for key, value in kaldi_io.read_vec_flt_ark(xvector_ark)}
+    index = open_ark_index(xvector_ark)
+    assert os.path.exists(xvector_ark + ".idx.npz")
+    assert_same_records(open_ark_index(xvector_ark), xvectors)
+    with open(xvector_ark, "rb") as ark_file:
+        content = ark_file.read()
+    with open(xvector_ark, "wb") as ark_file:
+        ark_file.write(content)
+        kaldi_io.write_vec_flt(ark_file, np.ones(512, dtype=np.float32), key="appended")
+    assert ArkIndex.load(xvector_ark + ".idx.npz") is None
+    assert np.array_equal(open_ark_index(xvector_ark)["appended"], np.ones(512, dtype=np.float32))
+    index.close()
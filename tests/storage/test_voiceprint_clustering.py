@@ -0,0 +1,112 @@
+"""
+=================================== LICENSE ==================================
+Copyright (c) 2021, Consortium Board ROXANNE
+All rights reserved.
+
+Redistribution and use in source and binary forms, with or without
+modification, are permitted provided that the following conditions are met:
+
+Redistributions of source code must retain the above copyright
+notice, this list of conditions and the following disclaimer.
+
+Redistributions in binary form must reproduce the above copyright
+notice, this list of conditions and the following disclaimer in the
+documentation and/or other materials provided with the distribution.
+
+Neither the name of the ROXANNE nor the
+names of its contributors may be used to endorse or promote products
+derived from this software without specific prior written permission.
+
+THIS SOFTWARE IS PROVIDED BY CONSORTIUM BOARD ROXANNE ``AS IS'' AND ANY
+EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+DISCLAIMED. IN NO EVENT SHALL CONSORTIUM BOARD TENCOMPETENCE BE LIABLE FOR ANY
+DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+(INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+(INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+==============================================================================
+
+
+ Tests for the sparse clustering of voiceprints """
+import numpy as np
+import pytest
+from storage import voiceprint_clustering
+from storage.kit.VBx import diarization_lib
+
+
+def wp5_outputs(num_conversations=30, num_speakers=8, density=0.3, seed=0):
+    """ conversations of two channels, scores of a random subset of the pairs, high between channels of a speaker """
+    random_state = np.random.RandomState(seed)
+    conversations = [{'channels': [{'id': 'c%d_%d' % (c, i)} for i in range(2)]} for c in range(num_conversations)]
+    channel_ids = [channel['id'] for con in conversations for channel in con['channels']]
+    speakers = random_state.randint(num_speakers, size=len(channel_ids))
+    matrix = {u: {} for u in channel_ids}
+    for i, u in enumerate(channel_ids):
+        for j in range(i + 1, len(channel_ids)):
+            if random_state.rand() < density:
+                score = random_state.normal(5 if speakers[i] == speakers[j] else -3, 2)
+                matrix[u][channel_ids[j]] = matrix[channel_ids[j]][u] = score
+    return {'conversations': conversations, 'voiceprintsMatrix': matrix}
+
+
+def dense_labels(channel2index, outputs, threshold, calibration):
+    """ the former clustering, on the dense score matrix """
+    matrix = np.zeros((len(channel2index), len(channel2index)))
+    for u, row in outputs['voiceprintsMatrix'].items():
+        for v, s in row.items():
+            matrix[channel2index[u], channel2index[v]] = s
+    for con in outputs['conversations']:
+        for s in con['channels']:
+            for l in con['channels']:
+                if s != l:
+                    matrix[channel2index[s['id']], channel2index[l['id']]] = -np.inf
+    thr = diarization_lib.twoGMMcalib_lin(matrix[np.isfinite(matrix)])[0] if calibration else 0
+    return diarization_lib.AHC(matrix, thr + threshold), thr
+
+
+def sparse_labels(channel2index, outputs, threshold, calibration):
+    num_channels = len(channel2index)
+    rows, cols, scores = voiceprint_clustering.voiceprint_scores(channel2index, outputs['voiceprintsMatrix'])
+    cannot_rows, cannot_cols = voiceprint_clustering.cannot_link_pairs(channel2index, outputs['conversations'])
+    thr = 0
+    if calibration:
+        thr = voiceprint_clustering.calibration_threshold(num_channels, rows, cols, scores, cannot_rows, cannot_cols)
+    first, second, similarity = voiceprint_clustering.similarity_graph(num_channels, rows, cols, scores,
+                                                                       cannot_rows, cannot_cols)
+    return voiceprint_clustering.average_linkage_clusters(num_channels, first, second, similarity,
+                                                          thr + threshold), thr
+
+
+@pytest.mark.parametrize("seed", [0, 1, 2])
+@pytest.mark.parametrize("threshold, calibration", [(0.5, False), (2.0, False), (-0.5, False), (0.0, True)])
+def test_sparse_upgma_should_match_dense_ahc(seed, threshold, calibration):
+    """ the labels and the calibrated threshold should be the ones of diarization_lib on the dense matrix """
+    outputs = wp5_outputs(seed=seed)
+    channel2index = {channel['id']: i for i, channel in
+                     enumerate(channel for con in outputs['conversations'] for channel in con['channels'])}
+    expected, expected_thr = dense_labels(channel2index, outputs, threshold, calibration)
+    labels, thr = sparse_labels(channel2index, outputs, threshold, calibration)
+    assert thr == pytest.approx(expected_thr)
+    assert np.array_equal(labels, expected)
+    assert 1 < labels.max() + 1 < len(labels)
+
+
+def test_incremental_clusters_should_not_merge_existing_clusters():
+    """ new channels join the linked cluster they are most similar to, or start new clusters """
+    clusters = voiceprint_clustering.IncrementalClusters([0, 0, 1, 1])
+    # channel 4 is closer to cluster 0 than to cluster 1, channel 5 is close to channel 4 only, channel 6 to nothing
+    rows = np.array([4, 4, 4, 5])
+    cols = np.array([0, 1, 2, 4])
+    scores = np.array([3.0, 3.0, 2.0, 2.5])
+    no_pairs = np.zeros(0, dtype=np.int64)
+    labels = clusters.add_channels(3, rows, cols, scores, no_pairs, no_pairs, threshold=0.5)
+    assert labels.tolist() == [0, 0, 2]
+    assert clusters.labels.tolist() == [0, 0, 1, 1, 0, 0, 2]
+    assert clusters.sizes.tolist() == [4, 2, 1]
+    # a cannot-link pair keeps channel 7 out of cluster 0
+    labels = clusters.add_channels(1, np.array([7]), np.array([0]), np.array([5.0]), np.array([7]), np.array([1]),
+                                   threshold=0.5)
+    assert labels.tolist() == [3]
@@ -50,6 +50,7 @@ if path2root not in sys.path:
 from visualizer.dash_style import Style
 from visualizer.dash_layout import init_layout
 from storage.builtin_datasets import ActiveNetwork, BuiltinDatasetsManager
+from framework.caching import CachingDataManager
 from visualizer import dash_formatter, io_utils
 from visualizer import dash_io
 from visualizer.dash_io import output
@@ -103,7 +104,8 @@ DATA_INFO = {d['id']: {'path': d['path'], 'name': d['name']} for d in DATASETS +
 # ADD DATASETS TO DATASET MANAGER
 # Technically not all datasets need to be loaded -
 # Maybe just load the one set needed for retrieving entities when network is chosen.
-builtin_datasets = BuiltinDatasetsManager(connector=None, params=None)
+# Cached, the entities of a network are read for the filter dialog and the network chooser alike
+builtin_datasets = CachingDataManager(BuiltinDatasetsManager(connector=None, params=None))
 for ds in DATASETS:
     builtin_datasets.add_dataset(ds['id'], ds['name'], ds['path'])
 for ds in EXTERNAL_DATASETS:
@@ -120,9 +122,7 @@ ACTIVE_LAYOUT = {'name': 'cose-bilkent',
 
 
 # DISABLED ANALYSIS METHODS
-DISABLED_ANALYSIS_METHODS = ['authority', 'count_number_soundarajan_hopcroft',
-                             'resource_allocation_index_soundarajan_hopcroft',
-                             'within_inter_cluster']
+DISABLED_ANALYSIS_METHODS = ['authority']
 
 
 # INITIALIZE DASH/CYTOSCAPE